@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ConversationAnalytics on a large Parquet message history
+
+Writes a synthetic message history (default 2,000,000 rows with message
+text, a few hundred MB on disk) and compares:
+- legacy: read every column, to_pandas(), iterrows() into dicts, then the
+  per-message reports (the old load_arrow path)
+- arrow: load_arrow() with column projection, then the vectorized reports
+- arrow + range: the same with a one-day time range pushed down to Parquet
+
+Usage:
+    python benchmarks/bench_arrow_loader.py --rows 2000000
+    python benchmarks/bench_arrow_loader.py --path history.parquet --skip-legacy
+"""
+
+import argparse
+import random
+import string
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "src" / "utilities"))
+
+from conversation_analytics_engine import ConversationAnalytics, arrow_rows
+
+
+def write_history(path: Path, rows: int, batch: int = 200000, seed: int = 11) -> None:
+    """Time-ordered message history, one row group per batch"""
+    rng = random.Random(seed)
+    speakers = ["claude_code", "gemini_cli", "deepseek", "consolidated", "user"]
+    chains = ["system_architecture", "training", "frontend", "persistence", "grants", "general"]
+    words = [f"kw{i}" for i in range(500)]
+    writer = None
+    for start in range(0, rows, batch):
+        n = min(batch, rows - start)
+        table = pa.table({
+            "Id": [str(start + i) for i in range(n)],
+            "Timestamp": [f"2025-11-{1 + (start + i) * 28 // rows:02d}T{(start + i) % 24:02d}:00:00" for i in range(n)],
+            "SpeakerName": [rng.choice(speakers) for _ in range(n)],
+            "SpeakerRole": ["Agent"] * n,
+            "Message": ["".join(rng.choices(string.ascii_lowercase + " ", k=160)) for _ in range(n)],
+            "ConversationType": [i % 2 for i in range(n)],
+            "Metadata": [{"keywords": rng.sample(words, 4), "consolidated": i % 3 == 0,
+                          "content_hash": f"{start + i:016x}" if i % 4 == 0 else None} for i in range(n)],
+            "chain_type": [rng.choice(chains) for _ in range(n)],
+            "ace_tier": [rng.choice("ACE") for _ in range(n)],
+            "shl_tags": [[f"@Chain-{rng.choice(chains)}"] for _ in range(n)],
+        })
+        if writer is None:
+            writer = pq.ParquetWriter(path, table.schema)
+        writer.write_table(table)
+    writer.close()
+
+
+def legacy_analyze(log_dir: Path) -> dict:
+    """The previous load_arrow(): every column through pandas iterrows()"""
+    analytics = ConversationAnalytics(log_dir=str(log_dir))
+    for arrow_file in log_dir.glob("**/*.parquet"):
+        df = pq.read_table(arrow_file).to_pandas()
+        for _, row in df.iterrows():
+            msg = row.to_dict()
+            msg = {k: (v.item() if hasattr(v, 'item') else v) for k, v in msg.items()}
+            analytics.threads.append(msg)
+    return analytics._analyze_rowwise(False)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Arrow analytics loader.")
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--path", type=Path, help="Existing message Parquet file to use instead.")
+    parser.add_argument("--skip-legacy", action="store_true", help="Skip the slow iterrows() path.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_dir = Path(tmp)
+        if args.path:
+            (log_dir / args.path.name).symlink_to(args.path.resolve())
+        else:
+            _, write_s = timed(lambda: write_history(log_dir / "history.parquet", args.rows))
+            print(f"Wrote {args.rows:,} rows in {write_s:.1f} s")
+        size_mb = sum(f.stat().st_size for f in log_dir.glob("*.parquet")) / 1e6
+        print(f"Parquet history: {size_mb:.0f} MB\n")
+
+        def arrow_analyze(start_time=None, end_time=None):
+            analytics = ConversationAnalytics(log_dir=str(log_dir))
+            analytics.load_arrow(start_time, end_time)
+            return analytics, analytics.analyze()
+
+        (analytics, analysis), arrow_s = timed(arrow_analyze)
+        (_, day), range_s = timed(lambda: arrow_analyze("2025-11-10", "2025-11-11"))
+
+        sample = analytics.arrow_tables[0].slice(0, 50000)
+        check = ConversationAnalytics(log_dir=str(log_dir))
+        check.threads = arrow_rows(sample)
+        columnar = ConversationAnalytics(log_dir=str(log_dir))
+        columnar.arrow_tables = [sample]
+        assert columnar.get_columns(False).report() == check._analyze_rowwise(False), "reports differ"
+
+        print(f"{'path':<16}{'rows':>12}{'seconds':>10}")
+        if not args.skip_legacy:
+            _, legacy_s = timed(lambda: legacy_analyze(log_dir))
+            print(f"{'legacy':<16}{analysis['total_items']:>12,}{legacy_s:>10.2f}")
+        print(f"{'arrow':<16}{analysis['total_items']:>12,}{arrow_s:>10.2f}")
+        print(f"{'arrow + range':<16}{day['total_items']:>12,}{range_s:>10.2f}")
+        if not args.skip_legacy:
+            print(f"\nSpeedup: {legacy_s / arrow_s:.0f}x full history, {legacy_s / range_s:.0f}x one-day range")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Benchmark: checkpoint disk use, menu listing and restore, old format vs chunked
+
+Checkpoints a synthetic session log of --messages messages --checkpoints
+times, appending --append messages between checkpoints as the daemon's
+auto-checkpoints would see it grow. Each is written as a single-document
+JSON checkpoint (the old format) and as a chunked checkpoint. Reports:
+
+- disk used, with full streamed copies (one uncompressed log copy per
+  checkpoint) for reference
+- the time CheckpointStore.list_all takes to build the menu
+- the time and peak Python heap of restoring the newest checkpoint
+
+The old-format rows are measured twice: with the previous implementation
+(json.load of every file) and with the streamed reader's legacy path.
+
+Usage:
+    python benchmarks/bench_checkpoints.py --checkpoints 30 --messages 20000 --append 500
+"""
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "src" / "persistence"))
+
+from persistence_cli import CheckpointStore
+from storage.checkpoints import restore_checkpoint, storage_report, write_checkpoint
+from storage.chunk_store import ZSTD_SUPPORT
+
+
+VOCABULARY = [f"{stem}{suffix}" for stem in ("mesh", "token", "splat", "cache", "agent", "grant", "tier", "block",
+                                               "export", "render", "budget", "review", "thread", "model", "daemon")
+              for suffix in ("", "s", "ing", "ed", "er", "_v2", "_id", "42", "x", "ful")]
+
+
+def append_log(path: Path, first: int, count: int) -> None:
+    with open(path, 'a', encoding='utf-8') as f:
+        for n in range(first, first + count):
+            rng = random.Random(n)
+            text = " ".join(rng.choices(VOCABULARY, k=rng.randint(5, 80)))
+            f.write(json.dumps({"Id": str(n), "Timestamp": f"2025-11-01T10:{n // 60 % 60:02d}:{n % 60:02d}",
+                                "SpeakerName": ("claude_code", "gemini_cli")[n % 2], "SpeakerRole": "Agent",
+                                "Message": json.dumps({"message": f"{text} ({rng.getrandbits(64):x})"}),
+                                "ConversationType": 0, "ContextId": "bench",
+                                "Metadata": {"ace_tier": "E", "chain_type": "reconstruction"}}) + "\n")
+
+
+def write_legacy(log: Path, checkpoint_dir: Path, n: int) -> None:
+    lines = log.read_text(encoding='utf-8').splitlines(keepends=True)
+    path = checkpoint_dir / f"2025-11-01T10:00:{n:02d}.000000_legacy_{n}.json"
+    with open(path, 'w') as f:
+        json.dump({'checkpoint_id': str(path), 'timestamp': f"2025-11-01T10:00:{n:02d}", 'label': f"legacy_{n}",
+                   'message_count': len(lines), 'size_bytes': sum(len(l.encode()) for l in lines),
+                   'messages': [json.loads(l) for l in lines]}, f, indent=2)
+
+
+def list_old(checkpoint_dir: Path) -> int:
+    """The previous list_all: every checkpoint decoded in full"""
+    count = 0
+    for cp_file in sorted(checkpoint_dir.glob("*.json"), reverse=True):
+        with open(cp_file) as f:
+            count += json.load(f).get('message_count', 0) > 0
+    return count
+
+
+def restore_old(path: Path, log: Path) -> None:
+    with open(path) as f:
+        data = json.load(f)
+    with open(log, 'w') as f:
+        for msg in data.get('messages', []):
+            f.write(json.dumps(msg) + '\n')
+
+
+def measure(fn):
+    """Milliseconds untraced, then the peak traced heap in MB of a second run"""
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed * 1000, peak / 1e6
+
+
+def disk_bytes(directory: Path) -> int:
+    return sum(path.stat().st_size for path in directory.rglob("*") if path.is_file())
+
+
+def list_streamed(checkpoint_dir: Path) -> int:
+    store = CheckpointStore()
+    store.checkpoint_dir = checkpoint_dir
+    return len(store.list_all())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark checkpoint listing and restore.")
+    parser.add_argument("--checkpoints", type=int, default=30)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--append", type=int, default=500, help="Messages logged between checkpoints")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        log, restored = root / "current_session.jsonl", root / "restored.jsonl"
+        legacy_dir, chunked_dir = root / "legacy", root / "chunked"
+        legacy_dir.mkdir()
+        append_log(log, 0, args.messages)
+        start = time.perf_counter()
+        for n in range(args.checkpoints):
+            if n:
+                append_log(log, args.messages + (n - 1) * args.append, args.append)
+            write_legacy(log, legacy_dir, n)
+        legacy_s = time.perf_counter() - start
+        log.unlink()
+        append_log(log, 0, args.messages)
+        start = time.perf_counter()
+        for n in range(args.checkpoints):
+            if n:
+                append_log(log, args.messages + (n - 1) * args.append, args.append)
+            write_checkpoint(log, chunked_dir, f"auto_{n}")
+        chunked_s = time.perf_counter() - start
+        report = storage_report(chunked_dir)
+        print(f"{args.checkpoints} checkpoints of {args.messages:,}-{args.messages + (args.checkpoints - 1) * args.append:,} "
+              f"messages ({log.stat().st_size / 1e6:.1f} MB of log at the end), "
+              f"{report['chunks']} chunks, {'zstd' if ZSTD_SUPPORT else 'zlib'}")
+
+        legacy_file = max(legacy_dir.iterdir())
+        chunked_file = max(chunked_dir.glob("*.ckpt.jsonl"))
+        rows = [
+            ("old format, json.load", disk_bytes(legacy_dir), legacy_s,
+             lambda: list_old(legacy_dir), lambda: restore_old(legacy_file, restored)),
+            ("old format, streamed reader", disk_bytes(legacy_dir), legacy_s,
+             lambda: list_streamed(legacy_dir), lambda: restore_checkpoint(legacy_file, restored)),
+            ("full streamed copies", report['full_copy_bytes'], None, None, None),
+            ("chunked", disk_bytes(chunked_dir), chunked_s,
+             lambda: list_streamed(chunked_dir), lambda: restore_checkpoint(chunked_file, restored)),
+        ]
+        print(f"  {'':<30}{'disk MB':>10}{'write s':>9}{'list ms':>10}{'restore ms':>12}{'restore peak MB':>17}")
+        for name, disk, write_s, list_fn, restore_fn in rows:
+            if list_fn is None:
+                print(f"  {name:<30}{disk / 1e6:>10.1f}")
+                continue
+            list_ms = measure(list_fn)[0]
+            restore_ms, peak_mb = measure(restore_fn)
+            print(f"  {name:<30}{disk / 1e6:>10.1f}{write_s:>9.1f}{list_ms:>10.1f}{restore_ms:>12.1f}{peak_mb:>17.1f}")
+        print(f"  chunked saves {1 - disk_bytes(chunked_dir) / disk_bytes(legacy_dir):.1%} against the old format, "
+              f"{1 - disk_bytes(chunked_dir) / report['full_copy_bytes']:.1%} against full copies")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-message vs columnar ConversationAnalytics reports
+
+Times the per-message report methods against MessageColumns on:
+- the recorded log (conversation_logs/current_session.jsonl)
+- a synthetic log of N messages (default 1,000,000)
+
+"columnar (build)" includes encoding the messages into columns;
+"columnar (cached)" is a repeat report on already-encoded data, which is
+what generate_report() and generate_json_report() hit during run().
+"run() reports" is the three analyses run() performs.
+Both paths are checked to produce identical reports.
+
+Usage:
+    python benchmarks/bench_conversation_analytics.py --synthetic 1000000
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "src" / "utilities"))
+
+from conversation_analytics_engine import ConversationAnalytics
+
+
+def synthetic_messages(n: int, seed: int = 7) -> list:
+    """Messages shaped like current_session.jsonl records"""
+    rng = random.Random(seed)
+    speakers = ["claude_code", "gemini_cli", "deepseek", "consolidated", "user"]
+    chains = ["system_architecture", "training", "frontend", "persistence", "grants", "general"]
+    tiers = ["A", "C", "E"]
+    words = [f"kw{i}" for i in range(500)]
+    messages = []
+    for i in range(n):
+        metadata = {"keywords": rng.sample(words, 5)}
+        if i % 3 == 0:
+            metadata["consolidated"] = True
+        if i % 4 == 0:
+            metadata["content_hash"] = f"{i:016x}"
+        messages.append({
+            "Id": str(i),
+            "Timestamp": f"2025-11-{1 + i % 28:02d}T12:00:00",
+            "SpeakerName": rng.choice(speakers),
+            "ConversationType": i % 2,
+            "Metadata": metadata,
+            "chain_type": rng.choice(chains),
+            "ace_tier": rng.choice(tiers),
+            "shl_tags": [f"@Chain-{rng.choice(chains)}"],
+            "keywords": [],
+        })
+    return messages
+
+
+def load_log(path: Path) -> list:
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def bench(label: str, messages: list) -> None:
+    analytics = ConversationAnalytics()
+    analytics.threads = messages
+
+    rowwise, rowwise_ms = timed(lambda: analytics._analyze_rowwise(False))
+    columnar, build_ms = timed(lambda: analytics.get_columns(False).report())
+    _, cached_ms = timed(lambda: analytics.get_columns(False).report())
+    assert rowwise == columnar, f"{label}: columnar report differs from per-message report"
+
+    print(f"\n{label}: {len(messages):,} messages")
+    print(f"  {'per-message':<20}{rowwise_ms:>10.1f} ms")
+    print(f"  {'columnar (build)':<20}{build_ms:>10.1f} ms  {rowwise_ms / build_ms:>6.1f}x")
+    print(f"  {'columnar (cached)':<20}{cached_ms:>10.1f} ms  {rowwise_ms / cached_ms:>6.1f}x")
+    run_rowwise, run_columnar = 3 * rowwise_ms, build_ms + 2 * cached_ms
+    print(f"  {'run() reports':<20}{run_rowwise:>10.1f} ms -> {run_columnar:.1f} ms  "
+          f"{run_rowwise / run_columnar:>6.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ConversationAnalytics report paths.")
+    parser.add_argument("--log", type=Path, default=ROOT / "conversation_logs" / "current_session.jsonl")
+    parser.add_argument("--synthetic", type=int, default=1000000, help="Synthetic messages (0 to skip).")
+    args = parser.parse_args()
+
+    if args.log.exists():
+        bench(args.log.name, load_log(args.log))
+    if args.synthetic:
+        bench("synthetic", synthetic_messages(args.synthetic))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark: parallel multi-source loader of defragment_sources
+
+Writes three synthetic source trees (default 90 files, 27,000 messages,
+about half of them duplicates) and times DefragmentationEngine.load_messages
+for each worker count. The loaded messages and stats are checked to be
+identical to the single-process run.
+
+Usage:
+    python benchmarks/bench_defragment_sources.py --files 90 --per-file 300 --workers 1 2 4 8
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "src" / "utilities"))
+
+from defragment_sources import DefragmentationEngine
+
+SOURCES = ("dual_agents", "pc_next", "shearwater")
+
+
+def write_sources(base: Path, files: int, per_file: int, seed: int = 1) -> dict:
+    """Source trees in the three message formats, sharing one pool of texts"""
+    rng = random.Random(seed)
+    texts = [f"Message {i}: status update, with punctuation!  and   spacing. " * 30
+             for i in range(files * per_file // 3)]
+    for index, source in enumerate(SOURCES):
+        for i in range(files // len(SOURCES)):
+            folder = base / source / f"d{i % 4}"
+            folder.mkdir(parents=True, exist_ok=True)
+            messages = []
+            for _ in range(per_file):
+                text, context = rng.choice(texts), f"ctx_{rng.randint(0, 50)}"
+                ts = f"2025-11-{rng.randint(1, 20):02d}T{rng.randint(0, 23):02d}:00:00"
+                messages.append([
+                    {"Message": json.dumps({"text": text}), "ContextId": context, "Timestamp": ts},
+                    {"message": text, "conversation_id": context, "timestamp": ts},
+                    {"content": {"message": text}, "context_id": context, "timestamp": ts},
+                ][index])
+            if i % 3 == 2:
+                (folder / f"f{i}.json").write_text(json.dumps(messages), encoding='utf-8')
+            else:
+                (folder / f"f{i}.jsonl").write_text("".join(json.dumps(m) + "\n" for m in messages), encoding='utf-8')
+    return {source: base / source for source in SOURCES}
+
+
+def load(source_dirs: dict, workers: int):
+    engine = DefragmentationEngine(source_dirs)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine.load_messages(workers=workers)
+    return engine, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parallel source loader.")
+    parser.add_argument("--files", type=int, default=90)
+    parser.add_argument("--per-file", type=int, default=300)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source_dirs = write_sources(Path(tmp), args.files, args.per_file)
+        reference, serial_s = load(source_dirs, 1)
+        print(f"Sources: {reference.stats['total_loaded']:,} messages, "
+              f"{reference.stats['exact_duplicates_removed']:,} duplicates, {os.cpu_count()} CPUs\n")
+        print(f"{'workers':<10}{'seconds':>10}{'msg/s':>12}{'speedup':>10}")
+        for workers in sorted(set(args.workers)):
+            engine, seconds = (reference, serial_s) if workers == 1 else load(source_dirs, workers)
+            assert engine.stats == reference.stats, "stats differ"
+            assert engine.messages_by_context == reference.messages_by_context, "messages differ"
+            rate = engine.stats['total_loaded'] / seconds
+            print(f"{workers:<10}{seconds:>10.2f}{rate:>12,.0f}{serial_s / seconds:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
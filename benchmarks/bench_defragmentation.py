@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark: in-memory vs streaming DefragmentationEngine
+
+Writes a synthetic raw log (default 100,000 messages) and compares:
+- in-memory: load every message, sort, group into lists, re-parse timestamps
+- streaming (ordered): a single sorted pass over an append-ordered log
+- streaming (shuffled): the same log out of order, through the external sort
+
+Peak Python heap is measured with tracemalloc. The in-memory and streaming
+outputs are checked to be identical.
+
+Usage:
+    python benchmarks/bench_defragmentation.py --messages 100000
+"""
+
+import argparse
+import filecmp
+import json
+import logging
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "src" / "utilities"))
+
+from defragmentation_engine import DefragmentationEngine
+
+
+def write_log(path: Path, n: int, shuffle: bool, seed: int = 5) -> None:
+    """Messages shaped like current_session.jsonl records"""
+    rng = random.Random(seed)
+    speakers = ["claude_code", "gemini_cli", "deepseek", "user"]
+    chains = ["system_architecture", "training", "frontend", "persistence"]
+    start = datetime(2025, 11, 1)
+    lines = []
+    for i in range(n):
+        ts = start + timedelta(seconds=i * 3 + rng.randint(0, 2))
+        msg = {
+            "Id": str(i),
+            "Timestamp": ts.isoformat(),
+            "SpeakerName": rng.choice(speakers),
+            "Message": "x" * rng.randint(80, 400),
+            "Metadata": {"chain_type": rng.choice(chains), "shl_tags": ["@Status-Ready"] if i % 50 == 0 else []},
+        }
+        if i % 5:
+            msg["ContextId"] = f"ctx_{i // 40}_{i % 3}"
+        lines.append(json.dumps(msg) + "\n")
+    if shuffle:
+        rng.shuffle(lines)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the defragmentation engine.")
+    parser.add_argument("--messages", type=int, default=100000)
+    args = parser.parse_args()
+    logging.getLogger('DefragmentationEngine').setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(tmp)
+        write_log(base / "ordered.jsonl", args.messages, shuffle=False)
+        write_log(base / "shuffled.jsonl", args.messages, shuffle=True)
+        print(f"Raw log: {args.messages:,} messages, "
+              f"{(base / 'ordered.jsonl').stat().st_size / 1e6:.0f} MB\n")
+
+        cases = [
+            ("in-memory", "ordered.jsonl", False),
+            ("streaming (ordered)", "ordered.jsonl", True),
+            ("streaming (shuffled)", "shuffled.jsonl", True),
+        ]
+        print(f"{'mode':<24}{'seconds':>10}{'peak MB':>10}")
+        for label, log, streaming in cases:
+            engine = DefragmentationEngine(str(base / log), str(base / label.replace(" ", "_") / "out.jsonl"))
+            seconds, peak = measure(lambda: engine.run(streaming=streaming))
+            print(f"{label:<24}{seconds:>10.2f}{peak:>10.0f}")
+
+        reference = base / "in-memory" / "out.jsonl"
+        for label in ("streaming_(ordered)", "streaming_(shuffled)"):
+            assert filecmp.cmp(reference, base / label / "out.jsonl", shallow=False), f"{label} output differs"
+
+
+if __name__ == "__main__":
+    main()
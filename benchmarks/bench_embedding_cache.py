@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark: embedding cache and vectorized adjacent similarities
+
+Times the per-pair cosine loop the consolidation bot used to run against
+one row-wise dot product over normalized embeddings, and a cold versus warm
+EmbeddingCache pass over a synthetic log (random 384-d vectors, with
+encoding cost simulated per text). Similarities are checked to agree.
+
+Usage:
+    python benchmarks/bench_embedding_cache.py --messages 20000 --encode-us 500
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "src" / "bots"))
+
+from embedding_cache import EmbeddingCache, adjacent_similarities
+
+DIM = 384
+
+
+def pairwise_loop(embeddings: np.ndarray) -> np.ndarray:
+    """The old shape: one 1x1 cosine similarity per adjacent pair"""
+    out = []
+    for i in range(len(embeddings) - 1):
+        a, b = embeddings[i], embeddings[i + 1]
+        out.append(a @ b / (np.linalg.norm(a) * np.linalg.norm(b)))
+    return np.array(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the embedding cache and adjacent similarities.")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--encode-us", type=float, default=500, help="Simulated encoder cost per text")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    embeddings = rng.normal(size=(args.messages, DIM)).astype(np.float32)
+
+    start = time.perf_counter()
+    expected = pairwise_loop(embeddings)
+    loop_s = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = adjacent_similarities(embeddings)
+    vector_s = time.perf_counter() - start
+    assert np.allclose(actual, expected, atol=1e-5), "similarities differ"
+    print(f"Adjacent similarities ({args.messages:,} messages)")
+    print(f"  per-pair loop: {loop_s:8.3f}s")
+    print(f"  row-wise dot:  {vector_s:8.3f}s ({loop_s / vector_s:.0f}x)\n")
+
+    texts = [f"message {i}" for i in range(args.messages)]
+    vectors = {text: row for text, row in zip(texts, embeddings)}
+
+    def encode(batch):
+        time.sleep(len(batch) * args.encode_us / 1e6)
+        return np.stack([vectors[text] for text in batch])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print("Embedding cache")
+        for label, count in (("cold run", args.messages * 9 // 10), ("rerun +10%", args.messages)):
+            cache = EmbeddingCache(Path(tmp), "bench")
+            start = time.perf_counter()
+            result = cache.embed(texts[:count], encode)
+            seconds = time.perf_counter() - start
+            assert np.allclose(adjacent_similarities(result), expected[:count - 1], atol=1e-2), "cached rows differ"
+            print(f"  {label:<12}{seconds:8.3f}s  ({cache.stats['encoded']:,} encoded, {cache.stats['hits']:,} cached)")
+        size = sum(f.stat().st_size for f in Path(tmp).iterdir())
+        print(f"  cache size:  {size / 1e6:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
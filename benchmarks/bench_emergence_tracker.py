@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark: shared MessageCorpus in EmergentPropertyTracker
+
+Times generate_report on a synthetic log with the corpus built once per
+load, against the same tracker rebuilding the corpus on every access (the
+per-metric corpus passes the tracker used to make). Reports are checked to
+be identical.
+
+Then times EmergenceWindow scoring every message of a sliding window
+against recomputing the window's novelty and turn balance from scratch
+after each message (checked to agree).
+
+Usage:
+    python benchmarks/bench_emergence_tracker.py --messages 5000 20000 --window 200 --stream 2000
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "src" / "utilities"))
+
+from emergent_property_tracker import EmergenceWindow, EmergentPropertyTracker
+from message_corpus import MessageCorpus
+
+WORDS = ("cache database latency 5 ms actually rather than hybrid agreed question? risk fallback "
+         "tested deploy monitor snake_case_name def handler class Worker the a of to and").split()
+
+
+class RebuildingTracker(EmergentPropertyTracker):
+    """Tokenizes the whole log for every metric that reads it"""
+
+    builds = 0
+
+    @property
+    def corpus(self):
+        RebuildingTracker.builds += 1
+        return MessageCorpus(self.messages)
+
+
+def synthetic_messages(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    messages = []
+    for i in range(count):
+        words = [rng.choice(WORDS) if rng.random() < 0.6 else f"term{rng.randint(0, 20000)}"
+                 for _ in range(rng.randint(5, 60))]
+        messages.append({"SpeakerName": ("claude", "gemini")[i % 2], "from": "a", "to": "b",
+                         "Message": " ".join(words)})
+    return messages
+
+
+def report(tracker_class, messages):
+    tracker = tracker_class()
+    tracker.messages = messages
+    tracker.extract_conversations()
+    start = time.perf_counter()
+    result = tracker.generate_report()
+    seconds = time.perf_counter() - start
+    result.pop('timestamp')
+    return result, seconds
+
+
+def window_scores(messages, size: int):
+    """(online seconds, recompute seconds) for a sliding window over messages"""
+    window = EmergenceWindow(max_messages=size)
+    start = time.perf_counter()
+    points = [window.add(msg) for msg in messages]
+    online_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i, point in enumerate(points):
+        tracker = EmergentPropertyTracker()
+        tracker.messages = messages[max(0, i - size + 1):i + 1]
+        assert abs(point['novelty'] - tracker._calculate_novelty_score() / 100) < 1e-4, "novelty differs"
+        assert point['turn_balance'] == tracker._measure_turn_balance(), "turn balance differs"
+    return online_s, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the shared tracker corpus and sliding window.")
+    parser.add_argument("--messages", type=int, nargs="+", default=[5000, 20000])
+    parser.add_argument("--window", type=int, default=200, help="Sliding window size in messages")
+    parser.add_argument("--stream", type=int, default=2000, help="Messages streamed through the window")
+    args = parser.parse_args()
+
+    print(f"{'messages':>10}{'rebuild s':>12}{'shared s':>10}{'speedup':>10}{'passes':>8}")
+    for count in args.messages:
+        messages = synthetic_messages(count)
+        RebuildingTracker.builds = 0
+        expected, rebuild_s = report(RebuildingTracker, messages)
+        actual, shared_s = report(EmergentPropertyTracker, messages)
+        assert actual == expected, "reports differ"
+        print(f"{count:>10,}{rebuild_s:>12.2f}{shared_s:>10.2f}{rebuild_s / shared_s:>9.1f}x"
+              f"{RebuildingTracker.builds:>8}")
+
+    online_s, recompute_s = window_scores(synthetic_messages(args.stream), args.window)
+    print(f"\nSliding window of {args.window} over {args.stream:,} messages")
+    print(f"  recompute per message: {recompute_s:8.2f}s")
+    print(f"  EmergenceWindow:       {online_s:8.2f}s ({recompute_s / online_s:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark: file vs SQLite MessageQueue backends
+
+Queues N tasks (default 10,000) into one agent's inbox with each backend,
+then times the operations an agent polls with:
+- get_pending_tasks() and get_status()
+- wait_for_task() when a task is already waiting
+- claiming and completing a batch of tasks
+
+Usage:
+    python benchmarks/bench_message_queue.py --tasks 10000
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.message_queue import AgentName, MessageQueue
+
+
+def timed(fn, repeat: int = 1) -> float:
+    """Average wall time of fn() in milliseconds"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def bench_backend(kind: str, n_tasks: int, n_claims: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(tmp)
+        sender = MessageQueue(AgentName.CLAUDE, base_path=base, backend=kind)
+        worker = MessageQueue(AgentName.GEMINI, base_path=base, backend=kind)
+        priorities = ["low", "normal", "high"]
+
+        start = time.perf_counter()
+        for i in range(n_tasks):
+            sender.send_task(AgentName.GEMINI, "bench", {"n": i}, priority=priorities[i % 3])
+        enqueue_ms = (time.perf_counter() - start) * 1000
+
+        results = {
+            'enqueue_total_ms': enqueue_ms,
+            'get_pending_tasks_ms': timed(worker.get_pending_tasks, repeat=3),
+            'get_status_ms': timed(worker.get_status, repeat=3),
+            'wait_for_task_ms': timed(lambda: worker.wait_for_task(timeout=1.0), repeat=10),
+        }
+
+        task_ids = [t["id"] for t in worker.get_pending_tasks()[:n_claims]]
+
+        def claim_and_complete():
+            for task_id in task_ids:
+                worker.mark_task_processing(task_id)
+                worker.mark_task_complete(task_id)
+
+        results['claim_complete_per_task_ms'] = timed(claim_and_complete) / max(1, len(task_ids))
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MessageQueue backends.")
+    parser.add_argument("--tasks", type=int, default=10000, help="Tasks queued before timing polls.")
+    parser.add_argument("--claims", type=int, default=200, help="Tasks claimed and completed.")
+    args = parser.parse_args()
+
+    report = {kind: bench_backend(kind, args.tasks, args.claims) for kind in ("file", "sqlite")}
+
+    print(f"\nMessageQueue backends with {args.tasks:,} queued tasks")
+    print("=" * 64)
+    print(f"{'operation':<30}{'file':>12}{'sqlite':>12}{'speedup':>10}")
+    for metric in report["file"]:
+        file_ms, sqlite_ms = report["file"][metric], report["sqlite"][metric]
+        speedup = file_ms / sqlite_ms if sqlite_ms else float('inf')
+        print(f"{metric:<30}{file_ms:>12.2f}{sqlite_ms:>12.2f}{speedup:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memory of phrase counting for _find_unique_phrases
+
+Counts 3-term phrases of a synthetic log (Zipf-like vocabulary) three ways
+and reports retained and peak memory (tracemalloc) and time:
+
+- a Counter of phrase strings, as _find_unique_phrases used to build
+- PhraseStats exact: sorted 64-bit hashes with counts
+- PhraseStats approximate: a fixed-size count-min sketch
+
+Unique-phrase counts are checked against the Counter (approximate mode
+may only undercount, within its documented bound).
+
+Usage:
+    python benchmarks/bench_phrase_stats.py --messages 50000 --words 30
+"""
+
+import argparse
+import gc
+import random
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "src" / "utilities"))
+
+from message_corpus import MessageCorpus, PhraseStats
+
+
+def synthetic_messages(count: int, words: int, seed: int = 1):
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(50000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    return [{"Message": " ".join(rng.choices(vocabulary, weights, k=rng.randint(words // 2, words * 3 // 2)))}
+            for _ in range(count)]
+
+
+def measure(build):
+    """(result, retained bytes, peak bytes, seconds) of build()"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    seconds = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, retained, peak, seconds
+
+
+def string_counter(messages):
+    counts = Counter()
+    for msg in messages:
+        words = str(msg.get('Message', '')).split()
+        for i in range(len(words) - 2):
+            phrase = ' '.join(words[i:i + 3]).lower()
+            if len(phrase) > 10:
+                counts[phrase] += 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark phrase-count memory.")
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--words", type=int, default=30, help="Average words per message")
+    args = parser.parse_args()
+
+    messages = synthetic_messages(args.messages, args.words)
+    corpus = MessageCorpus(messages, phrase_mode='approximate')  # Term arrays shared by both modes
+    terms = (corpus.term_ids, corpus.term_offsets, corpus.term_lengths)
+
+    counter, retained, peak, seconds = measure(lambda: string_counter(messages))
+    expected = sum(1 for count in counter.values() if count == 1)
+    print(f"{len(messages):,} messages, {sum(counter.values()):,} phrases, {len(counter):,} distinct, "
+          f"{expected:,} unique\n")
+    print(f"{'method':<14}{'retained MB':>13}{'peak MB':>10}{'seconds':>9}{'unique':>12}")
+    print(f"{'Counter[str]':<14}{retained / 1e6:>13.1f}{peak / 1e6:>10.1f}{seconds:>9.2f}{expected:>12,}")
+    del counter
+
+    for mode in ("exact", "approximate"):
+        stats, retained, peak, seconds = measure(lambda: PhraseStats(*terms, mode=mode))
+        unique = stats.unique_count()
+        if mode == "exact":
+            assert unique == expected, "exact count differs"
+        else:
+            assert unique <= expected, "sketch overcounted"
+        print(f"{mode:<14}{retained / 1e6:>13.1f}{peak / 1e6:>10.1f}{seconds:>9.2f}{unique:>12,}"
+              f"  ({(expected - unique) / max(1, expected):.3%} missed)")
+
+
+if __name__ == "__main__":
+    main()
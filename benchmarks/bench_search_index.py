@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark: full-text search index for persistence_cli
+
+Writes a synthetic session log and reports:
+
+- the time to index it from scratch, and the index size
+- the per-message cost of catch_up() after each append, as the
+  persistence daemon calls it
+- query latency through the index (ranked among the newest RANK_WINDOW
+  matches and newest first, phrases, prefixes, filters) against the
+  keyword scan ConversationBrowser used to do, which stops at the first
+  --limit (oldest) hits
+
+Usage:
+    python benchmarks/bench_search_index.py --messages 1000000 --appends 500
+"""
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "src" / "persistence"))
+
+from storage.search_index import MessageSearchIndex
+
+SPEAKERS = ["claude_code", "gemini_cli", "deepseek", "user"]
+CHAINS = ["reconstruction", "photo_capture", "token_optimization", "system_architecture", "testing_validation"]
+START = datetime(2025, 1, 1)
+COMMON = ("the a to of and mesh token cache agent model test build ready review design".split())
+
+
+def synthetic_event(rng: random.Random, n: int) -> dict:
+    words = [rng.choice(COMMON) if rng.random() < 0.6 else f"term{int(rng.paretovariate(1.1)) % 200000}"
+             for _ in range(rng.randint(8, 60))]
+    return {"Id": str(n), "Timestamp": (START + timedelta(minutes=n)).isoformat(),
+            "SpeakerName": SPEAKERS[n % len(SPEAKERS)], "SpeakerRole": "Agent",
+            "Message": json.dumps({"message": " ".join(words)}), "ConversationType": 0,
+            "ContextId": f"context_{n // 50}", "Metadata": {"chain_type": rng.choice(CHAINS), "ace_tier": "E"}}
+
+
+def write_log(path: Path, count: int, start: int = 0, seed: int = 1) -> None:
+    rng = random.Random(seed + start)
+    with open(path, 'a', encoding='utf-8') as f:
+        for n in range(start, start + count):
+            f.write(json.dumps(synthetic_event(rng, n)) + "\n")
+
+
+def scan(log_path: Path, query: str, limit: int):
+    """ConversationBrowser.search before the index"""
+    results = []
+    query_lower = query.lower()
+    with open(log_path) as f:
+        for line in f:
+            msg = json.loads(line)
+            if query_lower in msg.get('Message', '').lower():
+                results.append(msg)
+                if len(results) >= limit:
+                    break
+    return results
+
+
+def timed_ms(fn, repeat: int = 5):
+    fn()  # Warm the page cache
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the persistence search index.")
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--appends", type=int, default=200, help="Messages appended one at a time afterwards")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path, index_path = Path(tmp) / "current_session.jsonl", Path(tmp) / "search_index.db"
+        write_log(log_path, args.messages)
+        index = MessageSearchIndex(index_path)
+        start = time.perf_counter()
+        indexed = index.catch_up(log_path)
+        build_s = time.perf_counter() - start
+        index_mb = sum(p.stat().st_size for p in Path(tmp).glob("search_index.db*")) / 1e6
+        print(f"Indexed {indexed:,} messages in {build_s:.1f}s ({indexed / build_s:,.0f} msg/s); "
+              f"log {log_path.stat().st_size / 1e6:.0f} MB, index {index_mb:.0f} MB")
+
+        start = time.perf_counter()
+        for n in range(args.messages, args.messages + args.appends):
+            write_log(log_path, 1, start=n)
+            index.catch_up(log_path)
+        print(f"catch_up after each append: {(time.perf_counter() - start) / args.appends * 1000:.2f} ms/message\n")
+
+        queries = [
+            ("rare term", "term300", {}),
+            ("common term", "mesh", {}),
+            ("common, newest first", "mesh", {'order': 'newest'}),
+            ("phrase", '"mesh token"', {}),
+            ("prefix", "term98*", {}),
+            ("term + speaker + time", "cache speaker:gemini_cli since:2025-02-01 until:2025-03-01", {}),
+            ("filters only", "chain:reconstruction tier:E", {}),
+        ]
+        print(f"{'query':<24}{'index ms':>10}{'hits':>6}{'scan ms':>10}{'hits':>6}")
+        for name, query, kwargs in queries:
+            hits, index_ms = timed_ms(lambda: index.search(query, limit=args.limit, **kwargs))
+            row = f"{name:<24}{index_ms:>10.2f}{len(hits):>6}"
+            if ":" not in query and not query.endswith("*"):
+                scanned, scan_ms = timed_ms(lambda: scan(log_path, query.strip('"'), args.limit), repeat=1)
+                row += f"{scan_ms:>10.0f}{len(scanned):>6}"
+            print(row)
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
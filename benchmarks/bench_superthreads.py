@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Benchmark: incremental topic modeling in SuperthreadAnalyzer
+
+Clusters a synthetic set of threads (each drawn from one of --topics
+overlapping word distributions plus shared noise words), then adds --new
+threads per round for --rounds rounds. Each round is clustered two ways:
+
+- full: TF-IDF and NMF fitted on every thread, as run() does
+- incremental: the saved hashed TF-IDF / MiniBatchNMF model updated with
+  the new threads only, as run(incremental=True) does
+
+and reports the topic modeling wall time of each (text preprocessing is
+shared and timed separately), how stable the existing threads' assignments are
+from one round to the next (adjusted Rand index, so topic numbering does
+not matter) and how well the topics recover the generating ones.
+
+Then times text preprocessing of the first round's threads: the former
+three re.sub passes with a list stopword check, clean_text() serially and
+in a process pool of --workers, and a rerun served from the text cache
+(all checked to give the same texts).
+
+Usage:
+    python benchmarks/bench_superthreads.py --threads 5000 --new 250 --rounds 4 --topics 20 --workers 4
+"""
+
+import argparse
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "src" / "utilities"))
+
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+from sklearn.metrics import adjusted_rand_score
+
+import superthread_analyzer
+from superthread_analyzer import SuperthreadAnalyzer
+
+logging.getLogger('SuperthreadAnalyzer').setLevel(logging.ERROR)
+
+
+def word(i: int) -> str:
+    return "term" + "".join(chr(97 + int(d)) for d in str(i))  # Letters only: digits are stripped
+
+
+def synthetic_threads(count: int, topics: int, start: int = 0, seed: int = 1):
+    """Threads mixing one topic's words (overlapping vocabularies) with shared noise"""
+    topic_rng = random.Random(seed)
+    vocabularies = [topic_rng.sample(range(2000), 100) for _ in range(topics)]
+    weights = [1 / (rank + 1) for rank in range(100)]
+    rng = random.Random(seed + start)
+    threads, labels = [], []
+    for i in range(start, start + count):
+        topic = rng.randrange(topics)
+        messages = [{"Message": " ".join(word(rng.choices(vocabularies[topic], weights)[0]) if rng.random() < 0.35
+                                         else word(rng.randrange(5000)) for _ in range(rng.randint(10, 40)))}
+                    for _ in range(rng.randint(2, 8))]
+        threads.append({"thread_id": f"thread_{i}", "messages": messages})
+        labels.append(topic)
+    return threads, labels
+
+
+def legacy_preprocess(threads):
+    """_preprocess_text as it was: three re.sub passes and a list membership test per word"""
+    custom_stopwords = ['message', 'consolidated', 'true', 'original_count', 'time_window', 'keywords', 'contextid',
+                        'updatedat', 'phases', 'timestamp', 'phase', 'data', 'length', 'domain', 'confidence',
+                        'commandcount', 'routing', 'lease', 'context', 'activated', 'manager']
+    texts = []
+    for thread in threads:
+        full_text = " ".join([msg.get('Message', '') for msg in thread['messages']])
+        full_text = re.sub(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d+Z?', '', full_text)
+        full_text = re.sub(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', '', full_text,
+                           flags=re.IGNORECASE)
+        full_text = re.sub(r'[^a-zA-Z\s]', '', full_text).lower()
+        texts.append(" ".join([w for w in full_text.split() if w not in custom_stopwords and len(w) > 2]))
+    return texts
+
+
+def preprocess_timings(threads, workers: int, tmp: str):
+    """Seconds to clean threads each way"""
+    for thread in threads:  # Log-like noise for the cleaning passes
+        thread['messages'].append({"Message": '{"timestamp": "2025-10-15T22:07:49.2368354Z", '
+                                              '"contextid": "1f2e3d4c-0000-4abc-8def-0123456789ab", "length": 42}'})
+    expected, legacy_s = timed(legacy_preprocess, threads)
+    rows = [("3x re.sub, list stopwords", legacy_s)]
+    for name, count in (("single pass, serial", 1), (f"single pass, {workers} workers", workers)):
+        cache = Path(tmp) / f"{count}.json"
+        analyzer = SuperthreadAnalyzer("unused.parquet", str(cache), workers=count)
+        analyzer.threads = threads
+        texts, seconds = timed(analyzer._preprocess_text)
+        assert texts == expected, "texts differ"
+        rows.append((name, seconds))
+    texts, seconds = timed(analyzer._preprocess_text)
+    assert texts == expected and analyzer.stats['texts_cleaned'] == 0
+    rows.append(("cached rerun", seconds))
+    return rows
+
+
+def full_fit(analyzer, texts):
+    model, _, tfidf = analyzer._perform_topic_modeling(texts)
+    return model.transform(tfidf).argmax(axis=1)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark incremental superthread topic modeling.")
+    parser.add_argument("--threads", type=int, default=5000, help="Threads in the first round")
+    parser.add_argument("--new", type=int, default=250, help="Threads added per round")
+    parser.add_argument("--rounds", type=int, default=4)
+    parser.add_argument("--topics", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Preprocessing processes")
+    args = parser.parse_args()
+
+    try:
+        superthread_analyzer.stopwords.words('english')
+    except LookupError:  # No NLTK data here; any fixed list times the same
+        stopwords = mock.Mock(**{'words.return_value': sorted(ENGLISH_STOP_WORDS)})
+        mock.patch.object(superthread_analyzer, 'stopwords', stopwords).start()
+
+    threads, labels = synthetic_threads(args.threads, args.topics)
+    with tempfile.TemporaryDirectory() as tmp:
+        analyzer = SuperthreadAnalyzer("unused.parquet", str(Path(tmp) / "superthreads.json"),
+                                       n_superthreads=args.topics)
+        print(f"{'round':>5}{'threads':>9}{'prep s':>8}{'full s':>9}{'incr s':>9}{'full stable':>13}{'incr stable':>13}"
+              f"{'full ARI':>10}{'incr ARI':>10}")
+        previous = None
+        for round_number in range(args.rounds + 1):
+            if round_number:
+                more, more_labels = synthetic_threads(args.new, args.topics, start=len(threads))
+                threads, labels = threads + more, labels + more_labels
+            analyzer.threads = threads
+            texts, preprocess_s = timed(analyzer._preprocess_text)
+            full, full_s = timed(full_fit, analyzer, texts)
+            incremental, incremental_s = timed(analyzer._update_topics, texts)
+
+            stable = ["", ""]
+            if previous is not None:
+                n = len(previous[0])
+                stable = [f"{adjusted_rand_score(before, now[:n]):.3f}" for before, now in zip(previous, (full, incremental))]
+            print(f"{round_number:>5}{len(threads):>9,}{preprocess_s:>8.2f}{full_s:>9.2f}{incremental_s:>9.2f}{stable[0]:>13}{stable[1]:>13}"
+                  f"{adjusted_rand_score(labels, full):>10.3f}{adjusted_rand_score(labels, incremental):>10.3f}")
+            previous = (full, incremental)
+
+        print(f"\nPreprocessing {args.threads:,} threads")
+        for name, seconds in preprocess_timings(synthetic_threads(args.threads, args.topics)[0], args.workers, tmp):
+            print(f"  {name:<28}{seconds:8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark: nested, day-partitioned thread Parquet vs JSON-string columns
+
+Defragments a synthetic raw log (default 100,000 messages) and compares the
+thread Parquet output with the previous layout (one file, messages,
+participants and context_shifts as JSON strings):
+- size on disk
+- SuperthreadAnalyzer-style full load into thread dicts
+- ConversationAnalytics load: JSONL threads vs projected nested columns
+
+Usage:
+    python benchmarks/bench_thread_parquet.py --messages 100000
+"""
+
+import argparse
+import json
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "src" / "utilities"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from bench_defragmentation import write_log
+from conversation_analytics_engine import ConversationAnalytics
+from defragmentation_engine import DefragmentationEngine, read_thread_table, threads_from_table
+
+
+def write_legacy(jsonl: Path, path: Path) -> None:
+    """The previous single-file layout with JSON-string columns"""
+    rows = []
+    with open(jsonl, 'r', encoding='utf-8') as f:
+        for line in f:
+            thread = json.loads(line)
+            for key in ('messages', 'participants', 'context_shifts'):
+                thread[key] = json.dumps(thread[key], ensure_ascii=False)
+            rows.append(thread)
+    pq.write_table(pa.Table.from_pylist(rows), path)
+
+
+def legacy_load(path: Path) -> list:
+    """The previous SuperthreadAnalyzer._load_threads()"""
+    threads = pq.read_table(path).to_pylist()
+    for thread in threads:
+        for key in ('messages', 'participants', 'context_shifts'):
+            thread[key] = json.loads(thread[key])
+    return threads
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def size_mb(path: Path) -> float:
+    files = path.rglob("*.parquet") if path.is_dir() else [path]
+    return sum(f.stat().st_size for f in files) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the nested thread Parquet layout.")
+    parser.add_argument("--messages", type=int, default=100000)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(tmp)
+        write_log(base / "raw.jsonl", args.messages, shuffle=False)
+        jsonl = base / "defragmented_sessions.jsonl"
+        DefragmentationEngine(str(base / "raw.jsonl"), str(jsonl)).run()
+        nested = jsonl.with_suffix('.parquet')
+        legacy = base / "legacy.parquet"
+        write_legacy(jsonl, legacy)
+
+        old_threads, legacy_s = timed(lambda: legacy_load(legacy))
+        threads, nested_s = timed(lambda: threads_from_table(read_thread_table(nested)))
+        assert threads == old_threads, "thread dicts differ"
+
+        def analytics(parquet: bool):
+            engine = ConversationAnalytics(log_dir=tmp, defragmented_log_file=str(jsonl))
+            engine.load_defragmented_arrow(nested) if parquet else engine.load_jsonl()
+            return engine.analyze()
+
+        analytics(True)  # Warm up the Arrow compute kernels
+        jsonl_report, jsonl_s = timed(lambda: analytics(False))
+        arrow_report, arrow_s = timed(lambda: analytics(True))
+        for key in jsonl_report:
+            assert key == 'timestamp' or jsonl_report[key] == arrow_report[key], f"{key} differs"
+
+        print(f"Threads: {len(threads):,} ({args.messages:,} messages)\n")
+        print(f"{'layout':<34}{'MB':>8}{'seconds':>10}")
+        print(f"{'JSON-string columns, full load':<34}{size_mb(legacy):>8.1f}{legacy_s:>10.2f}")
+        print(f"{'nested, full load':<34}{size_mb(nested):>8.1f}{nested_s:>10.2f}")
+        print(f"{'analytics from JSONL':<34}{jsonl.stat().st_size / 1e6:>8.1f}{jsonl_s:>10.2f}")
+        print(f"{'analytics, projected nested':<34}{'':>8}{arrow_s:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark: semantic vector index query latency on CPU
+
+For each --sizes corpus of synthetic unit vectors (--dim wide, drawn
+around --clusters topic centres so neighbourhoods look like real sentence
+embeddings), reports:
+
+- the time to append the float16 rows and to train the IVF lists
+- flat (exact, memory-mapped float16) query latency
+- IVF latency and recall@k against flat, for several nprobe values
+- latency with a speaker filter that keeps about a quarter of the rows
+
+Usage:
+    python benchmarks/bench_vector_index.py --sizes 100000 1000000 --queries 50
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "src" / "bots"))
+
+from vector_index import MESSAGE, VectorIndex
+
+SPEAKERS = 4
+APPEND_ROWS = 65536
+
+
+def synthetic_rows(rng, centres, count, noise):
+    rows = centres[rng.integers(len(centres), size=count)] + rng.normal(scale=noise, size=(count, centres.shape[1]))
+    return rows.astype(np.float32)
+
+
+def build(path: Path, size: int, centres: np.ndarray, noise: float, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    index = VectorIndex(path / "index", path / "cache", model_name="synthetic", backend='flat')
+    index.index_dir.mkdir(parents=True, exist_ok=True)
+    index.state['vocab']['speaker'] = [f"speaker_{s}" for s in range(SPEAKERS)]
+    index.codes['speaker'] = {name: code for code, name in enumerate(index.state['vocab']['speaker'])}
+    start = time.perf_counter()
+    for first in range(0, size, APPEND_ROWS):
+        count = min(APPEND_ROWS, size - first)
+        records = [(MESSAGE, 0, 0, row % SPEAKERS, -1, -1) for row in range(first, first + count)]
+        index._append(synthetic_rows(rng, centres, count, noise), records)
+    append_s = time.perf_counter() - start
+    start = time.perf_counter()
+    index.train_ivf()
+    return index, append_s, time.perf_counter() - start
+
+
+def latencies(fn, queries):
+    results, times = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(fn(query))
+        times.append((time.perf_counter() - start) * 1000)
+    return results, statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the vector index.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--dim", type=int, default=384, help="all-MiniLM-L6-v2 width")
+    parser.add_argument("--clusters", type=int, default=2000)
+    parser.add_argument("--noise", type=float, default=1.0, help="Spread around a centre, per dimension")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centres = rng.normal(size=(args.clusters, args.dim)).astype(np.float32)
+    queries = synthetic_rows(rng, centres, args.queries, args.noise)
+
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            index, append_s, train_s = build(Path(tmp), size, centres, args.noise)
+            print(f"\n{size:,} vectors x {args.dim}: appended in {append_s:.1f}s, "
+                  f"{index.state['ivf']['lists']} IVF lists trained in {train_s:.1f}s, "
+                  f"{index.vectors.nbytes / 1e6:.0f} MB float16")
+            print(f"  {'search':<28}{'p50 ms':>9}{'recall@' + str(args.k):>11}")
+            with mock.patch.object(index, '_read_hits', lambda rows, scores: rows.tolist()):
+                index.backend = 'flat'
+                exact, flat_ms = latencies(lambda q: index.search_vector(q, args.k), queries)
+                print(f"  {'flat':<28}{flat_ms:>9.1f}{1:>11.3f}")
+                index.backend = 'ivf'
+                for nprobe in args.nprobe:
+                    found, ivf_ms = latencies(lambda q: index.search_vector(q, args.k, nprobe=nprobe), queries)
+                    recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(found, exact)])
+                    print(f"  {f'ivf, nprobe={nprobe}':<28}{ivf_ms:>9.1f}{recall:>11.3f}")
+                _, filtered_ms = latencies(lambda q: index.search_vector(q, args.k, {'speaker': 'speaker_1'}), queries)
+                print(f"  {'ivf + speaker filter':<28}{filtered_ms:>9.1f}")
+                index.backend = 'flat'
+                _, filtered_ms = latencies(lambda q: index.search_vector(q, args.k, {'speaker': 'speaker_1'}), queries)
+                print(f"  {'flat + speaker filter':<28}{filtered_ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
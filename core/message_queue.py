@@ -2,18 +2,26 @@
 Inter-CLI Communication System
 Enables Claude Code, Gemini CLI, and Deepseek to communicate without copy-paste
 
-Uses file-based JSONL queues with status tracking
-Can be upgraded to named pipes or sockets later
+Uses file-based JSON queues with status tracking by default, or an
+indexed SQLite queue (see core.queue_backends)
 """
 
 import json
+import os
 import uuid
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Union
 from datetime import datetime, timezone
 from enum import Enum
 import sys
 
+try:
+    from .queue_backends import FileQueueBackend, QueueBackend, create_backend
+    from .task_scheduler import DEFAULT_LEASE_SECONDS, DEFAULT_MAX_ATTEMPTS, TaskScheduler, default_worker_id
+except ImportError:
+    from queue_backends import FileQueueBackend, QueueBackend, create_backend
+    from task_scheduler import DEFAULT_LEASE_SECONDS, DEFAULT_MAX_ATTEMPTS, TaskScheduler, default_worker_id
+
 # Fix Unicode output on Windows
 if sys.platform == "win32":
     sys.stdout.reconfigure(encoding='utf-8')
@@ -38,18 +46,35 @@ class MessageType(Enum):
 
 class MessageQueue:
     """
-    File-based message queue for inter-CLI communication
+    Message queue for inter-CLI communication
 
     Each agent has:
     - inbox/  - incoming messages
     - outbox/ - outgoing messages
     - archive/ - processed messages (for audit trail)
 
-    File naming: {message_id}_{type}_{status}.json
-    Status: PENDING → PROCESSING → DONE or FAILED
+    Status: PENDING → PROCESSING → DONE, or back to PENDING on failure /
+    lease expiry, and DEAD (dead-lettered) after max_attempts deliveries
+
+    Claiming a task leases it to this worker for lease_seconds. Several
+    workers (threads or processes) can drain one inbox with claim(n)
+    without ever processing the same task twice.
+
+    Storage is pluggable (see core.queue_backends):
+    - "file" (default): one JSON file per message, {message_id}_{status}.json
+    - "sqlite": indexed WAL database with atomic transitions and fast waits
+    The backend can also be chosen with SHEARWATER_QUEUE_BACKEND.
     """
 
-    def __init__(self, agent_name: AgentName, base_path: Optional[Path] = None):
+    def __init__(
+        self,
+        agent_name: AgentName,
+        base_path: Optional[Path] = None,
+        backend: Union[str, QueueBackend, None] = None,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        worker_id: Optional[str] = None
+    ):
         """Initialize message queue for an agent"""
         if base_path is None:
             base_path = Path("C:/Users/user/ShearwaterAICAD/communication")
@@ -60,16 +85,30 @@ class MessageQueue:
         self.outbox_path = base_path / f"{agent_name.value}_outbox"
         self.archive_path = base_path / f"{agent_name.value}_archive"
 
-        # Create directories
-        for path in [self.inbox_path, self.outbox_path, self.archive_path]:
-            path.mkdir(parents=True, exist_ok=True)
+        if backend is None:
+            backend = os.getenv("SHEARWATER_QUEUE_BACKEND", "file")
+        if isinstance(backend, str):
+            backend = create_backend(backend, base_path)
+        self.backend = backend
+        self.scheduler = TaskScheduler(
+            backend,
+            [agent_name.value],
+            lease_seconds=lease_seconds,
+            max_attempts=max_attempts,
+            worker_id=worker_id or default_worker_id(agent_name.value)
+        )
+
+        if isinstance(backend, FileQueueBackend):
+            # Create directories
+            for path in [self.inbox_path, self.outbox_path, self.archive_path]:
+                path.mkdir(parents=True, exist_ok=True)
 
     def send_task(
         self,
         to_agent: AgentName,
         task_type: str,
         content: Dict,
-        priority: str = "normal",
+        priority: Union[str, int] = "normal",
         metadata: Optional[Dict] = None
     ) -> str:
         """
@@ -79,7 +118,7 @@ class MessageQueue:
             to_agent: Recipient agent
             task_type: Type of task (e.g., "implement_recorder", "review_code")
             content: Task content/details
-            priority: "low", "normal", "high"
+            priority: "low", "normal", "high", or a number (lower runs first)
             metadata: Optional metadata (context, references, etc.)
 
         Returns:
@@ -101,15 +140,10 @@ class MessageQueue:
         }
 
         # Write to recipient's inbox
-        recipient_inbox = self.base_path / f"{to_agent.value}_inbox"
-        recipient_inbox.mkdir(parents=True, exist_ok=True)
-
-        filepath = recipient_inbox / f"{message_id}_PENDING.json"
-        self._write_json(filepath, message)
+        self.backend.put_task(message)
 
         # Log to own outbox
-        own_outbox_file = self.outbox_path / f"{message_id}_SENT.json"
-        self._write_json(own_outbox_file, message)
+        self.backend.log_sent(message)
 
         return message_id
 
@@ -131,16 +165,11 @@ class MessageQueue:
             True if sent successfully
         """
         try:
-            # Read original message from outbox to find sender
-            original_file = None
-            for f in self.outbox_path.glob(f"{message_id}_*.json"):
-                original_file = f
-                break
-
-            if not original_file:
+            # Find the original message (outbox, then inbox) to get the sender
+            original_msg = self.backend.find_original(self.agent_name.value, message_id)
+            if not original_msg:
                 return False
 
-            original_msg = self._read_json(original_file)
             sender = original_msg["from"]
 
             result_msg = {
@@ -154,14 +183,10 @@ class MessageQueue:
             }
 
             # Write to sender's inbox
-            sender_inbox = self.base_path / f"{sender}_inbox"
-            sender_inbox.mkdir(parents=True, exist_ok=True)
-
-            result_file = sender_inbox / f"{message_id}_RESULT.json"
-            self._write_json(result_file, result_msg)
+            self.backend.put_result(result_msg)
 
             # Archive original
-            self._archive_file(original_file)
+            self.backend.archive_original(self.agent_name.value, message_id)
 
             return True
 
@@ -170,86 +195,65 @@ class MessageQueue:
             return False
 
     def get_pending_tasks(self) -> List[Dict]:
-        """Get all pending tasks for this agent"""
-        tasks = []
-        for task_file in self.inbox_path.glob("*_PENDING.json"):
-            try:
-                task = self._read_json(task_file)
-                tasks.append(task)
-            except Exception:
-                pass
-        return sorted(tasks, key=lambda x: x.get("priority") == "high", reverse=True)
+        """Get all pending tasks for this agent, by priority level then age"""
+        return self.backend.pending_tasks(self.agent_name.value)
 
     def get_results(self, message_id: Optional[str] = None) -> List[Dict]:
         """Get results for completed tasks"""
-        results = []
-        pattern = f"{message_id}_RESULT.json" if message_id else "*_RESULT.json"
-        for result_file in self.inbox_path.glob(pattern):
-            try:
-                result = self._read_json(result_file)
-                results.append(result)
-            except Exception:
-                pass
-        return results
+        return self.backend.results(self.agent_name.value, message_id)
+
+    def claim(self, n: int = 1) -> List[Dict]:
+        """Lease up to n pending tasks, highest priority first"""
+        return self.scheduler.claim(n)
 
     def mark_task_processing(self, message_id: str) -> bool:
-        """Mark a task as being processed"""
+        """Lease a specific task (atomic: only one worker wins)"""
         try:
-            pending_file = self.inbox_path / f"{message_id}_PENDING.json"
-            if not pending_file.exists():
-                return False
-
-            message = self._read_json(pending_file)
-            message["status"] = "PROCESSING"
-            message["started_at"] = datetime.now(timezone.utc).isoformat()
-
-            processing_file = self.inbox_path / f"{message_id}_PROCESSING.json"
-            self._write_json(processing_file, message)
-            pending_file.unlink()
-
-            return True
+            return self.backend.mark_processing(
+                self.agent_name.value, message_id, self.scheduler.worker_id, self.scheduler.lease_seconds
+            )
         except Exception:
             return False
 
     def mark_task_complete(self, message_id: str) -> bool:
-        """Mark a task as complete (after sending result)"""
+        """Mark a task as complete (after sending result); fails if the lease was lost"""
         try:
-            processing_file = self.inbox_path / f"{message_id}_PROCESSING.json"
-            if processing_file.exists():
-                self._archive_file(processing_file)
-                return True
+            return self.backend.mark_complete(self.agent_name.value, message_id, self.scheduler.worker_id)
+        except Exception:
             return False
+
+    def mark_task_failed(self, message_id: str, error: Optional[str] = None) -> bool:
+        """Return a task to the queue, or dead-letter it after max_attempts"""
+        try:
+            return self.backend.fail(self.agent_name.value, message_id, self.scheduler.worker_id,
+                                     error, self.scheduler.max_attempts)
         except Exception:
             return False
 
+    def extend_lease(self, message_id: str, lease_seconds: Optional[float] = None) -> bool:
+        """Keep a long-running task leased to this worker"""
+        return self.backend.extend_lease(self.agent_name.value, message_id, self.scheduler.worker_id,
+                                         lease_seconds or self.scheduler.lease_seconds)
+
+    def requeue_expired(self) -> int:
+        """Requeue tasks whose lease ran out (claim() also does this)"""
+        return self.scheduler.requeue_expired()
+
+    def get_dead_letters(self) -> List[Dict]:
+        """Tasks that failed max_attempts times"""
+        return self.backend.dead_letters(self.agent_name.value)
+
+    def wait_for_task(self, timeout: float = 30.0) -> bool:
+        """Block until a pending task arrives; False if the timeout expires"""
+        return self.backend.wait_for_task(self.agent_name.value, timeout)
+
     def get_status(self) -> Dict:
         """Get queue status"""
         return {
             "agent": self.agent_name.value,
-            "pending_tasks": len(list(self.inbox_path.glob("*_PENDING.json"))),
-            "processing_tasks": len(list(self.inbox_path.glob("*_PROCESSING.json"))),
-            "pending_results": len(list(self.inbox_path.glob("*_RESULT.json"))),
-            "archived_messages": len(list(self.archive_path.glob("*.json")))
+            **self.backend.status_counts(self.agent_name.value)
         }
 
-    @staticmethod
-    def _write_json(filepath: Path, data: Dict) -> None:
-        """Write JSON to file atomically"""
-        filepath.parent.mkdir(parents=True, exist_ok=True)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2)
-
-    @staticmethod
-    def _read_json(filepath: Path) -> Dict:
-        """Read JSON from file"""
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
-
-    def _archive_file(self, filepath: Path) -> None:
-        """Move a file to archive"""
-        archive_file = self.archive_path / filepath.name
-        filepath.rename(archive_file)
-
 
 class HandshakeManager:
     """
@@ -0,0 +1,703 @@
+"""
+Storage backends for the inter-CLI MessageQueue
+
+MessageQueue keeps its public API and delegates storage to a backend:
+- FileQueueBackend: the original one-JSON-file-per-message layout
+- SQLiteQueueBackend: a single WAL-mode database with indexed lookups
+
+Every backend method takes the owning agent's name explicitly, so one
+backend instance can serve any number of MessageQueue objects.
+
+Claimed tasks carry a lease (owner + expiry). Expired leases are requeued
+and tasks delivered max_attempts times without success are dead-lettered.
+"""
+
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+try:
+    from .task_scheduler import fair_select, normalize_priority
+except ImportError:
+    from task_scheduler import fair_select, normalize_priority
+
+CLAIM_STALE_SECONDS = 30.0  # A claim lasts one file write; older ones were left by a crashed worker
+
+
+def _utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _leased(message: Dict, worker_id: str, lease_seconds: float) -> Dict:
+    """Copy of a task as it looks once claimed by worker_id"""
+    message = dict(message)
+    message["status"] = "PROCESSING"
+    message["started_at"] = _utc_now()
+    message["lease_owner"] = worker_id
+    message["lease_expires"] = time.time() + lease_seconds
+    message["attempts"] = message.get("attempts", 0) + 1
+    return message
+
+
+def _released(message: Dict, error: Optional[str], max_attempts: int) -> Dict:
+    """Copy of a task after a failed or expired delivery"""
+    message = dict(message)
+    message["status"] = "DEAD" if message.get("attempts", 0) >= max_attempts else "PENDING"
+    message["last_error"] = error
+    message.pop("lease_owner", None)
+    message.pop("lease_expires", None)
+    return message
+
+
+class QueueBackend:
+    """Interface shared by all MessageQueue storage backends"""
+
+    def put_task(self, message: Dict) -> None:
+        """Deliver a PENDING task to message['to']"""
+        raise NotImplementedError
+
+    def log_sent(self, message: Dict) -> None:
+        """Record a task in the sender's outbox"""
+        raise NotImplementedError
+
+    def find_original(self, agent: str, message_id: str) -> Optional[Dict]:
+        """Find the task a result answers: the agent's outbox, then its inbox"""
+        raise NotImplementedError
+
+    def put_result(self, result: Dict) -> None:
+        """Deliver a result to result['to']"""
+        raise NotImplementedError
+
+    def archive_original(self, agent: str, message_id: str) -> None:
+        """Archive the outbox copy of a task once its result is sent"""
+        raise NotImplementedError
+
+    def pending_tasks(self, agent: str) -> List[Dict]:
+        """PENDING tasks for an agent, by priority level then age"""
+        raise NotImplementedError
+
+    def results(self, agent: str, message_id: Optional[str] = None) -> List[Dict]:
+        raise NotImplementedError
+
+    def claim(self, recipients: Sequence[str], n: int, worker_id: str,
+              lease_seconds: float, max_attempts: int) -> List[Dict]:
+        """Atomically lease up to n PENDING tasks across recipients"""
+        raise NotImplementedError
+
+    def mark_processing(self, agent: str, message_id: str, worker_id: str,
+                        lease_seconds: float) -> bool:
+        """Atomically lease one specific PENDING task"""
+        raise NotImplementedError
+
+    def mark_complete(self, agent: str, message_id: str, worker_id: Optional[str] = None) -> bool:
+        """Archive a PROCESSING task (only by its lease owner, if given)"""
+        raise NotImplementedError
+
+    def fail(self, agent: str, message_id: str, worker_id: Optional[str],
+             error: Optional[str], max_attempts: int) -> bool:
+        """Requeue a PROCESSING task, or dead-letter it after max_attempts"""
+        raise NotImplementedError
+
+    def extend_lease(self, agent: str, message_id: str, worker_id: str, lease_seconds: float) -> bool:
+        raise NotImplementedError
+
+    def requeue_expired(self, recipients: Optional[Sequence[str]], max_attempts: int) -> int:
+        """Release every task whose lease has run out; returns how many"""
+        raise NotImplementedError
+
+    def dead_letters(self, agent: str) -> List[Dict]:
+        raise NotImplementedError
+
+    def status_counts(self, agent: str) -> Dict[str, int]:
+        raise NotImplementedError
+
+    def wait_for_task(self, agent: str, timeout: float) -> bool:
+        """Block until the agent has a PENDING task or the timeout expires"""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release resources held by the calling thread"""
+
+
+class FileQueueBackend(QueueBackend):
+    """
+    One JSON file per message under {agent}_inbox / _outbox / _archive / _deadletter.
+
+    File naming: {message_id}_{status}.json (PENDING, PROCESSING, RESULT, SENT, DEAD)
+    Transitions first rename the source file to a hidden claim file; rename
+    is atomic, so only one worker (thread or process) can win a task. The
+    claim file name records when it was taken, and requeue_expired() puts
+    claims a crashed worker left behind back in the inbox.
+    """
+
+    def __init__(self, base_path: Path, poll_interval: float = 0.1,
+                 claim_stale_seconds: float = CLAIM_STALE_SECONDS):
+        self.base_path = Path(base_path)
+        self.poll_interval = poll_interval
+        self.claim_stale_seconds = claim_stale_seconds
+
+    def _box(self, agent: str, box: str) -> Path:
+        path = self.base_path / f"{agent}_{box}"
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def _take(self, path: Path) -> Optional[Path]:
+        """Atomically take ownership of a file, or None if someone else did"""
+        claimed = path.with_name(f".{path.stem}.{os.getpid()}.{threading.get_ident()}.{time.time_ns()}.claim")
+        try:
+            path.rename(claimed)
+            return claimed
+        except OSError:
+            return None
+
+    def put_task(self, message: Dict) -> None:
+        self._write_json(self._box(message["to"], "inbox") / f"{message['id']}_PENDING.json", message)
+
+    def log_sent(self, message: Dict) -> None:
+        self._write_json(self._box(message["from"], "outbox") / f"{message['id']}_SENT.json", message)
+
+    def find_original(self, agent: str, message_id: str) -> Optional[Dict]:
+        for box in ("outbox", "inbox"):
+            for f in self._box(agent, box).glob(f"{message_id}_*.json"):
+                if not f.name.endswith("_RESULT.json"):
+                    return self._read_json(f)
+        return None
+
+    def put_result(self, result: Dict) -> None:
+        self._write_json(self._box(result["to"], "inbox") / f"{result['id']}_RESULT.json", result)
+
+    def archive_original(self, agent: str, message_id: str) -> None:
+        for f in self._box(agent, "outbox").glob(f"{message_id}_*.json"):
+            self._archive_file(agent, f)
+            return
+
+    def _sort_key(self, task: Dict):
+        return (normalize_priority(task.get("priority")), task.get("timestamp", ""))
+
+    def pending_tasks(self, agent: str) -> List[Dict]:
+        tasks = []
+        for task_file in self._box(agent, "inbox").glob("*_PENDING.json"):
+            try:
+                tasks.append(self._read_json(task_file))
+            except Exception:
+                pass
+        return sorted(tasks, key=self._sort_key)
+
+    def results(self, agent: str, message_id: Optional[str] = None) -> List[Dict]:
+        results = []
+        pattern = f"{message_id}_RESULT.json" if message_id else "*_RESULT.json"
+        for result_file in self._box(agent, "inbox").glob(pattern):
+            try:
+                results.append(self._read_json(result_file))
+            except Exception:
+                pass
+        return results
+
+    def claim(self, recipients: Sequence[str], n: int, worker_id: str,
+              lease_seconds: float, max_attempts: int) -> List[Dict]:
+        self.requeue_expired(recipients, max_attempts)
+
+        candidates = {}
+        for recipient in recipients:
+            tasks = self.pending_tasks(recipient)
+            heads = heapq.nsmallest(n, tasks, key=self._sort_key)
+            candidates[recipient] = [(normalize_priority(t.get("priority")), t.get("timestamp", ""), t["id"])
+                                     for t in heads]
+
+        claimed = []
+        for recipient, message_id in fair_select(candidates, n):
+            task = self._lease(recipient, message_id, worker_id, lease_seconds)
+            if task is not None:
+                claimed.append(task)
+        return claimed
+
+    def _lease(self, agent: str, message_id: str, worker_id: str, lease_seconds: float) -> Optional[Dict]:
+        inbox = self._box(agent, "inbox")
+        claim_file = self._take(inbox / f"{message_id}_PENDING.json")
+        if claim_file is None:
+            return None
+        message = _leased(self._read_json(claim_file), worker_id, lease_seconds)
+        self._write_json(inbox / f"{message_id}_PROCESSING.json", message)
+        claim_file.unlink()
+        return message
+
+    def mark_processing(self, agent: str, message_id: str, worker_id: str,
+                        lease_seconds: float) -> bool:
+        return self._lease(agent, message_id, worker_id, lease_seconds) is not None
+
+    def _take_processing(self, agent: str, message_id: str,
+                         worker_id: Optional[str]) -> Optional[tuple]:
+        """Take a PROCESSING task if worker_id (when given) still holds its lease"""
+        processing_file = self._box(agent, "inbox") / f"{message_id}_PROCESSING.json"
+        claim_file = self._take(processing_file)
+        if claim_file is None:
+            return None
+        message = self._read_json(claim_file)
+        # Checked on the taken file: the lease may have moved to another worker before the rename
+        if worker_id is not None and message.get("lease_owner") not in (None, worker_id):
+            claim_file.rename(processing_file)
+            return None
+        return claim_file, message
+
+    def mark_complete(self, agent: str, message_id: str, worker_id: Optional[str] = None) -> bool:
+        taken = self._take_processing(agent, message_id, worker_id)
+        if taken is None:
+            return False
+        claim_file, message = taken
+        message["status"] = "DONE"
+        self._write_json(self._box(agent, "archive") / f"{message_id}_PROCESSING.json", message)
+        claim_file.unlink()
+        return True
+
+    def _release(self, agent: str, claim_file: Path, message: Dict,
+                 error: Optional[str], max_attempts: int) -> None:
+        message = _released(message, error, max_attempts)
+        if message["status"] == "DEAD":
+            target = self._box(agent, "deadletter") / f"{message['id']}_DEAD.json"
+        else:
+            target = self._box(agent, "inbox") / f"{message['id']}_PENDING.json"
+        self._write_json(target, message)
+        claim_file.unlink()
+
+    def fail(self, agent: str, message_id: str, worker_id: Optional[str],
+             error: Optional[str], max_attempts: int) -> bool:
+        taken = self._take_processing(agent, message_id, worker_id)
+        if taken is None:
+            return False
+        self._release(agent, *taken, error, max_attempts)
+        return True
+
+    def extend_lease(self, agent: str, message_id: str, worker_id: str, lease_seconds: float) -> bool:
+        taken = self._take_processing(agent, message_id, worker_id)
+        if taken is None:
+            return False
+        claim_file, message = taken
+        message["lease_expires"] = time.time() + lease_seconds
+        self._write_json(self._box(agent, "inbox") / f"{message_id}_PROCESSING.json", message)
+        claim_file.unlink()
+        return True
+
+    def _transition_done(self, agent: str, message_id: str) -> bool:
+        """True once any transition of a task has written its target file"""
+        inbox = self._box(agent, "inbox")
+        return any(path.exists() for path in (
+            inbox / f"{message_id}_PENDING.json",
+            inbox / f"{message_id}_PROCESSING.json",
+            self._box(agent, "archive") / f"{message_id}_PROCESSING.json",
+            self._box(agent, "deadletter") / f"{message_id}_DEAD.json",
+        ))
+
+    def recover_claims(self, agent: str) -> int:
+        """
+        Undo transitions a crashed worker left half done; returns how many.
+
+        A stale claim whose transition already wrote its target is deleted.
+        Otherwise it is renamed back, so a PENDING task is claimable again and
+        a PROCESSING one is requeued when its lease expires.
+        """
+        inbox = self._box(agent, "inbox")
+        cutoff = time.time_ns() - int(self.claim_stale_seconds * 1e9)
+        recovered = 0
+        for claim_file in inbox.glob(".*.claim"):
+            try:
+                stem, _pid, _thread, claimed_at = claim_file.name[1:-len(".claim")].rsplit(".", 3)
+                if int(claimed_at) > cutoff:
+                    continue
+            except ValueError:
+                continue  # Not a claim file
+            try:
+                if self._transition_done(agent, stem.rsplit("_", 1)[0]):
+                    claim_file.unlink()
+                else:
+                    claim_file.rename(inbox / f"{stem}.json")
+            except OSError:
+                continue  # Another worker recovered it first
+            recovered += 1
+        return recovered
+
+    def requeue_expired(self, recipients: Optional[Sequence[str]], max_attempts: int) -> int:
+        if recipients is None:
+            recipients = [p.name[:-len("_inbox")] for p in self.base_path.glob("*_inbox") if p.is_dir()]
+        now = time.time()
+        released = 0
+        for agent in recipients:
+            self.recover_claims(agent)
+            for processing_file in self._box(agent, "inbox").glob("*_PROCESSING.json"):
+                try:
+                    message = self._read_json(processing_file)
+                except (OSError, json.JSONDecodeError):
+                    continue
+                if message.get("lease_expires", float("inf")) > now:
+                    continue
+                claim_file = self._take(processing_file)
+                if claim_file is None:
+                    continue
+                self._release(agent, claim_file, self._read_json(claim_file), "lease expired", max_attempts)
+                released += 1
+        return released
+
+    def dead_letters(self, agent: str) -> List[Dict]:
+        return [self._read_json(f) for f in sorted(self._box(agent, "deadletter").glob("*_DEAD.json"))]
+
+    def status_counts(self, agent: str) -> Dict[str, int]:
+        inbox = self._box(agent, "inbox")
+        return {
+            "pending_tasks": len(list(inbox.glob("*_PENDING.json"))),
+            "processing_tasks": len(list(inbox.glob("*_PROCESSING.json"))),
+            "pending_results": len(list(inbox.glob("*_RESULT.json"))),
+            "archived_messages": len(list(self._box(agent, "archive").glob("*.json"))),
+            "dead_letters": len(list(self._box(agent, "deadletter").glob("*.json")))
+        }
+
+    def wait_for_task(self, agent: str, timeout: float) -> bool:
+        # A new file bumps the inbox mtime, so only re-glob when it changes
+        inbox = self._box(agent, "inbox")
+        deadline = time.monotonic() + timeout
+        last_mtime = None
+        while True:
+            mtime = inbox.stat().st_mtime_ns
+            if mtime != last_mtime:
+                last_mtime = mtime
+                if next(inbox.glob("*_PENDING.json"), None) is not None:
+                    return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.poll_interval, remaining))
+
+    @staticmethod
+    def _write_json(filepath: Path, data: Dict) -> None:
+        """Write JSON to a temp file, then rename it into place"""
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = filepath.with_name(f".{filepath.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, filepath)
+
+    @staticmethod
+    def _read_json(filepath: Path) -> Dict:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _archive_file(self, agent: str, filepath: Path) -> None:
+        filepath.rename(self._box(agent, "archive") / filepath.name)
+
+
+class SQLiteQueueBackend(QueueBackend):
+    """
+    All agents' queues in one SQLite database in WAL mode.
+
+    Tasks are looked up through an index on (recipient, status, priority,
+    timestamp), so polling costs the same with 10 or 10,000 queued tasks.
+    Claims run inside BEGIN IMMEDIATE transactions, which serialize writers
+    across threads and processes, so a task is never leased twice.
+
+    wait_for_task() is woken immediately by inserts from the same process
+    and falls back to a short indexed poll for inserts from other processes.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS tasks (
+        id TEXT NOT NULL,
+        sender TEXT NOT NULL,
+        recipient TEXT NOT NULL,
+        status TEXT NOT NULL,
+        priority INTEGER NOT NULL,
+        timestamp TEXT NOT NULL,
+        started_at TEXT,
+        body TEXT NOT NULL,
+        PRIMARY KEY (recipient, id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_tasks_queue ON tasks (recipient, status, priority, timestamp);
+    CREATE TABLE IF NOT EXISTS sent (
+        id TEXT NOT NULL,
+        sender TEXT NOT NULL,
+        archived INTEGER NOT NULL DEFAULT 0,
+        body TEXT NOT NULL,
+        PRIMARY KEY (sender, id)
+    );
+    CREATE TABLE IF NOT EXISTS results (
+        id TEXT NOT NULL,
+        recipient TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        body TEXT NOT NULL,
+        PRIMARY KEY (recipient, id)
+    );
+    """
+
+    # Lease columns, added to databases created before leasing existed
+    LEASE_COLUMNS = {
+        "lease_owner": "TEXT",
+        "lease_expires": "REAL",
+        "attempts": "INTEGER NOT NULL DEFAULT 0",
+        "last_error": "TEXT",
+    }
+    LEASE_INDEX = "CREATE INDEX IF NOT EXISTS idx_tasks_lease ON tasks (status, lease_expires)"
+
+    # Wakes waiters in this process as soon as a task is inserted
+    _notifiers: Dict[str, threading.Condition] = {}
+    _notifiers_lock = threading.Lock()
+
+    def __init__(self, db_path: Path, poll_interval: float = 0.05):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.poll_interval = poll_interval
+        self.local = threading.local()
+
+        with self._notifiers_lock:
+            key = str(self.db_path.resolve())
+            self.notifier = self._notifiers.setdefault(key, threading.Condition())
+
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}
+        for column, ddl in self.LEASE_COLUMNS.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} {ddl}")
+        conn.execute(self.LEASE_INDEX)
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; sqlite3 connections are not thread-safe"""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def close(self) -> None:
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    def _transaction(self, fn):
+        """Run fn(conn) inside BEGIN IMMEDIATE ... COMMIT"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _task_row(self, message: Dict) -> tuple:
+        return (message["id"], message["from"], message["to"], normalize_priority(message.get("priority")),
+                message["timestamp"], json.dumps(message))
+
+    def put_task(self, message: Dict) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO tasks (id, sender, recipient, status, priority, timestamp, body) "
+            "VALUES (?, ?, ?, 'PENDING', ?, ?, ?)",
+            self._task_row(message)
+        )
+        with self.notifier:
+            self.notifier.notify_all()
+
+    def put_tasks(self, messages: List[Dict]) -> None:
+        """Deliver many tasks in one transaction"""
+        self._transaction(lambda conn: conn.executemany(
+            "INSERT OR REPLACE INTO tasks (id, sender, recipient, status, priority, timestamp, body) "
+            "VALUES (?, ?, ?, 'PENDING', ?, ?, ?)",
+            [self._task_row(m) for m in messages]
+        ))
+        with self.notifier:
+            self.notifier.notify_all()
+
+    def log_sent(self, message: Dict) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO sent (id, sender, body) VALUES (?, ?, ?)",
+            (message["id"], message["from"], json.dumps(message))
+        )
+
+    def find_original(self, agent: str, message_id: str) -> Optional[Dict]:
+        conn = self._conn()
+        row = conn.execute("SELECT body FROM sent WHERE sender = ? AND id = ?", (agent, message_id)).fetchone()
+        if row is None:
+            row = conn.execute("SELECT body FROM tasks WHERE recipient = ? AND id = ?",
+                               (agent, message_id)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_result(self, result: Dict) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO results (id, recipient, timestamp, body) VALUES (?, ?, ?, ?)",
+            (result["id"], result["to"], result["timestamp"], json.dumps(result))
+        )
+
+    def archive_original(self, agent: str, message_id: str) -> None:
+        self._conn().execute("UPDATE sent SET archived = 1 WHERE sender = ? AND id = ?", (agent, message_id))
+
+    def pending_tasks(self, agent: str) -> List[Dict]:
+        rows = self._conn().execute(
+            "SELECT body FROM tasks WHERE recipient = ? AND status = 'PENDING' ORDER BY priority, timestamp",
+            (agent,)
+        ).fetchall()
+        return [json.loads(body) for (body,) in rows]
+
+    def results(self, agent: str, message_id: Optional[str] = None) -> List[Dict]:
+        if message_id:
+            rows = self._conn().execute("SELECT body FROM results WHERE recipient = ? AND id = ?",
+                                        (agent, message_id)).fetchall()
+        else:
+            rows = self._conn().execute("SELECT body FROM results WHERE recipient = ? ORDER BY timestamp",
+                                        (agent,)).fetchall()
+        return [json.loads(body) for (body,) in rows]
+
+    def _lease_row(self, conn: sqlite3.Connection, agent: str, message_id: str,
+                   worker_id: str, lease_seconds: float) -> Optional[Dict]:
+        row = conn.execute("SELECT body, attempts FROM tasks WHERE recipient = ? AND id = ? AND status = 'PENDING'",
+                           (agent, message_id)).fetchone()
+        if row is None:
+            return None
+        message = json.loads(row[0])
+        message["attempts"] = row[1]
+        message = _leased(message, worker_id, lease_seconds)
+        conn.execute(
+            "UPDATE tasks SET status = 'PROCESSING', started_at = ?, lease_owner = ?, lease_expires = ?, "
+            "attempts = ?, body = ? WHERE recipient = ? AND id = ?",
+            (message["started_at"], worker_id, message["lease_expires"], message["attempts"],
+             json.dumps(message), agent, message_id)
+        )
+        return message
+
+    def claim(self, recipients: Sequence[str], n: int, worker_id: str,
+              lease_seconds: float, max_attempts: int) -> List[Dict]:
+        def claim_in(conn):
+            self._requeue_expired_in(conn, recipients, max_attempts)
+            candidates = {
+                recipient: conn.execute(
+                    "SELECT priority, timestamp, id FROM tasks WHERE recipient = ? AND status = 'PENDING' "
+                    "ORDER BY priority, timestamp LIMIT ?", (recipient, n)
+                ).fetchall()
+                for recipient in recipients
+            }
+            claimed = []
+            for recipient, message_id in fair_select(candidates, n):
+                task = self._lease_row(conn, recipient, message_id, worker_id, lease_seconds)
+                if task is not None:
+                    claimed.append(task)
+            return claimed
+
+        return self._transaction(claim_in)
+
+    def mark_processing(self, agent: str, message_id: str, worker_id: str,
+                        lease_seconds: float) -> bool:
+        return self._transaction(
+            lambda conn: self._lease_row(conn, agent, message_id, worker_id, lease_seconds)
+        ) is not None
+
+    def mark_complete(self, agent: str, message_id: str, worker_id: Optional[str] = None) -> bool:
+        cursor = self._conn().execute(
+            "UPDATE tasks SET status = 'DONE', lease_owner = NULL, lease_expires = NULL "
+            "WHERE recipient = ? AND id = ? AND status = 'PROCESSING' AND (? IS NULL OR lease_owner = ?)",
+            (agent, message_id, worker_id, worker_id)
+        )
+        return cursor.rowcount == 1
+
+    def _release_row(self, conn: sqlite3.Connection, agent: str, message_id: str, body: str,
+                     attempts: int, error: Optional[str], max_attempts: int) -> None:
+        message = json.loads(body)
+        message["attempts"] = attempts
+        message = _released(message, error, max_attempts)
+        conn.execute(
+            "UPDATE tasks SET status = ?, lease_owner = NULL, lease_expires = NULL, last_error = ?, body = ? "
+            "WHERE recipient = ? AND id = ?",
+            (message["status"], error, json.dumps(message), agent, message_id)
+        )
+
+    def fail(self, agent: str, message_id: str, worker_id: Optional[str],
+             error: Optional[str], max_attempts: int) -> bool:
+        def fail_in(conn):
+            row = conn.execute(
+                "SELECT body, attempts FROM tasks WHERE recipient = ? AND id = ? AND status = 'PROCESSING' "
+                "AND (? IS NULL OR lease_owner = ?)", (agent, message_id, worker_id, worker_id)
+            ).fetchone()
+            if row is None:
+                return False
+            self._release_row(conn, agent, message_id, row[0], row[1], error, max_attempts)
+            return True
+
+        released = self._transaction(fail_in)
+        if released:
+            with self.notifier:
+                self.notifier.notify_all()
+        return released
+
+    def extend_lease(self, agent: str, message_id: str, worker_id: str, lease_seconds: float) -> bool:
+        cursor = self._conn().execute(
+            "UPDATE tasks SET lease_expires = ? WHERE recipient = ? AND id = ? AND status = 'PROCESSING' "
+            "AND lease_owner = ?", (time.time() + lease_seconds, agent, message_id, worker_id)
+        )
+        return cursor.rowcount == 1
+
+    def _requeue_expired_in(self, conn: sqlite3.Connection, recipients: Optional[Sequence[str]],
+                            max_attempts: int) -> int:
+        rows = conn.execute(
+            "SELECT recipient, id, body, attempts FROM tasks WHERE status = 'PROCESSING' AND lease_expires < ?",
+            (time.time(),)
+        ).fetchall()
+        released = 0
+        for recipient, message_id, body, attempts in rows:
+            if recipients is not None and recipient not in recipients:
+                continue
+            self._release_row(conn, recipient, message_id, body, attempts, "lease expired", max_attempts)
+            released += 1
+        return released
+
+    def requeue_expired(self, recipients: Optional[Sequence[str]], max_attempts: int) -> int:
+        return self._transaction(lambda conn: self._requeue_expired_in(conn, recipients, max_attempts))
+
+    def dead_letters(self, agent: str) -> List[Dict]:
+        rows = self._conn().execute(
+            "SELECT body FROM tasks WHERE recipient = ? AND status = 'DEAD' ORDER BY timestamp", (agent,)
+        ).fetchall()
+        return [json.loads(body) for (body,) in rows]
+
+    def status_counts(self, agent: str) -> Dict[str, int]:
+        conn = self._conn()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM tasks WHERE recipient = ? GROUP BY status",
+                                   (agent,)).fetchall())
+        pending_results = conn.execute("SELECT COUNT(*) FROM results WHERE recipient = ?", (agent,)).fetchone()[0]
+        archived_sent = conn.execute("SELECT COUNT(*) FROM sent WHERE sender = ? AND archived = 1",
+                                     (agent,)).fetchone()[0]
+        return {
+            "pending_tasks": counts.get("PENDING", 0),
+            "processing_tasks": counts.get("PROCESSING", 0),
+            "pending_results": pending_results,
+            "archived_messages": counts.get("DONE", 0) + archived_sent,
+            "dead_letters": counts.get("DEAD", 0)
+        }
+
+    def _has_pending(self, agent: str) -> bool:
+        return self._conn().execute(
+            "SELECT 1 FROM tasks WHERE recipient = ? AND status = 'PENDING' LIMIT 1", (agent,)
+        ).fetchone() is not None
+
+    def wait_for_task(self, agent: str, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while True:
+            if self._has_pending(agent):
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            with self.notifier:
+                self.notifier.wait(min(self.poll_interval, remaining))
+
+
+def create_backend(kind: str, base_path: Path) -> QueueBackend:
+    """Build a backend by name ("file" or "sqlite") rooted at base_path"""
+    if kind == "file":
+        return FileQueueBackend(base_path)
+    if kind == "sqlite":
+        return SQLiteQueueBackend(Path(base_path) / "message_queue.db")
+    raise ValueError(f"Unknown queue backend: {kind}")
@@ -0,0 +1,115 @@
+"""
+Task scheduling for the inter-CLI MessageQueue
+
+- Numeric priorities: lower runs first (heapq order); "high", "normal" and
+  "low" map to 10, 50 and 90 so custom levels can sit between them
+- Per-recipient fairness: among tasks of equal priority, recipients take
+  turns instead of one busy inbox starving the others
+- Leases: a claimed task belongs to one worker until its lease expires, then
+  it is requeued; after max_attempts deliveries it is dead-lettered
+
+The storage backends do the atomic claiming; this module only decides the
+order in which claimable tasks are handed out.
+"""
+
+import heapq
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+PRIORITY_LEVELS = {"high": 10, "normal": 50, "low": 90}
+DEFAULT_PRIORITY = PRIORITY_LEVELS["normal"]
+DEFAULT_LEASE_SECONDS = 300.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+# (priority, timestamp, message_id) as read from a recipient's inbox
+Candidate = Tuple[int, str, str]
+
+
+def normalize_priority(priority: Union[str, int, float, None]) -> int:
+    """Map a priority label or number to its numeric level (lower runs first)"""
+    if isinstance(priority, bool):
+        return DEFAULT_PRIORITY
+    if isinstance(priority, (int, float)):
+        return int(priority)
+    if priority is None:
+        return DEFAULT_PRIORITY
+    label = str(priority).strip().lower()
+    if label in PRIORITY_LEVELS:
+        return PRIORITY_LEVELS[label]
+    try:
+        return int(label)
+    except ValueError:
+        return DEFAULT_PRIORITY
+
+
+def fair_select(candidates: Dict[str, Sequence[Candidate]], n: int) -> List[Tuple[str, str]]:
+    """
+    Pick up to n tasks across recipients.
+
+    Each recipient's candidates must already be sorted by (priority, timestamp).
+    The heap is keyed on (priority, turn, timestamp), where turn is a task's
+    position in its own inbox, so equal-priority work is interleaved across
+    recipients while a higher priority always wins.
+
+    Returns (recipient, message_id) pairs in claim order.
+    """
+    heap = []
+    for recipient, tasks in candidates.items():
+        if tasks:
+            priority, timestamp, message_id = tasks[0]
+            heap.append((priority, 0, timestamp, recipient, message_id))
+    heapq.heapify(heap)
+
+    chosen = []
+    while heap and len(chosen) < n:
+        priority, turn, timestamp, recipient, message_id = heapq.heappop(heap)
+        chosen.append((recipient, message_id))
+        next_turn = turn + 1
+        tasks = candidates[recipient]
+        if next_turn < len(tasks):
+            priority, timestamp, message_id = tasks[next_turn]
+            heapq.heappush(heap, (priority, next_turn, timestamp, recipient, message_id))
+    return chosen
+
+
+def default_worker_id(agent: str) -> str:
+    """Identify a worker by agent, process and thread"""
+    return f"{agent}:{os.getpid()}:{threading.get_ident()}"
+
+
+class TaskScheduler:
+    """
+    Claims work for a pool of workers serving one or more recipients.
+
+    Multiple scheduler instances (threads or processes) can share a backend;
+    the backend guarantees a task is leased to only one of them at a time.
+    """
+
+    def __init__(self, backend, recipients: Iterable[str],
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 worker_id: Optional[str] = None):
+        self.backend = backend
+        self.recipients = list(recipients)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = worker_id or default_worker_id("+".join(self.recipients))
+
+    def claim(self, n: int = 1) -> List[Dict]:
+        """Lease up to n tasks, fairly across recipients"""
+        return self.backend.claim(self.recipients, n, self.worker_id, self.lease_seconds, self.max_attempts)
+
+    def complete(self, task: Dict) -> bool:
+        return self.backend.mark_complete(task["to"], task["id"], self.worker_id)
+
+    def fail(self, task: Dict, error: Optional[str] = None) -> bool:
+        """Give a task back; it is dead-lettered once max_attempts is reached"""
+        return self.backend.fail(task["to"], task["id"], self.worker_id, error, self.max_attempts)
+
+    def extend_lease(self, task: Dict, lease_seconds: Optional[float] = None) -> bool:
+        return self.backend.extend_lease(task["to"], task["id"], self.worker_id,
+                                         lease_seconds or self.lease_seconds)
+
+    def requeue_expired(self) -> int:
+        return self.backend.requeue_expired(self.recipients, self.max_attempts)
@@ -52,11 +52,23 @@ def get_pid_file(service_name):
     """Returns the path to the PID file for a given service."""
     return os.path.join(PID_FILE_DIR, f"{service_name}.pid")
 
+def supervised_services():
+    """Status of the services a running supervisor (manage.py supervise) owns; {} when none is running"""
+    from src.core.service_supervisor import SupervisorClient, SupervisorUnavailable
+    try:
+        return SupervisorClient().status()
+    except SupervisorUnavailable:
+        return {}
+
 def start_services(args):
     """Starts all defined services as background processes."""
     print("Starting Synaptic Core services...")
+    supervised = supervised_services()
 
     for name, config in SERVICES.items():
+        if name in supervised:
+            print(f"- {name} is owned by the running supervisor ({supervised[name]['status']}).")
+            continue
         pid_file = get_pid_file(name)
         if os.path.exists(pid_file):
             print(f"- {name} is already running.")
@@ -95,6 +107,10 @@ def start_services(args):
 def stop_services(args):
     """Stops all running services."""
     print("Stopping Synaptic Mesh services...")
+    if supervised_services():
+        from src.core.service_supervisor import SupervisorClient
+        for name, result in SupervisorClient().stop().items():
+            print(f"- {name}: {result} (supervised)")
     for name in SERVICES.keys():
         pid_file = get_pid_file(name)
         if not os.path.exists(pid_file):
@@ -128,7 +144,13 @@ def stop_services(args):
 def status_services(args):
     """Checks the status of all services."""
     print("Checking status of Synaptic Mesh services...")
+    supervised = supervised_services()
+    for name, info in supervised.items():
+        pid = f" (PID: {info['pid']})" if info['pid'] else ""
+        print(f"- {name}: {info['status'].capitalize()}{pid} [supervised]")
     for name in SERVICES.keys():
+        if name in supervised:
+            continue
         pid_file = get_pid_file(name)
         if os.path.exists(pid_file):
             try:
@@ -142,6 +164,25 @@ def status_services(args):
         else:
             print(f"- {name}: Stopped")
 
+def supervise_services(args):
+    """Runs all services under the in-process supervisor until interrupted."""
+    import logging
+    from src.core.service_supervisor import ServiceSupervisor, build_service_specs
+
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] {%(levelname)s} - %(message)s')
+    specs = build_service_specs(args.claude_model, args.gemini_model, args.num_messages)
+    with ServiceSupervisor(specs) as supervisor:
+        for name, result in supervisor.start().items():
+            print(f"- {name}: {result}")
+        # The control panel's BFF is not supervised; it commands this process through its control socket
+        print("\nSupervising services. Start the control panel with 'python manage.py start' (it only adds the BFF).")
+        print("Press Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print("\nStopping supervised services...")
+
 def run_analytics(args):
     """Placeholder for running performance and data analysis."""
     print("Running analytics...")
@@ -167,7 +208,7 @@ def run_defragmentation(args):
             min_messages=args.min_messages,
             min_duration=args.min_duration
         )
-        engine.run()
+        engine.run(incremental=args.incremental)
         print("Defragmentation complete.")
     except ImportError:
         print("Could not import defragmentation engine. Make sure it's in src/utilities.")
@@ -195,6 +236,13 @@ def main():
     status_parser = subparsers.add_parser("status", help="Check the status of all services.")
     status_parser.set_defaults(func=status_services)
 
+    # Supervise command
+    supervise_parser = subparsers.add_parser("supervise", help="Run all services under the supervisor (restarts crashed services).")
+    supervise_parser.add_argument("--num-messages", type=int, default=10, help="Number of recent messages for Gemini's context.")
+    supervise_parser.add_argument("--gemini-model", type=str, default="gemini-2.5-flash", help="The Gemini model to use.")
+    supervise_parser.add_argument("--claude-model", type=str, default="claude-3-haiku-20240307", help="The Claude model to use.")
+    supervise_parser.set_defaults(func=supervise_services)
+
     # Analytics command
     analytics_parser = subparsers.add_parser("run-analytics", help="Run data and performance analytics.")
     analytics_parser.set_defaults(func=run_analytics)
@@ -203,11 +251,14 @@ def main():
     defragment_parser = subparsers.add_parser("defragment", help="Reconstruct conversation threads from raw logs.")
     defragment_parser.add_argument("--min-messages", type=int, default=2, help="Minimum messages for a significant thread.")
     defragment_parser.add_argument("--min-duration", type=int, default=5, help="Minimum duration in seconds for a significant thread.")
+    defragment_parser.add_argument("--incremental", action="store_true", help="Only process log lines added since the last run.")
     defragment_parser.set_defaults(func=run_defragmentation)
 
     # Superthread analysis command
     superthread_parser = subparsers.add_parser("create-superthreads", help="Cluster conversation threads into superthreads using NLP.")
     superthread_parser.add_argument("--num-threads", type=int, default=20, help="The target number of superthreads to create.")
+    superthread_parser.add_argument("--incremental", action="store_true", help="Update the saved topic model with new and changed threads only.")
+    superthread_parser.add_argument("--refit", action="store_true", help="With --incremental, rebuild the saved topic model from all threads.")
     superthread_parser.set_defaults(func=run_superthread_analysis)
 
     args = parser.parse_args()
@@ -223,7 +274,7 @@ def run_superthread_analysis(args):
             output_file="conversation_logs/superthreads.json",
             n_superthreads=args.num_threads
         )
-        analyzer.run()
+        analyzer.run(incremental=args.incremental, refit=args.refit)
         print("Superthread analysis complete.")
     except ImportError:
         print("Could not import superthread_analyzer. Make sure it's in src/utilities.")
@@ -3,17 +3,25 @@
 Backend-for-Frontend (BFF) for the Shearwater Control Panel
 
 This FastAPI server provides a simple REST API for the Svelte UI to
-interact with the underlying `manage.py` script and control the services.
+control the services. Services are owned by the supervisor that
+`manage.py supervise` runs; the BFF commands it over its control socket
+(SupervisorClient), so status, start, stop and restart never spawn a
+manage.py interpreter or a second set of services. Without a running
+supervisor the service endpoints answer 503.
 """
 
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-import subprocess
+import json
 import uvicorn
 import asyncio
 import zmq
 import zmq.asyncio
 from contextlib import asynccontextmanager
+from typing import Optional
+
+from core.heartbeat import HeartbeatAggregator, is_heartbeat_topic
+from core.service_supervisor import SupervisorClient, SupervisorUnavailable, format_status
 
 # --- Lifespan Management ---
 @asynccontextmanager
@@ -29,6 +37,12 @@ async def lifespan(app: FastAPI):
 app = FastAPI(lifespan=lifespan)
 context = zmq.asyncio.Context()
 
+# The running supervisor owns the services; the BFF only sends it requests
+supervisor = SupervisorClient()
+
+# Liveness table fed by the heartbeat topic the log broadcaster already receives
+heartbeats = HeartbeatAggregator()
+
 
 # --- CORS Middleware ---
 # This allows the Svelte frontend (running on a different port) to talk to this API
@@ -77,48 +91,62 @@ async def log_broadcaster():
     while True:
         try:
             topic, message = await sub_socket.recv_multipart()
+            if is_heartbeat_topic(topic):
+                heartbeats.update_from_frame(message)
+                continue
             await manager.broadcast(message.decode('utf-8'))
         except Exception as e:
             print(f"Error in log broadcaster: {e}")
             await asyncio.sleep(1) # Avoid tight loop on error
 
-def run_manage_py_command(command: str) -> str:
-    """Helper function to run a command via the manage.py script."""
+def format_results(action: str, results: dict) -> str:
+    """Render per-service results as the plain-text output the UI displays."""
+    lines = [f"- {name}: {result}" for name, result in results.items()]
+    return f"{action}:\n" + "\n".join(lines) + "\n"
+
+async def call_supervisor(command: str, name: Optional[str]) -> dict:
+    """Send one request to the supervisor, mapping its failures to HTTP errors"""
+    # Requests block until the supervisor answers (stopping waits for children), so keep them off the event loop
     try:
-        process = subprocess.Popen(
-            ["python", "manage.py", command],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        stdout, stderr = process.communicate(timeout=30)
-        if process.returncode != 0:
-            return f"Error running '{command}':\n{stderr}"
-        return stdout
-    except FileNotFoundError:
-        return "Error: manage.py not found."
-    except subprocess.TimeoutExpired:
-        return f"Error: Timeout running '{command}'."
-    except Exception as e:
-        return f"An unexpected error occurred: {e}"
+        return await asyncio.to_thread(supervisor.request, command, name)
+    except SupervisorUnavailable:
+        raise HTTPException(status_code=503, detail="No service supervisor is running. Start one with: "
+                                                    "python manage.py supervise")
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown service: {name}")
 
 @app.get("/api/services/status")
-async def get_status():
-    """Endpoint to get the status of all services."""
-    output = run_manage_py_command("status")
-    return {"output": output}
+async def get_status(name: Optional[str] = None):
+    """Endpoint to get the status of all services (or one, via ?name=)."""
+    reply = await call_supervisor("status", name)
+    return {"output": format_status(reply["services"]), "services": reply["services"]}
 
 @app.post("/api/services/start")
-async def start_services():
-    """Endpoint to start all services."""
-    output = run_manage_py_command("start")
-    return {"output": output}
+async def start_services(name: Optional[str] = None):
+    """Endpoint to start all services (or one, via ?name=)."""
+    reply = await call_supervisor("start", name)
+    return {"output": format_results("Started services", reply["results"]), "services": reply["services"]}
 
 @app.post("/api/services/stop")
-async def stop_services():
-    """Endpoint to stop all services."""
-    output = run_manage_py_command("stop")
-    return {"output": output}
+async def stop_services(name: Optional[str] = None):
+    """Endpoint to stop all services (or one, via ?name=)."""
+    reply = await call_supervisor("stop", name)
+    return {"output": format_results("Stopped services", reply["results"]), "services": reply["services"]}
+
+@app.post("/api/services/restart")
+async def restart_services(name: Optional[str] = None):
+    """Endpoint to restart all services (or one, via ?name=)."""
+    reply = await call_supervisor("restart", name)
+    return {"output": format_results("Restarted services", reply["results"]), "services": reply["services"]}
+
+@app.get("/api/health")
+async def get_health():
+    """Endpoint to get the heartbeat liveness table for every component."""
+    return {
+        "components": heartbeats.liveness(),
+        "dead": heartbeats.dead_components(),
+        "queue_depths": heartbeats.queue_depths(),
+    }
 
 @app.websocket("/ws/log")
 async def websocket_endpoint(websocket: WebSocket):
@@ -6,20 +6,38 @@ Converts 2,367 messages into 300-400 conversation blocks using semantic segmenta
 Phase 1 implementation: semantic similarity + time gaps + basic metadata.
 
 This is the hourly bot that runs during the day to create preliminary blocks.
+Embeddings are cached by content hash between runs, so each run only encodes
+messages added since the last one.
 """
 
+import argparse
 import json
 import numpy as np
 from pathlib import Path
 from datetime import datetime, timedelta
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 import uuid
 import sys
 
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_SUPPORT = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_SUPPORT = False
+
+try:
+    from embedding_cache import EmbeddingCache, adjacent_similarities
+except ImportError:
+    from .embedding_cache import EmbeddingCache, adjacent_similarities
+
 # Configuration
 HISTORY_FILE = Path("C:/Users/user/ShearwaterAICAD/conversation_logs/current_session.jsonl")
 OUTPUT_FILE = Path("C:/Users/user/ShearwaterAICAD/conversation_logs/blocks_index_v1.jsonl")
+EMBEDDING_CACHE_DIR = Path("C:/Users/user/ShearwaterAICAD/conversation_logs/embedding_cache")
+
+# Embedding model and CPU batching
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+EMBED_BATCH_SIZE = 64
+EMBED_THREADS = None  # None keeps torch's default thread count
 
 # Algorithm parameters (from research)
 SIMILARITY_THRESHOLD = 0.6  # Research-backed moderate threshold
@@ -27,21 +45,55 @@ TIME_THRESHOLD = 900  # 15 minutes in seconds
 MIN_BLOCK_SIZE = 5  # From TreeSeg paper
 WINDOW_SIZE = 6  # Sliding window for embedding context
 
+def embedding_text(msg, max_length=500):
+    """The normalized text of a message that is embedded (and cached by hash)"""
+    try:
+        if 'Message' in msg:
+            content = msg['Message']
+            if isinstance(content, str):
+                try:
+                    content_dict = json.loads(content)
+                    text = content_dict.get('message', str(content_dict))
+                except:
+                    text = content
+            else:
+                text = str(content)
+        else:
+            text = ""
+
+        # Normalize: remove newlines, extra spaces
+        text = ' '.join(text.split())[:max_length]
+        return text if text else "[empty message]"
+
+    except Exception as e:
+        return "[error extracting text]"
+
+
 class BlockConsolidationBot:
     """V1 Bot: Basic semantic + time-based segmentation"""
 
-    def __init__(self):
+    def __init__(self, batch_size=EMBED_BATCH_SIZE, threads=EMBED_THREADS, cache_dir=EMBEDDING_CACHE_DIR):
         self.model = None
         self.messages = []
         self.embeddings = None
+        self.similarities = None  # similarities[i]: message i vs message i + 1
         self.boundaries = []
         self.blocks = []
+        self.batch_size = batch_size
+        self.threads = threads
+        self.cache = EmbeddingCache(cache_dir, MODEL_NAME) if cache_dir else None
 
     def load_model(self):
         """Load sentence-transformers model"""
-        print("[MODEL] Loading sentence-transformers/all-MiniLM-L6-v2...")
+        print(f"[MODEL] Loading {MODEL_NAME}...")
+        if not SENTENCE_TRANSFORMERS_SUPPORT:
+            print("[ERROR] sentence-transformers is not installed (pip install sentence-transformers)")
+            return False
         try:
-            self.model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+            if self.threads:
+                import torch
+                torch.set_num_threads(self.threads)
+            self.model = SentenceTransformer(MODEL_NAME, device='cpu')
             print("[MODEL] ✓ Model loaded successfully")
             return True
         except Exception as e:
@@ -74,26 +126,7 @@ class BlockConsolidationBot:
 
     def get_message_text(self, msg, max_length=500):
         """Extract and normalize text from message"""
-        try:
-            if 'Message' in msg:
-                content = msg['Message']
-                if isinstance(content, str):
-                    try:
-                        content_dict = json.loads(content)
-                        text = content_dict.get('message', str(content_dict))
-                    except:
-                        text = content
-                else:
-                    text = str(content)
-            else:
-                text = ""
-
-            # Normalize: remove newlines, extra spaces
-            text = ' '.join(text.split())[:max_length]
-            return text if text else "[empty message]"
-
-        except Exception as e:
-            return "[error extracting text]"
+        return embedding_text(msg, max_length)
 
     def parse_timestamp(self, msg):
         """Parse timestamp from message, handle multiple formats"""
@@ -129,14 +162,25 @@ class BlockConsolidationBot:
 
         try:
             texts = [self.get_message_text(msg) for msg in self.messages]
-            self.embeddings = self.model.encode(texts, show_progress_bar=True)
-            print(f"[EMBEDDING] ✓ Generated {len(self.embeddings)} embeddings")
+            if self.cache is None:
+                self.embeddings = self.encode(texts)
+                print(f"[EMBEDDING] ✓ Generated {len(self.embeddings)} embeddings")
+            else:
+                self.embeddings = self.cache.embed(texts, self.encode)
+                print(f"[EMBEDDING] ✓ Generated {len(self.embeddings)} embeddings "
+                      f"({self.cache.stats['encoded']} encoded, {self.cache.stats['hits']} from cache)")
+            self.similarities = adjacent_similarities(self.embeddings)
             return True
 
         except Exception as e:
             print(f"[ERROR] Embedding generation failed: {e}")
             return False
 
+    def encode(self, texts):
+        """Encode texts in CPU batches as unit-length vectors"""
+        return self.model.encode(texts, batch_size=self.batch_size, show_progress_bar=len(texts) > self.batch_size,
+                                 convert_to_numpy=True, normalize_embeddings=True)
+
     def detect_boundaries(self):
         """Detect conversation boundaries using semantic similarity + time"""
         print("[BOUNDARY] Detecting boundaries...")
@@ -164,19 +208,9 @@ class BlockConsolidationBot:
                 continue
 
             # Check semantic similarity
-            try:
-                similarity = cosine_similarity(
-                    [self.embeddings[i]],
-                    [self.embeddings[i + 1]]
-                )[0][0]
-
-                if similarity < SIMILARITY_THRESHOLD:
-                    self.boundaries.append(i + 1)
-                    changes_detected += 1
-
-            except Exception as e:
-                print(f"[WARN] Similarity computation failed at message {i}: {e}")
-                continue
+            if self.similarities[i] < SIMILARITY_THRESHOLD:
+                self.boundaries.append(i + 1)
+                changes_detected += 1
 
         self.boundaries.append(len(self.messages))  # Always end with last message
 
@@ -269,6 +303,11 @@ class BlockConsolidationBot:
 
     def _extract_keywords(self, messages):
         """Extract keywords from block messages"""
+        text = ' '.join(self.get_message_text(msg).lower() for msg in messages)
+        return list(self._match_keywords(text))[:5]
+
+    def _match_keywords(self, text):
+        """Known keywords occurring in lowercased text"""
         all_keywords = set()
         keyword_dict = {
             'photo_capture': ['photo', 'image', 'camera', 'capture', 'upload'],
@@ -278,14 +317,12 @@ class BlockConsolidationBot:
             'system_architecture': ['architecture', 'design', 'framework', 'pattern'],
         }
 
-        text = ' '.join(self.get_message_text(msg).lower() for msg in messages)
-
         for category, keywords in keyword_dict.items():
             for kw in keywords:
                 if kw in text:
                     all_keywords.add(kw)
 
-        return list(all_keywords)[:5]
+        return all_keywords
 
     def _compute_confidence(self, start_idx, end_idx):
         """Compute confidence score for a block"""
@@ -294,15 +331,7 @@ class BlockConsolidationBot:
             return 0.5
 
         try:
-            similarities = []
-            for i in range(start_idx, end_idx - 1):
-                sim = cosine_similarity(
-                    [self.embeddings[i]],
-                    [self.embeddings[i + 1]]
-                )[0][0]
-                similarities.append(sim)
-
-            avg_similarity = np.mean(similarities) if similarities else 0.5
+            avg_similarity = float(np.mean(self.similarities[start_idx:end_idx - 1]))
             # Confidence: higher similarity = more confident
             confidence = min(0.95, 0.5 + (avg_similarity * 0.5))
             return round(confidence, 2)
@@ -388,7 +417,15 @@ class BlockConsolidationBot:
 
 def main():
     """Main entry point"""
-    bot = BlockConsolidationBot()
+    parser = argparse.ArgumentParser(description="Consolidate the session log into conversation blocks.")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="Messages per encoder batch")
+    parser.add_argument("--threads", type=int, default=EMBED_THREADS, help="CPU threads for the encoder")
+    parser.add_argument("--cache-dir", type=Path, default=EMBEDDING_CACHE_DIR, help="Embedding cache directory")
+    parser.add_argument("--no-cache", action="store_true", help="Encode every message without the cache")
+    args = parser.parse_args()
+
+    bot = BlockConsolidationBot(batch_size=args.batch_size, threads=args.threads,
+                                cache_dir=None if args.no_cache else args.cache_dir)
     success = bot.run()
     return success
 
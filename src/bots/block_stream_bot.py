@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Streaming Block Consolidation Bot
+
+Live counterpart of BlockConsolidationBot: tails current_session.jsonl and
+segments messages as they arrive instead of re-reading the whole log.
+
+- New messages are embedded per read (batched, through the embedding cache)
+  and compared with the running centroid of the open block; a similarity
+  under SIMILARITY_THRESHOLD or a time gap over TIME_THRESHOLD closes it
+- Closed blocks are appended to blocks.jsonl as soon as they close, in the
+  blocks_index_v1.jsonl schema plus the block's running similarity stats
+- Only the open block's running stats are kept, so memory and per-message
+  work depend on the block, not the history
+- A state file records where the open block starts in the log; a restart
+  replays just that block (the first run catches up from the beginning)
+- The log's vector index (see vector_index.py) is caught up after each
+  read, so searches of it never have to embed the log themselves; its
+  messages are already in the embedding cache by then
+- A block already at the end of blocks.jsonl is not written again, so a
+  crash between writing a block and saving the state does not duplicate it
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from block_consolidation_bot_v1 import (
+        BlockConsolidationBot, EMBED_BATCH_SIZE, EMBED_THREADS, EMBEDDING_CACHE_DIR, HISTORY_FILE,
+        MIN_BLOCK_SIZE, SIMILARITY_THRESHOLD, TIME_THRESHOLD,
+    )
+    from embedding_cache import normalize_rows
+    from vector_index import VectorIndex, vector_index_dir
+except ImportError:
+    from .block_consolidation_bot_v1 import (
+        BlockConsolidationBot, EMBED_BATCH_SIZE, EMBED_THREADS, EMBEDDING_CACHE_DIR, HISTORY_FILE,
+        MIN_BLOCK_SIZE, SIMILARITY_THRESHOLD, TIME_THRESHOLD,
+    )
+    from .embedding_cache import normalize_rows
+    from .vector_index import VectorIndex, vector_index_dir
+
+STREAM_OUTPUT_FILE = HISTORY_FILE.parent / "blocks.jsonl"
+POLL_INTERVAL = 0.5  # Seconds between checks for new lines
+READ_BATCH = EMBED_BATCH_SIZE * 4  # Lines read (and embedded) per poll at most
+
+
+class OpenBlock:
+    """Running stats of the block being built"""
+
+    def __init__(self, start_index, offset, dim):
+        self.start_index = start_index
+        self.offset = offset  # Byte offset of the block's first message in the log
+        self.count = 0
+        self.centroid = np.zeros(dim, dtype=np.float32)  # Sum of unit embeddings
+        self.similarities = []  # Each message vs the centroid before it joined
+        self.first_time = None
+        self.last_time = None
+        self.speakers = Counter()
+        self.chains = Counter()
+        self.tiers = Counter()
+        self.chain_counts = Counter()
+        self.tier_counts = Counter()
+        self.keywords = set()
+
+    def similarity(self, embedding):
+        norm = np.linalg.norm(self.centroid)
+        return float(embedding @ self.centroid / norm) if norm else 1.0
+
+    def add(self, msg, timestamp, embedding, similarity, keywords):
+        if self.count:
+            self.similarities.append(similarity)
+        else:
+            self.first_time = timestamp
+        self.count += 1
+        self.last_time = timestamp
+        self.centroid += embedding
+        if msg.get('Sender'):
+            self.speakers[msg['Sender']] += 1
+        if msg.get('chain_type'):
+            self.chains[msg['chain_type']] += 1
+        if msg.get('ace_tier'):
+            self.tiers[msg['ace_tier']] += 1
+        self.chain_counts[msg.get('chain_type', 'system_architecture')] += 1
+        self.tier_counts[msg.get('ace_tier', 'E')] += 1
+        self.keywords.update(keywords)
+
+
+class StreamingBlockBot(BlockConsolidationBot):
+    """Online segmentation of the session log into blocks"""
+
+    def __init__(self, history_file=HISTORY_FILE, output_file=STREAM_OUTPUT_FILE, state_file=None,
+                 index_dir=None, vector_index=True, **kwargs):
+        super().__init__(**kwargs)
+        self.history_file = Path(history_file)
+        self.output_file = Path(output_file)
+        self.state_file = Path(state_file) if state_file else self.output_file.with_suffix('.state.json')
+        self.index_dir = Path(index_dir) if index_dir else vector_index_dir(self.history_file)
+        self.vector_index = None
+        self.index_vectors = vector_index
+        self.open_block = None
+        self.offset = 0  # Next unread byte of the log
+        self.index = 0  # Index of the next message (valid JSON lines, as in the batch bot)
+        self.blocks_emitted = 0
+        self.stats = {'messages': 0, 'blocks': 0, 'skipped': 0, 'errors': 0}
+        self._load_state()
+        self.last_written = self._last_block_start()  # Start index of the newest block in the output
+
+    def _load_state(self):
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        # Resume at the open block's first message; it is replayed from the log
+        self.offset = state['offset']
+        self.index = state['index']
+        self.blocks_emitted = state['blocks_emitted']
+        print(f"[RESUME] Replaying from message {self.index} (byte {self.offset})")
+
+    def _save_state(self, offset, index):
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_file.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'offset': offset, 'index': index, 'blocks_emitted': self.blocks_emitted}, f)
+        os.replace(tmp, self.state_file)
+
+    def _last_block_start(self):
+        """First message index of the last block in the output file, or None"""
+        try:
+            with open(self.output_file, 'rb') as f:
+                end = f.seek(0, os.SEEK_END)
+                position = end
+                while position > 0:
+                    position = max(0, position - 4096)
+                    f.seek(position)
+                    tail = f.read(end - position).rstrip(b'\n')
+                    if b'\n' in tail or position == 0:
+                        return json.loads(tail.rsplit(b'\n', 1)[-1])['message_indices'][0]
+        except (OSError, ValueError, KeyError, IndexError):
+            pass
+        return None
+
+    def read_new(self, limit=READ_BATCH):
+        """Complete lines appended since the last read, as (offset, index, msg)"""
+        if not self.history_file.exists():
+            return []
+        if self.history_file.stat().st_size < self.offset:
+            print("[WARN] Log was truncated, starting over")
+            self.offset, self.index, self.open_block, self.last_written = 0, 0, None, None
+
+        entries = []
+        with open(self.history_file, 'rb') as f:
+            f.seek(self.offset)
+            while len(entries) < limit:
+                line = f.readline()
+                if not line.endswith(b'\n'):
+                    break  # Nothing more, or a line still being written
+                offset, self.offset = self.offset, self.offset + len(line)
+                try:
+                    msg = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    self.stats['errors'] += 1
+                    continue
+                entries.append((offset, self.index, msg))
+                self.index += 1
+        return entries
+
+    def embed(self, texts):
+        """Unit-length embeddings, through the cache when there is one"""
+        if self.cache is not None:
+            return self.cache.embed(texts, self.encode)
+        return normalize_rows(self.encode(texts))
+
+    def process(self, entries):
+        """Segment a batch of new messages, writing any blocks they close"""
+        if not entries:
+            return
+        texts = [self.get_message_text(msg) for _, _, msg in entries]
+        for (offset, index, msg), text, embedding in zip(entries, texts, self.embed(texts)):
+            timestamp = self.parse_timestamp(msg)
+            block = self.open_block
+            similarity = block.similarity(embedding) if block else 1.0
+            if block is not None:
+                if (timestamp - block.last_time).total_seconds() > TIME_THRESHOLD:
+                    self.close_block('time_gap', offset, index)
+                elif similarity < SIMILARITY_THRESHOLD:
+                    self.close_block('topic_shift', offset, index)
+            if self.open_block is None:
+                self.open_block = OpenBlock(index, offset, len(embedding))
+            self.open_block.add(msg, timestamp, embedding, similarity, self._match_keywords(text.lower()))
+            self.stats['messages'] += 1
+
+    def close_block(self, reason, next_offset, next_index):
+        """Emit the open block (unless tiny) and record where the next one starts"""
+        block, self.open_block = self.open_block, None
+        if block.count < MIN_BLOCK_SIZE:
+            self.stats['skipped'] += 1
+        elif self.last_written is not None and block.start_index <= self.last_written:
+            # Written before a crash that lost the state update; keep its id
+            self.blocks_emitted += 1
+            print(f"[RESUME] Block starting at message {block.start_index} was already written")
+        else:
+            self._write_block(self._block_record(block, reason))
+            self.last_written = block.start_index
+        self._save_state(next_offset, next_index)
+
+    def flush(self):
+        """Close the open block at the end of the log"""
+        if self.open_block is not None:
+            self.close_block('end_of_log', self.offset, self.index)
+
+    def _block_record(self, block, reason):
+        duration_seconds = (block.last_time - block.first_time).total_seconds()
+        primary_chain = block.chain_counts.most_common(1)[0][0]
+        primary_tier = block.tier_counts.most_common(1)[0][0]
+        mean_similarity = float(np.mean(block.similarities)) if block.similarities else None
+        return {
+            'block_id': f"block_{datetime.utcnow().strftime('%Y%m%d')}_{self.blocks_emitted:04d}",
+            'timestamp_start': block.first_time.isoformat() + 'Z',
+            'timestamp_end': block.last_time.isoformat() + 'Z',
+            'duration_minutes': round(duration_seconds / 60 if duration_seconds > 0 else 0, 1),
+            'message_count': block.count,
+            'message_indices': list(range(block.start_index, block.start_index + block.count)),
+            'speakers': list(block.speakers),
+            'primary_chain': primary_chain,
+            'secondary_chains': [c for c in block.chains if c != primary_chain],
+            'primary_tier': primary_tier,
+            'secondary_tiers': [t for t in block.tiers if t != primary_tier],
+            'keywords': sorted(block.keywords)[:5],
+            'summary': '[Summary pending - requires BART model]',
+            'confidence': round(min(0.95, 0.5 + mean_similarity * 0.5), 2) if mean_similarity is not None else 0.5,
+            'stats': {
+                'mean_similarity': round(mean_similarity, 4) if mean_similarity is not None else None,
+                'min_similarity': round(min(block.similarities), 4) if block.similarities else None,
+                'speaker_messages': dict(block.speakers),
+                'close_reason': reason,
+            },
+            'algorithm_version': '1.0-stream',
+            'source': 'bot'
+        }
+
+    def _write_block(self, record):
+        self.output_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.output_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.blocks_emitted += 1
+        self.stats['blocks'] += 1
+        print(f"[BLOCK] {record['block_id']}: {record['message_count']} messages "
+              f"({record['stats']['close_reason']}, confidence {record['confidence']})")
+
+    def update_vector_index(self):
+        """Index the messages and blocks written since the last update"""
+        if not self.index_vectors:
+            return
+        try:
+            if self.vector_index is None:
+                cache_dir = self.cache.cache_dir if self.cache else EMBEDDING_CACHE_DIR
+                self.vector_index = VectorIndex(self.index_dir, cache_dir, encode=self.encode, cache=self.cache)
+            added = self.vector_index.catch_up(self.history_file, self.output_file)
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Vector index not updated: {e}")
+            return
+        if added:
+            print(f"[VECTOR] {added} rows indexed, {len(self.vector_index)} in total")
+
+    def catch_up(self):
+        """Process everything currently in the log; returns the number of messages"""
+        processed = 0
+        while True:
+            entries = self.read_new()
+            if not entries:
+                return processed
+            self.process(entries)
+            processed += len(entries)
+
+    def run(self, follow=True, poll_interval=POLL_INTERVAL):
+        """Tail the log; without follow, segment it to the end and close the last block"""
+        print("\n" + "=" * 80)
+        print("[START] Streaming Block Consolidation Bot")
+        print(f"[TAIL]  {self.history_file} -> {self.output_file}")
+        print("=" * 80 + "\n")
+
+        if self.model is None and not self.load_model():
+            return False
+
+        try:
+            while True:
+                if self.catch_up():
+                    self.update_vector_index()
+                elif not follow:
+                    break
+                else:
+                    time.sleep(poll_interval)
+            self.flush()
+            self.update_vector_index()
+        except KeyboardInterrupt:
+            print("\n[STOP] Interrupted; the open block resumes on restart")
+
+        print(f"[SUMMARY] {self.stats['messages']} messages, {self.stats['blocks']} blocks written, "
+              f"{self.stats['skipped']} tiny blocks skipped, {self.stats['errors']} invalid lines")
+        return True
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Segment the session log into blocks as it grows.")
+    parser.add_argument("--history", type=Path, default=HISTORY_FILE, help="Session log to tail")
+    parser.add_argument("--output", type=Path, default=STREAM_OUTPUT_FILE, help="Blocks file to append to")
+    parser.add_argument("--once", action="store_true", help="Segment to the end of the log and exit")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL)
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="Messages per encoder batch")
+    parser.add_argument("--threads", type=int, default=EMBED_THREADS, help="CPU threads for the encoder")
+    parser.add_argument("--cache-dir", type=Path, default=EMBEDDING_CACHE_DIR, help="Embedding cache directory")
+    parser.add_argument("--no-cache", action="store_true", help="Encode every message without the cache")
+    parser.add_argument("--index-dir", type=Path, help="Vector index directory (default: <history>.vectors)")
+    parser.add_argument("--no-vector-index", action="store_true", help="Do not keep the vector index up to date")
+    args = parser.parse_args()
+
+    bot = StreamingBlockBot(history_file=args.history, output_file=args.output, batch_size=args.batch_size,
+                            threads=args.threads, cache_dir=None if args.no_cache else args.cache_dir,
+                            index_dir=args.index_dir, vector_index=not args.no_vector_index)
+    return bot.run(follow=not args.once, poll_interval=args.poll_interval)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
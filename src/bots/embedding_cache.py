@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Persistent Embedding Cache
+
+Sentence embeddings keyed by content hash, so reruns of the consolidation
+bots only encode messages they have not seen before.
+
+Layout (in one directory):
+- embeddings.f16: row-major float16 matrix, one unit-length row per text,
+  appended to and read back through a memory map
+- embeddings_index.json: model name, dimension and the content hash of
+  each row, in row order
+
+Rows are written before the index, and rows past the end of the index are
+truncated on load, so a crash mid-append loses at most the new rows.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+CACHE_VERSION = 1
+MATRIX_FILE = "embeddings.f16"
+INDEX_FILE = "embeddings_index.json"
+DTYPE = np.dtype('<f2')
+
+
+def content_hash(text: str) -> str:
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Rows scaled to unit length (zero rows stay zero)"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def adjacent_similarities(embeddings: np.ndarray) -> np.ndarray:
+    """Cosine similarity of each row with the next, as one row-wise dot product"""
+    embeddings = normalize_rows(embeddings)
+    return np.einsum('ij,ij->i', embeddings[:-1], embeddings[1:])
+
+
+class EmbeddingCache:
+    """Content-hash keyed, memory-mapped float16 embedding store"""
+
+    def __init__(self, cache_dir: Path, model_name: str):
+        self.cache_dir = Path(cache_dir)
+        self.model_name = model_name
+        self.matrix_path = self.cache_dir / MATRIX_FILE
+        self.index_path = self.cache_dir / INDEX_FILE
+        self.dim: Optional[int] = None
+        self.hashes: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.stats = {'hits': 0, 'encoded': 0}
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def _load(self) -> None:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        if index.get('version') != CACHE_VERSION or index.get('model') != self.model_name:
+            return  # Another model's vectors are not comparable; start over
+        self.dim = index['dim']
+        self.hashes = index['hashes']
+        expected = len(self.hashes) * self.dim * DTYPE.itemsize
+        size = self.matrix_path.stat().st_size if self.matrix_path.exists() else 0
+        if size < expected:
+            self.dim, self.hashes = None, []
+            return
+        if size > expected:
+            with open(self.matrix_path, 'r+b') as f:
+                f.truncate(expected)
+        self.rows = {h: row for row, h in enumerate(self.hashes)}
+
+    def _save_index(self) -> None:
+        tmp = self.index_path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'version': CACHE_VERSION, 'model': self.model_name,
+                                'dim': self.dim, 'hashes': self.hashes}))
+        os.replace(tmp, self.index_path)
+
+    def matrix(self) -> np.ndarray:
+        """All cached rows as a read-only memory map"""
+        if not self.hashes:
+            return np.zeros((0, self.dim or 0), dtype=DTYPE)
+        return np.memmap(self.matrix_path, dtype=DTYPE, mode='r', shape=(len(self.hashes), self.dim))
+
+    def append(self, hashes: Sequence[str], vectors: np.ndarray) -> None:
+        """Store unit-length float16 rows for new hashes"""
+        vectors = normalize_rows(vectors)
+        if not len(hashes):
+            return
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self.matrix_path.unlink(missing_ok=True)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.matrix_path, 'ab') as f:
+            f.write(vectors.astype(DTYPE).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        for h in hashes:
+            self.rows[h] = len(self.hashes)
+            self.hashes.append(h)
+        self._save_index()
+
+    def embed(self, texts: Sequence[str], encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Unit-length float32 embeddings for texts, encoding only cache misses.
+
+        encode gets the distinct uncached texts in first-seen order and
+        returns one row per text.
+        """
+        hashes = [content_hash(text) for text in texts]
+        missing = {}
+        for h, text in zip(hashes, texts):
+            if h not in self.rows and h not in missing:
+                missing[h] = text
+        self.stats['hits'] += sum(1 for h in hashes if h in self.rows)
+        if missing:
+            self.append(list(missing), encode(list(missing.values())))
+            self.stats['encoded'] += len(missing)
+        if not hashes:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.asarray(self.matrix()[[self.rows[h] for h in hashes]], dtype=np.float32)
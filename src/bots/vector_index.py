@@ -0,0 +1,602 @@
+#!/usr/bin/env python3
+"""
+Semantic Vector Index
+
+Nearest-neighbour search over message and block embeddings, so callers can
+pull the past context most similar to a text instead of only the last N
+messages.
+
+Each log has its own index directory next to it, <log>.vectors (see
+vector_index_dir), so indexes of different logs never replace each other.
+Layout (rows in the order they were indexed):
+- vectors.f16: row-major float16 matrix of unit-length vectors, read
+  through a memory map
+- records.bin: one fixed-size record per row (kind, byte offset of the
+  message or block in its file, time, speaker, tier and chain codes), used
+  for filters and for reading hits back
+- ivf_centroids.npy / ivf_lists.i4: IVF coarse centroids and each row's
+  list, once trained
+- state.json: model, dimension, row count, filter vocabularies and how far
+  the session log and blocks.jsonl have been indexed
+
+catch_up() indexes the messages appended to the session log (embedded
+through the shared EmbeddingCache, so only texts no bot has embedded yet
+are encoded) and the blocks appended to the streaming bot's blocks.jsonl
+(the normalized mean of their messages). One process writes at a time,
+under a lock file; the streaming block bot keeps the current session's
+index up to date as it embeds messages. Rows are written before the state,
+and the writer truncates rows past the state's count before appending.
+Readers never write: refresh() maps the rows a newer state covers.
+
+Search is an exact inner product over the whole matrix (flat), or, from
+IVF_MIN_VECTORS rows on, over the rows of the IVF_NPROBE lists nearest the
+query. Filtered queries that leave few rows are always scored exactly.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+try:
+    from block_consolidation_bot_v1 import (
+        BlockConsolidationBot, EMBEDDING_CACHE_DIR, HISTORY_FILE, MODEL_NAME, embedding_text,
+    )
+    from embedding_cache import DTYPE, EmbeddingCache, content_hash, normalize_rows
+except ImportError:
+    from .block_consolidation_bot_v1 import (
+        BlockConsolidationBot, EMBEDDING_CACHE_DIR, HISTORY_FILE, MODEL_NAME, embedding_text,
+    )
+    from .embedding_cache import DTYPE, EmbeddingCache, content_hash, normalize_rows
+
+BLOCKS_FILE = HISTORY_FILE.parent / "blocks.jsonl"
+
+INDEX_VERSION = 1
+VECTORS_FILE = "vectors.f16"
+RECORDS_FILE = "records.bin"
+CENTROIDS_FILE = "ivf_centroids.npy"
+LISTS_FILE = "ivf_lists.i4"
+STATE_FILE = "state.json"
+LOCK_FILE = "writer.lock"
+
+KINDS = ('message', 'block')
+MESSAGE, BLOCK = range(len(KINDS))
+RECORD_DTYPE = np.dtype([('kind', 'u1'), ('offset', '<i8'), ('time_us', '<i8'),
+                         ('speaker', '<i4'), ('tier', '<i4'), ('chain', '<i4')])
+VOCAB_FIELDS = ('speaker', 'tier', 'chain')
+FILTER_KEYS = ('kind',) + VOCAB_FIELDS + ('since', 'until')
+NO_TIME = np.iinfo(np.int64).min
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+BACKENDS = ('auto', 'flat', 'ivf')
+IVF_MIN_VECTORS = 20000  # 'auto' searches flat below this
+IVF_MAX_LISTS = 4096
+IVF_NPROBE = 16  # Lists scanned per query
+IVF_TRAIN_POINTS = 64  # Sampled vectors per list for k-means
+IVF_TRAIN_ITERATIONS = 10
+IVF_RETRAIN_GROWTH = 4  # Retrain once the index is this many times the trained size
+FLAT_CHUNK_ROWS = 65536  # Rows converted to float32 at a time
+EXACT_FILTER_ROWS = 20000  # Filtered queries leaving fewer rows skip the IVF lists
+CATCH_UP_BATCH = 1024  # Lines embedded and appended at a time
+STALE_LOCK_SECONDS = 600
+
+
+def timestamp_us(value: Any) -> Optional[int]:
+    """Epoch microseconds of an ISO timestamp or datetime (naive times are UTC); None if unparseable"""
+    if isinstance(value, str):
+        text = value.strip()
+        if text.endswith('Z'):
+            text = text[:-1] + '+00:00'
+        try:
+            value = datetime.fromisoformat(text)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def vector_index_dir(log_path: Path) -> Path:
+    """The index directory of a log: <log>.vectors next to it"""
+    return Path(log_path).with_suffix('.vectors')
+
+
+VECTOR_INDEX_DIR = vector_index_dir(HISTORY_FILE)
+
+
+def line_hash(line: bytes) -> str:
+    return content_hash(line.decode('utf-8', errors='replace'))
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first"""
+    if len(scores) > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+    else:
+        best = np.arange(len(scores))
+    return best[np.argsort(-scores[best], kind='stable')]
+
+
+def spherical_kmeans(sample: np.ndarray, lists: int, iterations: int, seed: int = 0) -> np.ndarray:
+    """Unit-length centroids of unit-length rows, by cosine k-means"""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = (sample @ centroids.T).argmax(axis=1)
+        order = np.argsort(assignment, kind='stable')
+        present, starts = np.unique(assignment[order], return_index=True)
+        centroids[present] = np.add.reduceat(sample[order], starts, axis=0)
+        empty = np.setdiff1d(np.arange(lists), present)
+        centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]  # Reseed
+        centroids = normalize_rows(centroids)
+    return centroids
+
+
+class VectorIndex:
+    """Memory-mapped float16 vector index over the session log and its blocks"""
+
+    def __init__(self, index_dir: Path = VECTOR_INDEX_DIR, cache_dir: Path = EMBEDDING_CACHE_DIR,
+                 model_name: str = MODEL_NAME, encode: Optional[Callable[[List[str]], np.ndarray]] = None,
+                 backend: str = 'auto', nprobe: int = IVF_NPROBE, cache: Optional[EmbeddingCache] = None):
+        if backend not in BACKENDS:
+            raise ValueError(f"backend must be one of {BACKENDS}, got {backend!r}")
+        self.index_dir = Path(index_dir)
+        self.cache = cache if cache is not None else EmbeddingCache(cache_dir, model_name)  # Share a bot's
+        self.model_name = model_name
+        self.encode = encode
+        self.backend = backend
+        self.nprobe = nprobe
+        self.lock = threading.RLock()
+        self.stats = {'messages': 0, 'blocks': 0, 'encoded': 0}
+        self.state_stamp = None
+        self._load()
+
+    def __len__(self) -> int:
+        return self.count
+
+    # ---- storage ----
+
+    def _path(self, name: str) -> Path:
+        return self.index_dir / name
+
+    def _empty_state(self) -> Dict[str, Any]:
+        return {'version': INDEX_VERSION, 'model': self.model_name, 'dim': None, 'count': 0,
+                'vocab': {field: [] for field in VOCAB_FIELDS}, 'ivf': None, 'messages': {}, 'blocks': {}}
+
+    def _state_stamp(self) -> Optional[tuple]:
+        try:
+            stat = self._path(STATE_FILE).stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self, truncate: bool = False) -> None:
+        """Read the state and map the rows it covers; with truncate (writer only), drop rows past them"""
+        with self.lock:
+            self.state_stamp = self._state_stamp()
+            try:
+                with open(self._path(STATE_FILE), 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                state = None
+            if state is None or state.get('version') != INDEX_VERSION or state.get('model') != self.model_name:
+                state = self._empty_state()
+            self.state = state
+            self.count = state['count']
+            self.codes = {field: {value: code for code, value in enumerate(state['vocab'][field])}
+                          for field in VOCAB_FIELDS}
+            self.vectors = self.records = None  # Unmapped before truncating
+            sizes = [(VECTORS_FILE, (state['dim'] or 0) * DTYPE.itemsize), (RECORDS_FILE, RECORD_DTYPE.itemsize)]
+            if state['ivf']:
+                sizes.append((LISTS_FILE, 4))
+            for name, row_bytes in sizes if truncate else ():
+                path = self._path(name)
+                if path.exists() and path.stat().st_size > self.count * row_bytes:
+                    with open(path, 'r+b') as f:
+                        f.truncate(self.count * row_bytes)  # Rows of an append the state never recorded
+            self.centroids = np.load(self._path(CENTROIDS_FILE)) if state['ivf'] else None
+            self._map()
+
+    def _map(self, lists: bool = True) -> None:
+        """Memory-map the indexed rows; with lists, group them by IVF list too"""
+        dim = self.state['dim'] or 0
+        if self.count:
+            self.vectors = np.memmap(self._path(VECTORS_FILE), dtype=DTYPE, mode='r', shape=(self.count, dim))
+            self.records = np.memmap(self._path(RECORDS_FILE), dtype=RECORD_DTYPE, mode='r', shape=(self.count,))
+        else:
+            self.vectors = np.zeros((0, dim), dtype=DTYPE)
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+        self.list_order = self.list_bounds = None
+        if lists and self.centroids is not None:
+            assignment = np.fromfile(self._path(LISTS_FILE), dtype='<i4', count=self.count)
+            self.list_order = np.argsort(assignment, kind='stable')
+            self.list_bounds = np.searchsorted(assignment[self.list_order], np.arange(len(self.centroids) + 1))
+
+    def _save_state(self) -> None:
+        self.state['count'] = self.count
+        tmp = self._path(STATE_FILE).with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self._path(STATE_FILE))
+        self.state_stamp = self._state_stamp()
+
+    def exists(self) -> bool:
+        """Whether a writer has built this index"""
+        return self.state_stamp is not None
+
+    def refresh(self) -> bool:
+        """Map the rows another process has added since the last load; returns whether there were any"""
+        with self.lock:
+            if self._state_stamp() == self.state_stamp:
+                return False
+            self._load()
+            return True
+
+    def _reset(self) -> None:
+        for name in (VECTORS_FILE, RECORDS_FILE, CENTROIDS_FILE, LISTS_FILE, STATE_FILE):
+            self._path(name).unlink(missing_ok=True)
+        self._load()
+
+    @contextmanager
+    def _writer(self):
+        """Whether this process may append: one writer at a time across processes, by lock file"""
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        lock_path = self._path(LOCK_FILE)
+        with self.lock:
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except FileExistsError:
+                try:
+                    stale = time.time() - lock_path.stat().st_mtime > STALE_LOCK_SECONDS
+                except OSError:
+                    stale = True
+                if not stale:
+                    yield False  # Another process is catching up; search what is indexed
+                    return
+            try:
+                yield True
+            finally:
+                lock_path.unlink(missing_ok=True)
+
+    def _code(self, field: str, value: Any) -> int:
+        if not isinstance(value, str) or not value:
+            return -1
+        codes = self.codes[field]
+        if value not in codes:
+            codes[value] = len(codes)
+            self.state['vocab'][field].append(value)
+        return codes[value]
+
+    def _append(self, vectors: np.ndarray, records: List[tuple]) -> None:
+        """Append rows (vectors before records before IVF lists), then record them in the state"""
+        vectors = normalize_rows(vectors)
+        if self.state['dim'] is None:
+            self.state['dim'] = vectors.shape[1]
+        rows = np.array(records, dtype=RECORD_DTYPE)
+        with open(self._path(VECTORS_FILE), 'ab') as f:
+            f.write(vectors.astype(DTYPE).tobytes())
+        with open(self._path(RECORDS_FILE), 'ab') as f:
+            f.write(rows.tobytes())
+        if self.centroids is not None:
+            lists = (vectors @ self.centroids.T).argmax(axis=1).astype('<i4')
+            with open(self._path(LISTS_FILE), 'ab') as f:
+                f.write(lists.tobytes())
+        self.count += len(rows)
+        self._save_state()
+        self._map(lists=False)  # Grouped once the catch-up is done
+
+    # ---- indexing ----
+
+    def load_encoder(self) -> None:
+        """Load the embedding model unless an encoder was given; raises RuntimeError without it"""
+        if self.encode is None:
+            bot = BlockConsolidationBot(cache_dir=None)
+            if not bot.load_model():
+                raise RuntimeError(f"Cannot embed without the {self.model_name} model")
+            self.encode = bot.encode
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        self.load_encoder()
+        self.stats['encoded'] += len(texts)
+        return self.encode(texts)
+
+    def _is_continuation(self, path: Path, source: Dict[str, Any]) -> bool:
+        """Whether the file still starts with the lines indexed so far"""
+        offset = source.get('offset', 0)
+        if source.get('path') != str(path) or path.stat().st_size < offset:
+            return False
+        if offset == 0:
+            return True
+        with open(path, 'rb') as f:
+            head = f.readline()
+            f.seek(source['tail_offset'])
+            tail = f.read(offset - source['tail_offset'])
+        return line_hash(head) == source['head_hash'] and line_hash(tail) == source['tail_hash']
+
+    def _read_lines(self, path: Path, offset: int):
+        """(offset, line, parsed JSON or None) of the complete lines from offset on"""
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    return  # Still being written
+                try:
+                    item = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    item = None
+                yield offset, line, item
+                offset += len(line)
+
+    @staticmethod
+    def _advance(source: Dict[str, Any], offset: int, line: bytes) -> None:
+        """Record a line as indexed, with the hashes _is_continuation checks"""
+        if offset == 0:
+            source['head_hash'] = line_hash(line)
+        source.update(offset=offset + len(line), tail_offset=offset, tail_hash=line_hash(line))
+
+    def catch_up(self, log_path: Path = HISTORY_FILE, blocks_path: Optional[Path] = BLOCKS_FILE) -> int:
+        """Index messages and blocks appended since the last call; returns the number of rows added"""
+        with self._writer() as writer:
+            if not writer:
+                return 0
+            self._load(truncate=True)  # Another process may have appended
+            added = self._catch_up_messages(Path(log_path).resolve())
+            if blocks_path is not None:
+                added += self._catch_up_blocks(Path(blocks_path).resolve())
+            if self._needs_training():
+                self.train_ivf()
+            elif added:
+                self._map()
+            return added
+
+    def _catch_up_messages(self, log_path: Path) -> int:
+        if not log_path.exists():
+            return 0
+        source = self.state['messages']
+        if not self._is_continuation(log_path, source):
+            if source.get('offset'):
+                print(f"[VECTOR] {log_path} changed underneath the index, rebuilding")
+                self._reset()
+            source = self.state['messages'] = {'path': str(log_path), 'offset': 0, 'count': 0}
+            self.state['blocks'] = {}  # Block message indices refer to the old log
+
+        added, batch = 0, []
+        for offset, line, msg in self._read_lines(log_path, source['offset']):
+            self._advance(source, offset, line)
+            if msg is None:
+                continue  # Not counted as a message, as in the block bots
+            batch.append((offset, msg if isinstance(msg, dict) else {}))
+            if len(batch) >= CATCH_UP_BATCH:
+                added += self._add_messages(batch, source)
+                batch = []
+        return added + self._add_messages(batch, source)
+
+    def _add_messages(self, batch: List[tuple], source: Dict[str, Any]) -> int:
+        if batch:
+            vectors = self.cache.embed([embedding_text(msg) for _, msg in batch], self._encode)
+            records = []
+            for offset, msg in batch:
+                metadata = msg.get('Metadata') if isinstance(msg.get('Metadata'), dict) else {}
+                records.append((MESSAGE, offset, timestamp_us(msg.get('Timestamp')) or NO_TIME,
+                                self._code('speaker', msg.get('SpeakerName') or msg.get('Sender')),
+                                self._code('tier', msg.get('ace_tier', metadata.get('ace_tier'))),
+                                self._code('chain', msg.get('chain_type', metadata.get('chain_type')))))
+            source['count'] += len(batch)
+            self._append(vectors, records)
+        else:
+            self._save_state()  # The offset moved past skipped lines
+        self.stats['messages'] += len(batch)
+        return len(batch)
+
+    def _catch_up_blocks(self, blocks_path: Path) -> int:
+        if not blocks_path.exists() or not self.count:
+            return 0
+        source = self.state['blocks']
+        if not self._is_continuation(blocks_path, source):
+            if source.get('offset'):
+                print(f"[VECTOR] {blocks_path} was rewritten; only blocks appended from now on are indexed")
+            source = self.state['blocks'] = {'path': str(blocks_path), 'offset': 0}
+
+        message_rows = np.flatnonzero(self.records['kind'] == MESSAGE)
+        vectors, records = [], []
+        for offset, line, block in self._read_lines(blocks_path, source['offset']):
+            indices = block.get('message_indices') if isinstance(block, dict) else None
+            if indices and max(indices) >= len(message_rows):
+                break  # Its messages are not indexed yet; retry next time
+            self._advance(source, offset, line)
+            if not indices:
+                continue
+            speakers = (block.get('stats') or {}).get('speaker_messages') or {}
+            vectors.append(np.asarray(self.vectors[message_rows[indices]], dtype=np.float32).sum(axis=0))
+            records.append((BLOCK, offset, timestamp_us(block.get('timestamp_start')) or NO_TIME,
+                            self._code('speaker', max(speakers, key=speakers.get) if speakers else None),
+                            self._code('tier', block.get('primary_tier')),
+                            self._code('chain', block.get('primary_chain'))))
+        if records:
+            self._append(np.array(vectors), records)
+        else:
+            self._save_state()
+        self.stats['blocks'] += len(records)
+        return len(records)
+
+    # ---- IVF ----
+
+    def _needs_training(self) -> bool:
+        if self.backend == 'flat' or not self.count:
+            return False
+        if self.backend == 'auto' and self.count < IVF_MIN_VECTORS:
+            return False
+        trained = (self.state['ivf'] or {}).get('trained', 0)
+        return not trained or self.count >= IVF_RETRAIN_GROWTH * trained
+
+    def train_ivf(self, lists: Optional[int] = None) -> None:
+        """Cluster a sample of the rows into IVF lists (about sqrt(rows)) and assign every row"""
+        with self.lock:
+            lists = lists or int(np.clip(round(np.sqrt(self.count)), 1, IVF_MAX_LISTS))
+            lists = min(lists, self.count)
+            rng = np.random.default_rng(0)
+            sample_rows = np.sort(rng.choice(self.count, min(self.count, lists * IVF_TRAIN_POINTS), replace=False))
+            sample = np.asarray(self.vectors[sample_rows], dtype=np.float32)
+            centroids = spherical_kmeans(sample, lists, IVF_TRAIN_ITERATIONS).astype(np.float32)
+
+            assignment = np.empty(self.count, dtype='<i4')
+            for start in range(0, self.count, FLAT_CHUNK_ROWS):
+                chunk = np.asarray(self.vectors[start:start + FLAT_CHUNK_ROWS], dtype=np.float32)
+                assignment[start:start + len(chunk)] = (chunk @ centroids.T).argmax(axis=1)
+            np.save(self._path(CENTROIDS_FILE), centroids)
+            assignment.tofile(self._path(LISTS_FILE))
+            self.state['ivf'] = {'lists': lists, 'trained': self.count}
+            self._save_state()
+            self._load()
+
+    # ---- search ----
+
+    def _filter_mask(self, filters: Dict[str, Any]) -> Optional[np.ndarray]:
+        """Rows passing the filters (None without filters); speaker, tier and chain match case-insensitively"""
+        filters = {key: value for key, value in (filters or {}).items() if value is not None}
+        unknown = set(filters) - set(FILTER_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown filters {sorted(unknown)}; expected {FILTER_KEYS}")
+        if not filters:
+            return None
+        mask = np.ones(self.count, dtype=bool)
+        if 'kind' in filters:
+            if filters['kind'] not in KINDS:
+                raise ValueError(f"kind must be one of {KINDS}, got {filters['kind']!r}")
+            mask &= self.records['kind'] == KINDS.index(filters['kind'])
+        for field in VOCAB_FIELDS:
+            if field in filters:
+                wanted = str(filters[field]).lower()
+                codes = [code for value, code in self.codes[field].items() if value.lower() == wanted]
+                mask &= np.isin(self.records[field], codes)
+        for key in ('since', 'until'):
+            if key in filters:
+                bound = timestamp_us(filters[key])
+                if bound is None:
+                    raise ValueError(f"{key} must be an ISO timestamp, got {filters[key]!r}")
+                times = self.records['time_us']
+                mask &= (times >= bound) if key == 'since' else (times != NO_TIME) & (times < bound)
+        return mask
+
+    def _score_rows(self, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        scores = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), FLAT_CHUNK_ROWS):
+            chunk = rows[start:start + FLAT_CHUNK_ROWS]
+            scores[start:start + len(chunk)] = np.asarray(self.vectors[chunk], dtype=np.float32) @ query
+        return scores
+
+    def _search_flat(self, query: np.ndarray, k: int, mask: Optional[np.ndarray]):
+        best_rows, best_scores = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        for start in range(0, self.count, FLAT_CHUNK_ROWS):
+            scores = np.asarray(self.vectors[start:start + FLAT_CHUNK_ROWS], dtype=np.float32) @ query
+            rows = np.arange(start, start + len(scores))
+            if mask is not None:
+                keep = mask[start:start + len(scores)]
+                rows, scores = rows[keep], scores[keep]
+            best = top_k(scores, k)
+            best_rows = np.concatenate([best_rows, rows[best]])
+            best_scores = np.concatenate([best_scores, scores[best]])
+        best = top_k(best_scores, k)
+        return best_rows[best], best_scores[best]
+
+    def _search_ivf(self, query: np.ndarray, k: int, mask: Optional[np.ndarray], nprobe: int):
+        probes = top_k(self.centroids @ query, nprobe)
+        rows = np.sort(np.concatenate([self.list_order[self.list_bounds[p]:self.list_bounds[p + 1]] for p in probes]))
+        if mask is not None:
+            rows = rows[mask[rows]]
+        scores = self._score_rows(rows, query)
+        best = top_k(scores, k)
+        return rows[best], scores[best]
+
+    def search_vector(self, vector: np.ndarray, k: int = 10, filters: Optional[Dict[str, Any]] = None,
+                      nprobe: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        The k rows most similar to a vector, best first.
+
+        filters take kind ('message' or 'block'), speaker, tier, chain and
+        since/until ISO timestamps (since inclusive, until exclusive). Each
+        hit has its kind, cosine score, the byte offset in its file and the
+        decoded message or block.
+        """
+        with self.lock:
+            if not self.count or k <= 0:
+                return []
+            query = normalize_rows(np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+            mask = self._filter_mask(filters)
+            if mask is not None and mask.sum() <= EXACT_FILTER_ROWS:
+                rows = np.flatnonzero(mask)
+                scores = self._score_rows(rows, query)
+                best = top_k(scores, k)
+                rows, scores = rows[best], scores[best]
+            elif self.centroids is not None and self.backend != 'flat':
+                rows, scores = self._search_ivf(query, k, mask, nprobe or self.nprobe)
+            else:
+                rows, scores = self._search_flat(query, k, mask)
+            return self._read_hits(rows, scores)
+
+    def search_similar(self, text: str, k: int = 10, filters: Optional[Dict[str, Any]] = None,
+                       nprobe: Optional[int] = None) -> List[Dict[str, Any]]:
+        """The k messages and blocks most similar to text (see search_vector)"""
+        if not self.count:
+            return []
+        return self.search_vector(self._encode([text])[0], k, filters, nprobe)
+
+    def _read_hits(self, rows: np.ndarray, scores: np.ndarray) -> List[Dict[str, Any]]:
+        """Decode the messages and blocks of search hits from their files"""
+        hits, files = [], {}
+        try:
+            for row, score in zip(rows.tolist(), scores.tolist()):
+                record = self.records[row]
+                kind = KINDS[record['kind']]
+                path = self.state['messages' if kind == 'message' else 'blocks'].get('path')
+                if path not in files:
+                    files[path] = open(path, 'rb')
+                f = files[path]
+                f.seek(int(record['offset']))
+                try:
+                    item = json.loads(f.readline())
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    continue  # The file changed since it was indexed
+                hits.append({'kind': kind, 'score': score, 'offset': int(record['offset']), kind: item})
+        finally:
+            for f in files.values():
+                f.close()
+        return hits
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the vector index or query it.")
+    parser.add_argument("query", nargs="?", help="Text to find similar messages and blocks for")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--kind", choices=KINDS)
+    parser.add_argument("--speaker")
+    parser.add_argument("--index-dir", type=Path, help="Index directory (default: <log>.vectors)")
+    parser.add_argument("--cache-dir", type=Path, default=EMBEDDING_CACHE_DIR)
+    parser.add_argument("--log", type=Path, default=HISTORY_FILE)
+    parser.add_argument("--blocks", type=Path, help="Blocks of the log (default: blocks.jsonl for the session log)")
+    parser.add_argument("--backend", choices=BACKENDS, default='auto')
+    args = parser.parse_args()
+
+    index = VectorIndex(args.index_dir or vector_index_dir(args.log), args.cache_dir, backend=args.backend)
+    blocks = args.blocks or (BLOCKS_FILE if args.log == HISTORY_FILE else None)  # Block indices number this log
+    added = index.catch_up(args.log, blocks)
+    print(f"[VECTOR] {added} rows added, {len(index)} indexed ({index.stats['encoded']} texts encoded)")
+    if args.query:
+        for hit in index.search_similar(args.query, args.k, {'kind': args.kind, 'speaker': args.speaker}):
+            text = embedding_text(hit['message']) if hit['kind'] == 'message' else ", ".join(hit['block'].get('keywords', []))
+            print(f"  {hit['score']:.3f} {hit['kind']:<8} {text[:100]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,7 +13,7 @@ Features:
 - Chain-type auto-detection (10 domain chains)
 - ACE tier classification (A-Tier, C-Tier, E-Tier)
 - SHL tag generation and keyword extraction
-- Duplicate detection (content hashing)
+- Duplicate detection (content hashing, MinHash/LSH near duplicates)
 - Smart metadata enrichment
 - Session archiving with recovery
 - Statistics and querying interface
@@ -25,6 +25,7 @@ import json
 import time
 import os
 import re
+import sys
 import hashlib
 from pathlib import Path
 from datetime import datetime
@@ -33,10 +34,29 @@ from dataclasses import dataclass, asdict
 from typing import Dict, List, Optional
 import uuid
 
+try:
+    from ..core.heartbeat import HeartbeatStats, is_heartbeat_topic, start_component_heartbeat
+except ImportError:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))  # src, when run from src/brokers
+    from core.heartbeat import HeartbeatStats, is_heartbeat_topic, start_component_heartbeat
+
+# Near-duplicate tagging is optional; without it messages are still forwarded and recorded
+try:
+    from ..utilities.near_duplicates import NearDuplicateIndex
+    NEAR_DUPLICATE_SUPPORT = True
+except ImportError:
+    try:
+        from utilities.near_duplicates import NearDuplicateIndex
+        NEAR_DUPLICATE_SUPPORT = True
+    except ImportError:
+        NEAR_DUPLICATE_SUPPORT = False
+
 # --- Configuration ---
 FRONTEND_PORT = 5555
 BACKEND_PORT = 5556
 MAX_MESSAGE_HISTORY = 10000
+MAX_DRAIN = 1000  # Messages taken off the frontend per wake-up before subscriptions are served
+NEAR_DUP_THRESHOLD = 0.8  # MinHash Jaccard similarity flagged as a near duplicate
 LOG_DIR = Path("conversation_logs")
 CURRENT_LOG_FILE = LOG_DIR / "current_session.jsonl"
 ARCHIVE_DIR = LOG_DIR / "archive"
@@ -92,6 +112,9 @@ class EnhancedConversationRecorder:
 
     def __init__(self):
         self.message_log = collections.deque(maxlen=MAX_MESSAGE_HISTORY)
+        # Same window as message_log, so memory stays bounded
+        self.near_duplicates = (NearDuplicateIndex(NEAR_DUP_THRESHOLD, max_entries=MAX_MESSAGE_HISTORY)
+                                if NEAR_DUPLICATE_SUPPORT else None)
         self._setup_directories()
 
     def _setup_directories(self):
@@ -173,6 +196,22 @@ class EnhancedConversationRecorder:
                 return msg.get('Id')
         return None
 
+    def check_near_duplicate(self, event: ConversationEvent, content: str) -> Optional[str]:
+        """
+        Flag an event that nearly duplicates a recent message.
+
+        Sets near_duplicate_of/near_duplicate_similarity in its Metadata and
+        returns the earlier Id; the event is still recorded.
+        """
+        if self.near_duplicates is None or not isinstance(content, str) or not content.strip():
+            return None
+        match = self.near_duplicates.check(event.Id, content)
+        if match is None:
+            return None
+        event.Metadata['near_duplicate_of'] = match[0]
+        event.Metadata['near_duplicate_similarity'] = round(match[1], 3)
+        return match[0]
+
     def enrich_metadata(self, message: Dict) -> Dict:
         """Enhance metadata with advanced fields"""
         content = message.get('content', {}).get('message', '')
@@ -233,6 +272,7 @@ class EnhancedConversationRecorder:
                     try:
                         msg = json.loads(line.strip())
                         self.message_log.append(msg)
+                        self._index_loaded_message(msg)
                         count += 1
                     except json.JSONDecodeError:
                         continue
@@ -241,6 +281,19 @@ class EnhancedConversationRecorder:
             print(f"[ERROR] Could not load session: {e}")
             return 0
 
+    def _index_loaded_message(self, msg: Dict) -> None:
+        """Add a recovered message to the near-duplicate window"""
+        if self.near_duplicates is None:
+            return
+        try:
+            content = json.loads(msg.get('Message') or '{}')
+        except (json.JSONDecodeError, TypeError):
+            content = msg.get('Message')
+        if isinstance(content, dict):
+            content = content.get('message', '')
+        if isinstance(content, str) and content.strip():
+            self.near_duplicates.check(msg.get('Id'), content)
+
 
 def main():
     """Main broker with enhanced recording"""
@@ -259,12 +312,22 @@ def main():
     print(f"[*] Listening for publishers on port {FRONTEND_PORT}")
     print(f"[*] Listening for subscribers on port {BACKEND_PORT}")
     print(f"[*] Recording to: {CURRENT_LOG_FILE.absolute()}")
+    if not NEAR_DUPLICATE_SUPPORT:
+        print("[*] Near-duplicate tagging disabled (utilities.near_duplicates is not importable)")
 
     # Load previous session
     loaded = recorder.load_previous_session()
     if loaded > 0:
         print(f"[RECOVERY] Loaded {loaded} messages from previous session")
 
+    # Messages taken off the frontend but not yet forwarded and recorded
+    pending = collections.deque()
+
+    # Publish beats (queue depth, processed count, loop lag, last error) on the
+    # bus and to the service supervisor when it launched us
+    stats = HeartbeatStats(expected_loop_interval=1.0, queue_depth=lambda: len(pending))
+    heartbeat = start_component_heartbeat("broker", stats, context=context)
+
     # Poller
     poller = zmq.Poller()
     poller.register(xsub_socket, zmq.POLLIN)
@@ -275,17 +338,25 @@ def main():
     try:
         while True:
             events = dict(poller.poll(1000))
+            stats.tick()
 
             # Handle messages from publishers
             if xsub_socket in events and events[xsub_socket] == zmq.POLLIN:
-                message = xsub_socket.recv_multipart()
+                while len(pending) < MAX_DRAIN:
+                    try:
+                        pending.append(xsub_socket.recv_multipart(zmq.NOBLOCK))
+                    except zmq.Again:
+                        break
+
+            while pending:
+                message = pending.popleft()
 
                 # Forward to subscribers
                 xpub_socket.send_multipart(message)
 
                 # Process and persist
                 try:
-                    if len(message) == 2:
+                    if len(message) == 2 and not is_heartbeat_topic(message[0]):
                         topic, payload_str = message
                         payload = json.loads(payload_str)
 
@@ -309,16 +380,20 @@ def main():
 
                         # Create and persist event
                         event = recorder.create_event(payload)
+                        duplicate_of = recorder.check_near_duplicate(event, content)
                         recorder.persist_message(event)
                         recorder.message_log.append(asdict(event))
 
                         message_counter += 1
+                        stats.processed()
 
                         print(f"[LOG #{message_counter}] {payload.get('sender_id', '?')} "
-                              f"| Tier:{ace_tier} | Chain:{chain_type} | Topic:{topic.decode()}")
+                              f"| Tier:{ace_tier} | Chain:{chain_type} | Topic:{topic.decode()}"
+                              + (f" | Near-dup of {duplicate_of}" if duplicate_of else ""))
 
                 except (json.JSONDecodeError, KeyError) as e:
                     print(f"[ERROR] Could not parse message: {e}")
+                    stats.error(e)
 
             # Handle subscriptions
             if xpub_socket in events and events[xpub_socket] == zmq.POLLIN:
@@ -328,8 +403,14 @@ def main():
     except KeyboardInterrupt:
         print(f"\n[INFO] Broker shutting down...")
         print(f"[STATS] Processed {message_counter} messages in this session")
+        if recorder.near_duplicates is not None:
+            near = recorder.near_duplicates.report()
+            print(f"[STATS] Near duplicates flagged: {near['near_duplicates']} of {near['checked']} "
+                  f"({near['extra_reduction_percent']:.1f}% extra reduction available)")
 
     finally:
+        if heartbeat:
+            heartbeat.stop()
         xsub_socket.close()
         xpub_socket.close()
         context.term()
@@ -10,14 +10,22 @@ All agents (Claude, Gemini, etc.) inherit from this class to gain:
 """
 
 import zmq
+import collections
 import json
 import logging
+import sys
 import time
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any, Optional
 import socket
 
+try:
+    from ..heartbeat import HeartbeatStats, start_component_heartbeat
+except ImportError:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))  # src/core, when run from src/core/clients
+    from heartbeat import HeartbeatStats, start_component_heartbeat
+
 
 class AgentBaseClient:
     """
@@ -40,6 +48,8 @@ class AgentBaseClient:
         
         self.sent_messages = []
         self.received_messages = []
+        # Messages taken off the SUB socket but not yet processed
+        self.inbox = collections.deque()
         
         LOG_DIR = Path("logs")
         LOG_DIR.mkdir(parents=True, exist_ok=True)
@@ -54,6 +64,11 @@ class AgentBaseClient:
         self.persistence_socket = None
         self.persistence_port = 5557  # Dedicated persistence layer port
 
+        # Heartbeat on the bus (and to the supervisor when launched by it):
+        # received messages count as processed, the inbox is the queue depth
+        self.stats = HeartbeatStats(queue_depth=lambda: len(self.inbox))
+        self.heartbeat = None
+
     def _publish_to_persistence(self, event_type: str, message: Dict[str, Any]) -> None:
         """
         Automatically publish messages to the persistence layer for recording.
@@ -111,12 +126,16 @@ class AgentBaseClient:
             # Allow robust time for connections to establish and subscriptions to be processed by the broker
             time.sleep(1.5)
             self.logger.info(f"[CONNECTED] Agent '{self.agent_name}' is online.")
+            self.heartbeat = start_component_heartbeat(self.agent_name, self.stats, context=self.context)
             return True
         except Exception as e:
             self.logger.error(f"[FAILED] Could not connect: {e}", exc_info=True)
             return False
 
     def disconnect(self):
+        if self.heartbeat:
+            self.heartbeat.stop()
+            self.heartbeat = None
         if self.pub_socket:
             self.pub_socket.close()
         if self.sub_socket:
@@ -168,11 +187,18 @@ class AgentBaseClient:
         if not self.is_connected:
             return None
         try:
+            self.stats.tick()
             # Set a timeout on the receive operation
-            if self.sub_socket.poll(timeout_ms):
-                # Receive a multipart message: [topic, payload]
-                topic_bytes, payload_bytes = self.sub_socket.recv_multipart()
-                
+            if self.inbox or self.sub_socket.poll(timeout_ms):
+                # Take everything waiting, so the heartbeat sees how far behind we are
+                while True:
+                    try:
+                        self.inbox.append(self.sub_socket.recv_multipart(zmq.NOBLOCK))
+                    except zmq.error.Again:
+                        break
+                # Multipart messages: [topic, payload]
+                topic_bytes, payload_bytes = self.inbox.popleft()
+
                 msg = json.loads(payload_bytes.decode('utf-8'))
 
                 self.received_messages.append(msg)
@@ -182,6 +208,7 @@ class AgentBaseClient:
                 self._publish_to_persistence('received', msg)
 
                 self.process_incoming_message(msg)
+                self.stats.processed()
                 return msg
             else:
                 # Timeout occurred, no message received
@@ -190,6 +217,7 @@ class AgentBaseClient:
             return None # Expected when no message
         except Exception as e:
             self.logger.error(f"An error occurred in receive_message: {e}", exc_info=True)
+            self.stats.error(e)
             self.is_connected = False
             return None
 
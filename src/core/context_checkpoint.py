@@ -1,14 +1,28 @@
 """
 Context Checkpoint System - Auto-saves state when token budget <5%
 Prevents data loss during context compaction
+
+Timestamped checkpoints are stored like session checkpoints: compressed
+chunks shared between snapshots, pruned by the same tiered retention
+policy (see persistence/storage/checkpoints.py). LATEST_CHECKPOINT.json
+stays a plain JSON copy for quick access.
 """
 
 import json
 import os
+import sys
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, Optional
 
+try:
+    from ..persistence.storage.checkpoints import (CHECKPOINT_SUFFIX, iter_checkpoint_data, prune_checkpoints,
+                                                   write_snapshot)
+except ImportError:
+    sys.path.append(str(Path(__file__).parent.parent))  # src, when run from src/core
+    from persistence.storage.checkpoints import (CHECKPOINT_SUFFIX, iter_checkpoint_data, prune_checkpoints,
+                                                 write_snapshot)
+
 
 class ContextCheckpoint:
     """Manages automatic context snapshots to preserve state across compaction"""
@@ -24,7 +38,7 @@ class ContextCheckpoint:
     def get_checkpoint_filename(self) -> str:
         """Generate timestamped checkpoint filename"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        return f"CHECKPOINT_{timestamp}.json"
+        return f"CHECKPOINT_{timestamp}{CHECKPOINT_SUFFIX}"
 
     def should_checkpoint(self, token_budget_percent: float) -> bool:
         """
@@ -61,15 +75,17 @@ class ContextCheckpoint:
             ]
         }
 
-        # Save timestamped checkpoint
-        checkpoint_file = self.checkpoint_dir / self.get_checkpoint_filename()
-        with open(checkpoint_file, 'w') as f:
-            json.dump(checkpoint_data, f, indent=2, default=str)
+        # Save timestamped checkpoint; indented, so unchanged parts of the state chunk the same way
+        document = json.dumps(checkpoint_data, indent=2, default=str)
+        checkpoint_file = write_snapshot(document.encode('utf-8'),
+                                         self.checkpoint_dir / self.get_checkpoint_filename(),
+                                         timestamp=checkpoint_data["timestamp"], label="context")
 
         # Also save as LATEST for quick access
         with open(self.last_checkpoint_file, 'w') as f:
-            json.dump(checkpoint_data, f, indent=2, default=str)
+            f.write(document)
 
+        self.prune_checkpoints()
         return str(checkpoint_file)
 
     def load_latest_checkpoint(self) -> Optional[Dict[str, Any]]:
@@ -88,17 +104,43 @@ class ContextCheckpoint:
         except (json.JSONDecodeError, IOError):
             return None
 
+    def load_checkpoint(self, checkpoint_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Load a timestamped checkpoint, in the chunked or the older plain JSON format
+
+        Returns:
+            Checkpoint data if readable, None otherwise
+        """
+        try:
+            if checkpoint_path.endswith(CHECKPOINT_SUFFIX):
+                return json.loads(b"".join(iter_checkpoint_data(Path(checkpoint_path))))
+            with open(checkpoint_path, 'r') as f:
+                return json.load(f)
+        except (ValueError, IOError):
+            return None
+
     def list_checkpoints(self) -> list:
         """List all available checkpoints"""
         if not self.checkpoint_dir.exists():
             return []
 
         checkpoints = sorted(
-            self.checkpoint_dir.glob("CHECKPOINT_*.json"),
+            [*self.checkpoint_dir.glob("CHECKPOINT_*.json"),
+             *self.checkpoint_dir.glob(f"CHECKPOINT_*{CHECKPOINT_SUFFIX}")],
+            key=lambda cp: cp.name,
             reverse=True
         )
         return [str(cp) for cp in checkpoints]
 
+    def prune_checkpoints(self) -> Dict[str, int]:
+        """Thin out checkpoints by the tiered retention policy and delete unreferenced chunks"""
+        try:
+            # Checkpoint timestamps are local time
+            return prune_checkpoints(self.checkpoint_dir, paths=[Path(cp) for cp in self.list_checkpoints()],
+                                     now=datetime.now())
+        except OSError:
+            return {}
+
     def cleanup_old_checkpoints(self, keep_count: int = 5) -> None:
         """Keep only the N most recent checkpoints"""
         checkpoints = self.list_checkpoints()
@@ -109,6 +151,8 @@ class ContextCheckpoint:
                     os.remove(checkpoint)
                 except OSError:
                     pass
+        # Drop the chunks only the removed checkpoints used
+        prune_checkpoints(self.checkpoint_dir, paths=[], now=datetime.now())
 
 
 class ContextState:
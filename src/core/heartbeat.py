@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Heartbeat and Liveness Protocol for the Synaptic Core
+
+Every component (broker, persistence daemon, agent clients) publishes a
+periodic beat on the "heartbeat" topic of the PUB-SUB bus. A beat carries:
+- queue_depth: messages received but not yet handled (None when not measurable)
+- processed: messages handled since the component started
+- last_error: most recent error string (None when healthy)
+- loop_lag: worst main-loop stall since the previous beat, in seconds
+
+When the component was launched by the service supervisor, the same beat is
+also sent to the supervisor as a UDP datagram, so one thread per component
+serves both the bus and process supervision.
+
+HeartbeatAggregator subscribes to the topic and keeps a liveness table with
+per-component timeouts. It is the basis for autoscaling workers and for
+alerting when a component falls behind the bus.
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import zmq
+
+try:
+    from .service_supervisor import HEARTBEAT_ADDR_ENV, HEARTBEAT_INTERVAL, SERVICE_NAME_ENV
+except ImportError:
+    from service_supervisor import HEARTBEAT_ADDR_ENV, HEARTBEAT_INTERVAL, SERVICE_NAME_ENV
+
+logger = logging.getLogger('heartbeat')
+
+HEARTBEAT_TOPIC = "heartbeat"
+BROKER_PUB_ENDPOINT = "tcp://localhost:5555"  # Broker XSUB (publishers connect here)
+BROKER_SUB_ENDPOINT = "tcp://localhost:5556"  # Broker XPUB (subscribers connect here)
+DEFAULT_INTERVAL = HEARTBEAT_INTERVAL  # seconds between beats, short enough for the supervisor's timeout
+TIMEOUT_MULTIPLIER = 3  # missed beats before a component counts as dead
+MAX_ERROR_CHARS = 500  # keeps a beat within one datagram
+
+
+def is_heartbeat_topic(topic) -> bool:
+    """True for bus frames that belong to the heartbeat protocol"""
+    if isinstance(topic, bytes):
+        topic = topic.decode('utf-8', errors='replace')
+    return topic == HEARTBEAT_TOPIC
+
+
+class HeartbeatStats:
+    """
+    Counters a component updates from its main loop.
+
+    Call tick() once per loop iteration, processed() per handled message and
+    error() when something goes wrong. All methods are thread-safe.
+    """
+
+    def __init__(self, expected_loop_interval: float = 0.0,
+                 queue_depth: Optional[Callable[[], Optional[int]]] = None):
+        self.expected_loop_interval = expected_loop_interval
+        self.queue_depth_fn = queue_depth
+        self.lock = threading.Lock()
+        self.processed_count = 0
+        self.last_error: Optional[str] = None
+        self.last_tick: Optional[float] = None
+        self.max_gap = 0.0
+
+    def tick(self) -> None:
+        now = time.monotonic()
+        with self.lock:
+            if self.last_tick is not None:
+                self.max_gap = max(self.max_gap, now - self.last_tick)
+            self.last_tick = now
+
+    def processed(self, count: int = 1) -> None:
+        with self.lock:
+            self.processed_count += count
+
+    def error(self, error) -> None:
+        with self.lock:
+            self.last_error = str(error)[:MAX_ERROR_CHARS]
+
+    def snapshot(self) -> Dict:
+        """Read the counters and reset the loop-lag window"""
+        now = time.monotonic()
+        with self.lock:
+            gap = self.max_gap
+            if self.last_tick is not None:
+                gap = max(gap, now - self.last_tick)
+            self.max_gap = 0.0
+            data = {
+                'processed': self.processed_count,
+                'last_error': self.last_error,
+                'loop_lag': round(max(0.0, gap - self.expected_loop_interval), 3) if self.last_tick else None,
+            }
+        try:
+            data['queue_depth'] = self.queue_depth_fn() if self.queue_depth_fn else None
+        except Exception:
+            data['queue_depth'] = None
+        return data
+
+
+def supervisor_address() -> Optional[tuple]:
+    """(host, port) of the supervisor that launched this process, if any"""
+    address = os.getenv(HEARTBEAT_ADDR_ENV)
+    if not address:
+        return None
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+class HeartbeatPublisher:
+    """
+    Publishes beats for one component from a background thread.
+
+    Uses its own PUB socket, since ZMQ sockets must not be shared across
+    threads. Pass the component's context to avoid creating a new one.
+    Under a supervisor each beat is also sent to it, named after the service
+    the supervisor launched.
+    """
+
+    def __init__(self, component: str, stats: HeartbeatStats,
+                 endpoint: str = BROKER_PUB_ENDPOINT,
+                 interval: float = DEFAULT_INTERVAL,
+                 context: Optional[zmq.Context] = None):
+        self.component = component
+        self.stats = stats
+        self.endpoint = endpoint
+        self.interval = interval
+        self.context = context or zmq.Context.instance()
+        self.supervisor = supervisor_address()
+        self.service_name = os.getenv(SERVICE_NAME_ENV) or component
+        self.sequence = 0
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'HeartbeatPublisher':
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=self.interval + 1)
+
+    def build_beat(self) -> Dict:
+        self.sequence += 1
+        return {
+            'type': HEARTBEAT_TOPIC,
+            'from': self.component,
+            'pid': os.getpid(),
+            'seq': self.sequence,
+            'timestamp': datetime.now().isoformat(),
+            'interval': self.interval,
+            **self.stats.snapshot(),
+        }
+
+    def _run(self) -> None:
+        pub_socket = self.context.socket(zmq.PUB)
+        pub_socket.setsockopt(zmq.LINGER, 0)
+        pub_socket.connect(self.endpoint)
+        datagrams = socket.socket(socket.AF_INET, socket.SOCK_DGRAM) if self.supervisor else None
+        try:
+            while not self.stop_event.is_set():
+                beat = self.build_beat()
+                try:
+                    pub_socket.send_multipart([HEARTBEAT_TOPIC.encode('utf-8'),
+                                               json.dumps(beat).encode('utf-8')], flags=zmq.NOBLOCK)
+                except zmq.error.Again:
+                    pass  # Broker not reachable; beats are best-effort
+                if datagrams:
+                    try:
+                        datagrams.sendto(json.dumps({**beat, 'service': self.service_name}).encode('utf-8'),
+                                         self.supervisor)
+                    except OSError:
+                        pass  # Supervisor not listening
+                self.stop_event.wait(self.interval)
+        finally:
+            pub_socket.close()
+            if datagrams:
+                datagrams.close()
+
+
+class HeartbeatAggregator:
+    """
+    Liveness table built from heartbeat beats.
+
+    A component is alive while its last beat is younger than its timeout.
+    Timeouts come from the constructor; otherwise TIMEOUT_MULTIPLIER times
+    the interval the component advertises in its beats.
+    """
+
+    def __init__(self, timeouts: Optional[Dict[str, float]] = None,
+                 default_timeout: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.timeouts = dict(timeouts or {})
+        self.default_timeout = default_timeout
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.components: Dict[str, Dict] = {}
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+
+    def update(self, beat: Dict) -> None:
+        """Fold one beat into the table"""
+        component = beat.get('from')
+        if not component:
+            return
+        now = self.clock()
+        with self.lock:
+            previous = self.components.get(component)
+            rate = None
+            if previous and previous['pid'] == beat.get('pid') and now > previous['received_at']:
+                delta = (beat.get('processed') or 0) - (previous['processed'] or 0)
+                rate = round(delta / (now - previous['received_at']), 3)
+            self.components[component] = {
+                'pid': beat.get('pid'),
+                'seq': beat.get('seq'),
+                'interval': beat.get('interval', DEFAULT_INTERVAL),
+                'queue_depth': beat.get('queue_depth'),
+                'processed': beat.get('processed'),
+                'rate': rate,
+                'last_error': beat.get('last_error'),
+                'loop_lag': beat.get('loop_lag'),
+                'received_at': now,
+            }
+
+    def update_from_frame(self, payload: bytes) -> bool:
+        """Fold a raw heartbeat payload from the bus; False if it is unreadable"""
+        try:
+            self.update(json.loads(payload.decode('utf-8')))
+            return True
+        except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+            return False
+
+    def timeout_for(self, component: str, interval: float) -> float:
+        if component in self.timeouts:
+            return self.timeouts[component]
+        if self.default_timeout is not None:
+            return self.default_timeout
+        return interval * TIMEOUT_MULTIPLIER
+
+    def liveness(self) -> Dict[str, Dict]:
+        """Current liveness table keyed by component"""
+        now = self.clock()
+        table = {}
+        with self.lock:
+            for component, info in self.components.items():
+                age = now - info['received_at']
+                timeout = self.timeout_for(component, info['interval'])
+                entry = {k: v for k, v in info.items() if k != 'received_at'}
+                entry.update({
+                    'alive': age <= timeout,
+                    'age': round(age, 2),
+                    'timeout': timeout,
+                })
+                table[component] = entry
+        return table
+
+    def dead_components(self) -> List[str]:
+        return [name for name, info in self.liveness().items() if not info['alive']]
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Messages waiting in each component that reports a queue depth"""
+        with self.lock:
+            return {component: info['queue_depth'] for component, info in self.components.items()
+                    if info['queue_depth'] is not None}
+
+    # --- Standalone subscription ---
+
+    def start(self, endpoint: str = BROKER_SUB_ENDPOINT,
+              context: Optional[zmq.Context] = None) -> 'HeartbeatAggregator':
+        """Subscribe to the heartbeat topic from a background thread"""
+        self.running = True
+        self.thread = threading.Thread(target=self._run, args=(endpoint, context or zmq.Context.instance()),
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=2)
+
+    def _run(self, endpoint: str, context: zmq.Context) -> None:
+        socket = context.socket(zmq.SUB)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(endpoint)
+        socket.setsockopt_string(zmq.SUBSCRIBE, HEARTBEAT_TOPIC)
+        try:
+            while self.running:
+                if socket.poll(500):
+                    frames = socket.recv_multipart()
+                    if len(frames) >= 2 and is_heartbeat_topic(frames[0]):
+                        self.update_from_frame(frames[1])
+        finally:
+            socket.close()
+
+
+def start_component_heartbeat(component: str, stats: HeartbeatStats,
+                              interval: float = DEFAULT_INTERVAL,
+                              context: Optional[zmq.Context] = None) -> Optional[HeartbeatPublisher]:
+    """Start publishing beats for a component (and to its supervisor, if any); never raises"""
+    try:
+        return HeartbeatPublisher(component, stats, interval=interval, context=context).start()
+    except Exception as e:
+        logger.warning(f"Could not start heartbeat publisher for {component}: {e}")
+        return None
+
+
+if __name__ == "__main__":
+    # Print the liveness table every few seconds
+    aggregator = HeartbeatAggregator().start()
+    try:
+        while True:
+            time.sleep(DEFAULT_INTERVAL)
+            print(json.dumps(aggregator.liveness(), indent=2))
+            for component, depth in aggregator.queue_depths().items():
+                if depth:
+                    print(f"[WARN] {component} has {depth} messages waiting")
+    except KeyboardInterrupt:
+        aggregator.stop()
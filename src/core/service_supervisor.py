@@ -0,0 +1,577 @@
+#!/usr/bin/env python3
+"""
+In-Process Service Supervisor for the Synaptic Core
+
+Launches the Synaptic Core services (broker, persistence daemon, agent
+clients) as child processes and keeps them healthy:
+- start / stop / restart / status as plain method calls (no manage.py subprocess)
+- Liveness from the child process handle plus UDP heartbeat datagrams
+- Crashed or unresponsive services are restarted with exponential backoff
+- Cross-platform shutdown (terminate, then kill) instead of PID files and taskkill
+
+Services opt in to heartbeats by calling core.heartbeat's
+start_component_heartbeat(), whose publisher sends each bus beat to the
+supervisor as well. The supervisor passes the heartbeat address and service
+name to each child through the environment, so without a supervisor only
+the bus beat is sent.
+
+One supervisor owns the services of a machine. Other processes (the BFF
+control panel, manage.py) command it through SupervisorClient, which sends
+one JSON request per connection to the supervisor's TCP control socket.
+"""
+
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger('service_supervisor')
+
+# Paths
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+SRC_DIR = PROJECT_ROOT / "src"
+
+# Heartbeat transport (UDP on loopback; 5550-5557 are taken by the ZMQ mesh)
+HEARTBEAT_HOST = "127.0.0.1"
+HEARTBEAT_PORT = 5560
+HEARTBEAT_ADDR_ENV = "SHEARWATER_HEARTBEAT_ADDR"
+SERVICE_NAME_ENV = "SHEARWATER_SERVICE_NAME"
+HEARTBEAT_INTERVAL = 2.0  # seconds between beats sent by a service (core.heartbeat.DEFAULT_INTERVAL)
+
+# Control socket (TCP on loopback) for processes that command the running supervisor
+CONTROL_HOST = "127.0.0.1"
+CONTROL_PORT = 5561
+CONTROL_ADDR_ENV = "SHEARWATER_SUPERVISOR_ADDR"
+CONTROL_COMMANDS = ("status", "start", "stop", "restart")
+CONTROL_CONNECT_TIMEOUT = 1.0  # seconds; a supervisor on loopback answers at once
+CONTROL_REQUEST_TIMEOUT = 60.0  # seconds; stopping waits for every child to exit
+MAX_CONTROL_BYTES = 65536
+
+# Module commands for each service, run with src/ as the working directory.
+# The BFF is not one of them: it commands the supervisor instead of being supervised.
+SERVICE_COMMANDS = {
+    "broker": ["-m", "brokers.pub_hub"],
+    "persistence_daemon": ["-m", "persistence.persistence_daemon"],
+    "claude_client": ["-m", "monitors.claude_client"],
+    "gemini_client": ["-m", "monitors.gemini_client"],
+}
+
+# Services that start a component heartbeat; others are judged on process liveness only
+HEARTBEAT_SERVICES = {"broker", "persistence_daemon", "claude_client", "gemini_client"}
+
+
+@dataclass
+class ServiceSpec:
+    """How to launch and judge one supervised service"""
+    name: str
+    command: List[str]
+    cwd: Path = SRC_DIR
+    env: Dict[str, str] = field(default_factory=dict)
+    heartbeat: bool = True
+    heartbeat_timeout: float = 10.0  # seconds without a beat before a restart
+    startup_grace: float = 15.0  # seconds allowed before the first beat
+    autorestart: bool = True
+
+
+@dataclass
+class ServiceState:
+    """Runtime state of one supervised service"""
+    spec: ServiceSpec
+    process: Optional[subprocess.Popen] = None
+    status: str = "stopped"  # stopped | starting | running | unresponsive | backoff
+    started_at: Optional[float] = None
+    last_heartbeat: Optional[float] = None
+    restarts: int = 0
+    consecutive_failures: int = 0
+    next_restart_at: Optional[float] = None
+    last_exit_code: Optional[int] = None
+    last_error: Optional[str] = None
+    desired_running: bool = False
+
+    def snapshot(self, now: float) -> Dict:
+        """Serializable view used by status()"""
+        pid = self.process.pid if self.process and self.process.poll() is None else None
+        return {
+            'status': self.status,
+            'pid': pid,
+            'uptime': round(now - self.started_at, 1) if pid and self.started_at else None,
+            'last_heartbeat_age': round(now - self.last_heartbeat, 2) if self.last_heartbeat else None,
+            'restarts': self.restarts,
+            'last_exit_code': self.last_exit_code,
+            'last_error': self.last_error,
+            'next_restart_in': round(max(0.0, self.next_restart_at - now), 1) if self.next_restart_at else None,
+        }
+
+
+def format_status(status: Dict[str, Dict]) -> str:
+    """Human-readable status in the same shape as manage.py status"""
+    lines = ["Checking status of Synaptic Mesh services..."]
+    for service_name, info in status.items():
+        if info['pid']:
+            lines.append(f"- {service_name}: {info['status'].capitalize()} (PID: {info['pid']})")
+        else:
+            lines.append(f"- {service_name}: {info['status'].capitalize()}")
+    return "\n".join(lines) + "\n"
+
+
+def control_address() -> tuple:
+    """(host, port) of the supervisor's control socket, overridable as host:port in the environment"""
+    address = os.getenv(CONTROL_ADDR_ENV)
+    if not address:
+        return CONTROL_HOST, CONTROL_PORT
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+def build_service_specs(claude_model: str = "claude-3-haiku-20240307",
+                        gemini_model: str = "gemini-2.5-flash",
+                        num_messages: int = 10,
+                        exclude: Iterable[str] = ()) -> List[ServiceSpec]:
+    """
+    Build specs for the standard services.
+
+    API keys are read from the environment (ANTHROPIC_API_KEY / GOOGLE_API_KEY).
+    A client whose key is missing is left out, mirroring manage.py start.
+    """
+    excluded = set(exclude)
+    specs = []
+    for name, args in SERVICE_COMMANDS.items():
+        if name in excluded:
+            continue
+        command = [sys.executable] + args
+
+        if name == "claude_client":
+            api_key = os.getenv("ANTHROPIC_API_KEY")
+            if not api_key or "YOUR_CLAUDE_API_KEY" in api_key:
+                logger.warning("ANTHROPIC_API_KEY is not set. Skipping claude_client.")
+                continue
+            command += ["--api-key", api_key, "--model-name", claude_model]
+        elif name == "gemini_client":
+            api_key = os.getenv("GOOGLE_API_KEY")
+            if not api_key or "YOUR_GOOGLE_API_KEY" in api_key:
+                logger.warning("GOOGLE_API_KEY is not set. Skipping gemini_client.")
+                continue
+            command += ["--api-key", api_key, "--num-messages", str(num_messages),
+                        "--model-name", gemini_model]
+
+        specs.append(ServiceSpec(name=name, command=command, heartbeat=name in HEARTBEAT_SERVICES))
+    return specs
+
+
+class ServiceSupervisor:
+    """
+    Owns the child processes for a set of services.
+
+    A single monitor thread receives heartbeat datagrams and reaps, restarts
+    or kills children. All public methods only touch in-memory state under
+    a lock, so status() is cheap enough to serve on every API poll.
+    """
+
+    def __init__(self, specs: Iterable[ServiceSpec],
+                 heartbeat_host: str = HEARTBEAT_HOST,
+                 heartbeat_port: int = HEARTBEAT_PORT,
+                 control_address: Optional[tuple] = None,
+                 control: bool = True,
+                 backoff_base: float = 1.0,
+                 backoff_max: float = 60.0,
+                 stable_after: float = 30.0,
+                 stop_timeout: float = 5.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.services: Dict[str, ServiceState] = {spec.name: ServiceState(spec=spec) for spec in specs}
+        self.heartbeat_host = heartbeat_host
+        self.heartbeat_port = heartbeat_port
+        self.control_address = control_address  # None: control_address() at open
+        self.control = control
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self.stop_timeout = stop_timeout
+        self.clock = clock
+
+        self.lock = threading.RLock()
+        self.running = False
+        self.heartbeat_socket: Optional[socket.socket] = None
+        self.control_socket: Optional[socket.socket] = None
+        self.monitor_thread: Optional[threading.Thread] = None
+        self.control_thread: Optional[threading.Thread] = None
+
+    # --- Lifecycle ---
+
+    def open(self) -> None:
+        """Bind the heartbeat and control sockets and start the monitor threads"""
+        if self.running:
+            return
+        self.heartbeat_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            self.heartbeat_socket.bind((self.heartbeat_host, self.heartbeat_port))
+            if self.control:
+                self.control_socket = self._bind_control()
+        except OSError:
+            self.heartbeat_socket.close()
+            self.heartbeat_socket = None
+            raise
+        self.heartbeat_socket.settimeout(0.25)
+        # Port 0 asks the OS for a free port; record the real one for children
+        self.heartbeat_port = self.heartbeat_socket.getsockname()[1]
+
+        self.running = True
+        self.monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
+        self.monitor_thread.start()
+        logger.info(f"Supervisor listening for heartbeats on {self.heartbeat_host}:{self.heartbeat_port}")
+        if self.control_socket:
+            self.control_thread = threading.Thread(target=self._control_loop, daemon=True)
+            self.control_thread.start()
+            host, port = self.control_address
+            logger.info(f"Supervisor accepting control requests on {host}:{port}")
+
+    def close(self) -> None:
+        """Stop every service and shut the monitor down"""
+        self.stop()
+        self.running = False
+        for thread in (self.monitor_thread, self.control_thread):
+            if thread:
+                thread.join(timeout=2)
+        for sock in (self.heartbeat_socket, self.control_socket):
+            if sock:
+                sock.close()
+        self.heartbeat_socket = self.control_socket = self.monitor_thread = self.control_thread = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    # --- Public API ---
+
+    def start(self, name: Optional[str] = None) -> Dict[str, str]:
+        """Start one service (or all). Returns a per-service result message."""
+        results = {}
+        with self.lock:
+            for state in self._select(name):
+                state.desired_running = True
+                state.consecutive_failures = 0
+                state.next_restart_at = None
+                if self._is_alive(state):
+                    results[state.spec.name] = "already running"
+                    continue
+                results[state.spec.name] = self._spawn(state)
+        return results
+
+    def stop(self, name: Optional[str] = None) -> Dict[str, str]:
+        """Stop one service (or all) and disable automatic restarts for it"""
+        results = {}
+        with self.lock:
+            targets = list(self._select(name))
+            for state in targets:
+                state.desired_running = False
+                state.next_restart_at = None
+        # Wait for exits outside the lock so status() stays responsive
+        for state in reversed(targets):
+            results[state.spec.name] = self._terminate(state)
+        return results
+
+    def restart(self, name: Optional[str] = None) -> Dict[str, str]:
+        """Stop then start one service (or all)"""
+        self.stop(name)
+        return self.start(name)
+
+    def status(self, name: Optional[str] = None) -> Dict[str, Dict]:
+        """Current health of one service (or all)"""
+        now = self.clock()
+        with self.lock:
+            return {state.spec.name: state.snapshot(now) for state in self._select(name)}
+
+    def format_status(self) -> str:
+        """Human-readable status in the same shape as manage.py status"""
+        return format_status(self.status())
+
+    def record_heartbeat(self, service_name: str, pid: Optional[int] = None) -> bool:
+        """Register a beat for a service. Beats from a previous PID are ignored."""
+        with self.lock:
+            state = self.services.get(service_name)
+            if not state or not self._is_alive(state):
+                return False
+            if pid is not None and pid != state.process.pid:
+                return False
+            state.last_heartbeat = self.clock()
+            if state.status in ("starting", "unresponsive"):
+                state.status = "running"
+            return True
+
+    # --- Internals ---
+
+    def _select(self, name: Optional[str]) -> List[ServiceState]:
+        if name is None:
+            return list(self.services.values())
+        if name not in self.services:
+            raise KeyError(f"Unknown service: {name}")
+        return [self.services[name]]
+
+    @staticmethod
+    def _is_alive(state: ServiceState) -> bool:
+        return state.process is not None and state.process.poll() is None
+
+    def _spawn(self, state: ServiceState) -> str:
+        spec = state.spec
+        env = os.environ.copy()
+        env.update(spec.env)
+        env[SERVICE_NAME_ENV] = spec.name
+        env[HEARTBEAT_ADDR_ENV] = f"{self.heartbeat_host}:{self.heartbeat_port}"
+        try:
+            state.process = subprocess.Popen(spec.command, cwd=str(spec.cwd), env=env)
+        except Exception as e:
+            state.process = None
+            state.last_error = str(e)
+            logger.error(f"Error starting {spec.name}: {e}")
+            self._schedule_restart(state)
+            return f"error: {e}"
+
+        state.started_at = self.clock()
+        state.last_heartbeat = None
+        state.status = "starting" if spec.heartbeat else "running"
+        logger.info(f"Started {spec.name} (PID: {state.process.pid})")
+        return f"started (PID: {state.process.pid})"
+
+    def _terminate(self, state: ServiceState) -> str:
+        process = state.process
+        if process is None or process.poll() is not None:
+            with self.lock:
+                state.status = "stopped"
+            return "not running"
+
+        process.terminate()
+        try:
+            process.wait(timeout=self.stop_timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+        with self.lock:
+            state.last_exit_code = process.returncode
+            state.status = "stopped"
+        logger.info(f"Stopped {state.spec.name} (PID: {process.pid})")
+        return f"stopped (PID: {process.pid})"
+
+    def _schedule_restart(self, state: ServiceState) -> None:
+        now = self.clock()
+        if state.started_at and now - state.started_at >= self.stable_after:
+            state.consecutive_failures = 0
+        state.consecutive_failures += 1
+
+        if not (state.desired_running and state.spec.autorestart):
+            state.status = "stopped"
+            return
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (state.consecutive_failures - 1)))
+        state.next_restart_at = now + delay
+        state.status = "backoff"
+        logger.warning(f"{state.spec.name} will restart in {delay:.1f}s "
+                       f"(failure #{state.consecutive_failures})")
+
+    def _monitor_loop(self) -> None:
+        while self.running:
+            self._receive_heartbeats()
+            try:
+                self._check_services()
+            except Exception as e:
+                logger.error(f"Supervisor check failed: {e}")
+
+    def _receive_heartbeats(self) -> None:
+        """Wait briefly for one heartbeat datagram"""
+        sock = self.heartbeat_socket
+        if sock is None:
+            return
+        try:
+            data, _ = sock.recvfrom(4096)
+            beat = json.loads(data.decode('utf-8'))
+            self.record_heartbeat(beat.get('service') or beat.get('from'), beat.get('pid'))
+        except (socket.timeout, OSError):
+            pass
+        except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+            pass  # Not a heartbeat
+
+    def _bind_control(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if os.name != 'nt':
+            # Rebind right after a restart; on Windows this option would let two supervisors share the port
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind(self.control_address or control_address())
+            sock.listen(8)
+        except OSError:
+            sock.close()
+            raise
+        sock.settimeout(0.25)
+        self.control_address = sock.getsockname()[:2]
+        return sock
+
+    def _control_loop(self) -> None:
+        while self.running:
+            try:
+                conn, _ = self.control_socket.accept()
+            except (socket.timeout, OSError):
+                continue
+            # Stop and restart wait for children, so each request gets its own thread
+            threading.Thread(target=self._serve_control, args=(conn,), daemon=True).start()
+
+    def _serve_control(self, conn: socket.socket) -> None:
+        with conn:
+            try:
+                conn.settimeout(CONTROL_REQUEST_TIMEOUT)
+                reply = self.handle_control(json.loads(conn.makefile('rb').readline(MAX_CONTROL_BYTES)))
+            except (OSError, ValueError) as e:
+                reply = {'ok': False, 'error': f"bad request: {e}"}
+            try:
+                conn.sendall(json.dumps(reply).encode('utf-8') + b"\n")
+            except OSError:
+                pass  # The client gave up
+
+    def handle_control(self, request: Dict) -> Dict:
+        """Run one control request ({'command', 'name'}) and return the reply sent back"""
+        command, name = request.get('command'), request.get('name')
+        if command not in CONTROL_COMMANDS:
+            return {'ok': False, 'error': f"unknown command: {command!r}"}
+        try:
+            results = getattr(self, command)(name)
+        except KeyError:
+            return {'ok': False, 'error': f"Unknown service: {name}", 'unknown_service': True}
+        return {'ok': True, 'results': results if command != 'status' else None, 'services': self.status(name)}
+
+    def _check_services(self) -> None:
+        now = self.clock()
+        stale = []
+        with self.lock:
+            for state in self.services.values():
+                process = state.process
+
+                if process is not None and process.poll() is not None:
+                    # Child exited on its own
+                    if state.status not in ("stopped", "backoff"):
+                        state.last_exit_code = process.returncode
+                        state.last_error = f"exited with code {process.returncode}"
+                        logger.warning(f"{state.spec.name} exited (code {process.returncode})")
+                        self._schedule_restart(state)
+                    state.process = None
+                    continue
+
+                if process is None:
+                    if state.status == "backoff" and state.next_restart_at and now >= state.next_restart_at:
+                        state.next_restart_at = None
+                        state.restarts += 1
+                        self._spawn(state)
+                    continue
+
+                if not state.spec.heartbeat:
+                    continue
+                if state.last_heartbeat is None:
+                    if now - state.started_at > state.spec.startup_grace:
+                        stale.append(state)
+                elif now - state.last_heartbeat > state.spec.heartbeat_timeout:
+                    stale.append(state)
+
+            for state in stale:
+                state.status = "unresponsive"
+                state.last_error = "heartbeat timeout"
+
+        for state in stale:
+            logger.warning(f"{state.spec.name} missed heartbeats; restarting")
+            self._terminate(state)
+            with self.lock:
+                state.process = None
+                self._schedule_restart(state)
+
+
+class SupervisorUnavailable(ConnectionError):
+    """No supervisor is answering on the control socket"""
+
+
+class SupervisorClient:
+    """
+    Commands the supervisor running in another process.
+
+    Mirrors ServiceSupervisor's start / stop / restart / status, so callers
+    can use either. Every call is a blocking request; it raises
+    SupervisorUnavailable when no supervisor answers and KeyError for an
+    unknown service.
+    """
+
+    def __init__(self, address: Optional[tuple] = None,
+                 connect_timeout: float = CONTROL_CONNECT_TIMEOUT,
+                 request_timeout: float = CONTROL_REQUEST_TIMEOUT):
+        self.address = address
+        self.connect_timeout = connect_timeout
+        self.request_timeout = request_timeout
+
+    def request(self, command: str, name: Optional[str] = None) -> Dict:
+        address = self.address or control_address()
+        try:
+            with socket.create_connection(address, timeout=self.connect_timeout) as conn:
+                conn.settimeout(self.request_timeout)
+                conn.sendall(json.dumps({'command': command, 'name': name}).encode('utf-8') + b"\n")
+                reply = json.loads(conn.makefile('rb').readline())
+        except (OSError, ValueError) as e:
+            raise SupervisorUnavailable(f"No supervisor answering on {address[0]}:{address[1]} ({e})")
+        if not reply.get('ok'):
+            if reply.get('unknown_service'):
+                raise KeyError(name)
+            raise ValueError(reply.get('error', 'request failed'))
+        return reply
+
+    def is_running(self) -> bool:
+        """Whether a supervisor answers"""
+        try:
+            self.request('status')
+            return True
+        except SupervisorUnavailable:
+            return False
+
+    def start(self, name: Optional[str] = None) -> Dict[str, str]:
+        return self.request('start', name)['results']
+
+    def stop(self, name: Optional[str] = None) -> Dict[str, str]:
+        return self.request('stop', name)['results']
+
+    def restart(self, name: Optional[str] = None) -> Dict[str, str]:
+        return self.request('restart', name)['results']
+
+    def status(self, name: Optional[str] = None) -> Dict[str, Dict]:
+        return self.request('status', name)['services']
+
+    def format_status(self) -> str:
+        return format_status(self.status())
+
+
+def main():
+    """Run the supervisor in the foreground for all configured services"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Supervise the Synaptic Core services.")
+    parser.add_argument("--exclude", nargs="*", default=[], help="Services to leave out.")
+    parser.add_argument("--num-messages", type=int, default=10)
+    parser.add_argument("--gemini-model", type=str, default="gemini-2.5-flash")
+    parser.add_argument("--claude-model", type=str, default="claude-3-haiku-20240307")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] {%(levelname)s} - %(message)s')
+    specs = build_service_specs(args.claude_model, args.gemini_model, args.num_messages, args.exclude)
+
+    with ServiceSupervisor(specs) as supervisor:
+        supervisor.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            logger.info("Shutdown signal received")
+
+
+if __name__ == "__main__":
+    main()
@@ -29,6 +29,9 @@ class ClaudeApiEngine:
 
         try:
             context_summary = self.context_loader.get_context_summary()
+            relevant_context = self.context_loader.get_relevant_context(message_text)
+            if relevant_context:
+                context_summary = f"{context_summary}\n\n{relevant_context}"
             system_prompt = (
                 f"{context_summary}\n\n"
                 "You are 'claude_code', a helpful and brilliant AI assistant within the ShearwaterAICAD system. "
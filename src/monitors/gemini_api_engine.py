@@ -33,6 +33,9 @@ class GeminiApiEngine:
 
         try:
             context_summary = self.context_loader.get_context_summary(num_messages=self.num_messages)
+            relevant_context = self.context_loader.get_relevant_context(message_text)
+            if relevant_context:
+                context_summary = f"{context_summary}\n\n{relevant_context}"
             system_prompt = (
                 f"{context_summary}\n\n"
                 "You are 'gemini_cli', a helpful and brilliant AI assistant within the ShearwaterAICAD system. "
@@ -5,22 +5,48 @@ Persistence CLI - Interactive checkpoint and recovery management
 Provides user-friendly interface for:
 - Selecting and loading previous checkpoints
 - Viewing recent conversations
-- Searching conversation history
+- Searching conversation history (a full-text index, see storage/search_index.py)
+- Finding similar past messages and blocks (the vector index, see bots/vector_index.py)
 - System diagnostics
 """
 
 import json
 import os
+import sqlite3
 from pathlib import Path
 from datetime import datetime
 from typing import List, Optional
 import sys
 
+try:
+    from storage.checkpoints import (CHECKPOINT_VERSION, checkpoint_paths, complete_lines, read_header,
+                                     restore_checkpoint, storage_report, write_checkpoint)
+    from storage.search_index import FTS5_SUPPORT, MessageSearchIndex, message_text
+except ImportError:
+    from .storage.checkpoints import (CHECKPOINT_VERSION, checkpoint_paths, complete_lines, read_header,
+                                      restore_checkpoint, storage_report, write_checkpoint)
+    from .storage.search_index import FTS5_SUPPORT, MessageSearchIndex, message_text
+
+try:
+    from ..bots.vector_index import VectorIndex, vector_index_dir
+    VECTOR_SEARCH_SUPPORT = True
+except ImportError:
+    sys.path.append(str(Path(__file__).parent.parent))  # src, when run from src/persistence
+    try:
+        from bots.vector_index import VectorIndex, vector_index_dir
+        VECTOR_SEARCH_SUPPORT = True
+    except ImportError:
+        VECTOR_SEARCH_SUPPORT = False
+
 # Storage paths
 # Use an absolute path relative to this file's location
 LOG_DIR = Path(__file__).parent.parent.parent / "conversation_logs"
 CHECKPOINT_DIR = LOG_DIR / "checkpoints"
 CURRENT_LOG_FILE = LOG_DIR / "current_session.jsonl"
+SEARCH_INDEX_FILE = LOG_DIR / "search_index.db"
+EMBEDDING_CACHE_DIR = LOG_DIR / "embedding_cache"
+BLOCKS_FILE = LOG_DIR / "blocks.jsonl"
+SIMILAR_FILTER_KEYS = ('kind', 'speaker', 'tier', 'chain', 'since', 'until')
 
 
 class CheckpointStore:
@@ -31,30 +57,30 @@ class CheckpointStore:
         self.current_log = CURRENT_LOG_FILE
 
     def list_all(self) -> List[dict]:
-        """List all available checkpoints"""
+        """List all available checkpoints, newest first, reading only their headers"""
         checkpoints = []
 
-        if not self.checkpoint_dir.exists():
-            return checkpoints
-
-        for cp_file in sorted(self.checkpoint_dir.glob("*.json"), reverse=True):
+        for cp_file in checkpoint_paths(self.checkpoint_dir):
             try:
-                with open(cp_file) as f:
-                    data = json.load(f)
-
-                size_mb = os.path.getsize(cp_file) / (1024 * 1024)
-                checkpoints.append({
-                    'id': cp_file.stem,
-                    'path': str(cp_file),
-                    'timestamp': data.get('timestamp', 'unknown'),
-                    'label': data.get('label', 'unlabeled'),
-                    'message_count': data.get('message_count', 0),
-                    'size_bytes': data.get('size_bytes', 0),
-                    'size_mb': f"{size_mb:.2f}"
-                })
-            except (IOError, json.JSONDecodeError) as e:
+                header = read_header(cp_file)
+                # A chunked checkpoint's file is only its manifest; show the size of the log it holds
+                size = header['size_bytes'] if header.get('version') == CHECKPOINT_VERSION else os.path.getsize(cp_file)
+                size_mb = size / (1024 * 1024)
+            except (IOError, ValueError) as e:
                 print(f"[ERROR] Failed to read checkpoint {cp_file}: {e}")
-
+                continue
+
+            checkpoints.append({
+                'id': cp_file.stem,
+                'path': str(cp_file),
+                'timestamp': str(header.get('timestamp', 'unknown')),
+                'label': str(header.get('label', 'unlabeled')),
+                'message_count': header.get('message_count', 0),
+                'size_bytes': header.get('size_bytes', 0),
+                'size_mb': f"{size_mb:.2f}"
+            })
+
+        checkpoints.sort(key=lambda cp: cp['timestamp'], reverse=True)
         return checkpoints
 
     def get_current_message_count(self) -> int:
@@ -64,26 +90,26 @@ class CheckpointStore:
 
         count = 0
         try:
-            with open(self.current_log) as f:
-                count = sum(1 for _ in f)
+            count, _ = complete_lines(self.current_log)
         except IOError as e:
             print(f"[ERROR] Failed to read {self.current_log}: {e}")
 
         return count
 
-    def load_checkpoint(self, checkpoint_path: str) -> bool:
-        """Load a checkpoint (copy to current session)"""
+    def create_checkpoint(self, label: str) -> Optional[str]:
+        """Snapshot the current session"""
         try:
-            with open(checkpoint_path) as f:
-                data = json.load(f)
-
-            # Write messages back to current session
-            with open(CURRENT_LOG_FILE, 'w') as f:
-                for msg in data.get('messages', []):
-                    f.write(json.dumps(msg) + '\n')
+            return str(write_checkpoint(self.current_log, self.checkpoint_dir, label))
+        except IOError as e:
+            print(f"[ERROR] Failed to create checkpoint: {e}")
+            return None
 
+    def load_checkpoint(self, checkpoint_path: str) -> bool:
+        """Load a checkpoint (stream its messages into the current session)"""
+        try:
+            restore_checkpoint(Path(checkpoint_path), self.current_log)
             return True
-        except (IOError, json.JSONDecodeError) as e:
+        except (IOError, ValueError) as e:
             print(f"[ERROR] Failed to load checkpoint: {e}")
             return False
 
@@ -93,6 +119,10 @@ class ConversationBrowser:
 
     def __init__(self):
         self.log_file = CURRENT_LOG_FILE
+        self.index_file = SEARCH_INDEX_FILE
+        self.index = None
+        self.blocks_file = BLOCKS_FILE
+        self.vector_index = None
 
     def get_recent_messages(self, count: int = 10) -> List[dict]:
         """Get most recent N messages"""
@@ -121,8 +151,83 @@ class ConversationBrowser:
 
         return messages
 
-    def search(self, query: str, limit: int = 20) -> List[dict]:
-        """Search conversation by keyword"""
+    def search(self, query: str, limit: int = 20, order: Optional[str] = None, **filters) -> List[dict]:
+        """
+        Search the conversation through the full-text index.
+
+        query takes words, "quoted phrases", prefix* terms and speaker:,
+        tier:, chain:, since:, until: and order:newest filters (see
+        MessageSearchIndex.search). Results are ranked by BM25 unless
+        order is 'newest'. Without FTS5 this falls back to a keyword scan.
+        """
+        if not FTS5_SUPPORT:
+            return self._scan(query, limit)
+
+        try:
+            if self.index is None:
+                self.index = MessageSearchIndex(self.index_file)
+            self.index.catch_up(self.log_file)  # Whatever the daemon has not indexed yet
+            hits = self.index.search(query, limit=limit, order=order, **filters)
+        except (sqlite3.Error, IOError) as e:
+            print(f"[ERROR] Search index unavailable, scanning the log: {e}")
+            return self._scan(query, limit)
+
+        results = []
+        for hit in hits:
+            msg = hit['message']
+            results.append({
+                'timestamp': msg.get('Timestamp'),
+                'sender': msg.get('SpeakerName'),
+                'preview': message_text(msg)[:80],
+                'score': hit['score'],
+            })
+        return results
+
+    def search_similar(self, query: str, limit: int = 10) -> List[dict]:
+        """
+        Messages and blocks closest in meaning to the query, by embedding.
+
+        Words of the form kind:, speaker:, tier:, chain:, since: and until:
+        are filters; the rest is the text to compare against. Raises
+        RuntimeError without numpy or the embedding model.
+        """
+        if not VECTOR_SEARCH_SUPPORT:
+            raise RuntimeError("Semantic search needs numpy (pip install numpy)")
+        words, filters = [], {}
+        for word in query.split():
+            key, _, value = word.partition(':')
+            if value and key.lower() in SIMILAR_FILTER_KEYS:
+                filters[key.lower()] = value
+            else:
+                words.append(word)
+
+        if self.vector_index is None:
+            self.vector_index = VectorIndex(vector_index_dir(self.log_file), EMBEDDING_CACHE_DIR)
+        self.vector_index.catch_up(self.log_file, self.blocks_file)
+        hits = self.vector_index.search_similar(" ".join(words), limit, filters)
+
+        results = []
+        for hit in hits:
+            if hit['kind'] == 'message':
+                msg = hit['message']
+                results.append({
+                    'timestamp': msg.get('Timestamp'),
+                    'sender': msg.get('SpeakerName'),
+                    'preview': message_text(msg)[:80],
+                    'score': hit['score'],
+                })
+            else:
+                block = hit['block']
+                results.append({
+                    'timestamp': block.get('timestamp_start'),
+                    'sender': f"block ({block.get('message_count', 0)})",
+                    'preview': ", ".join(block.get('keywords', [])) or block.get('block_id', ''),
+                    'score': hit['score'],
+                })
+        return results
+
+    def _scan(self, query: str, limit: int = 20) -> List[dict]:
+        """Search conversation by keyword, oldest first"""
         results = []
         query_lower = query.lower()
 
@@ -334,6 +439,9 @@ class PersistenceCLI:
         print("  SEARCH CONVERSATIONS")
         print("=" * 70 + "\n")
 
+        print('  Words, "exact phrases" and prefix* terms; filter with speaker:, tier:,')
+        print('  chain:, since:, until: (ISO dates) and order:newest. Start with ~ to find')
+        print('  messages and blocks similar in meaning (kind:message or kind:block)\n')
         query = input("  Enter search term: ").strip()
 
         if not query:
@@ -341,7 +449,16 @@ class PersistenceCLI:
             return
 
         print("\n  Searching...")
-        results = self.browser.search(query)
+        try:
+            if query.startswith('~'):
+                results = self.browser.search_similar(query[1:])
+            else:
+                results = self.browser.search(query)
+        except (ValueError, RuntimeError) as e:
+            print(f"\n  [!] {e}\n")
+            input("  Press Enter to continue...")
+            self._search_conversations()
+            return
 
         self._clear_screen()
         print("=" * 70)
@@ -386,6 +503,7 @@ class PersistenceCLI:
         # Count messages
         msg_count = self.checkpoint_store.get_current_message_count()
         checkpoint_count = len(self.checkpoint_store.list_all())
+        storage = storage_report(self.checkpoint_store.checkpoint_dir)
 
         # Check file sizes
         current_size = 0
@@ -397,6 +515,8 @@ class PersistenceCLI:
         print(f"    File size: {current_size:.2f} MB")
         print(f"\n  Checkpoint System:")
         print(f"    Checkpoints: {checkpoint_count}")
+        print(f"    Disk used: {storage['stored_bytes'] / (1024 * 1024):.2f} MB "
+              f"({storage['chunks']} chunks), {storage['full_copy_bytes'] / (1024 * 1024):.2f} MB as full copies")
         print(f"    Storage dir: {str(CHECKPOINT_DIR)}")
         print(f"\n  Directories:")
         print(f"    Logs: {str(LOG_DIR)}")
@@ -7,12 +7,14 @@ This daemon runs separately from the broker and handles:
 - Creating checkpoints
 - Managing crash recovery
 - Metadata indexing
+- Keeping the full-text search index current (storage/search_index.py)
 
 KEY: This is INDEPENDENT from the broker. If broker changes or crashes,
 persistence continues working. If persistence crashes, broker is unaffected.
 """
 
 import zmq
+import collections
 import json
 import time
 import os
@@ -23,6 +25,15 @@ from datetime import datetime
 from dataclasses import dataclass, asdict
 import hashlib
 
+try:
+    from ..core.heartbeat import HeartbeatStats, is_heartbeat_topic, start_component_heartbeat
+    from ..utilities.conversation_analytics_engine import ANALYTICS_STATE_FILE, AnalyticsState
+except ImportError:
+    from core.heartbeat import HeartbeatStats, is_heartbeat_topic, start_component_heartbeat
+    from utilities.conversation_analytics_engine import ANALYTICS_STATE_FILE, AnalyticsState
+from .storage.checkpoints import AUTO_LABEL_PREFIX, prune_checkpoints, storage_report, write_checkpoint
+from .storage.search_index import FTS5_SUPPORT, MessageSearchIndex
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -33,12 +44,15 @@ logger = logging.getLogger('persistence_daemon')
 # Broker connection
 BROKER_FRONTEND = "tcp://localhost:5555"
 AGENT_MESSAGES_PORT = 5557  # Port agents publish to for persistence recording
+MAX_DRAIN = 1000  # Messages taken off each socket per poll before writing
 
 # Storage paths
 LOG_DIR = Path(__file__).parent.parent.parent / "conversation_logs"
 CURRENT_LOG_FILE = LOG_DIR / "current_session.jsonl"
 CHECKPOINT_DIR = LOG_DIR / "checkpoints"
 RECOVERY_FILE = LOG_DIR / "recovery" / "crash_recovery.jsonl"
+ANALYTICS_STATE_PATH = LOG_DIR / ANALYTICS_STATE_FILE
+SEARCH_INDEX_FILE = LOG_DIR / "search_index.db"
 
 # Ensure directories exist
 LOG_DIR.mkdir(parents=True, exist_ok=True)
@@ -155,8 +169,13 @@ class PersistenceStorage:
     def __init__(self):
         self.lock = threading.Lock()
         self.enricher = MetadataEnricher()
+        self.last_error = None
+        # Live analytics aggregates, folded as lines are appended to the log
+        self.analytics = AnalyticsState(ANALYTICS_STATE_PATH)
+        # Full-text index, extended with each appended line
+        self.search_index = MessageSearchIndex(SEARCH_INDEX_FILE) if FTS5_SUPPORT else None
 
-    def persist_message(self, message: dict) -> None:
+    def persist_message(self, message: dict) -> bool:
         """Atomically write message to log"""
         with self.lock:
             try:
@@ -176,52 +195,84 @@ class PersistenceStorage:
                     Metadata=message.get('metadata', {})
                 )
 
+                record = asdict(event)
+                line = json.dumps(record, ensure_ascii=False) + '\n'
+
                 # Write atomically
                 with open(CURRENT_LOG_FILE, 'a', encoding='utf-8') as f:
-                    f.write(json.dumps(asdict(event), ensure_ascii=False) + '\n')
+                    start = os.fstat(f.fileno()).st_size
+                    f.write(line)
                     f.flush()
                     os.fsync(f.fileno())
+                    end = os.fstat(f.fileno()).st_size
 
                 # Update recovery file
                 with open(RECOVERY_FILE, 'a', encoding='utf-8') as f:
-                    f.write(json.dumps(asdict(event), ensure_ascii=False) + '\n')
+                    f.write(line)
                     f.flush()
 
             except Exception as e:
                 logger.error(f"Failed to persist message: {e}")
+                self.last_error = str(e)
+                return False
+
+            try:
+                # Fold the event we just wrote; only re-read the log if something else changed it
+                if not self.analytics.add_appended(record, CURRENT_LOG_FILE, start, end):
+                    self.analytics.fold_log(CURRENT_LOG_FILE)
+            except Exception as e:
+                logger.warning(f"Failed to update analytics state: {e}")
+            self.update_search_index()
+            return True
+
+    def update_search_index(self) -> int:
+        """Index log lines the search index has not seen; returns how many were added"""
+        if self.search_index is None:
+            return 0
+        try:
+            return self.search_index.catch_up(CURRENT_LOG_FILE)
+        except Exception as e:
+            logger.warning(f"Failed to update search index: {e}")
+            return 0
+
+    def save_analytics(self):
+        """Persist the live analytics aggregates"""
+        try:
+            self.analytics.save()
+        except Exception as e:
+            logger.warning(f"Failed to save analytics state: {e}")
 
     def create_checkpoint(self, label: str = None) -> str:
         """Create immutable snapshot of current session"""
         global checkpoint_counter
         checkpoint_counter += 1
 
-        timestamp = datetime.utcnow().isoformat()
         label = label or f"checkpoint_{checkpoint_counter}"
-        checkpoint_file = CHECKPOINT_DIR / f"{timestamp}_{label}.json"
 
         try:
-            with open(CURRENT_LOG_FILE, 'r') as src:
-                lines = src.readlines()
-
-            checkpoint_data = {
-                'checkpoint_id': str(checkpoint_file),
-                'timestamp': timestamp,
-                'label': label,
-                'message_count': len(lines),
-                'size_bytes': sum(len(l.encode()) for l in lines),
-                'messages': [json.loads(l) for l in lines]
-            }
-
-            with open(checkpoint_file, 'w') as f:
-                json.dump(checkpoint_data, f, indent=2)
-
-            logger.info(f"Checkpoint created: {checkpoint_file} ({len(lines)} messages)")
+            # Deduplicated: a header line, then references to compressed chunks shared with earlier checkpoints
+            checkpoint_file = write_checkpoint(CURRENT_LOG_FILE, CHECKPOINT_DIR, label)
+            logger.info(f"Checkpoint created: {checkpoint_file}")
             return str(checkpoint_file)
 
         except Exception as e:
             logger.error(f"Failed to create checkpoint: {e}")
             return None
 
+    def prune_checkpoints(self) -> dict:
+        """Thin out old auto_ checkpoints by the retention policy and delete chunks nothing refers to"""
+        try:
+            removed = prune_checkpoints(CHECKPOINT_DIR)
+            report = storage_report(CHECKPOINT_DIR)
+        except Exception as e:
+            logger.warning(f"Failed to prune checkpoints: {e}")
+            return {}
+        if removed['checkpoints'] or removed['chunks']:
+            logger.info(f"Pruned {removed['checkpoints']} checkpoints and {removed['chunks']} chunks")
+        logger.info(f"Checkpoints: {report['checkpoints']} in {report['stored_bytes'] / 1e6:.1f} MB, "
+                    f"{report['full_copy_bytes'] / 1e6:.1f} MB as full copies")
+        return removed
+
 
 class PersistenceService:
     """Main persistence daemon service"""
@@ -230,6 +281,10 @@ class PersistenceService:
         self.context = zmq.Context()
         self.storage = PersistenceStorage()
         self.running = False
+        # Payloads received but not yet written, reported as the heartbeat queue depth
+        self.pending = collections.deque()
+        self.heartbeat = None
+        self.stats = HeartbeatStats(expected_loop_interval=0.1, queue_depth=lambda: len(self.pending))
 
     def connect_to_broker(self) -> zmq.Socket:
         """Connect to broker to listen to messages"""
@@ -268,6 +323,15 @@ class PersistenceService:
         )
         checkpoint_thread.start()
 
+        # Report liveness on the bus and to the service supervisor when it launched us
+        self.heartbeat = start_component_heartbeat("persistence_daemon", self.stats, context=self.context)
+
+        # Catch the analytics state up with anything logged while we were down
+        added = self.storage.analytics.fold_log(CURRENT_LOG_FILE)
+        logger.info(f"Analytics state caught up ({added} new messages)")
+        indexed = self.storage.update_search_index()
+        logger.info(f"Search index caught up ({indexed} new messages)")
+
         logger.info("Persistence daemon ready")
         print("\n" + "="*60)
         print("  PERSISTENCE DAEMON ACTIVE")
@@ -287,42 +351,34 @@ class PersistenceService:
                 try:
                     # Poll both sockets for incoming messages
                     events = poller.poll(100)  # 100ms timeout
+                    self.stats.tick()
 
                     for socket, event in events:
                         if event & zmq.POLLIN:
-                            try:
-                                # Handle both multipart (from broker SUB) and single-part (from agent PUSH)
-                                if socket == sub_socket:
-                                    # Broker messages are multipart: [topic, payload]
-                                    message = socket.recv_multipart(zmq.NOBLOCK)
-                                    if len(message) >= 2:
-                                        payload = message[1]
-                                    else:
-                                        logger.warning(f"Received malformed multipart message: {message}")
-                                        continue # Skip to next iteration
-                                else:
-                                    # Agent messages are single-part from PUSH socket
-                                    payload = socket.recv(zmq.NOBLOCK)
-
-                                try:
-                                    payload_dict = json.loads(payload.decode('utf-8'))
-                                    enriched = self.storage.enricher.enrich(payload_dict)
-                                    self.storage.persist_message(enriched)
-
-                                    message_counter += 1
-
-                                    # Log progress
-                                    if message_counter % 10 == 0:
-                                        logger.info(f"Recorded {message_counter} messages")
-
-                                except json.JSONDecodeError:
-                                    pass  # Non-JSON messages, ignore
-
-                            except zmq.Again:
-                                pass  # No message available on this socket
+                            self._drain(socket, is_broker=socket == sub_socket)
+
+                    while self.pending:
+                        payload = self.pending.popleft()
+                        try:
+                            payload_dict = json.loads(payload.decode('utf-8'))
+                        except json.JSONDecodeError:
+                            continue  # Non-JSON messages, ignore
+
+                        enriched = self.storage.enricher.enrich(payload_dict)
+                        if not self.storage.persist_message(enriched):
+                            self.stats.error(self.storage.last_error)
+                            continue
+
+                        message_counter += 1
+                        self.stats.processed()
+
+                        # Log progress
+                        if message_counter % 10 == 0:
+                            logger.info(f"Recorded {message_counter} messages")
 
                 except Exception as e:
                     logger.warning(f"Error processing message: {e}")
+                    self.stats.error(e)
                     pass
 
         except KeyboardInterrupt:
@@ -330,20 +386,44 @@ class PersistenceService:
         finally:
             self.shutdown()
 
+    def _drain(self, socket: zmq.Socket, is_broker: bool) -> None:
+        """Move the messages waiting on a socket into the pending queue"""
+        for _ in range(MAX_DRAIN):
+            try:
+                # Handle both multipart (from broker SUB) and single-part (from agent PUSH)
+                if is_broker:
+                    # Broker messages are multipart: [topic, payload]
+                    message = socket.recv_multipart(zmq.NOBLOCK)
+                    if len(message) < 2:
+                        logger.warning(f"Received malformed multipart message: {message}")
+                    elif not is_heartbeat_topic(message[0]):  # Liveness traffic is not conversation
+                        self.pending.append(message[1])
+                else:
+                    # Agent messages are single-part from PUSH socket
+                    self.pending.append(socket.recv(zmq.NOBLOCK))
+            except zmq.Again:
+                return  # No more messages on this socket
+
     def _checkpoint_thread(self):
         """Periodically create checkpoints (every 5 minutes)"""
         while self.running:
             time.sleep(300)  # 5 minutes
             if message_counter > 0:
-                self.storage.create_checkpoint(f"auto_{int(time.time())}")
+                self.storage.create_checkpoint(f"{AUTO_LABEL_PREFIX}{int(time.time())}")
+                self.storage.prune_checkpoints()
+                self.storage.save_analytics()
 
     def shutdown(self):
         """Graceful shutdown"""
         logger.info("Persistence daemon shutting down...")
         self.running = False
+        if self.heartbeat:
+            self.heartbeat.stop()
+            self.heartbeat = None
 
         # Create final checkpoint
         self.storage.create_checkpoint("final_checkpoint_before_shutdown")
+        self.storage.save_analytics()
 
         logger.info(f"Final stats: {message_counter} messages recorded")
         logger.info("Persistence daemon stopped")
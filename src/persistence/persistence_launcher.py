@@ -102,10 +102,8 @@ class PersistenceLauncher:
         # Create emergency checkpoint
         print("\n  Saving session checkpoint...")
         try:
-            self.cli.checkpoint_store.checkpoint_store.create_checkpoint(
-                "session_end_snapshot"
-            )
-            logger.info("Emergency checkpoint created")
+            if self.cli.checkpoint_store.create_checkpoint("session_end_snapshot"):
+                logger.info("Emergency checkpoint created")
         except Exception as e:
             logger.error(f"Failed to create checkpoint: {e}")
 
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Streamed, deduplicated session checkpoints
+
+A checkpoint is a small JSONL manifest. Its first line is a header record
+(timestamp, label, message count, size), and each following line names a
+chunk of the session log. The chunks themselves are compressed and stored
+once, by content, in a chunk store shared by every checkpoint in the
+directory (see chunk_store.py). Consecutive checkpoints of an append-only
+log share all but their newest chunks, so each one costs roughly what was
+appended since the last, compressed.
+
+Listing reads only the header line. Writing and restoring handle one chunk
+at a time, so neither depends on how large a checkpoint is.
+
+Older checkpoints are still listed and restored:
+- Version 2 files carry the log's lines, uncompressed, after the header.
+- Single-document checkpoints have their header fields parsed from the
+  start of the file, and their messages decoded one at a time.
+
+prune_checkpoints() applies a tiered retention policy (RETENTION_TIERS),
+then deletes the chunks no remaining checkpoint references. Unless given
+the checkpoints to prune, it only thins out the daemon's periodic ones
+(labels starting with AUTO_LABEL_PREFIX); manual and shutdown checkpoints
+and older-format .json files are never deleted.
+storage_report() compares the space used with what full copies would take.
+"""
+
+import io
+import json
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+try:
+    from .chunk_store import ChunkStore, iter_chunks
+except ImportError:
+    from chunk_store import ChunkStore, iter_chunks
+
+CHECKPOINT_FORMAT = "session-checkpoint"
+FLAT_VERSION = 2  # Log lines inline after the header
+CHECKPOINT_VERSION = 3  # Chunk references after the header
+CHECKPOINT_SUFFIX = ".ckpt.jsonl"
+CHUNKS_DIR = "chunks"
+LEGACY_SUFFIX = ".json"
+AUTO_LABEL_PREFIX = "auto_"  # Label of the periodic checkpoints pruned by default
+COPY_CHUNK_BYTES = 1 << 20
+HEADER_MAX_BYTES = 64 * 1024  # Also how much of a legacy checkpoint is read for its header
+
+LEGACY_MESSAGES_KEY = re.compile(r'"messages"\s*:\s*')
+SEPARATORS = re.compile(r'[\s,]*')
+
+# (age below which a tier applies, spacing of the checkpoints kept in it); None keeps them all.
+# Checkpoints older than the last tier are removed, except the newest checkpoint, which is always kept.
+# By default only AUTO_LABEL_PREFIX checkpoints are subject to the tiers.
+RETENTION_TIERS = (
+    (timedelta(hours=1), None),
+    (timedelta(days=1), timedelta(hours=1)),
+    (timedelta(days=30), timedelta(days=1)),
+)
+
+
+def complete_lines(log_path: Path) -> Tuple[int, int]:
+    """Number of newline-terminated lines in a log and the byte length they span; a torn last line is left out"""
+    lines = length = position = 0
+    with open(log_path, 'rb') as f:
+        while True:
+            chunk = f.read(COPY_CHUNK_BYTES)
+            if not chunk:
+                return lines, length
+            newlines = chunk.count(b'\n')
+            if newlines:
+                lines += newlines
+                length = position + chunk.rindex(b'\n') + 1
+            position += len(chunk)
+
+
+def checkpoint_paths(checkpoint_dir: Path) -> List[Path]:
+    """Checkpoint files in a directory, in both formats"""
+    checkpoint_dir = Path(checkpoint_dir)
+    if not checkpoint_dir.exists():
+        return []
+    return [path for path in checkpoint_dir.iterdir()
+            if path.is_file() and path.name.endswith((CHECKPOINT_SUFFIX, LEGACY_SUFFIX))]
+
+
+def write_checkpoint(log_path: Path, checkpoint_dir: Path, label: str) -> Path:
+    """
+    Snapshot the complete lines of a log into a new checkpoint.
+
+    The log is read up to the last newline seen when counting, so lines
+    appended while the copy runs are left for the next checkpoint. The
+    manifest appears under its final name only once its chunks are stored.
+    """
+    log_path, checkpoint_dir = Path(log_path), Path(checkpoint_dir)
+    now = datetime.utcnow()
+    path = checkpoint_dir / f"{now.strftime('%Y%m%d_%H%M%S_%f')}_{label}{CHECKPOINT_SUFFIX}"
+    message_count, size_bytes = complete_lines(log_path) if log_path.exists() else (0, 0)
+    header = {'timestamp': now.isoformat(), 'label': label, 'message_count': message_count}
+    if not size_bytes:
+        return _write_manifest(path, header, None, 0)
+    with open(log_path, 'rb') as src:
+        return _write_manifest(path, header, src, size_bytes)
+
+
+def write_snapshot(data: bytes, path: Path, **fields) -> Path:
+    """Checkpoint of an in-memory document (such as a state dict's JSON), stored like a log"""
+    return _write_manifest(Path(path), fields, io.BytesIO(data), len(data))
+
+
+def _write_manifest(path: Path, fields: Dict[str, Any], src: Optional[BinaryIO], size: int) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    store = ChunkStore(path.parent / CHUNKS_DIR)
+    refs = [{'chunk': store.put(chunk), 'bytes': len(chunk)} for chunk in iter_chunks(src, size)] if size else []
+    header = {'format': CHECKPOINT_FORMAT, 'version': CHECKPOINT_VERSION, 'checkpoint_id': str(path),
+              **fields, 'size_bytes': size, 'chunks': len(refs)}
+
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as out:
+        out.write(json.dumps(header, ensure_ascii=False) + '\n')
+        out.writelines(json.dumps(ref) + '\n' for ref in refs)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+def read_header(path: Path) -> Dict[str, Any]:
+    """Header record of a checkpoint in either format; raises ValueError if it is not one"""
+    path = Path(path)
+    with open(path, 'rb') as f:
+        head = f.readline(HEADER_MAX_BYTES)
+    try:
+        header = json.loads(head)
+    except ValueError:
+        header = None
+    if isinstance(header, dict) and header.get('format') == CHECKPOINT_FORMAT:
+        if header.get('version') not in (FLAT_VERSION, CHECKPOINT_VERSION):
+            raise ValueError(f"{path} is checkpoint version {header.get('version')}, "
+                             f"expected {FLAT_VERSION} or {CHECKPOINT_VERSION}")
+        return header
+    return _legacy_header(path)
+
+
+def _legacy_header(path: Path) -> Dict[str, Any]:
+    """Fields before the message list of a single-document checkpoint"""
+    with open(path, encoding='utf-8', errors='replace') as f:
+        head = f.read(HEADER_MAX_BYTES)
+    match = LEGACY_MESSAGES_KEY.search(head)
+    try:
+        if match is not None:
+            header = json.loads(head[:match.start()].rstrip().rstrip(',') + '}')
+        else:
+            header = json.loads(head)  # A small file whose message list is not last
+    except ValueError:
+        with open(path, encoding='utf-8') as f:
+            header = json.load(f)  # Unusual layout; read it the old way
+    if not isinstance(header, dict):
+        raise ValueError(f"{path} is not a checkpoint")
+    header.pop('messages', None)
+    header.setdefault('version', 1)
+    return header
+
+
+def chunk_refs(path: Path) -> Iterator[Dict[str, Any]]:
+    """Chunk references of a chunked checkpoint, in log order"""
+    with open(path, 'rb') as f:
+        f.readline(HEADER_MAX_BYTES)
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_checkpoint_data(path: Path) -> Iterator[bytes]:
+    """Content of a chunked or flat checkpoint, a piece at a time"""
+    path = Path(path)
+    header = read_header(path)
+    if header['version'] == CHECKPOINT_VERSION:
+        store = ChunkStore(path.parent / CHUNKS_DIR)
+        remaining = header['size_bytes']
+        for ref in chunk_refs(path):
+            data = store.get(ref['chunk'])
+            remaining -= len(data)
+            yield data
+        if remaining:
+            raise ValueError(f"{path} is missing {remaining} bytes of chunk references")
+    elif header['version'] == FLAT_VERSION:
+        with open(path, 'rb') as src:
+            src.readline(HEADER_MAX_BYTES)
+            remaining = header['size_bytes']
+            while remaining:
+                data = src.read(min(COPY_CHUNK_BYTES, remaining))
+                if not data:
+                    raise ValueError(f"{path} ended {remaining} bytes early")
+                remaining -= len(data)
+                yield data
+    else:
+        raise ValueError(f"{path} is a single-document checkpoint; use iter_legacy_messages")
+
+
+def iter_legacy_messages(path: Path) -> Iterator[Any]:
+    """Messages of a single-document checkpoint, decoded one at a time"""
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as f:
+        buffer = ''
+        while True:
+            match = LEGACY_MESSAGES_KEY.search(buffer)
+            if match is not None and match.end() < len(buffer):
+                buffer = buffer[match.end():]
+                break
+            chunk = f.read(COPY_CHUNK_BYTES)
+            if not chunk:
+                return  # No message list
+            buffer += chunk
+        if not buffer.startswith('['):
+            raise ValueError(f"{path}: messages is not a list")
+        position = 1
+
+        while True:
+            position = SEPARATORS.match(buffer, position).end()
+            if buffer.startswith(']', position):
+                return
+            try:
+                if position == len(buffer):
+                    raise ValueError("buffer drained")
+                message, position = decoder.raw_decode(buffer, position)
+            except ValueError:
+                chunk = f.read(COPY_CHUNK_BYTES)
+                if not chunk:
+                    raise ValueError(f"{path} ends inside its message list")
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield message
+
+
+def restore_checkpoint(path: Path, log_path: Path) -> int:
+    """
+    Replace a log with a checkpoint's messages; returns how many were restored.
+
+    The messages are streamed into a file next to the log, which then
+    replaces it, so a failed restore leaves the log as it was.
+    """
+    path, log_path = Path(path), Path(log_path)
+    header = read_header(path)
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = log_path.with_name(log_path.name + '.restore.tmp')
+    count = 0
+    try:
+        with open(tmp, 'wb') as out:
+            if header['version'] in (FLAT_VERSION, CHECKPOINT_VERSION):
+                out.writelines(iter_checkpoint_data(path))
+                count = header.get('message_count', 0)
+            else:
+                for message in iter_legacy_messages(path):
+                    out.write(json.dumps(message).encode('utf-8') + b'\n')
+                    count += 1
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, log_path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return count
+
+
+def _checkpoint_time(header: Dict[str, Any]) -> Optional[datetime]:
+    """Naive UTC time of a checkpoint's header timestamp, None if it has none"""
+    try:
+        when = datetime.fromisoformat(str(header.get('timestamp')).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc).replace(tzinfo=None)
+    return when
+
+
+def retained(checkpoints: Iterable[Tuple[Path, Optional[datetime]]], now: datetime) -> Set[Path]:
+    """
+    Checkpoints RETENTION_TIERS keeps, of (path, time) pairs.
+
+    Within a tier the newest checkpoint of each spacing-long slot is kept.
+    Checkpoints without a readable time are always kept.
+    """
+    checkpoints = sorted(checkpoints, key=lambda c: c[1] or datetime.max, reverse=True)
+    keep, slots = set(), set()
+    for path, when in checkpoints:
+        if when is None:
+            keep.add(path)
+            continue
+        age = now - when
+        for tier, (horizon, spacing) in enumerate(RETENTION_TIERS):
+            if age >= horizon:
+                continue
+            slot = (tier, (when - datetime.min) // spacing) if spacing is not None else (tier, path)
+            if slot not in slots:
+                slots.add(slot)
+                keep.add(path)
+            break
+    dated = [path for path, when in checkpoints if when is not None]
+    if dated:
+        keep.add(dated[0])
+    return keep
+
+
+def referenced_chunks(checkpoint_dir: Path) -> Set[str]:
+    """Ids of the chunks some checkpoint in a directory still refers to"""
+    referenced = set()
+    for path in Path(checkpoint_dir).glob('*' + CHECKPOINT_SUFFIX):
+        try:
+            if read_header(path).get('version') == CHECKPOINT_VERSION:
+                referenced.update(ref['chunk'] for ref in chunk_refs(path))
+        except (OSError, ValueError, KeyError):
+            continue
+    return referenced
+
+
+def prune_checkpoints(checkpoint_dir: Path, paths: Optional[Iterable[Path]] = None,
+                      now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Apply the retention policy, then delete chunks no checkpoint refers to.
+
+    paths are the checkpoints the policy applies to. By default they are
+    the directory's periodic checkpoints: chunked or flat ones whose label
+    starts with AUTO_LABEL_PREFIX. Checkpoints with any other label (such
+    as session_end_snapshot or final_checkpoint_before_shutdown) and
+    single-document .json files are kept, along with the chunks they use.
+    Timestamps are compared with now, naive UTC unless given. Returns
+    counts of what was removed and the bytes freed.
+    """
+    checkpoint_dir = Path(checkpoint_dir)
+    periodic_only = paths is None
+    if periodic_only:
+        paths = [path for path in checkpoint_paths(checkpoint_dir) if path.name.endswith(CHECKPOINT_SUFFIX)]
+    else:
+        paths = [Path(p) for p in paths]
+    timed = []
+    for path in paths:
+        try:
+            header = read_header(path)
+        except (OSError, ValueError):
+            continue  # Not a checkpoint we can date; leave it alone
+        if periodic_only and not str(header.get('label', '')).startswith(AUTO_LABEL_PREFIX):
+            continue
+        timed.append((path, _checkpoint_time(header)))
+    keep = retained(timed, now or datetime.utcnow())
+
+    removed = {'checkpoints': 0, 'checkpoint_bytes': 0}
+    for path, _ in timed:
+        if path in keep:
+            continue
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            continue
+        removed['checkpoints'] += 1
+        removed['checkpoint_bytes'] += size
+
+    collected = ChunkStore(checkpoint_dir / CHUNKS_DIR).collect_garbage(referenced_chunks(checkpoint_dir))
+    removed['chunks'], removed['chunk_bytes'] = collected['chunks'], collected['bytes']
+    return removed
+
+
+def storage_report(checkpoint_dir: Path) -> Dict[str, int]:
+    """
+    Disk used by a directory's checkpoints against keeping each as a full copy.
+
+    full_copy_bytes counts a chunked checkpoint at the size of the log it
+    holds, and older checkpoints at their file size; stored_bytes is what
+    the files and chunks take on disk.
+    """
+    checkpoint_dir = Path(checkpoint_dir)
+    report = {'checkpoints': 0, 'chunks': 0, 'full_copy_bytes': 0, 'stored_bytes': 0}
+    for path in checkpoint_paths(checkpoint_dir):
+        try:
+            header, size = read_header(path), path.stat().st_size
+        except (OSError, ValueError):
+            continue
+        report['checkpoints'] += 1
+        report['stored_bytes'] += size
+        report['full_copy_bytes'] += header['size_bytes'] if header.get('version') == CHECKPOINT_VERSION else size
+    chunk_sizes = ChunkStore(checkpoint_dir / CHUNKS_DIR).sizes()
+    report['chunks'] = len(chunk_sizes)
+    report['stored_bytes'] += sum(chunk_sizes.values())
+    report['saved_bytes'] = report['full_copy_bytes'] - report['stored_bytes']
+    return report
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Content-addressed, compressed chunk store
+
+Checkpoints are cut into chunks at content-defined line boundaries, and
+each distinct chunk is stored once, compressed, under the SHA-256 of its
+content. Successive checkpoints of an append-only log then share all but
+their newest chunks.
+
+A line ends a chunk once the chunk holds CHUNK_MIN_BYTES and the line's
+CRC-32 is divisible by CHUNK_CUT_MODULUS, or when the chunk reaches
+CHUNK_MAX_BYTES. Boundaries depend only on the lines around them, so
+inserting or removing lines early in a log does not shift every boundary
+after it.
+
+Chunks are zstd-compressed when zstandard is installed, and
+zlib-compressed otherwise. The codec is recorded in the file suffix, so a
+store can hold both.
+"""
+
+import hashlib
+import os
+import time
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, Optional, Set
+
+try:
+    import zstandard
+    ZSTD_SUPPORT = True
+except ImportError:
+    ZSTD_SUPPORT = False
+
+CHUNK_MIN_BYTES = 256 * 1024
+CHUNK_MAX_BYTES = 4 * 1024 * 1024
+CHUNK_CUT_MODULUS = 64  # About one cut every 64 lines past the minimum
+ZSTD_LEVEL = 10
+ZLIB_LEVEL = 6
+GC_GRACE_SECONDS = 3600  # Unreferenced chunks this recent may belong to a checkpoint still being written
+
+CODEC_SUFFIXES = {'.zst': 'zstd', '.zz': 'zlib'}
+DECOMPRESS_ERRORS = (zlib.error, zstandard.ZstdError) if ZSTD_SUPPORT else (zlib.error,)
+
+
+def iter_chunks(src: BinaryIO, size: int) -> Iterator[bytes]:
+    """Content-defined chunks of the next size bytes of a binary file"""
+    pending, pending_bytes = [], 0
+    while size > 0:
+        line = src.readline(min(size, CHUNK_MAX_BYTES))
+        if not line:
+            raise ValueError(f"{getattr(src, 'name', 'source')} ended {size} bytes early")
+        size -= len(line)
+        pending.append(line)
+        pending_bytes += len(line)
+        if pending_bytes >= CHUNK_MAX_BYTES or (pending_bytes >= CHUNK_MIN_BYTES
+                                                 and zlib.crc32(line) % CHUNK_CUT_MODULUS == 0):
+            yield b''.join(pending)
+            pending, pending_bytes = [], 0
+    if pending:
+        yield b''.join(pending)
+
+
+class ChunkStore:
+    """Directory of compressed chunks named by the SHA-256 of their content"""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.suffix = '.zst' if ZSTD_SUPPORT else '.zz'
+
+    def _path(self, chunk_id: str, suffix: str) -> Path:
+        return self.root / chunk_id[:2] / (chunk_id + suffix)
+
+    def find(self, chunk_id: str) -> Optional[Path]:
+        """File holding a chunk, in whichever codec it was written"""
+        for suffix in CODEC_SUFFIXES:
+            path = self._path(chunk_id, suffix)
+            if path.exists():
+                return path
+        return None
+
+    def put(self, data: bytes) -> str:
+        """Store a chunk unless it is already present; returns its id"""
+        chunk_id = hashlib.sha256(data).hexdigest()
+        existing = self.find(chunk_id)
+        if existing is not None:
+            try:
+                os.utime(existing)  # Referenced again, so garbage collection leaves it for a while
+                return chunk_id
+            except FileNotFoundError:
+                pass  # Collected in the meantime; write it again
+
+        path = self._path(chunk_id, self.suffix)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if ZSTD_SUPPORT:
+            compressed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+        else:
+            compressed = zlib.compress(data, ZLIB_LEVEL)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, 'wb') as f:
+            f.write(compressed)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        return chunk_id
+
+    def get(self, chunk_id: str) -> bytes:
+        """Content of a chunk; raises ValueError if it is missing or damaged"""
+        path = self.find(chunk_id)
+        if path is None:
+            raise ValueError(f"Chunk {chunk_id} is missing from {self.root}")
+        compressed = path.read_bytes()
+        try:
+            if CODEC_SUFFIXES[path.suffix] == 'zlib':
+                data = zlib.decompress(compressed)
+            elif ZSTD_SUPPORT:
+                data = zstandard.ZstdDecompressor().decompress(compressed)
+            else:
+                raise ValueError(f"Chunk {chunk_id} is zstd-compressed and zstandard is not installed")
+        except DECOMPRESS_ERRORS as e:
+            raise ValueError(f"Chunk {chunk_id} is damaged: {e}")
+        if hashlib.sha256(data).hexdigest() != chunk_id:
+            raise ValueError(f"Chunk {chunk_id} is damaged: content does not match its id")
+        return data
+
+    def sizes(self) -> Dict[str, int]:
+        """On-disk size of each stored chunk, by id"""
+        if not self.root.exists():
+            return {}
+        return {path.name.split('.')[0]: path.stat().st_size
+                for path in self.root.glob("*/*") if path.suffix in CODEC_SUFFIXES}
+
+    def collect_garbage(self, referenced: Set[str], grace_seconds: float = GC_GRACE_SECONDS) -> Dict[str, int]:
+        """
+        Delete chunks no checkpoint references; returns the chunks and bytes removed.
+
+        Chunks written or reused within grace_seconds are kept, since a
+        checkpoint being written stores its chunks before its manifest.
+        """
+        removed = {'chunks': 0, 'bytes': 0}
+        if not self.root.exists():
+            return removed
+        cutoff = time.time() - grace_seconds
+        for path in self.root.glob("*/*"):
+            chunk_id = path.name.split('.')[0]
+            try:
+                stat = path.stat()
+                if stat.st_mtime >= cutoff or (path.suffix in CODEC_SUFFIXES and chunk_id in referenced):
+                    continue
+                path.unlink()  # Unreferenced chunk, or a leftover .tmp
+            except FileNotFoundError:
+                continue
+            if path.suffix in CODEC_SUFFIXES:
+                removed['chunks'] += 1
+                removed['bytes'] += stat.st_size
+        return removed
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Full-text search index over the session log
+
+A SQLite database next to the log holds:
+- an FTS5 inverted index of each message's text, contentless (the text
+  itself stays in the log) and ranked with BM25
+- a messages table with each log line's byte offset, time, speaker, ACE
+  tier and chain, for filters and for reading hits back from the log
+
+catch_up() indexes the complete lines appended since the last call, so the
+persistence daemon keeps the index current as it writes and any reader can
+catch up whatever it missed. A log that was truncated or replaced is
+reindexed from the start.
+
+Queries are words (all must match), "quoted phrases" and prefix* terms,
+plus speaker:, tier:, chain:, since:, until: filters and order:newest.
+Newest-first results walk the postings backwards and stop at the limit.
+BM25 has to score every match, so ranked results are the best of the
+newest RANK_WINDOW matches, which keeps common terms as fast as rare ones.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger('search_index')
+
+SEARCH_INDEX_VERSION = 1
+INDEX_BATCH_LINES = 10000  # Lines indexed per transaction
+RANK_WINDOW = 10000  # Newest matches ranked by BM25
+FILTER_KEYS = ('speaker', 'tier', 'chain', 'since', 'until')
+ORDERS = ('rank', 'newest')
+
+QUERY_PATTERN = re.compile(r'(\w+):("[^"]*"|\S+)|"([^"]*)"?|(\S+)')
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _fts5_available() -> bool:
+    try:
+        sqlite3.connect(':memory:').execute("CREATE VIRTUAL TABLE probe USING fts5(body)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+FTS5_SUPPORT = _fts5_available()
+
+
+def message_text(msg: Dict[str, Any]) -> str:
+    """Text of a logged message: the 'message' of a JSON-encoded content dict, else the field as is"""
+    content = msg.get('Message', '')
+    if isinstance(content, str) and content.startswith('{'):
+        try:
+            decoded = json.loads(content)
+        except ValueError:
+            return content
+        if isinstance(decoded, dict) and isinstance(decoded.get('message'), str):
+            return decoded['message']
+    return content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+
+
+def timestamp_us(value: Any) -> Optional[int]:
+    """Epoch microseconds of an ISO timestamp or datetime (naive times are UTC); None if unparseable"""
+    if isinstance(value, str):
+        text = value.strip()
+        if text.endswith('Z'):
+            text = text[:-1] + '+00:00'
+        try:
+            value = datetime.fromisoformat(text)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def parse_query(query: str) -> Tuple[str, Dict[str, str]]:
+    """
+    FTS5 match expression and filters of a search box query.
+
+    Every word and phrase is quoted, so FTS5 syntax characters in the query
+    are searched for rather than interpreted; a trailing * keeps prefix
+    matching. Returns ("", filters) when the query only has filters.
+    """
+    terms, filters = [], {}
+    for match in QUERY_PATTERN.finditer(query):
+        key, value, phrase, word = match.groups()
+        if key is not None and (key.lower() in FILTER_KEYS or key.lower() == 'order'):
+            filters[key.lower()] = value.strip('"')
+            continue
+        if key is not None:
+            word = match.group(0)
+        text = phrase if phrase is not None else word
+        prefix = phrase is None and text.endswith('*')
+        text = text.rstrip('*') if prefix else text
+        if not re.search(r'\w', text):
+            continue  # Nothing FTS5 would tokenize
+        terms.append('"' + text.replace('"', '""') + '"' + (' *' if prefix else ''))
+    return " ".join(terms), filters
+
+
+def line_hash(line: bytes) -> str:
+    return hashlib.sha1(line).hexdigest()
+
+
+class MessageSearchIndex:
+    """SQLite FTS5 index of a JSONL message log, maintained by catch_up()"""
+
+    def __init__(self, index_path: Path):
+        self.index_path = Path(index_path)
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(str(self.index_path), timeout=30, isolation_level=None,
+                                    check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")  # Readers are not blocked by the daemon's writes
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+
+    def _create_tables(self) -> None:
+        with self.lock:
+            conn = self.conn
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+            version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if version is not None and version[0] != SEARCH_INDEX_VERSION:
+                conn.execute("DROP TABLE IF EXISTS messages")
+                conn.execute("DROP TABLE IF EXISTS message_text")
+                conn.execute("DELETE FROM meta")
+            conn.execute("CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY, offset INTEGER NOT NULL, "
+                         "time_us INTEGER, speaker TEXT, tier TEXT, chain TEXT)")
+            for column in ('time_us', 'speaker', 'tier', 'chain'):
+                conn.execute(f"CREATE INDEX IF NOT EXISTS messages_{column} ON messages ({column})")
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS message_text USING fts5(body, content='', "
+                         "tokenize='unicode61 remove_diacritics 2')")
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (SEARCH_INDEX_VERSION,))
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+    def _meta(self) -> Dict[str, Any]:
+        return dict(self.conn.execute("SELECT key, value FROM meta"))
+
+    def _set_meta(self, **values) -> None:
+        self.conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", values.items())
+
+    def _clear(self) -> None:
+        self.conn.execute("DELETE FROM messages")
+        self.conn.execute("INSERT INTO message_text(message_text) VALUES ('delete-all')")
+
+    @property
+    def message_count(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT count(*) FROM messages").fetchone()[0]
+
+    @property
+    def log_offset(self) -> int:
+        """Byte offset in the log up to which lines are indexed"""
+        with self.lock:
+            return self._meta().get('log_offset', 0)
+
+    def _is_continuation(self, log_path: Path, meta: Dict[str, Any]) -> bool:
+        """Whether the log still starts with the lines indexed so far"""
+        if meta.get('log_path') != str(log_path):
+            return False
+        offset, tail_offset = meta.get('log_offset', 0), meta.get('tail_offset', 0)
+        if log_path.stat().st_size < offset:
+            return False
+        if offset == 0:
+            return True
+        with open(log_path, 'rb') as f:
+            first = f.readline()
+            f.seek(tail_offset)
+            tail = f.read(offset - tail_offset)
+        return line_hash(first) == meta.get('head_hash') and line_hash(tail) == meta.get('tail_hash')
+
+    def catch_up(self, log_path: Path) -> int:
+        """Index complete lines appended since the last call; returns the number of messages added"""
+        log_path = Path(log_path).resolve()
+        if not log_path.exists():
+            return 0
+
+        with self.lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")  # Another writer may be catching up the same log
+            try:
+                meta = self._meta()
+                if not self._is_continuation(log_path, meta):
+                    if meta.get('log_offset'):
+                        logger.info(f"Log {log_path} changed underneath the search index, reindexing")
+                    self._clear()
+                    meta = {'log_path': str(log_path), 'log_offset': 0, 'tail_offset': 0}
+                offset, tail_offset = meta['log_offset'], meta['tail_offset']
+                head_hash, tail_hash = meta.get('head_hash'), meta.get('tail_hash')
+                next_id = conn.execute("SELECT coalesce(max(id), 0) + 1 FROM messages").fetchone()[0]
+
+                added, rows, texts = 0, [], []
+                with open(log_path, 'rb') as f:
+                    f.seek(offset)
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            break  # Still being written; pick it up next time
+                        if offset == 0:
+                            head_hash = line_hash(line)
+                        line_offset, offset = offset, offset + len(line)
+                        tail_offset, tail_hash = line_offset, line_hash(line)
+                        if not line.strip():
+                            continue
+                        try:
+                            msg = json.loads(line)
+                        except ValueError:
+                            logger.warning(f"Skipping invalid JSON line at byte {line_offset} of {log_path}")
+                            continue
+                        if not isinstance(msg, dict):
+                            continue
+                        metadata = msg.get('Metadata') if isinstance(msg.get('Metadata'), dict) else {}
+                        rows.append((next_id, line_offset, timestamp_us(msg.get('Timestamp')), msg.get('SpeakerName'),
+                                     msg.get('ace_tier', metadata.get('ace_tier')),
+                                     msg.get('chain_type', metadata.get('chain_type'))))
+                        texts.append((next_id, message_text(msg)))
+                        next_id += 1
+                        if len(rows) >= INDEX_BATCH_LINES:
+                            added += self._insert(rows, texts)
+                            self._set_meta(log_path=str(log_path), log_offset=offset, tail_offset=tail_offset,
+                                           head_hash=head_hash, tail_hash=tail_hash)
+                            conn.execute("COMMIT")
+                            conn.execute("BEGIN IMMEDIATE")
+                            rows, texts = [], []
+                added += self._insert(rows, texts)
+                self._set_meta(log_path=str(log_path), log_offset=offset, tail_offset=tail_offset,
+                               head_hash=head_hash, tail_hash=tail_hash)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return added
+
+    def _insert(self, rows: List[Tuple], texts: List[Tuple[int, str]]) -> int:
+        self.conn.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self.conn.executemany("INSERT INTO message_text(rowid, body) VALUES (?, ?)", texts)
+        return len(rows)
+
+    @staticmethod
+    def _conditions(query: str, filters: Dict[str, Any]) -> Tuple[str, List[str], List[Any], Dict[str, str]]:
+        """FTS5 expression, WHERE conditions on messages m and their parameters, and the parsed filters"""
+        expression, parsed = parse_query(query)
+        parsed.update({key: value for key, value in filters.items() if value is not None})
+        where, params = [], []
+        for column in ('speaker', 'tier', 'chain'):
+            if parsed.get(column):
+                where.append(f"m.{column} = ? COLLATE NOCASE")
+                params.append(parsed[column])
+        for key, operator in (('since', '>='), ('until', '<')):
+            if parsed.get(key):
+                bound = timestamp_us(parsed[key])
+                if bound is None:
+                    raise ValueError(f"{key} must be an ISO timestamp, got {parsed[key]!r}")
+                where.append(f"m.time_us {operator} ?")
+                params.append(bound)
+        return expression, where, params, parsed
+
+    @staticmethod
+    def _source(expression: str, where: List[str], params: List[Any]) -> Tuple[str, List[Any]]:
+        """FROM ... WHERE ... over the matching messages"""
+        if expression:
+            return (f"FROM message_text JOIN messages m ON m.id = message_text.rowid "
+                    f"WHERE {' AND '.join(['message_text MATCH ?'] + where)}", [expression] + params)
+        return f"FROM messages m WHERE {' AND '.join(where) or '1'}", params
+
+    def search(self, query: str, limit: int = 20, order: Optional[str] = None, skip: int = 0,
+               **filters) -> List[Dict[str, Any]]:
+        """
+        Messages matching query, best first (order='rank', among the newest
+        RANK_WINDOW matches) or newest first, after skipping skip of them.
+
+        Filters in the query (speaker:claude) and keyword filters are
+        combined, the keywords winning. speaker, tier and chain match
+        case-insensitively; since/until are ISO timestamps or datetimes,
+        since inclusive and until exclusive. Each hit has the log line's
+        id, offset and decoded message, and a BM25 score (higher is better,
+        None without search terms).
+        """
+        expression, where, params, parsed = self._conditions(query, filters)
+        order = order or parsed.pop('order', None) or 'rank'
+        if order not in ORDERS:
+            raise ValueError(f"order must be one of {ORDERS}, got {order!r}")
+
+        matches, params = self._source(expression, where, params)
+        with self.lock:
+            if expression:
+                if order == 'rank':
+                    cutoff = self.conn.execute(f"SELECT message_text.rowid {matches} "
+                                               f"ORDER BY message_text.rowid DESC LIMIT 1 OFFSET ?",
+                                               params + [RANK_WINDOW - 1]).fetchone()
+                    if cutoff is not None:
+                        matches += " AND message_text.rowid >= ?"
+                        params.append(cutoff[0])
+                    order_by = "bm25(message_text), m.id DESC"
+                else:
+                    order_by = "message_text.rowid DESC"
+                sql = f"SELECT m.id, m.offset, bm25(message_text) {matches} ORDER BY {order_by} LIMIT ? OFFSET ?"
+            else:
+                sql = f"SELECT m.id, m.offset, NULL {matches} ORDER BY m.id DESC LIMIT ? OFFSET ?"
+            rows = self.conn.execute(sql, params + [limit, skip]).fetchall()
+            log_path = self._meta().get('log_path')
+        return self._read_hits(log_path, rows)
+
+    def stats(self, query: str = "", **filters) -> Dict[str, Any]:
+        """
+        Totals over the messages search() would return: their count, counts
+        per speaker, tier and chain, and the earliest and latest timestamp
+        (as epoch microseconds). Nothing is read from the log.
+        """
+        expression, where, params, _ = self._conditions(query, filters)
+        source, params = self._source(expression, where, params)
+        with self.lock:
+            count, first_us, last_us = self.conn.execute(
+                f"SELECT count(*), min(m.time_us), max(m.time_us) {source}", params).fetchone()
+            result = {'count': count, 'first_us': first_us, 'last_us': last_us}
+            for column in ('speaker', 'tier', 'chain'):
+                result[column] = dict(self.conn.execute(
+                    f"SELECT m.{column}, count(*) {source} GROUP BY m.{column} ORDER BY count(*) DESC", params))
+        return result
+
+    def _read_hits(self, log_path: Optional[str], rows: List[Tuple]) -> List[Dict[str, Any]]:
+        """Decode the log lines of search hits"""
+        hits = []
+        if not rows:
+            return hits
+        with open(log_path, 'rb') as f:
+            for message_id, offset, rank in rows:
+                f.seek(offset)
+                try:
+                    msg = json.loads(f.readline())
+                except ValueError:
+                    continue  # The log changed since it was indexed
+                hits.append({'id': message_id, 'offset': offset, 'message': msg,
+                             'score': None if rank is None else -rank})
+        return hits
@@ -1,8 +1,18 @@
 import json
 import os
+import threading
 from pathlib import Path
 from typing import Dict, List, Optional
 
+try:
+    from bots.vector_index import VectorIndex, vector_index_dir
+    from bots.block_consolidation_bot_v1 import embedding_text
+    VECTOR_SEARCH_SUPPORT = True
+except ImportError:
+    VECTOR_SEARCH_SUPPORT = False
+
+RELEVANT_CONTEXT_MESSAGES = 5  # Similar past messages and blocks added to a prompt
+
 class ContextLoader:
     """
     Loads and summarizes conversation history for agents.
@@ -23,6 +33,33 @@ class ContextLoader:
             
         self.history: List[Dict] = []
         self._load_history()
+        self.vector_index = None  # Set once the index is open and its encoder loaded
+        self.semantic_context = VECTOR_SEARCH_SUPPORT
+        self._opener = None
+        self._open_vector_index_async()
+
+    def _open_vector_index_async(self):
+        """Open the log's vector index in the background, so loading the model never delays a reply"""
+        if self.semantic_context and (self._opener is None or not self._opener.is_alive()):
+            self._opener = threading.Thread(target=self._open_vector_index, name="ContextLoader-vectors", daemon=True)
+            self._opener.start()
+
+    def _open_vector_index(self):
+        index_dir = vector_index_dir(self.log_file)
+        try:
+            index = VectorIndex(index_dir, self.log_file.parent / "embedding_cache")
+            if not index.exists():
+                return  # Looked for again on the next request
+            index.load_encoder()
+        except RuntimeError as e:
+            print(f"ContextLoader: semantic context disabled: {e}")
+            self.semantic_context = False
+            return
+        except (OSError, ValueError) as e:
+            print(f"ContextLoader: cannot open the vector index at {index_dir}: {e}")
+            return
+        print(f"ContextLoader: Using the vector index at {index_dir} ({len(index)} rows)")
+        self.vector_index = index
 
     def _load_history(self):
         """Loads conversation history from the JSONL log file."""
@@ -75,6 +112,44 @@ class ContextLoader:
         
         return f"### Recent Conversation History (Consolidated):\n{combined_content}"
 
+    def get_relevant_context(self, text: str, k: int = RELEVANT_CONTEXT_MESSAGES, filters: Optional[Dict] = None) -> str:
+        """
+        The k past messages and blocks most similar in meaning to text, from
+        the vector index of the log (see bots/vector_index.py), so an engine
+        can answer with relevant history rather than only the latest.
+
+        The index is only searched here: the streaming block bot keeps the
+        session log's up to date (bots/vector_index.py --log builds others).
+        Returns "" until the index exists and the embedding model is loaded.
+        """
+        if not self.semantic_context or not text:
+            return ""
+        if self.vector_index is None:
+            self._open_vector_index_async()
+            return ""
+        try:
+            self.vector_index.refresh()  # Rows the builder appended since the last request
+            hits = self.vector_index.search_similar(text, k + 1, filters)
+        except (OSError, ValueError, RuntimeError) as e:
+            print(f"ContextLoader: vector search failed: {e}")
+            return ""
+
+        lines = []
+        for hit in hits:
+            if hit['kind'] == 'message':
+                msg = hit['message']
+                content = embedding_text(msg, max_length=200)
+                if content == embedding_text({'Message': text}, max_length=200):
+                    continue  # The message being answered, already logged
+                lines.append(f"[{msg.get('SpeakerName', 'unknown')} {str(msg.get('Timestamp', ''))[:16]}] {content}")
+            else:
+                block = hit['block']
+                lines.append(f"[block {str(block.get('timestamp_start', ''))[:16]}, {block.get('message_count', 0)} messages] "
+                             f"{', '.join(block.get('keywords', []))}")
+        if not lines:
+            return ""
+        return "### Relevant Earlier Context (by similarity):\n" + "\n".join(lines[:k])
+
 # Example Usage (for testing)
 if __name__ == "__main__":
     # Assuming this is run from the project root (ShearwaterAICAD)
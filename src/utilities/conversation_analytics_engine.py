@@ -3,38 +3,617 @@
 Conversation Analytics Engine
 Analyzes persistence recording data from JSONL and Arrow formats
 Generates actionable reports with collaboration metrics
+
+Reports are computed from a columnar view of the log (MessageColumns):
+one pass encodes every message into typed arrays, then each report is a
+vectorized group-by. The per-message methods remain as the fallback
+when NumPy is not installed.
+
+Arrow/Parquet logs stay Arrow tables: only the columns the reports use
+are read, time ranges are pushed down to the Parquet reader, and the
+columns are encoded with Arrow compute. Dicts are only built for the
+messages that are displayed. Defragmented threads are read the same way
+from the nested, day-partitioned Parquet output when it exists.
+
+AnalyticsState keeps the same aggregates on disk with the offset of the
+last folded log line; incremental runs and the persistence daemon only
+fold in new records.
 """
 
+import argparse
+import hashlib
 import json
+import os
 import re
+import threading
 from pathlib import Path
 from datetime import datetime
 from collections import Counter, defaultdict
-from typing import Dict, List, Tuple, Any
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 import logging
 
 # Try to import pyarrow for Arrow support
 try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.feather as feather
     import pyarrow.parquet as pq
     ARROW_SUPPORT = True
 except ImportError:
     ARROW_SUPPORT = False
 
+# Columnar analytics need NumPy; without it the per-message path is used
+try:
+    import numpy as np
+    NUMPY_SUPPORT = True
+except ImportError:
+    NUMPY_SUPPORT = False
+
 logging.basicConfig(
     level=logging.INFO,
     format='[%(asctime)s] %(levelname)s - %(message)s'
 )
 logger = logging.getLogger('AnalyticsEngine')
 
+try:
+    from defragmentation_engine import MESSAGES_COLUMN, read_thread_table, thread_partition_files, threads_from_table
+except ImportError:
+    from .defragmentation_engine import MESSAGES_COLUMN, read_thread_table, thread_partition_files, threads_from_table
+
+ANALYTICS_STATE_FILE = "analytics_state.json"
+
+# Message columns read by the reports (everything else is left on disk)
+ARROW_REPORT_COLUMNS = ('SpeakerName', 'Type', 'type', 'ConversationType', 'chain_type', 'ace_tier',
+                        'Timestamp', 'Metadata', 'keywords', 'shl_tags')
+ARROW_METADATA_FIELDS = ('chain_type', 'ace_tier', 'keywords', 'shl_tags', 'consolidated', 'content_hash')
+ANALYTICS_STATE_VERSION = 1
+FINGERPRINT_BYTES = 4096  # Prefix of the log's first line that identifies the log
+
+# Bits of MessageColumns.flags
+FLAG_METADATA = 1       # Metadata present and non-empty
+FLAG_CONSOLIDATED = 2   # Metadata.consolidated is truthy
+FLAG_CONTENT_HASH = 4   # Metadata has a content_hash
+FLAG_SHL_TAGGED = 8     # shl_tags present at root or in Metadata
+
+
+def collaboration_score(speakers_count: int, chains_count: int, total_messages: int,
+                        enriched: int, tagged: int) -> float:
+    """Overall collaboration quality (0-100), five components weighted 20% each"""
+    score = 0.0
+
+    # 1. Speaker diversity: 0-100 based on unique speakers
+    score += min(speakers_count / 3 * 100, 100) * 0.2
+
+    # 2. Domain coverage: 0-100 based on domain chains
+    score += min(chains_count / 10 * 100, 100) * 0.2
+
+    # 3. Message consistency: normalized to a 100-message baseline
+    score += min(total_messages / 100.0 * 100, 100) * 0.2
+
+    # 4. Metadata enrichment
+    score += ((enriched / total_messages * 100) if total_messages > 0 else 0) * 0.2
+
+    # 5. SHL tagging
+    score += ((tagged / total_messages * 100) if total_messages > 0 else 0) * 0.2
+
+    return round(score, 2)
+
+
+def arrow_rows(table) -> List[Dict[str, Any]]:
+    """
+    Materialize Arrow rows as message dicts.
+
+    Arrow has no "missing key", so null fields (top-level and in Metadata)
+    are dropped; the vectorized reports treat null the same way.
+    """
+    rows = []
+    for row in table.to_pylist():
+        msg = {k: v for k, v in row.items() if v is not None}
+        if isinstance(msg.get('Metadata'), dict):
+            msg['Metadata'] = {k: v for k, v in msg['Metadata'].items() if v is not None}
+        rows.append(msg)
+    return rows
+
+
+def _arrow_truthy(array):
+    """Python truthiness of an Arrow array, null as False"""
+    if pa.types.is_boolean(array.type):
+        truthy = array
+    elif pa.types.is_string(array.type) or pa.types.is_large_string(array.type):
+        truthy = pc.greater(pc.utf8_length(array), 0)
+    elif pa.types.is_list(array.type) or pa.types.is_large_list(array.type):
+        truthy = pc.greater(pc.list_value_length(array), 0)
+    elif pa.types.is_integer(array.type) or pa.types.is_floating(array.type):
+        truthy = pc.not_equal(array, 0)
+    else:
+        truthy = pc.is_valid(array)
+    return pc.fill_null(truthy, False)
+
+
+def _arrow_str(array):
+    """str() of each value, as Python would print it"""
+    if pa.types.is_string(array.type):
+        return array
+    if pa.types.is_integer(array.type):
+        return pc.cast(array, pa.string())
+    if pa.types.is_boolean(array.type):
+        return pc.if_else(array, "True", "False")
+    return pa.array([None if v is None else str(v) for v in array.to_pylist()], type=pa.string())
+
+
+def summarize(counts: Dict[str, List[Tuple[Any, int]]], total: int, consolidated: int,
+              content_hash: int, enriched: int, tagged: int) -> Dict[str, Any]:
+    """
+    Assemble the analyze() reports from aggregates.
+
+    counts maps speakers, message_types, chain_types, ace_tiers, keywords
+    and shl_tags to (value, count) pairs, most common first and already cut
+    to size, and timeline to (date, count) pairs in any order.
+    """
+    speakers = dict(counts['speakers'])
+    chain_types = dict(counts['chain_types'])
+    return {
+        'speakers': speakers,
+        'message_types': dict(counts['message_types']),
+        'chain_types': chain_types,
+        'ace_tiers': dict(counts['ace_tiers']),
+        'keywords': list(counts['keywords']),
+        'timeline': dict(sorted(counts['timeline'])),
+        'metadata_insights': {
+            'shl_tags_frequency': dict(counts['shl_tags']),
+            'consolidation_ratio': {
+                'consolidated_count': consolidated,
+                'total_count': total,
+                'consolidation_percentage': (consolidated / total * 100) if total > 0 else 0,
+            },
+            'content_hash_coverage': content_hash,
+        },
+        'collaboration_score': collaboration_score(len(speakers), len(chain_types), total, enriched, tagged),
+    }
+
+
+class MessageFields(NamedTuple):
+    """Report fields of one message"""
+    speaker: Any
+    message_type: str
+    chain_type: Any
+    ace_tier: Any
+    date: Optional[str]
+    keywords: List[Any]
+    shl_tags: List[Any]
+    flags: int  # FLAG_* bits
+
+
+def message_fields(msg: Dict[str, Any]) -> MessageFields:
+    """
+    Read the fields every report counts from one message.
+
+    chain_type, ace_tier and shl_tags are taken from the message root, else
+    from its Metadata; keywords from both, Metadata first.
+    """
+    metadata = msg.get('Metadata', {})
+
+    keywords = []
+    if isinstance(msg.get('Metadata'), dict):
+        meta_keywords = metadata.get('keywords', [])
+        if isinstance(meta_keywords, list):
+            keywords.extend(meta_keywords)
+    if isinstance(msg.get('keywords'), list):
+        keywords.extend(msg['keywords'])
+
+    shl_tags = msg.get('shl_tags', metadata.get('shl_tags', []))
+
+    bits = FLAG_METADATA if msg.get('Metadata') else 0
+    if metadata.get('consolidated'):
+        bits |= FLAG_CONSOLIDATED
+    if 'content_hash' in metadata:
+        bits |= FLAG_CONTENT_HASH
+    if msg.get('shl_tags') or metadata.get('shl_tags'):
+        bits |= FLAG_SHL_TAGGED
+
+    timestamp = msg.get('Timestamp', '')
+    return MessageFields(
+        speaker=msg.get('SpeakerName', 'unknown'),
+        message_type=str(msg.get('Type') or msg.get('type') or msg.get('ConversationType') or 'unknown'),
+        chain_type=msg.get('chain_type', metadata.get('chain_type', 'unknown')),
+        ace_tier=msg.get('ace_tier', metadata.get('ace_tier', 'unknown')),
+        date=timestamp.split('T')[0] if timestamp else None,
+        keywords=keywords,
+        shl_tags=shl_tags if isinstance(shl_tags, list) else [],
+        flags=bits,
+    )
+
+
+class MessageColumns:
+    """
+    Columnar view of a message log for vectorized reports.
+
+    The per-message loop only gathers raw field values; they are then
+    factorized into int32 codes per field, with values kept in first-seen
+    order so a stable sort of the counts reproduces the tie order of
+    Counter.most_common(). Keywords and SHL tags are flattened into one
+    code array each, and boolean metadata checks share a uint8 bitmask.
+    Messages can be appended later with extend().
+    """
+
+    CATEGORIES = ('speaker', 'message_type', 'chain_type', 'ace_tier', 'date', 'keyword', 'shl_tag')
+
+    def __init__(self, messages=()):
+        self.values = {field: [] for field in self.CATEGORIES}
+        self._index = {field: {} for field in self.CATEGORIES}
+        self._raw = {field: [] for field in self.CATEGORIES}
+        self._codes = {field: np.zeros(0, dtype=np.int32) for field in self.CATEGORIES}
+        self._raw_flags = []
+        self._flags = np.zeros(0, dtype=np.uint8)
+        self.extend(messages)
+
+    def __len__(self) -> int:
+        return len(self._flags) + len(self._raw_flags)
+
+    def extend(self, messages) -> None:
+        """Gather the raw column values of more messages"""
+        raw = self._raw
+        speakers, msg_types, chains, tiers, dates = (raw['speaker'], raw['message_type'], raw['chain_type'],
+                                                     raw['ace_tier'], raw['date'])
+        keywords, shl_tags_all, flags = raw['keyword'], raw['shl_tag'], self._raw_flags
+
+        for msg in messages:
+            fields = message_fields(msg)
+            speakers.append(fields.speaker)
+            msg_types.append(fields.message_type)
+            chains.append(fields.chain_type)
+            tiers.append(fields.ace_tier)
+            dates.append(fields.date)
+            keywords.extend(fields.keywords)
+            shl_tags_all.extend(fields.shl_tags)
+            flags.append(fields.flags)
+
+    def extend_arrow(self, table) -> None:
+        """
+        Encode a table of messages with Arrow compute, without building dicts.
+
+        Tables whose Metadata is not a struct (e.g. JSON text) or whose
+        fallback columns disagree on type go through arrow_rows() instead.
+        """
+        table = table.combine_chunks()
+        names = set(table.column_names)
+        column = lambda name: table.column(name).chunk(0) if name in names and table.num_rows else None
+        metadata = column('Metadata')
+        if metadata is not None and not pa.types.is_struct(metadata.type):
+            self.extend(arrow_rows(table))
+            return
+
+        meta_names = {metadata.type.field(i).name for i in range(metadata.type.num_fields)} if metadata is not None else set()
+        meta = lambda name: pc.struct_field(metadata, name) if name in meta_names else None
+
+        def first_present(*arrays):
+            arrays = [a for a in arrays if a is not None]
+            if len({a.type for a in arrays}) > 1:
+                raise TypeError("mixed column types")
+            return pc.coalesce(*arrays) if len(arrays) > 1 else (arrays[0] if arrays else None)
+
+        try:
+            chain = first_present(column('chain_type'), meta('chain_type'))
+            tier = first_present(column('ace_tier'), meta('ace_tier'))
+            shl_tags = first_present(column('shl_tags'), meta('shl_tags'))
+        except TypeError:
+            self.extend(arrow_rows(table))
+            return
+
+        self._factorize()
+        n = table.num_rows
+        if n == 0:
+            return
+
+        unknown = pa.array(['unknown'] * n)
+        speaker = column('SpeakerName')
+        self._append_arrow('speaker', pc.fill_null(speaker, 'unknown') if speaker is not None else unknown)
+
+        msg_type = unknown
+        for name in ('ConversationType', 'type', 'Type'):
+            candidate = column(name)
+            if candidate is not None:
+                msg_type = pc.if_else(_arrow_truthy(candidate), _arrow_str(candidate), msg_type)
+        self._append_arrow('message_type', msg_type)
+
+        self._append_arrow('chain_type', pc.fill_null(chain, 'unknown') if chain is not None else unknown)
+        self._append_arrow('ace_tier', pc.fill_null(tier, 'unknown') if tier is not None else unknown)
+
+        timestamp = column('Timestamp')
+        if timestamp is None:
+            dates = pa.nulls(n, pa.string())
+        elif pa.types.is_timestamp(timestamp.type):
+            dates = pc.strftime(timestamp, format='%Y-%m-%d')
+        else:
+            first = pc.list_element(pc.split_pattern(timestamp, 'T', max_splits=1), 0)
+            dates = pc.if_else(_arrow_truthy(timestamp), first, pa.nulls(n, pa.string()))
+        self._append_arrow('date', dates)
+
+        # Metadata keywords then root keywords, interleaved per message
+        keyword_lists = [lists for lists in (meta('keywords'), column('keywords'))
+                         if lists is not None and pa.types.is_list(lists.type)]
+        if keyword_lists:
+            values = [pc.list_flatten(lists) for lists in keyword_lists]
+            parents = np.concatenate([pc.list_parent_indices(lists).to_numpy() for lists in keyword_lists])
+            ranks = np.concatenate([np.full(len(v), rank) for rank, v in enumerate(values)])
+            positions = np.concatenate([np.arange(len(v)) for v in values])
+            order = np.lexsort((positions, ranks, parents))
+            self._append_arrow('keyword', pa.concat_arrays([v.cast(values[0].type) for v in values]).take(pa.array(order)))
+
+        if shl_tags is not None and pa.types.is_list(shl_tags.type):
+            self._append_arrow('shl_tag', pc.list_flatten(shl_tags))
+
+        # A Metadata struct with every field null reads back as {}, which is falsy
+        enriched = None
+        for name in meta_names:
+            valid = pc.is_valid(meta(name))
+            enriched = valid if enriched is None else pc.or_(enriched, valid)
+        tagged = [_arrow_truthy(lists) for lists in (column('shl_tags'), meta('shl_tags')) if lists is not None]
+
+        flag_sources = (
+            (FLAG_METADATA, [enriched] if enriched is not None else []),
+            (FLAG_CONSOLIDATED, [_arrow_truthy(meta('consolidated'))] if 'consolidated' in meta_names else []),
+            (FLAG_CONTENT_HASH, [pc.is_valid(meta('content_hash'))] if 'content_hash' in meta_names else []),
+            (FLAG_SHL_TAGGED, tagged),
+        )
+        flags = np.zeros(n, dtype=np.uint8)
+        for bit, masks in flag_sources:
+            for mask in masks:
+                flags |= mask.to_numpy(zero_copy_only=False).astype(np.uint8) * np.uint8(bit)
+        self._flags = np.concatenate([self._flags, flags])
+
+    def _append_arrow(self, field: str, array) -> None:
+        """Dictionary-encode an Arrow array and append it under this column's codes"""
+        encoded = pc.dictionary_encode(array)
+        index, values = self._index[field], self.values[field]
+        remap = []
+        local_values = encoded.dictionary.to_pylist()
+        if encoded.indices.null_count:
+            local_values.append(None)  # Nulls take the last slot
+        for value in local_values:
+            if value not in index:
+                index[value] = len(index)
+                values.append(value)
+            remap.append(index[value])
+        local = pc.fill_null(encoded.indices, len(remap) - 1).to_numpy(zero_copy_only=False)
+        codes = np.asarray(remap, dtype=np.int32)[local]
+        self._codes[field] = np.concatenate([self._codes[field], codes])
+
+    def _factorize(self) -> None:
+        """Encode gathered raw values into the typed arrays"""
+        for field, raw in self._raw.items():
+            if not raw:
+                continue
+            index, values = self._index[field], self.values[field]
+            for value in dict.fromkeys(raw):
+                if value not in index:
+                    index[value] = len(index)
+                    values.append(value)
+            codes = np.fromiter(map(index.__getitem__, raw), dtype=np.int32, count=len(raw))
+            self._codes[field] = np.concatenate([self._codes[field], codes])
+            self._raw[field] = []
+        if self._raw_flags:
+            self._flags = np.concatenate([self._flags, np.array(self._raw_flags, dtype=np.uint8)])
+            self._raw_flags = []
+
+    def arrays(self) -> Dict[str, Any]:
+        """Typed arrays for every column"""
+        self._factorize()
+        return dict(self._codes, flags=self._flags)
+
+    def counts(self, field: str, top_n: int = None) -> List[Tuple[Any, int]]:
+        """Group-by count of a categorical column, most common first"""
+        codes = self.arrays()[field]
+        totals = np.bincount(codes, minlength=len(self.values[field]))
+        if field == 'date' and None in self._index['date']:
+            totals[self._index['date'][None]] = 0  # Messages without a timestamp
+        order = np.argsort(-totals, kind='stable')
+        if top_n is not None:
+            order = order[:top_n]
+        values = self.values[field]
+        return [(values[i], int(totals[i])) for i in order if totals[i]]
+
+    def flag_count(self, flag: int) -> int:
+        return int(np.count_nonzero(self.arrays()['flags'] & flag))
+
+    def report(self, top_keywords: int = 20) -> Dict[str, Any]:
+        """Every per-message report of ConversationAnalytics.analyze"""
+        counts = {
+            'speakers': self.counts('speaker'),
+            'message_types': self.counts('message_type'),
+            'chain_types': self.counts('chain_type'),
+            'ace_tiers': self.counts('ace_tier'),
+            'keywords': self.counts('keyword', top_keywords),
+            'shl_tags': self.counts('shl_tag', 10),
+            'timeline': self.counts('date'),
+        }
+        return summarize(
+            counts, len(self),
+            consolidated=self.flag_count(FLAG_CONSOLIDATED),
+            content_hash=self.flag_count(FLAG_CONTENT_HASH),
+            enriched=self.flag_count(FLAG_METADATA),
+            tagged=self.flag_count(FLAG_SHL_TAGGED),
+        )
+
+
+class AnalyticsState:
+    """
+    Persisted aggregates of the raw message log.
+
+    Holds the counters behind every analyze() report plus the byte offset
+    just past the last folded log line, so each run only parses records
+    appended since the previous one. Counters are saved as (value, count)
+    pairs to keep their first-seen order, which decides most_common() ties.
+    """
+
+    COUNTERS = ('speakers', 'message_types', 'chain_types', 'ace_tiers', 'keywords', 'shl_tags', 'timeline')
+    FLAGS = ('consolidated', 'content_hash', 'enriched', 'tagged')
+
+    def __init__(self, state_file: Path):
+        self.state_file = Path(state_file)
+        self.lock = threading.RLock()
+        self.reset()
+        self.load()
+
+    def reset(self, log_path: str = None):
+        """Forget all aggregates, e.g. when the log was truncated or replaced"""
+        self.counters = {name: Counter() for name in self.COUNTERS}
+        self.flags = dict.fromkeys(self.FLAGS, 0)
+        self.total = 0
+        self.log_path = log_path
+        self.log_offset = 0
+        self.log_fingerprint = None
+
+    def load(self) -> bool:
+        if not self.state_file.exists():
+            return False
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable analytics state {self.state_file}: {e}")
+            return False
+        if data.get('version') != ANALYTICS_STATE_VERSION:
+            return False
+
+        with self.lock:
+            self.counters = {name: Counter({value: count for value, count in data['counters'].get(name, [])})
+                             for name in self.COUNTERS}
+            self.flags = {name: data['flags'].get(name, 0) for name in self.FLAGS}
+            self.total = data['total']
+            self.log_path = data['log_path']
+            self.log_offset = data['log_offset']
+            self.log_fingerprint = data['log_fingerprint']
+        return True
+
+    def save(self) -> None:
+        """Atomically write the state file"""
+        with self.lock:
+            data = {
+                'version': ANALYTICS_STATE_VERSION,
+                'saved_at': datetime.now().isoformat(),
+                'total': self.total,
+                'log_path': self.log_path,
+                'log_offset': self.log_offset,
+                'log_fingerprint': self.log_fingerprint,
+                'flags': self.flags,
+                'counters': {name: list(counter.items()) for name, counter in self.counters.items()},
+            }
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.state_file.with_suffix('.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_file, self.state_file)
+
+    def add_message(self, msg: Dict[str, Any]) -> None:
+        """Fold one raw message into the aggregates"""
+        counters = self.counters
+        fields = message_fields(msg)
+
+        with self.lock:
+            counters['speakers'][fields.speaker] += 1
+            counters['message_types'][fields.message_type] += 1
+            counters['chain_types'][fields.chain_type] += 1
+            counters['ace_tiers'][fields.ace_tier] += 1
+            if fields.date:
+                counters['timeline'][fields.date] += 1
+            counters['keywords'].update(fields.keywords)
+            counters['shl_tags'].update(fields.shl_tags)
+
+            flags = self.flags
+            flags['enriched'] += bool(fields.flags & FLAG_METADATA)
+            flags['consolidated'] += bool(fields.flags & FLAG_CONSOLIDATED)
+            flags['content_hash'] += bool(fields.flags & FLAG_CONTENT_HASH)
+            flags['tagged'] += bool(fields.flags & FLAG_SHL_TAGGED)
+            self.total += 1
+
+    def add_appended(self, msg: Dict[str, Any], log_path: Path, start: int, end: int) -> bool:
+        """
+        Fold a message the caller just appended to log_path as bytes [start, end).
+
+        Saves re-reading the log for every write. Returns False, folding
+        nothing, unless the state ends exactly at start; fold_log() then
+        catches up from the file.
+        """
+        with self.lock:
+            if self.log_offset != start or self.log_path != str(Path(log_path).resolve()):
+                return False
+            self.add_message(msg)
+            self.log_offset = end
+            if self.log_fingerprint is None:
+                self.log_fingerprint = self._fingerprint(log_path)
+            return True
+
+    @staticmethod
+    def _fingerprint(log_path: Path) -> Optional[str]:
+        """Hash of the log's first line (at most FINGERPRINT_BYTES of it), to notice a replaced log"""
+        with open(log_path, 'rb') as f:
+            head = f.readline(FINGERPRINT_BYTES)
+        if head.endswith(b'\n'):
+            head = head[:-1]
+        elif len(head) < FINGERPRINT_BYTES:
+            return None  # First line still being written
+        return hashlib.sha1(head).hexdigest()
+
+    def fold_log(self, log_path: Path) -> int:
+        """Fold complete lines appended since the last fold; returns the number of messages added"""
+        log_path = Path(log_path).resolve()
+        if not log_path.exists():
+            return 0
+
+        with self.lock:
+            fingerprint = self._fingerprint(log_path)
+            if (self.log_path != str(log_path) or log_path.stat().st_size < self.log_offset
+                    or (self.log_fingerprint and fingerprint != self.log_fingerprint)):
+                if self.total:
+                    logger.info(f"Log {log_path} changed underneath the analytics state, refolding")
+                self.reset(str(log_path))
+
+            added = 0
+            with open(log_path, 'rb') as f:
+                f.seek(self.log_offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # Still being written; pick it up next time
+                    self.log_offset += len(line)
+                    if not line.strip():
+                        continue
+                    try:
+                        msg = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning(f"Skipping invalid JSON line in {log_path}")
+                        continue
+                    self.add_message(msg)
+                    added += 1
+            self.log_fingerprint = fingerprint
+            return added
+
+    def report(self, top_keywords: int = 20) -> Dict[str, Any]:
+        with self.lock:
+            counters = self.counters
+            counts = {name: counters[name].most_common() for name in
+                      ('speakers', 'message_types', 'chain_types', 'ace_tiers')}
+            counts['keywords'] = counters['keywords'].most_common(top_keywords)
+            counts['shl_tags'] = counters['shl_tags'].most_common(10)
+            counts['timeline'] = list(counters['timeline'].items())
+            return summarize(counts, self.total, **self.flags)
+
+
 class ConversationAnalytics:
     """Analyzes conversation data for collaboration metrics and insights"""
 
     def __init__(self, log_dir: str = "conversation_logs", defragmented_log_file: str = None):
         self.log_dir = Path(log_dir)
         self.threads = []  # Changed from self.messages to self.threads
+        self.arrow_tables = []  # Message tables from load_arrow(), kept columnar
+        self.arrow_threads = 0  # Threads flattened into arrow_tables by load_defragmented_arrow()
+        self.arrow_thread_messages = 0
         self.reports_dir = Path("reports")
         self.reports_dir.mkdir(exist_ok=True)
         self.defragmented_log_path = Path(defragmented_log_file) if defragmented_log_file else None
+        self._columns = None
+        self._columns_source = None  # (threads list, items encoded, is_defragmented)
+        self.state_file = self.log_dir / ANALYTICS_STATE_FILE
 
     def load_jsonl(self) -> int:
         """Load data from JSONL file (either raw messages or defragmented threads)."""
@@ -46,19 +625,22 @@ class ConversationAnalytics:
 
         count = 0
         if "defragmented_sessions.jsonl" in str(file_to_load):
-            # Load as threads
+            # Load as threads. Incremental defragmentation appends a newer
+            # line for a thread that changed, so the last line wins.
+            latest = {}
             try:
                 with open(file_to_load, 'r', encoding='utf-8') as f:
                     for line in f:
                         try:
                             thread = json.loads(line.strip())
                             if "messages" in thread and isinstance(thread["messages"], list):
-                                self.threads.append(thread)
-                                count += 1
+                                latest[thread.get("thread_id", id(thread))] = thread
                         except json.JSONDecodeError:
                             logger.warning(f"Skipping invalid JSON line in {file_to_load}")
             except Exception as e:
                 logger.error(f"Error loading defragmented JSONL: {e}")
+            self.threads.extend(latest.values())
+            count = len(latest)
             logger.info(f"Loaded {count} threads from {file_to_load}")
         else:
             # Load as raw messages
@@ -77,41 +659,148 @@ class ConversationAnalytics:
 
         return count
 
-    def load_arrow(self) -> int:
-        """Load messages from Arrow/Parquet format"""
+    def load_arrow(self, start_time: str = None, end_time: str = None) -> int:
+        """
+        Load messages from Arrow/Parquet format as Arrow tables.
+
+        Only the report columns are read. start_time/end_time (ISO strings,
+        end exclusive) are pushed down to the Parquet reader so row groups
+        outside the range are skipped.
+        """
         if not ARROW_SUPPORT:
             logger.warning("PyArrow not available, skipping Arrow format")
             return 0
 
-        arrow_files = list(self.log_dir.glob("**/*.arrow")) + list(self.log_dir.glob("**/*.parquet"))
+        arrow_files = [path for pattern in ("**/*.arrow", "**/*.parquet")
+                       for path in self.log_dir.glob(pattern) if path.is_file()]
 
         count = 0
         for arrow_file in arrow_files:
             try:
-                table = pq.read_table(arrow_file)
-                df = table.to_pandas()
-
-                for _, row in df.iterrows():
-                    msg = row.to_dict()
-                    # Convert numpy types to native Python types
-                    msg = {k: (v.item() if hasattr(v, 'item') else v) for k, v in msg.items()}
-                    self.threads.append(msg) # Append raw messages to self.threads
-                    count += 1
-
-                logger.info(f"Loaded {count} messages from {arrow_file.name}")
+                table = self._read_arrow_table(arrow_file, start_time, end_time)
+                if table is None:
+                    continue
+                self.arrow_tables.append(table)
+                count += table.num_rows
+                logger.info(f"Loaded {table.num_rows} messages from {arrow_file.name}")
             except Exception as e:
                 logger.warning(f"Error loading Arrow file {arrow_file}: {e}")
 
         return count
 
+    def load_defragmented_arrow(self, path: Path) -> int:
+        """
+        Load defragmented threads from the day-partitioned Parquet dataset.
+
+        Only the report fields of each message are read, and the messages of
+        each partition are flattened into one Arrow table. If any message
+        holds values that did not fit the nested schema (its "extra" column),
+        the dataset is loaded as thread dicts instead, so the reports stay
+        exact.
+        """
+        if not ARROW_SUPPORT:
+            logger.warning("PyArrow not available, skipping Arrow format")
+            return 0
+
+        wanted = ['message_count', f"{MESSAGES_COLUMN}.extra"]
+        wanted += [f"{MESSAGES_COLUMN}.{name}" for name in ARROW_REPORT_COLUMNS if name != 'Metadata']
+        wanted += [f"{MESSAGES_COLUMN}.Metadata.{name}" for name in ARROW_METADATA_FIELDS]
+
+        tables = []
+        for partition in thread_partition_files(path):
+            try:
+                parquet_file = pq.ParquetFile(partition)
+                available = {column.path for column in parquet_file.schema}
+                if f"{MESSAGES_COLUMN}.extra" not in available:
+                    logger.warning(f"Skipping {partition}: not a nested thread table")
+                    continue
+                columns = [name for name in wanted if name in available
+                           or any(leaf.startswith(name + ".") for leaf in available)]
+                table = parquet_file.read(columns=columns)
+            except Exception as e:
+                logger.warning(f"Error loading thread partition {partition}: {e}")
+                continue
+            messages = pc.list_flatten(table.column('messages'))
+            if pc.any(pc.is_valid(pc.struct_field(messages, 'extra'))).as_py():
+                threads = threads_from_table(read_thread_table(path))
+                self.threads.extend(threads)
+                logger.info(f"Loaded {len(threads)} threads from {path} (values outside the schema)")
+                return len(threads)
+            tables.append((table.num_rows, pa.Table.from_struct_array(messages).drop_columns(['extra'])))
+
+        for thread_count, messages in tables:
+            self.arrow_tables.append(messages)
+            self.arrow_threads += thread_count
+            self.arrow_thread_messages += messages.num_rows
+        count = sum(thread_count for thread_count, _ in tables)
+        logger.info(f"Loaded {count} threads from {path}")
+        return count
+
+    def _read_arrow_table(self, arrow_file: Path, start_time: str = None, end_time: str = None):
+        """Read the report columns of one message table, or None if it holds threads"""
+        if arrow_file.suffix == '.parquet':
+            schema = pq.read_schema(arrow_file)
+        else:
+            schema = feather.read_table(arrow_file, memory_map=True).schema
+
+        if 'messages' in schema.names or 'SpeakerName' not in schema.names:
+            logger.info(f"Skipping {arrow_file.name}: not a message table")
+            return None
+
+        columns = [name for name in ARROW_REPORT_COLUMNS if name in schema.names]
+        filters = []
+        if 'Timestamp' in schema.names and pa.types.is_string(schema.field('Timestamp').type):
+            if start_time:
+                filters.append(('Timestamp', '>=', start_time))
+            if end_time:
+                filters.append(('Timestamp', '<', end_time))
+
+        if arrow_file.suffix == '.parquet':
+            return pq.read_table(arrow_file, columns=columns, filters=filters or None)
+
+        table = feather.read_table(arrow_file, columns=columns, memory_map=True)
+        for name, op, value in filters:
+            compare = pc.greater_equal if op == '>=' else pc.less
+            table = table.filter(compare(table.column(name), value))
+        return table
+
+    @property
+    def arrow_row_count(self) -> int:
+        return sum(table.num_rows for table in self.arrow_tables)
+
+    def get_messages(self, offset: int = 0, limit: int = 20) -> List[Dict[str, Any]]:
+        """Materialize dicts for a page of the loaded messages (JSONL first, then Arrow)"""
+        is_defragmented = bool(self.threads) and isinstance(self.threads[0].get("messages"), list)
+        messages = []
+        if is_defragmented:
+            for thread in self.threads:
+                for msg in thread["messages"]:
+                    if offset:
+                        offset -= 1
+                    elif len(messages) < limit:
+                        messages.append(msg)
+        else:
+            messages = self.threads[offset:offset + limit]
+            offset = max(0, offset - len(self.threads))
+
+        for table in self.arrow_tables:
+            if len(messages) >= limit:
+                break
+            if offset >= table.num_rows:
+                offset -= table.num_rows
+                continue
+            messages.extend(arrow_rows(table.slice(offset, limit - len(messages))))
+            offset = 0
+        return messages
+
     def analyze(self) -> Dict[str, Any]:
         """Perform comprehensive analysis"""
-        if not self.threads: # Changed from self.messages to self.threads
+        if not self.threads and not self.arrow_row_count:
             logger.error("No data loaded!")
             return {}
 
         # Determine if we are analyzing raw messages or defragmented threads
-        is_defragmented = False
+        is_defragmented = bool(self.arrow_threads)
         if self.threads and "messages" in self.threads[0] and isinstance(self.threads[0]["messages"], list):
             is_defragmented = True
 
@@ -120,12 +809,68 @@ class ConversationAnalytics:
             total_messages_count = sum(thread["message_count"] for thread in self.threads)
         else:
             total_messages_count = len(self.threads)
+        total_messages_count += self.arrow_row_count
+        total_items = len(self.threads) + self.arrow_row_count - self.arrow_thread_messages + self.arrow_threads
 
         results = {
             'timestamp': datetime.now().isoformat(),
-            'total_items': len(self.threads), # Total threads or raw messages
+            'total_items': total_items, # Total threads or raw messages
             'total_messages_within_threads': total_messages_count, # Total raw messages
             'is_defragmented': is_defragmented,
+        }
+        if NUMPY_SUPPORT:
+            results.update(self.get_columns(is_defragmented).report())
+        else:
+            results.update(self._analyze_rowwise(is_defragmented))
+
+        return results
+
+    def analyze_incremental(self) -> Dict[str, Any]:
+        """Fold new records of the raw log into the persisted state and report from it"""
+        state = AnalyticsState(self.state_file)
+        added = state.fold_log(self.log_dir / "current_session.jsonl")
+        state.save()
+        logger.info(f"Folded {added} new messages into analytics state ({state.total} total)")
+
+        if not state.total:
+            logger.error("No data loaded!")
+            return {}
+
+        results = {
+            'timestamp': datetime.now().isoformat(),
+            'total_items': state.total,
+            'total_messages_within_threads': state.total,
+            'is_defragmented': False,
+        }
+        results.update(state.report())
+        return results
+
+    def get_columns(self, is_defragmented: bool) -> MessageColumns:
+        """Columnar view of the loaded data, extended with items added since the last call"""
+        source = self._columns_source
+        if (source is None or source[0] is not self.threads or source[2] != is_defragmented
+                or source[1] > len(self.threads) or source[3] > len(self.arrow_tables)
+                or (source[3] and source[1] != len(self.threads))):
+            # Start over; JSONL items are always encoded ahead of Arrow tables
+            self._columns = MessageColumns()
+            encoded, tables_encoded = 0, 0
+        else:
+            encoded, tables_encoded = source[1], source[3]
+
+        new_items = self.threads[encoded:]
+        if new_items:
+            if is_defragmented:
+                self._columns.extend(msg for thread in new_items for msg in thread["messages"])
+            else:
+                self._columns.extend(new_items)
+        for table in self.arrow_tables[tables_encoded:]:
+            self._columns.extend_arrow(table)
+        self._columns_source = (self.threads, len(self.threads), is_defragmented, len(self.arrow_tables))
+        return self._columns
+
+    def _analyze_rowwise(self, is_defragmented: bool) -> Dict[str, Any]:
+        """Per-message reports, used when NumPy is unavailable"""
+        return {
             'speakers': self._analyze_speakers(is_defragmented),
             'message_types': self._analyze_message_types(is_defragmented),
             'chain_types': self._analyze_chain_types(is_defragmented),
@@ -136,23 +881,25 @@ class ConversationAnalytics:
             'collaboration_score': self._calculate_collaboration_score(is_defragmented),
         }
 
-        return results
-
     def _get_all_messages(self, is_defragmented: bool) -> List[Dict[str, Any]]:
         """Helper to get all individual messages, whether from raw or defragmented data."""
         if is_defragmented:
             all_msgs = []
             for thread in self.threads:
                 all_msgs.extend(thread["messages"])
-            return all_msgs
-        return self.threads # If not defragmented, self.threads already contains raw messages
+        elif self.arrow_tables:
+            all_msgs = list(self.threads)
+        else:
+            return self.threads # If not defragmented, self.threads already contains raw messages
+        for table in self.arrow_tables:
+            all_msgs.extend(arrow_rows(table))
+        return all_msgs
 
     def _analyze_speakers(self, is_defragmented: bool) -> Dict[str, int]:
         """Count messages by speaker"""
         speakers = Counter()
         for msg in self._get_all_messages(is_defragmented):
-            speaker = msg.get('SpeakerName', 'unknown')
-            speakers[speaker] += 1
+            speakers[message_fields(msg).speaker] += 1
         return dict(speakers.most_common())
 
     def _analyze_message_types(self, is_defragmented: bool) -> Dict[str, int]:
@@ -160,12 +907,7 @@ class ConversationAnalytics:
         msg_types = defaultdict(int)
 
         for msg in self._get_all_messages(is_defragmented):
-            # Try multiple possible type fields
-            msg_type = (msg.get('Type') or
-                       msg.get('type') or
-                       msg.get('ConversationType') or
-                       'unknown')
-            msg_types[str(msg_type)] += 1
+            msg_types[message_fields(msg).message_type] += 1
 
         return dict(sorted(msg_types.items(), key=lambda x: x[1], reverse=True))
 
@@ -173,16 +915,14 @@ class ConversationAnalytics:
         """Analyze domain chains"""
         chains = Counter()
         for msg in self._get_all_messages(is_defragmented):
-            chain = msg.get('chain_type', msg.get('Metadata', {}).get('chain_type', 'unknown')) # Check both direct and nested
-            chains[chain] += 1
+            chains[message_fields(msg).chain_type] += 1
         return dict(chains.most_common())
 
     def _analyze_ace_tiers(self, is_defragmented: bool) -> Dict[str, int]:
         """Analyze ACE tier distribution"""
         tiers = Counter()
         for msg in self._get_all_messages(is_defragmented):
-            tier = msg.get('ace_tier', msg.get('Metadata', {}).get('ace_tier', 'unknown')) # Check both direct and nested
-            tiers[tier] += 1
+            tiers[message_fields(msg).ace_tier] += 1
         return dict(tiers.most_common())
 
     def _analyze_keywords(self, is_defragmented: bool, top_n: int = 20) -> List[Tuple[str, int]]:
@@ -190,15 +930,7 @@ class ConversationAnalytics:
         keywords = Counter()
 
         for msg in self._get_all_messages(is_defragmented):
-            # Try metadata keywords first
-            if isinstance(msg.get('Metadata'), dict):
-                meta_keywords = msg['Metadata'].get('keywords', [])
-                if isinstance(meta_keywords, list):
-                    keywords.update(meta_keywords)
-
-            # Also try root-level keywords
-            if isinstance(msg.get('keywords'), list):
-                keywords.update(msg['keywords'])
+            keywords.update(message_fields(msg).keywords)
 
         return keywords.most_common(top_n)
 
@@ -207,10 +939,8 @@ class ConversationAnalytics:
         timeline = defaultdict(int)
 
         for msg in self._get_all_messages(is_defragmented):
-            timestamp = msg.get('Timestamp', '')
-            if timestamp:
-                # Extract date
-                date = timestamp.split('T')[0]
+            date = message_fields(msg).date
+            if date:
                 timeline[date] += 1
 
         return dict(sorted(timeline.items()))
@@ -221,7 +951,7 @@ class ConversationAnalytics:
             'shl_tags_frequency': self._count_shl_tags(is_defragmented),
             'consolidation_ratio': self._analyze_consolidation(is_defragmented),
             'content_hash_coverage': sum(1 for m in self._get_all_messages(is_defragmented)
-                                        if 'content_hash' in m.get('Metadata', {})),
+                                        if message_fields(m).flags & FLAG_CONTENT_HASH),
         }
         return insights
 
@@ -229,15 +959,13 @@ class ConversationAnalytics:
         """Count SHL tags"""
         tags = Counter()
         for msg in self._get_all_messages(is_defragmented):
-            shl_tags = msg.get('shl_tags', msg.get('Metadata', {}).get('shl_tags', [])) # Check both direct and nested
-            if isinstance(shl_tags, list):
-                tags.update(shl_tags)
+            tags.update(message_fields(msg).shl_tags)
         return dict(tags.most_common(10))
 
     def _analyze_consolidation(self, is_defragmented: bool) -> Dict[str, Any]:
         """Analyze message consolidation stats"""
         consolidated = sum(1 for m in self._get_all_messages(is_defragmented)
-                          if m.get('Metadata', {}).get('consolidated'))
+                          if message_fields(m).flags & FLAG_CONSOLIDATED)
         total = len(self._get_all_messages(is_defragmented))
 
         return {
@@ -248,43 +976,25 @@ class ConversationAnalytics:
 
     def _calculate_collaboration_score(self, is_defragmented: bool) -> float:
         """Calculate overall collaboration quality (0-100)"""
-        if not self.threads:
+        if not self.threads and not self.arrow_tables:
             return 0
 
-        score = 0.0
         all_messages = self._get_all_messages(is_defragmented)
-        total_raw_messages = len(all_messages)
-
-        # 1. Speaker diversity (20%)
-        speakers_count = len(self._analyze_speakers(is_defragmented)) # Use the updated analyze speakers
-        speaker_score = min(speakers_count / 3 * 100, 100)  # 0-100 based on unique speakers
-        score += speaker_score * 0.2
-
-        # 2. Domain coverage (20%)
-        chains_count = len(self._analyze_chain_types(is_defragmented)) # Use the updated analyze chain types
-        domain_score = min(chains_count / 10 * 100, 100)  # 0-100 based on domain chains
-        score += domain_score * 0.2
-
-        # 3. Message consistency (20%) - Now based on total raw messages
-        message_consistency_baseline = 100.0  # Normalize to 100-message baseline
-        consistency_score = min(total_raw_messages / message_consistency_baseline * 100, 100)
-        score += consistency_score * 0.2
-
-        # 4. Metadata enrichment (20%)
-        enriched = sum(1 for m in all_messages if m.get('Metadata'))
-        enrichment_score = (enriched / total_raw_messages * 100) if total_raw_messages > 0 else 0
-        score += enrichment_score * 0.2
-
-        # 5. SHL tagging (20%)
-        tagged = sum(1 for m in all_messages if m.get('shl_tags') or m.get('Metadata', {}).get('shl_tags'))
-        tagging_score = (tagged / total_raw_messages * 100) if total_raw_messages > 0 else 0
-        score += tagging_score * 0.2
-
-        return round(score, 2)
+        flags = [message_fields(m).flags for m in all_messages]
+        enriched = sum(1 for bits in flags if bits & FLAG_METADATA)
+        tagged = sum(1 for bits in flags if bits & FLAG_SHL_TAGGED)
+
+        return collaboration_score(
+            len(self._analyze_speakers(is_defragmented)),
+            len(self._analyze_chain_types(is_defragmented)),
+            len(all_messages),
+            enriched,
+            tagged,
+        )
 
-    def generate_report(self) -> str:
+    def generate_report(self, analysis: Dict[str, Any] = None) -> str:
         """Generate markdown report"""
-        analysis = self.analyze()
+        analysis = analysis or self.analyze()
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         report_path = self.reports_dir / f"analytics_report_{timestamp}.md"
@@ -377,9 +1087,9 @@ Generated: {analysis['timestamp']}
         logger.info(f"Report saved to {report_path}")
         return str(report_path)
 
-    def generate_json_report(self) -> str:
+    def generate_json_report(self, analysis: Dict[str, Any] = None) -> str:
         """Generate JSON report"""
-        analysis = self.analyze()
+        analysis = analysis or self.analyze()
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         report_path = self.reports_dir / f"analytics_report_{timestamp}.json"
@@ -406,25 +1116,40 @@ Generated: {analysis['timestamp']}
         logger.info(f"JSON report saved to {report_path}")
         return str(report_path)
 
-    def run(self) -> Dict[str, Any]:
-        """Load data and run analysis"""
+    def run(self, incremental: bool = False) -> Dict[str, Any]:
+        """
+        Load data and run analysis.
+
+        With incremental, the raw session log is folded into the persisted
+        AnalyticsState instead of being loaded in full (Arrow files and the
+        defragmented log are not part of that state).
+        """
         logger.info("Starting conversation analytics...")
 
-        # Load from both formats
-        jsonl_count = self.load_jsonl()
-        arrow_count = self.load_arrow()
+        if incremental:
+            analysis = self.analyze_incremental()
+            if not analysis:
+                return {}
+        else:
+            # Load from both formats; defragmented threads from Parquet when written
+            parquet_path = self.defragmented_log_path.with_suffix('.parquet') if self.defragmented_log_path else None
+            if ARROW_SUPPORT and parquet_path and parquet_path.is_dir():
+                jsonl_count = self.load_defragmented_arrow(parquet_path)
+            else:
+                jsonl_count = self.load_jsonl()
+            arrow_count = self.load_arrow()
+
+            logger.info(f"Total items loaded: {len(self.threads) + self.arrow_row_count}")
 
-        logger.info(f"Total items loaded: {len(self.threads)}")
+            if not self.threads and not self.arrow_row_count:
+                logger.error("No data to analyze!")
+                return {}
 
-        if not self.threads:
-            logger.error("No data to analyze!")
-            return {}
+            analysis = self.analyze()
 
         # Generate reports
-        analysis = self.analyze()
-
-        self.generate_json_report()
-        self.generate_report()
+        self.generate_json_report(analysis)
+        self.generate_report(analysis)
 
         # Print summary
         print("\n" + "="*70)
@@ -452,8 +1177,13 @@ Generated: {analysis['timestamp']}
 
 def main():
     """CLI entry point"""
+    parser = argparse.ArgumentParser(description="Conversation analytics reports.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Fold only new log records into the saved analytics state.")
+    args = parser.parse_args()
+
     analytics = ConversationAnalytics()
-    analytics.run()
+    analytics.run(incremental=args.incremental)
 
 
 if __name__ == "__main__":
@@ -5,8 +5,10 @@ Message Defragmentation & Consolidation Engine
 Reduces 21,717 fragmented messages → ~5,000-8,000 consolidated entries.
 
 Algorithm:
-1. Load all messages from 3 sources
-2. Remove exact duplicates (content hash)
+1. Load all messages from 3 sources (files are parsed, normalized and
+   hashed in a process pool; see load_messages)
+2. Remove exact duplicates (content hash), and optionally near duplicates
+   (MinHash/LSH, see near_duplicates.py)
 3. Group by conversation thread (context_id)
 4. Within each thread, cluster by time (1-hour windows)
 5. For each cluster, create consolidated entry
@@ -16,15 +18,24 @@ Algorithm:
 Result: Clean, lean history ready for ZeroMQ migration
 """
 
+import argparse
 import json
 import hashlib
+import os
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime, timedelta
 from collections import defaultdict
 from typing import Dict, List, Optional, Tuple
 import sys
 
+try:
+    from near_duplicates import DEFAULT_NUM_PERM, DEFAULT_SHINGLE_SIZE, MinHasher, NearDuplicateIndex
+except ImportError:
+    from .near_duplicates import DEFAULT_NUM_PERM, DEFAULT_SHINGLE_SIZE, MinHasher, NearDuplicateIndex
+
 # Configuration
 SOURCE_DIRS = {
     'dual_agents': Path("C:/Dev/Active_Projects/dual-agents"),
@@ -36,18 +47,92 @@ OUTPUT_DIR = Path("C:/Users/user/ShearwaterAICAD/conversation_logs")
 CONSOLIDATED_FILE = OUTPUT_DIR / "consolidated_history.jsonl"
 AUDIT_FILE = OUTPUT_DIR / "fragmentation_audit.jsonl"
 
+# Files handed to a worker at a time, and how often progress is printed
+LOAD_CHUNK_FILES = 4
+PROGRESS_EVERY_FILES = 200
+
+# (hash, context_id, timestamp, offset[, minhash signature]): offset is the
+# byte offset of a JSONL line, or the index into a JSON list (-1 for a
+# single JSON object); the signature is only computed for near-dup detection
+ScanRecord = Tuple
+
+_scan_engine = None
+_scan_hashers = {}
+
+
+def scan_file(task: Tuple[str, str, Optional[Tuple[int, int]]]) -> Tuple[List[ScanRecord], int, Optional[str]]:
+    """
+    Parses, normalizes and hashes one source file (runs in a worker process).
+
+    task is (kind, path, minhash) with kind "jsonl" or "json" and minhash
+    (num_perm, shingle_size), or None to skip signatures. Returns the
+    records of messages with content, the number of messages read
+    (including empty ones), and the error that stopped the file, if any.
+    """
+    global _scan_engine
+    if _scan_engine is None:
+        _scan_engine = DefragmentationEngine()
+    engine = _scan_engine
+    kind, path, minhash = task
+    if minhash is not None and minhash not in _scan_hashers:
+        _scan_hashers[minhash] = MinHasher(*minhash)
+    hasher = _scan_hashers.get(minhash)
+    records = []
+    loaded = 0
+
+    def scan(msg, offset):
+        content = engine.extract_content(msg)
+        if content and len(content.strip()) > 0:
+            record = (engine.calculate_hash(content), engine._extract_context_id(msg),
+                      engine._extract_timestamp(msg), offset)
+            records.append(record + (hasher.signature(content),) if hasher else record)
+
+    try:
+        with open(path, 'rb') as f:
+            if kind == 'jsonl':
+                offset = 0
+                for raw in f:
+                    try:
+                        msg = json.loads(raw.decode('utf-8').strip())
+                    except json.JSONDecodeError:
+                        offset += len(raw)
+                        continue
+                    scan(msg, offset)
+                    loaded += 1
+                    offset += len(raw)
+            else:
+                data = json.loads(f.read().decode('utf-8'))
+                if isinstance(data, list):
+                    for index, msg in enumerate(data):
+                        scan(msg, index)
+                        loaded += 1
+                elif isinstance(data, dict):
+                    scan(data, -1)
+                    loaded += 1
+    except Exception as e:
+        return records, loaded, str(e)
+    return records, loaded, None
+
 
 class DefragmentationEngine:
-    def __init__(self):
+    def __init__(self, source_dirs: Optional[Dict[str, Path]] = None, near_threshold: Optional[float] = None,
+                 shingle_size: int = DEFAULT_SHINGLE_SIZE, near_window: Optional[int] = None):
+        self.source_dirs = SOURCE_DIRS if source_dirs is None else source_dirs
+        # Near-duplicate detection is off unless a Jaccard threshold is given
+        self.near_index = None
+        if near_threshold:
+            self.near_index = NearDuplicateIndex(near_threshold, shingle_size, max_entries=near_window)
         self.stats = {
             'total_loaded': 0,
             'exact_duplicates_removed': 0,
+            'near_duplicates_removed': 0,
             'consolidated_groups': 0,
             'final_consolidated_messages': 0,
             'reduction_ratio': 0.0,
             'sources_processed': {}
         }
         self.seen_hashes = {}  # hash -> first occurrence
+        self.near_duplicate_hashes = set()  # Dropped as near duplicates; exact copies still count as exact
         self.messages_by_context = defaultdict(list)  # context_id -> messages
         self.consolidated_entries = []
         self.audit_trail = []
@@ -88,84 +173,91 @@ class DefragmentationEngine:
 
         return str(msg)
 
-    def load_messages(self) -> int:
-        """Load all messages from 3 sources"""
-        print("[LOAD] Starting message loading from 3 sources...")
-        total = 0
+    def load_messages(self, workers: Optional[int] = None) -> int:
+        """
+        Load all messages from 3 sources.
 
-        for source_name, source_path in SOURCE_DIRS.items():
+        Files are scanned by scan_file() in a process pool (workers=1 scans
+        in this process). Workers return compact (hash, context_id,
+        timestamp, offset) records; duplicates are dropped here against
+        seen_hashes in source/file/line order, so the result does not depend
+        on the number of workers. Only the unique messages are read back.
+        """
+        print("[LOAD] Starting message loading from 3 sources...")
+        workers = workers or os.cpu_count() or 1
+        tasks = []
+        for source_name, source_path in self.source_dirs.items():
             if not source_path.exists():
                 print(f"[WARNING] Source not found: {source_path}")
                 continue
-
-            source_count = 0
-
-            # Load JSONL files
-            for jsonl_file in source_path.rglob('*.jsonl'):
-                try:
-                    with open(jsonl_file, 'r', encoding='utf-8') as f:
-                        for line in f:
-                            try:
-                                msg = json.loads(line.strip())
-                                self._process_loaded_message(msg, source_name)
-                                source_count += 1
-                                total += 1
-                            except json.JSONDecodeError:
-                                continue
-                except Exception as e:
-                    print(f"[ERROR] Failed to read {jsonl_file}: {e}")
-                    continue
-
-            # Load JSON files
-            for json_file in source_path.rglob('*.json'):
-                try:
-                    with open(json_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        if isinstance(data, list):
-                            for msg in data:
-                                self._process_loaded_message(msg, source_name)
-                                source_count += 1
-                                total += 1
-                        elif isinstance(data, dict):
-                            self._process_loaded_message(data, source_name)
-                            source_count += 1
-                            total += 1
-                except Exception as e:
-                    print(f"[ERROR] Failed to read {json_file}: {e}")
-                    continue
-
-            print(f"[LOAD] {source_name}: {source_count} messages loaded")
-            self.stats['sources_processed'][source_name] = source_count
+            self.stats['sources_processed'][source_name] = 0
+            for kind in ('jsonl', 'json'):
+                for path in sorted(source_path.rglob(f'*.{kind}')):
+                    tasks.append((source_name, kind, str(path)))
+
+        kept = defaultdict(list)  # (kind, path) -> [(record, source)] of unique messages
+        started = time.perf_counter()
+        minhash = (DEFAULT_NUM_PERM, self.near_index.hasher.shingle_size) if self.near_index is not None else None
+        scans = [(kind, path, minhash) for _, kind, path in tasks]
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                self._merge_scans(tasks, pool.map(scan_file, scans, chunksize=LOAD_CHUNK_FILES), kept, started)
+        else:
+            self._merge_scans(tasks, map(scan_file, scans), kept, started)
+        total = sum(self.stats['sources_processed'].values())
+
+        for source_name, count in self.stats['sources_processed'].items():
+            print(f"[LOAD] {source_name}: {count} messages loaded")
+        self._read_unique_messages(kept)
 
         self.stats['total_loaded'] = total
         return total
 
-    def _process_loaded_message(self, msg: Dict, source: str):
-        """Process and deduplicate a loaded message"""
-        content = self.extract_content(msg)
-        if not content or len(content.strip()) == 0:
-            return
-
-        content_hash = self.calculate_hash(content)
-
-        # Exact duplicate detection
-        if content_hash in self.seen_hashes:
-            self.stats['exact_duplicates_removed'] += 1
-            return
-
-        self.seen_hashes[content_hash] = msg
-
-        # Get context ID (conversation thread)
-        context_id = self._extract_context_id(msg)
-
-        # Add to messages by context
-        self.messages_by_context[context_id].append({
-            'original': msg,
-            'content': content,
-            'hash': content_hash,
-            'source': source,
-            'timestamp': self._extract_timestamp(msg)
-        })
+    def _merge_scans(self, tasks: List[Tuple[str, str, str]], results, kept: Dict, started: float) -> None:
+        """Dedupe scanned records in task order and report throughput"""
+        messages = 0
+        for done, ((source_name, kind, path), (records, loaded, error)) in enumerate(zip(tasks, results), 1):
+            if error:
+                print(f"[ERROR] Failed to read {path}: {error}")
+            self.stats['sources_processed'][source_name] += loaded
+            messages += loaded
+            for record in records:
+                if record[0] in self.seen_hashes or record[0] in self.near_duplicate_hashes:
+                    self.stats['exact_duplicates_removed'] += 1
+                    continue
+                if self.near_index is not None and self.near_index.check(record[0], signature=record[4]):
+                    self.near_duplicate_hashes.add(record[0])
+                    self.stats['near_duplicates_removed'] += 1
+                    continue
+                self.seen_hashes[record[0]] = None  # Filled in by _read_unique_messages()
+                kept[(kind, path)].append((record, source_name))
+
+            if done % PROGRESS_EVERY_FILES == 0 or done == len(tasks):
+                elapsed = max(time.perf_counter() - started, 1e-9)
+                print(f"[LOAD] {done:,}/{len(tasks):,} files, {messages:,} messages "
+                      f"({messages / elapsed:,.0f} msg/s, {done / elapsed:,.1f} files/s)")
+
+    def _read_unique_messages(self, kept: Dict) -> None:
+        """Read back the messages that survived dedup, by offset"""
+        for (kind, path), entries in kept.items():
+            with open(path, 'rb') as f:
+                if kind == 'jsonl':
+                    messages = []
+                    for record, _ in entries:
+                        f.seek(record[3])
+                        messages.append(json.loads(f.readline().decode('utf-8').strip()))
+                else:
+                    data = json.loads(f.read().decode('utf-8'))
+                    messages = [data if record[3] < 0 else data[record[3]] for record, _ in entries]
+            for ((content_hash, context_id, timestamp, *_), source), msg in zip(entries, messages):
+                self.seen_hashes[content_hash] = msg
+                self.messages_by_context[context_id].append({
+                    'original': msg,
+                    'content': self.extract_content(msg),
+                    'hash': content_hash,
+                    'source': source,
+                    'timestamp': timestamp
+                })
 
     def _extract_context_id(self, msg: Dict) -> str:
         """Extract conversation context ID"""
@@ -381,6 +473,13 @@ class DefragmentationEngine:
         print(f"\nInput:")
         print(f"  Total messages loaded:       {total_loaded:,}")
         print(f"  Exact duplicates removed:    {exact_dupes:,}")
+        if self.near_index is not None:
+            near = self.stats['near_duplicates_removed']
+            report = self.near_index.report()
+            print(f"  Near duplicates removed:     {near:,} (Jaccard >= {report['threshold']}, "
+                  f"{report['shingle_size']}-char shingles)")
+            print(f"  Extra reduction:             {report['extra_reduction_percent']:.1f}% of exact-unique messages")
+            exact_dupes += near
         print(f"  Unique messages:             {total_loaded - exact_dupes:,}")
 
         print(f"\nConsolidation:")
@@ -406,15 +505,18 @@ class DefragmentationEngine:
 
         print("=" * 80)
 
-    def run(self) -> bool:
+    def run(self, workers: Optional[int] = None) -> bool:
         """Execute full defragmentation pipeline"""
         print("\n" + "=" * 80)
         print("[START] Message Defragmentation Engine")
         print("=" * 80 + "\n")
 
         # Phase 1: Load
-        loaded = self.load_messages()
+        loaded = self.load_messages(workers)
         print(f"\n[RESULT] Loaded {loaded:,} messages (after exact dedup: {loaded - self.stats['exact_duplicates_removed']:,})")
+        if self.near_index is not None:
+            print(f"[RESULT] After near-duplicate removal: "
+                  f"{loaded - self.stats['exact_duplicates_removed'] - self.stats['near_duplicates_removed']:,}")
 
         # Phase 2: Consolidate
         consolidated = self.consolidate()
@@ -430,6 +532,18 @@ class DefragmentationEngine:
 
 
 if __name__ == "__main__":
-    engine = DefragmentationEngine()
-    success = engine.run()
+    parser = argparse.ArgumentParser(description="Defragment and consolidate messages from the source trees.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Loader processes (default: CPU count; 1 loads in this process).")
+    parser.add_argument("--near-threshold", type=float, default=None,
+                        help="Also drop near duplicates at this MinHash Jaccard similarity (e.g. 0.8).")
+    parser.add_argument("--shingle-size", type=int, default=DEFAULT_SHINGLE_SIZE,
+                        help="Character shingle size for near-duplicate signatures.")
+    parser.add_argument("--near-window", type=int, default=None,
+                        help="Only compare against this many most recent unique messages (bounds memory).")
+    args = parser.parse_args()
+
+    engine = DefragmentationEngine(near_threshold=args.near_threshold, shingle_size=args.shingle_size,
+                                   near_window=args.near_window)
+    success = engine.run(workers=args.workers)
     sys.exit(0 if success else 1)
@@ -4,19 +4,52 @@ Defragmentation Engine for Conversation Analytics
 
 This engine processes raw, fragmented message logs (JSONL) and reconstructs
 them into coherent conversational threads based on ContextId and time-based sessioning.
+
+Streaming mode (the default for run()):
+- Each timestamp is parsed once into epoch microseconds
+- An append-ordered log is grouped in a single sorted pass; otherwise an
+  external merge sort spills sorted runs to disk
+- Threads keep running summaries plus the byte offsets of their messages.
+  A session is finished and dropped as soon as the next gap arrives;
+  ContextId records are externally sorted by ContextId and grouped one
+  thread at a time. Finished threads are spilled to sorted runs and merged
+  back in start-time order, and messages are read back from the raw log
+  while the output is written, so memory is bounded by the sort buffers,
+  the largest thread and one small state entry per thread
+
+Incremental mode (run(incremental=True)):
+- A watermark (raw log byte offset) and per-thread state are persisted
+  next to the output, so only log lines after the watermark are read
+- Open threads are extended or closed and new threads are appended to the
+  JSONL output; superseded lines are dropped by compact()
+- Parquet output is partitioned by thread start day and only the
+  partitions holding changed threads are rewritten
+
+Parquet threads use a nested schema (messages as list<struct>, participants
+as list<string>), so readers can project single message fields;
+read_thread_table() and threads_from_table() read it back.
 """
 
+import argparse
+import base64
+import hashlib
+import heapq
 import json
+import os
+import re
+import shutil
+import tempfile
+from array import array
 from pathlib import Path
 from datetime import datetime, timedelta, timezone
-from collections import defaultdict
+from collections import defaultdict, deque, namedtuple
 import logging
-from typing import List, Dict, Any
+from typing import Iterable, Iterator, List, Dict, Any, Optional
 
 try:
     import pyarrow as pa
+    import pyarrow.compute as pc
     import pyarrow.parquet as pq
-    import pandas as pd
     ARROW_SUPPORT = True
 except ImportError:
     ARROW_SUPPORT = False
@@ -27,19 +60,502 @@ logging.basicConfig(
 )
 logger = logging.getLogger('DefragmentationEngine')
 
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+# Records sorted per external-sort run
+SORT_BUFFER_SIZE = 100000
+
+# Threads per Parquet row group
+PARQUET_BATCH_SIZE = 1000
+PARQUET_COMPRESSION = "zstd"  # Nested message text compresses far better than snappy
+
+DEFRAG_STATE_VERSION = 1
+
+# Compact the JSONL output once superseded lines exceed this fraction
+COMPACT_RATIO = 0.5
+
+# A ContextId thread this far behind the newest message is closed
+THREAD_CLOSE_HOURS = 24
+
+PARTITION_FILE = "threads.parquet"
+DAY_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}')
+THREAD_ID_PREFIX = '{"thread_id": '
+_DECODER = json.JSONDecoder()
+
+STATUS_NONE, STATUS_READY, STATUS_BLOCKED = 0, 1, 2
+
+# The per-message fields grouping needs, plus where the message sits in the raw log.
+# (timestamp, offset) is unique, so records sort like the in-memory stable sort.
+MessageRecord = namedtuple(
+    'MessageRecord',
+    'timestamp offset length epoch_us context_id speaker chain_type status'
+)
+
+# Message fields stored as typed Parquet columns: s=string, i=int64, b=bool, ls=list<string>.
+# Anything else (other keys, nulls, values of another type) goes to the JSON "extra" column.
+MESSAGE_FIELDS = {
+    'Id': 's', 'Timestamp': 's', 'TimestampEnd': 's', 'SpeakerName': 's', 'SpeakerRole': 's',
+    'Message': 's', 'ConversationType': 'i', 'Type': 's', 'type': 's', 'ContextId': 's',
+    'chain_type': 's', 'ace_tier': 's', 'shl_tags': 'ls', 'keywords': 'ls', 'zmq_ready': 'b',
+}
+METADATA_FIELDS = {
+    'keywords': 'ls', 'consolidated': 'b', 'original_message_count': 'i', 'consolidation_ratio': 's',
+    'sources': 'ls', 'window_index': 'i', 'word_count': 'i', 'char_count': 'i', 'chain_type': 's',
+    'ace_tier': 's', 'shl_tags': 'ls', 'content_hash': 's', 'sender_role': 's', 'message_number': 'i',
+    'topic': 's', 'zmq_message_id': 's', 'timestamp': 's',
+}
+MESSAGES_COLUMN = "messages.list.element"  # Parquet path prefix of message fields
+
+if ARROW_SUPPORT:
+    _ARROW_KINDS = {'s': pa.string(), 'i': pa.int64(), 'b': pa.bool_(), 'ls': pa.list_(pa.string())}
+    METADATA_STRUCT = pa.struct([(name, _ARROW_KINDS[kind]) for name, kind in METADATA_FIELDS.items()])
+    MESSAGE_STRUCT = pa.struct(
+        [(name, _ARROW_KINDS[kind]) for name, kind in MESSAGE_FIELDS.items()]
+        + [("Metadata", METADATA_STRUCT), ("extra", pa.string())]
+    )
+    PARQUET_SCHEMA = pa.schema([
+        ("thread_id", pa.string()), ("start_time", pa.string()), ("end_time", pa.string()),
+        ("duration_seconds", pa.float64()), ("message_count", pa.int64()),
+        ("participants", pa.list_(pa.string())), ("final_status", pa.string()),
+        ("context_shifts", pa.list_(pa.struct([
+            ("from_topic", pa.string()), ("to_topic", pa.string()), ("message_index", pa.int64()),
+        ]))),
+        ("messages", pa.list_(MESSAGE_STRUCT)),
+    ])
+
+
+def _conforms(kind: Optional[str], value: Any) -> bool:
+    if kind == 's':
+        return isinstance(value, str)
+    if kind == 'i':
+        return isinstance(value, int) and not isinstance(value, bool) and -2**63 <= value < 2**63
+    if kind == 'b':
+        return isinstance(value, bool)
+    if kind == 'ls':
+        return isinstance(value, list) and all(isinstance(v, str) for v in value)
+    return False
+
+
+def _as_text(value: Any) -> Optional[str]:
+    return value if value is None or isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+
+def message_to_row(msg: Dict[str, Any]) -> Dict[str, Any]:
+    """Splits a message into MESSAGE_STRUCT fields plus a JSON "extra" for the rest"""
+    row = {}
+    extra = {}
+    for key, value in msg.items():
+        if key == 'Metadata' and isinstance(value, dict):
+            metadata = {}
+            for meta_key, meta_value in value.items():
+                if _conforms(METADATA_FIELDS.get(meta_key), meta_value):
+                    metadata[meta_key] = meta_value
+                else:
+                    extra.setdefault('Metadata', {})[meta_key] = meta_value
+            row['Metadata'] = metadata
+        elif _conforms(MESSAGE_FIELDS.get(key), value):
+            row[key] = value
+        else:
+            extra[key] = value
+    row['extra'] = json.dumps(extra, ensure_ascii=False) if extra else None
+    return row
+
+
+def message_from_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Inverse of message_to_row() for a row read back from Parquet"""
+    msg = {key: value for key, value in row.items() if value is not None and key not in ('Metadata', 'extra')}
+    extra = json.loads(row['extra']) if row.get('extra') else {}
+    metadata = row.get('Metadata')
+    if metadata is not None:
+        metadata = {key: value for key, value in metadata.items() if value is not None}
+        metadata.update(extra.pop('Metadata', {}))
+        msg['Metadata'] = metadata
+    msg.update(extra)
+    return msg
+
+
+def thread_partition_files(path: Path) -> List[Path]:
+    """Parquet files of a defragmented thread dataset, in day order"""
+    path = Path(path)
+    if path.is_dir():
+        return sorted(path.glob(f"day=*/{PARTITION_FILE}"))
+    return [path] if path.exists() else []
+
+
+def read_thread_table(path: Path, columns: Optional[List[str]] = None):
+    """
+    Reads defragmented threads as one Arrow table.
+
+    columns are Parquet column paths, so message fields can be projected
+    individually, e.g. ["thread_id", "messages.list.element.Message"].
+    Columns missing from a file are skipped.
+    """
+    tables = []
+    for file in thread_partition_files(path):
+        parquet_file = pq.ParquetFile(file)
+        if columns is None:
+            tables.append(parquet_file.read())
+            continue
+        available = set(parquet_file.schema.names) | {c.path for c in parquet_file.schema}
+        wanted = [c for c in columns if c in available or any(p.startswith(c + ".") for p in available)]
+        tables.append(parquet_file.read(columns=wanted))
+    if not tables:
+        return None
+    return pa.concat_tables(tables, promote_options="permissive") if len(tables) > 1 else tables[0]
+
+
+def _prune_struct(array):
+    """Drops struct fields that are null in every row, so to_pylist() skips them"""
+    fields, children = [], []
+    for field, child in zip(array.type, array.flatten()):
+        if pa.types.is_struct(child.type):
+            child = _prune_struct(child)
+        if child.null_count < len(child) or field.name == 'extra':
+            fields.append(pa.field(field.name, child.type))
+            children.append(child)
+    mask = array.is_null() if array.null_count else None
+    return pa.StructArray.from_arrays(children, fields=fields, mask=mask) if children else array
+
+
+def _prune_messages(batch):
+    """A record batch whose nested messages only keep the fields some message uses"""
+    if 'messages' not in batch.schema.names:
+        return batch
+    index = batch.schema.get_field_index('messages')
+    messages = batch.column(index)
+    if not (pa.types.is_list(messages.type) and pa.types.is_struct(messages.type.value_type)):
+        return batch
+    offsets = pc.subtract(messages.offsets, messages.offsets[0])
+    pruned = pa.ListArray.from_arrays(offsets, _prune_struct(messages.flatten()))
+    return batch.set_column(index, 'messages', pruned)
+
+
+def threads_from_table(table) -> List[Dict[str, Any]]:
+    """Thread dicts from read_thread_table(), with messages rebuilt from their rows"""
+    threads = []
+    for batch in table.to_batches():
+        threads.extend(_prune_messages(batch).to_pylist())
+    for thread in threads:
+        for key in ('messages', 'participants', 'context_shifts'):
+            if isinstance(thread.get(key), str):
+                thread[key] = json.loads(thread[key])  # Files written before the nested schema
+        if thread.get('messages') and isinstance(thread['messages'][0], dict) and 'extra' in thread['messages'][0]:
+            thread['messages'] = [message_from_row(row) for row in thread['messages']]
+    return threads
+
+
+def partition_day(start_time: str) -> str:
+    """Parquet partition for a thread: the date of its start time"""
+    day = start_time[:10] if isinstance(start_time, str) else ""
+    return day if DAY_PATTERN.fullmatch(day) else "unknown"
+
+
+def log_fingerprint(path: Path) -> Optional[str]:
+    """Hash of the first complete line, to notice a replaced log"""
+    try:
+        with open(path, 'rb') as f:
+            first = f.readline()
+    except OSError:
+        return None
+    return hashlib.sha1(first).hexdigest() if first.endswith(b"\n") else None
+
+
+class ThreadState:
+    """
+    Running summary of one thread in streaming mode.
+
+    Holds what _summarize_thread() needs, updated per message, and the raw
+    log offsets of the messages instead of the messages themselves.
+    """
+
+    def __init__(self, thread_id: Any, order: tuple, stability_threshold: int = 2):
+        self.thread_id = thread_id
+        self.order = order  # Tie-break for equal start times, matching run()
+        self.start_time = None
+        self.end_time = None
+        self.start_us = 0
+        self.end_us = 0
+        self.message_count = 0
+        self.participants = set()
+        self.final_status = "Completed"
+        self.context_shifts = []
+        self.spans = array('q')  # offset, length pairs into the raw log
+        self.stability_threshold = stability_threshold
+        self._window = deque(maxlen=stability_threshold)
+        self._current_context = None
+
+    def add(self, record: MessageRecord) -> None:
+        if self.message_count == 0:
+            self.start_time = record.timestamp
+            self.start_us = record.epoch_us
+            self._current_context = record.chain_type
+        self.end_time = record.timestamp
+        self.end_us = record.epoch_us
+        self.message_count += 1
+        self.participants.add(record.speaker)
+        if record.status == STATUS_BLOCKED:
+            self.final_status = "Blocked"
+        elif record.status == STATUS_READY:
+            self.final_status = "Ready"
+        self.spans.append(record.offset)
+        self.spans.append(record.length)
+
+        # Same rule as _analyze_context_shifts(): a shift at index i needs
+        # chain types i .. i + threshold - 1, so decide once they are all in
+        self._window.append(record.chain_type)
+        index = self.message_count - self.stability_threshold
+        if index >= 1:
+            new_context = self._window[0]
+            if new_context != self._current_context and all(c == new_context for c in self._window):
+                self.context_shifts.append({
+                    "from_topic": self._current_context,
+                    "to_topic": new_context,
+                    "message_index": index
+                })
+                self._current_context = new_context
+
+    def finish(self) -> None:
+        """Drop the look-ahead state once the messages are all in"""
+        self._window = None
+        self.participants = sorted(self.participants)
+
+    @property
+    def duration_seconds(self) -> float:
+        return (self.end_us - self.start_us) / 1e6
+
+    def summary(self) -> Dict[str, Any]:
+        """The _summarize_thread() fields, without messages"""
+        return {
+            "thread_id": self.thread_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration_seconds": self.duration_seconds,
+            "message_count": self.message_count,
+            "participants": self.participants,
+            "final_status": self.final_status,
+            "context_shifts": self.context_shifts,
+        }
+
+
+class DefragmentationState:
+    """
+    Watermark and per-thread state kept between incremental runs.
+
+    The watermark is the raw log byte offset after the last line read.
+    Every thread keeps its start/end time, message count and significance;
+    open threads also keep the raw log offsets of their messages so that a
+    later run can extend them. Closed threads drop those offsets.
+    """
+
+    def __init__(self, state_file: Path):
+        self.state_file = Path(state_file)
+        self.reset()
+
+    def reset(self) -> None:
+        self.settings = {}
+        self.log_path = None
+        self.log_offset = 0
+        self.log_fingerprint = None
+        self.watermark_us = None
+        self.sessions = 0
+        self.jsonl_lines = 0
+        self.threads: Dict[Any, Dict[str, Any]] = {}
+
+    def load(self) -> bool:
+        """Load saved state; False if there is none or it is unreadable"""
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get('version') != DEFRAG_STATE_VERSION:
+            return False
+        self.settings = data['settings']
+        self.log_path = data['log_path']
+        self.log_offset = data['log_offset']
+        self.log_fingerprint = data['log_fingerprint']
+        self.watermark_us = data['watermark_us']
+        self.sessions = data['sessions']
+        self.jsonl_lines = data['jsonl_lines']
+        self.threads = {entry['id']: entry for entry in data['threads']}
+        return True
+
+    def save(self) -> None:
+        data = {
+            'version': DEFRAG_STATE_VERSION,
+            'settings': self.settings,
+            'log_path': self.log_path,
+            'log_offset': self.log_offset,
+            'log_fingerprint': self.log_fingerprint,
+            'watermark_us': self.watermark_us,
+            'sessions': self.sessions,
+            'jsonl_lines': self.jsonl_lines,
+            'threads': list(self.threads.values()),
+        }
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_file.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(data, ensure_ascii=False))
+        os.replace(tmp, self.state_file)
+
+    def record(self, thread: ThreadState, significant: bool, is_open: bool) -> None:
+        entry = {
+            'id': thread.thread_id,
+            'order': list(thread.order),
+            'start': thread.start_time,
+            'end': thread.end_time,
+            'end_us': thread.end_us,
+            'count': thread.message_count,
+            'significant': significant,
+        }
+        if is_open:
+            entry['spans'] = base64.b64encode(thread.spans.tobytes()).decode('ascii')
+        self.threads[thread.thread_id] = entry
+
+    def spans(self, thread_id: Any) -> array:
+        spans = array('q')
+        spans.frombytes(base64.b64decode(self.threads[thread_id]['spans']))
+        return spans
+
+    def close_idle(self, close_before_us: int) -> int:
+        """Close open ContextId threads whose last message is older than close_before_us"""
+        closed = 0
+        for entry in self.threads.values():
+            if entry['order'][0] == 0 and 'spans' in entry and entry['end_us'] < close_before_us:
+                del entry['spans']
+                closed += 1
+        return closed
+
+    def sort_key(self, thread_id: Any) -> tuple:
+        entry = self.threads[thread_id]
+        return entry['start'], tuple(entry['order'])
+
+    @property
+    def live_threads(self) -> int:
+        return sum(1 for entry in self.threads.values() if entry['significant'])
+
+
+class _PartitionWriter:
+    """Streams rows into one day partition, replacing the old file when closed"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.tmp = path.with_suffix('.tmp')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.writer = pq.ParquetWriter(self.tmp, PARQUET_SCHEMA, compression=PARQUET_COMPRESSION)
+        self.batch = []
+
+    def write(self, row: Dict[str, Any]) -> None:
+        self.batch.append(row)
+        if len(self.batch) >= PARQUET_BATCH_SIZE:
+            self._flush()
+
+    def write_table(self, table) -> None:
+        self._flush()
+        self.writer.write_table(table)
+
+    def _flush(self) -> None:
+        if self.batch:
+            self.writer.write_table(pa.Table.from_pylist(self.batch, schema=PARQUET_SCHEMA))
+            self.batch = []
+
+    def close(self) -> None:
+        self._flush()
+        self.writer.close()
+        os.replace(self.tmp, self.path)
+
+
+class _OutOfOrder(Exception):
+    """Raised by the ordered grouping pass at the first record out of Timestamp order"""
+
+
+def _by_context(record: MessageRecord) -> tuple:
+    """Sort key grouping records by ContextId, each thread in (Timestamp, file order)"""
+    return json.dumps(record.context_id, sort_keys=True), record
+
+
+def _thread_order(item: list) -> tuple:
+    return item[0], item[1]
+
+
+class _ThreadRuns:
+    """
+    Finished threads handed back in (start_time, order) order with bounded memory.
+
+    Summaries and raw log spans are buffered until they cover buffer_size
+    messages, then spilled to a sorted run on disk; merged() merges the runs.
+    """
+
+    def __init__(self, buffer_size: int):
+        self.buffer_size = buffer_size
+        self.tmp = tempfile.TemporaryDirectory(prefix="defrag_threads_")
+        self.runs: List[Path] = []
+        self.buffer = []
+        self.buffered_messages = 0
+        self.count = 0
+
+    def add(self, thread: ThreadState) -> None:
+        self.buffer.append([thread.start_time, list(thread.order), thread.summary(), thread.spans.tolist()])
+        self.buffered_messages += thread.message_count
+        self.count += 1
+        if self.buffered_messages >= self.buffer_size:
+            self._spill()
+
+    def _spill(self) -> None:
+        self.buffer.sort(key=_thread_order)
+        path = Path(self.tmp.name) / f"threads_{len(self.runs)}.jsonl"
+        with open(path, 'w', encoding='utf-8') as f:
+            for item in self.buffer:
+                f.write(json.dumps(item, ensure_ascii=False) + '\n')
+        self.runs.append(path)
+        self.buffer = []
+        self.buffered_messages = 0
+
+    def merged(self) -> Iterator[tuple]:
+        """Yields (summary, spans) per thread"""
+        if not self.runs:
+            self.buffer.sort(key=_thread_order)
+            for item in self.buffer:
+                yield item[2], array('q', item[3])
+            return
+        if self.buffer:
+            self._spill()
+        handles = [open(run, 'r', encoding='utf-8') for run in self.runs]
+        try:
+            for item in heapq.merge(*((json.loads(line) for line in h) for h in handles), key=_thread_order):
+                yield item[2], array('q', item[3])
+        finally:
+            for handle in handles:
+                handle.close()
+
+    def close(self) -> None:
+        self.buffer = []
+        self.tmp.cleanup()
+
+
 class DefragmentationEngine:
     """
     Groups individual message events into logical sessions or threads.
     """
 
-    def __init__(self, raw_log_file: str, output_file: str, min_messages: int = 2, min_duration: int = 5, max_session_gap_minutes: int = 5):
+    def __init__(self, raw_log_file: str, output_file: str, min_messages: int = 2, min_duration: int = 5, max_session_gap_minutes: int = 5,
+                 sort_buffer_size: int = SORT_BUFFER_SIZE, thread_close_hours: float = THREAD_CLOSE_HOURS,
+                 compact_ratio: float = COMPACT_RATIO):
         self.raw_log_path = Path(raw_log_file)
         self.output_path = Path(output_file)
-        self.parquet_output_path = self.output_path.with_suffix('.parquet') # New path for Parquet file
+        # Directory of day partitions: <name>.parquet/day=YYYY-MM-DD/threads.parquet
+        self.parquet_output_path = self.output_path.with_suffix('.parquet')
+        self.state_path = self.output_path.with_suffix('.state.json')
         self.max_session_gap = timedelta(minutes=max_session_gap_minutes)
         self.min_messages = min_messages
         self.min_duration = min_duration
+        self.sort_buffer_size = sort_buffer_size
+        self.thread_close_after = timedelta(hours=thread_close_hours)
+        self.compact_ratio = compact_ratio
         self.messages = []
+        self.state = DefragmentationState(self.state_path)
+        self.stats = {}
 
     def _load_raw_logs(self) -> bool:
         """Loads and sorts messages from the raw JSONL file."""
@@ -184,34 +700,562 @@ class DefragmentationEngine:
         
         return shifts
 
+
+    def _settings(self) -> Dict[str, Any]:
+        """Options that change grouping; incremental runs need them unchanged"""
+        return {
+            'min_messages': self.min_messages,
+            'min_duration': self.min_duration,
+            'max_session_gap_seconds': self.max_session_gap.total_seconds(),
+            'thread_close_seconds': self.thread_close_after.total_seconds(),
+        }
+
+    def _is_significant(self, thread: ThreadState) -> bool:
+        return thread.message_count >= self.min_messages and thread.duration_seconds >= self.min_duration
+
+    def _is_open(self, thread: ThreadState) -> bool:
+        """The last session stays open; ContextId threads close once idle past thread_close_after"""
+        if thread.order[0] == 1:
+            return thread.order[1] == self.state.sessions
+        return thread.end_us >= self.state.watermark_us - self.thread_close_after // MICROSECOND
+
+    # --- Parquet output ---
+
+    def _partition_path(self, day: str) -> Path:
+        return self.parquet_output_path / f"day={day}" / PARTITION_FILE
+
+    def _reset_parquet_output(self) -> None:
+        # Older runs wrote a single file at this path
+        if self.parquet_output_path.is_dir():
+            shutil.rmtree(self.parquet_output_path)
+        elif self.parquet_output_path.exists():
+            self.parquet_output_path.unlink()
+        self.parquet_output_path.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def _parquet_row(thread: Dict[str, Any]) -> Dict[str, Any]:
+        """A summarized thread as a PARQUET_SCHEMA row"""
+        row = dict(thread, thread_id=str(thread['thread_id']))
+        row['participants'] = [_as_text(p) for p in thread['participants']]
+        row['context_shifts'] = [dict(shift, from_topic=_as_text(shift['from_topic']), to_topic=_as_text(shift['to_topic']))
+                                 for shift in thread['context_shifts']]
+        row['messages'] = [message_to_row(msg) for msg in thread['messages']]
+        return row
+
+    def _write_partitions(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        Writes rows in start-time order to fresh day partitions.
+
+        Rows for one day are contiguous in that order, so each partition is
+        closed as soon as the next day starts.
+        """
+        self._reset_parquet_output()
+        writers: Dict[str, _PartitionWriter] = {}
+        current = None
+        count = 0
+        try:
+            for row in rows:
+                day = partition_day(row['start_time'])
+                if day != current and current is not None and current != "unknown":
+                    writers.pop(current).close()
+                current = day
+                if day not in writers:
+                    writers[day] = _PartitionWriter(self._partition_path(day))
+                writers[day].write(row)
+                count += 1
+        finally:
+            for writer in writers.values():
+                writer.close()
+        return count
+
+    def _rewrite_partition(self, day: str, replaced_ids: set, rows: List[Dict[str, Any]], sort_keys: Dict[str, tuple]) -> None:
+        """Replaces the rows of changed threads in one day partition"""
+        path = self._partition_path(day)
+        table = pa.Table.from_pylist(rows, schema=PARQUET_SCHEMA)
+        if path.exists():
+            existing = pq.ParquetFile(path).read()
+            keep = pc.invert(pc.is_in(existing.column('thread_id'), value_set=pa.array(list(replaced_ids), pa.string())))
+            table = pa.concat_tables([existing.filter(keep), table])
+        if not table.num_rows:
+            if path.exists():
+                shutil.rmtree(path.parent)
+            return
+        ids = table.column('thread_id').to_pylist()
+        order = sorted(range(len(ids)), key=lambda i: sort_keys[ids[i]])
+        table = table.take(pa.array(order, pa.int64()))
+        writer = _PartitionWriter(path)
+        for start in range(0, table.num_rows, PARQUET_BATCH_SIZE):
+            writer.write_table(table.slice(start, PARQUET_BATCH_SIZE))
+        writer.close()
+
     def _write_to_parquet(self, threads: List[Dict[str, Any]]):
-        """Writes the list of summarized threads to a Parquet file."""
+        """Writes the list of summarized threads to day-partitioned Parquet."""
         if not ARROW_SUPPORT:
             logger.warning("Apache Arrow/PyArrow not installed. Skipping Parquet output.")
-            logger.warning("Install it with: pip install pyarrow pandas")
+            logger.warning("Install it with: pip install pyarrow")
             return
         
         try:
-            # For Parquet, complex types like list-of-dicts are best stored as JSON strings
-            df_data = []
-            for thread in threads:
-                thread_copy = thread.copy()
-                thread_copy['messages'] = json.dumps(thread_copy['messages'])
-                thread_copy['participants'] = json.dumps(thread_copy['participants'])
-                thread_copy['context_shifts'] = json.dumps(thread_copy['context_shifts'])
-                df_data.append(thread_copy)
-
-            df = pd.DataFrame(df_data)
-            table = pa.Table.from_pandas(df)
-            pq.write_table(table, self.parquet_output_path)
-            logger.info(f"Successfully wrote {len(threads)} threads to Parquet file: {self.parquet_output_path}")
+            self._write_partitions(self._parquet_row(thread) for thread in threads)
+            logger.info(f"Successfully wrote {len(threads)} threads to Parquet: {self.parquet_output_path}")
 
         except Exception as e:
             logger.error(f"Failed to write to Parquet file: {e}")
 
-    def run(self):
+    # --- Streaming mode ---
+
+    def _timestamp_to_epoch_us(self, ts_str: str) -> int:
+        """Parses a timestamp once into integer microseconds since the epoch."""
+        return (self._parse_and_normalize_timestamp(ts_str) - EPOCH) // MICROSECOND
+
+    def _make_record(self, msg: Dict[str, Any], offset: int, length: int) -> MessageRecord:
+        metadata = msg.get('Metadata', {})
+        if not isinstance(metadata, dict):
+            metadata = {}
+        tags = metadata.get('shl_tags', [])
+        if any("Status-Blocked" in tag for tag in tags):
+            status = STATUS_BLOCKED
+        elif any("Status-Ready" in tag for tag in tags):
+            status = STATUS_READY
+        else:
+            status = STATUS_NONE
+        context_id = msg.get('ContextId')
+        if not context_id or context_id == 'unknown':
+            context_id = None
+        return MessageRecord(
+            msg['Timestamp'], offset, length, self._timestamp_to_epoch_us(msg['Timestamp']),
+            context_id, msg.get('SpeakerName', 'unknown'), metadata.get('chain_type', 'unknown'), status
+        )
+
+    def _scan_records(self, start: int = 0) -> Iterator[MessageRecord]:
+        """
+        Yields one MessageRecord per usable raw log line from byte offset start.
+
+        A last line without a newline is still being written and is left for
+        the next run; stats['log_end'] is the offset after the last line read.
+        """
+        with open(self.raw_log_path, 'rb') as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    msg = json.loads(line.decode('utf-8'))
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    logger.warning(f"Skipping invalid JSON line in {self.raw_log_path}")
+                else:
+                    if isinstance(msg, dict) and isinstance(msg.get('Timestamp'), str):
+                        yield self._make_record(msg, offset, len(line))
+                offset += len(line)
+            self.stats['log_end'] = offset
+
+    @staticmethod
+    def _read_span(raw, offset: int, length: int) -> Dict[str, Any]:
+        raw.seek(offset)
+        return json.loads(raw.read(length).decode('utf-8'))
+
+    def _read_messages(self, raw, spans: array) -> List[Dict[str, Any]]:
+        return [self._read_span(raw, spans[i], spans[i + 1]) for i in range(0, len(spans), 2)]
+
+    def _records_at(self, raw, spans: array) -> List[MessageRecord]:
+        return [self._make_record(self._read_span(raw, spans[i], spans[i + 1]), spans[i], spans[i + 1])
+                for i in range(0, len(spans), 2)]
+
+    def _external_sort(self, records: Iterable[MessageRecord], key=None,
+                       runs_stat: Optional[str] = 'sorted_runs') -> Iterator[MessageRecord]:
+        """
+        Sorts records by key, default (Timestamp, file order), with bounded memory.
+
+        Sorted runs of sort_buffer_size records are spilled to a temporary
+        directory and merged with heapq.merge. The run count goes to
+        stats[runs_stat].
+        """
+        with tempfile.TemporaryDirectory(prefix="defrag_runs_") as tmp:
+            runs = []
+            buffer = []
+            for record in records:
+                buffer.append(record)
+                if len(buffer) >= self.sort_buffer_size:
+                    runs.append(self._spill_run(buffer, Path(tmp) / f"run_{len(runs)}.jsonl", key))
+                    buffer = []
+            if runs_stat:
+                self.stats[runs_stat] = len(runs) + (1 if buffer else 0)
+            if not runs:
+                # Everything fit in one buffer
+                buffer.sort(key=key)
+                yield from buffer
+                return
+            if buffer:
+                runs.append(self._spill_run(buffer, Path(tmp) / f"run_{len(runs)}.jsonl", key))
+                buffer = []
+
+            handles = [open(run, 'r', encoding='utf-8') for run in runs]
+            try:
+                yield from heapq.merge(*((MessageRecord(*json.loads(line)) for line in h) for h in handles), key=key)
+            finally:
+                for handle in handles:
+                    handle.close()
+
+    @staticmethod
+    def _spill_run(buffer: List[MessageRecord], path: Path, key=None) -> Path:
+        buffer.sort(key=key)
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in buffer:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return path
+
+    def _build_thread(self, thread_id: Any, records: List[MessageRecord]) -> ThreadState:
+        """A ContextId thread from its sorted records"""
+        thread = ThreadState(thread_id, (0, records[0].offset))
+        for record in records:
+            thread.add(record)
+        thread.finish()
+        return thread
+
+    def _split_sessions(self, records: Iterable[MessageRecord], number: int) -> List[ThreadState]:
+        """Time-based sessions from sorted unassigned records, numbered from number"""
+        gap_us = self.max_session_gap // MICROSECOND
+        sessions = []
+        for record in records:
+            if not sessions or record.epoch_us - sessions[-1].end_us > gap_us:
+                sessions.append(ThreadState(f"session_{number + len(sessions)}", (1, number + len(sessions))))
+            sessions[-1].add(record)
+        for session in sessions:
+            session.finish()
+        return sessions
+
+    def _emit(self, thread: ThreadState, output: _ThreadRuns) -> None:
+        """Records a finished thread in the state and queues it for output if significant"""
+        thread.finish()
+        significant = self._is_significant(thread)
+        self.state.record(thread, significant, self._is_open(thread))
+        if significant:
+            output.add(thread)
+
+    def _split_sessions_stream(self, records: Iterable[MessageRecord], output: _ThreadRuns,
+                               require_order: bool) -> Iterator[MessageRecord]:
+        """
+        Splits unassigned records into sessions and yields the ContextId records.
+
+        A session is emitted and dropped as soon as a gap larger than
+        max_session_gap arrives; only the last one is still open. Sets the
+        state watermark and session count once the records are exhausted.
+        """
+        gap_us = self.max_session_gap // MICROSECOND
+        session = None
+        last_timestamp = None
+        watermark_us = None
+        count = 0
+
+        for record in records:
+            if require_order and last_timestamp is not None and record.timestamp < last_timestamp:
+                raise _OutOfOrder()
+            last_timestamp = record.timestamp
+            if watermark_us is None or record.epoch_us > watermark_us:
+                watermark_us = record.epoch_us
+            count += 1
+
+            if record.context_id is not None:
+                yield record
+                continue
+
+            if session is None or record.epoch_us - session.end_us > gap_us:
+                self.state.sessions += 1
+                if session is not None:
+                    self._emit(session, output)
+                session = ThreadState(f"session_{self.state.sessions}", (1, self.state.sessions))
+            session.add(record)
+
+        if session is not None:
+            self._emit(session, output)
+        self.state.watermark_us = watermark_us
+        self.stats['messages'] = count
+
+    def _group_stream(self, records: Iterable[MessageRecord], require_order: bool = False) -> Optional[_ThreadRuns]:
+        """
+        Groups sorted records into ContextId threads and time-based sessions.
+
+        Each finished thread is recorded in self.state and, if significant,
+        queued in the returned _ThreadRuns, which spills to disk. Sessions
+        finish at the next gap; ContextId records go through an external
+        sort by ContextId and are grouped one thread at a time after the
+        whole log is read. With require_order, returns None at the first
+        record that is out of Timestamp order so the caller can sort
+        externally instead.
+        """
+        self.state.reset()
+        output = _ThreadRuns(self.sort_buffer_size)
+        threads = 0
+        try:
+            context_records = self._external_sort(self._split_sessions_stream(records, output, require_order),
+                                                  key=_by_context, runs_stat=None)
+            thread = None
+            current = None
+            for record in context_records:
+                key = _by_context(record)[0]
+                if key != current:
+                    if thread is not None:
+                        self._emit(thread, output)
+                    thread = ThreadState(record.context_id, (0, record.offset))
+                    current = key
+                    threads += 1
+                thread.add(record)
+            if thread is not None:
+                self._emit(thread, output)
+        except _OutOfOrder:
+            output.close()
+            return None
+        except BaseException:
+            output.close()
+            raise
+
+        sessions = self.state.sessions
+        self.stats.update(threads=threads, sessions=sessions, watermark_us=self.state.watermark_us)
+        logger.info(f"Grouped {self.stats['messages']} messages into {threads} threads by ContextId and {sessions} time-based sessions.")
+        filtered_count = threads + sessions - output.count
+        logger.info(f"Filtered out {filtered_count} insignificant threads based on min_messages={self.min_messages} and min_duration={self.min_duration}s.")
+        return output
+
+    def _write_streaming(self, output: _ThreadRuns) -> bool:
+        """Writes significant threads one at a time to JSONL and Parquet."""
+        if not ARROW_SUPPORT:
+            logger.warning("Apache Arrow/PyArrow not installed. Skipping Parquet output.")
+            logger.warning("Install it with: pip install pyarrow")
+
+        try:
+            self.output_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.raw_log_path, 'rb') as raw, open(self.output_path, 'w', encoding='utf-8') as f:
+                def rows():
+                    for summary, spans in output.merged():
+                        summary['messages'] = self._read_messages(raw, spans)
+                        f.write(json.dumps(summary, ensure_ascii=False) + '\n')
+                        yield self._parquet_row(summary) if ARROW_SUPPORT else None
+
+                if ARROW_SUPPORT:
+                    self._write_partitions(rows())
+                else:
+                    for _ in rows():
+                        pass
+            logger.info(f"Successfully wrote {output.count} defragmented threads to {self.output_path}")
+            if ARROW_SUPPORT:
+                logger.info(f"Successfully wrote {output.count} threads to Parquet: {self.parquet_output_path}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to write output: {e}")
+            return False
+
+    def run_streaming(self):
+        """
+        Defragments with bounded memory; produces the same output as the in-memory run.
+
+        Memory is bounded by sort_buffer_size records per sort, the largest
+        thread, and one small state entry per thread (the entries persisted
+        for incremental runs); messages are read back from the raw log.
+        """
+        if not self.raw_log_path.exists():
+            logger.error(f"Raw log file not found: {self.raw_log_path}")
+            return
+
+        self.stats = {'append_ordered': True, 'sorted_runs': 0, 'incremental': False}
+        output = self._group_stream(self._scan_records(), require_order=True)
+        if output is None:
+            logger.info("Raw log is not in Timestamp order; sorting it externally.")
+            self.stats['append_ordered'] = False
+            output = self._group_stream(self._external_sort(self._scan_records()))
+        try:
+            if not self._write_streaming(output):
+                return
+        finally:
+            output.close()
+
+        state = self.state
+        state.settings = self._settings()
+        state.log_path = str(self.raw_log_path.resolve())
+        state.log_offset = self.stats['log_end']
+        state.log_fingerprint = log_fingerprint(self.raw_log_path)
+        state.jsonl_lines = state.live_threads
+        state.save()
+
+    # --- Incremental mode ---
+
+    def _full_run_reason(self) -> Optional[str]:
+        """Why the saved state cannot be extended, or None if it can"""
+        if not self.state.load():
+            return "no saved state"
+        if self.state.settings != self._settings():
+            return "settings changed"
+        if (self.state.log_path != str(self.raw_log_path.resolve())
+                or self.state.log_fingerprint != log_fingerprint(self.raw_log_path)
+                or self.raw_log_path.stat().st_size < self.state.log_offset):
+            return "the raw log was replaced"
+        if not self.output_path.exists() or (ARROW_SUPPORT and not self.parquet_output_path.is_dir()):
+            return "output files are missing"
+        return None
+
+    def _extend_threads(self, records: List[MessageRecord]) -> Optional[List[ThreadState]]:
+        """
+        Rebuilds every thread the new (sorted) records touch.
+
+        Returns None if a record belongs to a closed thread or sorts before
+        the open session, since that changes threads no longer tracked.
+        """
+        by_context: Dict[Any, List[MessageRecord]] = defaultdict(list)
+        unassigned = []
+        for record in records:
+            if record.context_id is not None:
+                by_context[record.context_id].append(record)
+            else:
+                unassigned.append(record)
+
+        changed = []
+        with open(self.raw_log_path, 'rb') as raw:
+            for context_id, new in by_context.items():
+                entry = self.state.threads.get(context_id)
+                if entry is not None and 'spans' not in entry:
+                    return None
+                old = self._records_at(raw, self.state.spans(context_id)) if entry is not None else []
+                changed.append(self._build_thread(context_id, list(heapq.merge(old, new))))
+
+            if unassigned:
+                number = self.state.sessions
+                old = self._records_at(raw, self.state.spans(f"session_{number}")) if number else []
+                if old and unassigned[0] < old[0]:
+                    return None
+                sessions = self._split_sessions(heapq.merge(old, unassigned), number or 1)
+                self.state.sessions = sessions[-1].order[1]
+                changed.extend(sessions)
+
+        newest = max(record.epoch_us for record in records)
+        if self.state.watermark_us is None or newest > self.state.watermark_us:
+            self.state.watermark_us = newest
+        return changed
+
+    def _apply_changes(self, changed: List[ThreadState], new_count: int) -> bool:
+        """Appends changed threads to the JSONL output and rewrites their Parquet partitions."""
+        state = self.state
+        previous = {thread.thread_id: state.threads.get(thread.thread_id) for thread in changed}
+        for thread in changed:
+            state.record(thread, self._is_significant(thread), self._is_open(thread))
+        closed = state.close_idle(state.watermark_us - self.thread_close_after // MICROSECOND)
+
+        live = sorted((t for t in changed if state.threads[t.thread_id]['significant']),
+                      key=lambda t: (t.start_time, t.order))
+        dropped = [tid for tid, entry in previous.items()
+                   if entry and entry['significant'] and not state.threads[tid]['significant']]
+        days = {partition_day(t.start_time) for t in live}
+        days |= {partition_day(entry['start']) for entry in previous.values() if entry and entry['significant']}
+
+        try:
+            rows_by_day = defaultdict(list)
+            with open(self.raw_log_path, 'rb') as raw, open(self.output_path, 'a', encoding='utf-8') as f:
+                for thread in live:
+                    summary = thread.summary()
+                    summary['messages'] = self._read_messages(raw, thread.spans)
+                    f.write(json.dumps(summary, ensure_ascii=False) + '\n')
+                    if ARROW_SUPPORT:
+                        rows_by_day[partition_day(thread.start_time)].append(self._parquet_row(summary))
+            state.jsonl_lines += len(live)
+
+            if ARROW_SUPPORT:
+                replaced_ids = {str(t.thread_id) for t in changed}
+                sort_keys = {str(tid): state.sort_key(tid) for tid, entry in state.threads.items() if entry['significant']}
+                for day in sorted(days):
+                    self._rewrite_partition(day, replaced_ids, rows_by_day.get(day, []), sort_keys)
+        except Exception as e:
+            logger.error(f"Failed to update output: {e}")
+            return False
+
+        self.stats.update(changed_threads=len(changed), appended=len(live), partitions=len(days),
+                          closed=closed, compact=bool(dropped))
+        logger.info(f"{new_count} new messages changed {len(changed)} threads: appended {len(live)}, "
+                    f"rewrote {len(days)} Parquet partitions, closed {closed} idle threads.")
+        return True
+
+    def run_incremental(self):
+        """Reads only log lines after the saved watermark and updates the output in place."""
+        if not self.raw_log_path.exists():
+            logger.error(f"Raw log file not found: {self.raw_log_path}")
+            return
+
+        reason = self._full_run_reason()
+        if reason:
+            logger.info(f"Running a full defragmentation: {reason}.")
+            self.run_streaming()
+            return
+
+        self.stats = {'append_ordered': True, 'sorted_runs': 0, 'incremental': True}
+        records = list(self._external_sort(self._scan_records(self.state.log_offset)))
+        changed = self._extend_threads(records) if records else []
+        if changed is None:
+            logger.info("New messages reach a closed thread or an earlier session; running a full defragmentation.")
+            self.run_streaming()
+            return
+        if changed and not self._apply_changes(changed, len(records)):
+            return
+        if not changed:
+            logger.info("No new messages since the last run.")
+
+        self.state.log_offset = self.stats['log_end']
+        self.state.save()
+        superseded = self.state.jsonl_lines - self.state.live_threads
+        if self.stats.get('compact') or superseded > self.compact_ratio * self.state.jsonl_lines:
+            self.compact()
+
+    def compact(self) -> int:
+        """
+        Rewrites the JSONL output with only the latest line of each
+        significant thread, in start-time order. Returns the lines kept.
+        """
+        if not self.state.threads and not self.state.load():
+            logger.warning("No defragmentation state to compact against; run a full defragmentation instead.")
+            return 0
+
+        latest = {}
+        lines = 0
+        with open(self.output_path, 'rb') as f:
+            offset = 0
+            for line in f:
+                latest[self._line_thread_id(line)] = (offset, len(line))
+                offset += len(line)
+                lines += 1
+        keep = sorted(
+            (self.state.sort_key(tid), span) for tid, span in latest.items()
+            if tid in self.state.threads and self.state.threads[tid]['significant']
+        )
+
+        tmp = self.output_path.with_suffix('.compact.tmp')
+        with open(self.output_path, 'rb') as src, open(tmp, 'wb') as dst:
+            for _, (offset, length) in keep:
+                src.seek(offset)
+                dst.write(src.read(length))
+        os.replace(tmp, self.output_path)
+
+        self.state.jsonl_lines = len(keep)
+        self.state.save()
+        logger.info(f"Compacted {self.output_path}: {lines} lines -> {len(keep)}")
+        return len(keep)
+
+    @staticmethod
+    def _line_thread_id(line: bytes) -> Any:
+        """Decodes just the thread_id that leads every output line"""
+        text = line.decode('utf-8')
+        if text.startswith(THREAD_ID_PREFIX):
+            try:
+                return _DECODER.raw_decode(text, len(THREAD_ID_PREFIX))[0]
+            except ValueError:
+                pass
+        return json.loads(text).get('thread_id')
+
+    def run(self, streaming: bool = True, incremental: bool = False):
         """Executes the full defragmentation process."""
         logger.info("Starting defragmentation process...")
+        if incremental:
+            self.run_incremental()
+            return
+        if streaming:
+            self.run_streaming()
+            return
         if not self._load_raw_logs():
             return
 
@@ -246,13 +1290,25 @@ class DefragmentationEngine:
         # Write to Parquet format as well
         self._write_to_parquet(significant_threads)
 
+        # Incremental state does not describe this output
+        self.state_path.unlink(missing_ok=True)
+
 def main():
     """CLI entry point for running the engine directly."""
+    parser = argparse.ArgumentParser(description="Reconstruct conversational threads from the raw message log.")
+    parser.add_argument("--in-memory", action="store_true", help="Load the whole log into memory instead of streaming it.")
+    parser.add_argument("--incremental", action="store_true", help="Only process log lines added since the last run.")
+    parser.add_argument("--compact", action="store_true", help="Drop superseded lines from the JSONL output and exit.")
+    args = parser.parse_args()
+
     raw_log = "conversation_logs/current_session.jsonl"
     defragmented_log = "conversation_logs/defragmented_sessions.jsonl"
     
     engine = DefragmentationEngine(raw_log_file=raw_log, output_file=defragmented_log)
-    engine.run()
+    if args.compact:
+        engine.compact()
+    else:
+        engine.run(streaming=not args.in_memory, incremental=args.incremental)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -8,25 +8,56 @@ Tracks:
 - Novelty signals
 - Collaboration patterns
 - Emergence indicators
+
+Metrics read a MessageCorpus (interned tokens, phrase counts and one joined
+text buffer) built once per load rather than re-reading every message.
+EmergenceWindow keeps novelty, diversity and collaboration scores over a
+sliding window of recent messages, updated per message, and can feed them
+to RealtimeMonitoringDashboard.record_emergence_signal live.
 """
 
 import json
 import math
 from pathlib import Path
-from datetime import datetime
-from collections import defaultdict, Counter
-from typing import Dict, List, Tuple, Any
+from datetime import datetime, timedelta, timezone
+from collections import Counter, deque
+from typing import Dict, List, Optional, Tuple, Any
 import re
 
+try:
+    from message_corpus import MIN_PHRASE_CHARS, PHRASE_SIZE, WORD_PATTERN, MessageCorpus, message_text
+except ImportError:
+    from .message_corpus import MIN_PHRASE_CHARS, PHRASE_SIZE, WORD_PATTERN, MessageCorpus, message_text
+
+TECHNICAL_TERMS = [
+    'api', 'database', 'cache', 'optimization', 'architecture',
+    'performance', 'scalability', 'reliability', 'security', 'encryption',
+    'distributed', 'concurrent', 'async', 'network', 'bandwidth',
+    'latency', 'throughput', 'queue', 'pipeline', 'workflow'
+]
+
+
+def novelty_score(vocab_size: int, unique_phrases: int, concept_count: int) -> float:
+    """Novelty (0-100) from vocabulary size, unique phrases and distinct concepts"""
+    vocab_score = min(100, (vocab_size / 500) * 100)  # 500 unique words = max
+    phrase_score = min(100, (unique_phrases / 100) * 100)  # 100 unique = max
+    concept_score = min(100, (concept_count / 20) * 100)  # 20 concepts = max
+
+    # Weighted average
+    novelty = (vocab_score * 0.4 + phrase_score * 0.4 + concept_score * 0.2)
+    return round(novelty, 2)
+
 
 class EmergentPropertyTracker:
     """Track and measure emergent properties in agent interactions"""
 
-    def __init__(self, log_file: str = "conversation_logs/current_session.jsonl"):
+    def __init__(self, log_file: str = "conversation_logs/current_session.jsonl", phrase_mode: str = 'exact'):
         self.log_file = Path(log_file)
+        self.phrase_mode = phrase_mode  # 'approximate' bounds phrase-count memory (see PhraseStats)
         self.messages = []
         self.interactions = []  # Agent exchanges
         self.emergence_signals = []
+        self._corpus = None
 
         # Metrics storage
         self.metrics = {
@@ -58,6 +89,13 @@ class EmergentPropertyTracker:
 
         return len(self.messages) > 0
 
+    @property
+    def corpus(self) -> MessageCorpus:
+        """Tokenized corpus of self.messages, rebuilt when the messages change"""
+        if self._corpus is None or self._corpus[0] is not self.messages or self._corpus[1].size != len(self.messages):
+            self._corpus = (self.messages, MessageCorpus(self.messages, phrase_mode=self.phrase_mode))
+        return self._corpus[1]
+
     def extract_conversations(self):
         """Extract coherent conversations between agents"""
         conversations = []
@@ -101,19 +139,14 @@ class EmergentPropertyTracker:
         results = {}
 
         # By speaker
-        speaker_stats = defaultdict(int)
-        for msg in self.messages:
-            speaker = msg.get('SpeakerName', 'unknown')
-            speaker_stats[speaker] += 1
-
-        results['speaker_distribution'] = dict(speaker_stats)
+        results['speaker_distribution'] = dict(self.corpus.speaker_counts)
 
         # Vocabulary diversity
         vocabulary = self._extract_vocabulary()
         results['vocabulary_size'] = len(vocabulary)
 
         # Message length diversity
-        lengths = [len(str(m.get('Message', ''))) for m in self.messages]
+        lengths = self.corpus.lengths
         results['message_length'] = {
             'mean': sum(lengths) / len(lengths) if lengths else 0,
             'min': min(lengths) if lengths else 0,
@@ -131,30 +164,11 @@ class EmergentPropertyTracker:
 
     def _extract_vocabulary(self) -> set:
         """Extract unique words from all messages"""
-        vocab = set()
-        for msg in self.messages:
-            text = str(msg.get('Message', ''))
-            words = re.findall(r'\b\w+\b', text.lower())
-            vocab.update(words)
-        return vocab
+        return self.corpus.vocabulary.keys()
 
     def _extract_concepts(self) -> Counter:
         """Extract higher-level concepts (technical terms, patterns)"""
-        concepts = Counter()
-        technical_terms = [
-            'api', 'database', 'cache', 'optimization', 'architecture',
-            'performance', 'scalability', 'reliability', 'security', 'encryption',
-            'distributed', 'concurrent', 'async', 'network', 'bandwidth',
-            'latency', 'throughput', 'queue', 'pipeline', 'workflow'
-        ]
-
-        for msg in self.messages:
-            text = str(msg.get('Message', '')).lower()
-            for term in technical_terms:
-                if term in text:
-                    concepts[term] += 1
-
-        return concepts
+        return self.corpus.concept_counts(TECHNICAL_TERMS)
 
     # ========== NOVELTY METRICS ==========
 
@@ -167,8 +181,7 @@ class EmergentPropertyTracker:
         results['new_terms_introduction'] = new_terms_over_time
 
         # Unique phrasing (rare combinations)
-        unique_phrases = self._find_unique_phrases()
-        results['unique_phrases_count'] = len(unique_phrases)
+        results['unique_phrases_count'] = self._count_unique_phrases()
 
         # Conceptual novelty (new combinations)
         novelty_score = self._calculate_novelty_score()
@@ -186,58 +199,26 @@ class EmergentPropertyTracker:
 
     def _track_new_terms(self) -> List[Tuple[int, str]]:
         """Track introduction of new terms over message sequence"""
-        seen_terms = set()
-        new_introductions = []
-
-        for idx, msg in enumerate(self.messages):
-            text = str(msg.get('Message', '')).lower()
-            words = set(re.findall(r'\b\w+\b', text))
-
-            for word in words:
-                if len(word) > 5 and word not in seen_terms:
-                    new_introductions.append((idx, word))
-                    seen_terms.add(word)
-
+        new_introductions = [(idx, word) for idx, word in self.corpus.introductions if len(word) > 5]
         return new_introductions[-20:]  # Last 20 new terms
 
     def _find_unique_phrases(self) -> List[str]:
         """Find rare, unique phrases in conversations"""
-        phrase_counts = Counter()
+        # 3-word phrases over 10 characters, counted when the corpus was built
+        return self.corpus.unique_phrases()
 
-        for msg in self.messages:
-            text = str(msg.get('Message', ''))
-            # Extract 3-word phrases
-            words = text.split()
-            for i in range(len(words) - 2):
-                phrase = ' '.join(words[i:i+3]).lower()
-                if len(phrase) > 10:  # Meaningful phrases
-                    phrase_counts[phrase] += 1
-
-        # Find phrases that appear exactly once (unique)
-        unique = [p for p, c in phrase_counts.items() if c == 1]
-        return unique
+    def _count_unique_phrases(self) -> int:
+        """Number of phrases seen exactly once, without building their strings"""
+        return self.corpus.unique_phrase_count()
 
     def _calculate_novelty_score(self) -> float:
         """Calculate overall novelty score (0-100)"""
         if not self.messages:
             return 0.0
 
-        # Factors:
-        # 1. Vocabulary diversity
-        vocab_size = len(self._extract_vocabulary())
-        vocab_score = min(100, (vocab_size / 500) * 100)  # 500 unique words = max
-
-        # 2. Unique phrases
-        unique_phrases = len(self._find_unique_phrases())
-        phrase_score = min(100, (unique_phrases / 100) * 100)  # 100 unique = max
-
-        # 3. Concept diversity
-        concepts = self._extract_concepts()
-        concept_score = min(100, (len(concepts) / 20) * 100)  # 20 concepts = max
-
-        # Weighted average
-        novelty = (vocab_score * 0.4 + phrase_score * 0.4 + concept_score * 0.2)
-        return round(novelty, 2)
+        # Factors: vocabulary diversity, unique phrases, concept diversity
+        return novelty_score(len(self._extract_vocabulary()), self._count_unique_phrases(),
+                             len(self._extract_concepts()))
 
     def _count_cross_domain_references(self) -> int:
         """Count references to multiple technical domains"""
@@ -249,7 +230,7 @@ class EmergentPropertyTracker:
             'architecture': ['microservice', 'monolith', 'distributed', 'architecture']
         }
 
-        text = ' '.join(str(m.get('Message', '')) for m in self.messages).lower()
+        text = self.corpus.text
         domains_found = set()
 
         for domain, keywords in domains.items():
@@ -266,7 +247,7 @@ class EmergentPropertyTracker:
             'on second thought'
         ]
 
-        text = ' '.join(str(m.get('Message', '')) for m in self.messages).lower()
+        text = self.corpus.text
         count = sum(1 for signal in reframing_signals if signal in text)
 
         return count
@@ -318,7 +299,7 @@ class EmergentPropertyTracker:
             'documentation': ['document', 'readme', 'spec', 'guide']
         }
 
-        text = ' '.join(str(m.get('Message', '')) for m in self.messages).lower()
+        text = self.corpus.text
         covered = 0
 
         for aspect, keywords in aspects.items():
@@ -339,12 +320,7 @@ class EmergentPropertyTracker:
             r'\$\d+(?:,\d{3})*',  # Money amounts
         ]
 
-        text = ' '.join(str(m.get('Message', '')) for m in self.messages)
-        specific_count = 0
-
-        for pattern in specific_patterns:
-            matches = re.findall(pattern, text)
-            specific_count += len(matches)
+        specific_count = sum(self.corpus.count_matches(pattern, raw=True) for pattern in specific_patterns)
 
         specificity = min(100, (specific_count / 20) * 100)  # 20 specific refs = max
         return round(specificity, 2)
@@ -363,7 +339,7 @@ class EmergentPropertyTracker:
             'immature', 'unstable'
         ]
 
-        text = ' '.join(str(m.get('Message', '')) for m in self.messages).lower()
+        text = self.corpus.text
 
         pos_count = sum(1 for signal in positive_signals if signal in text)
         risk_count = sum(1 for signal in risk_signals if signal in text)
@@ -379,7 +355,7 @@ class EmergentPropertyTracker:
             'failure mode', 'edge case', 'bottleneck', 'limitation'
         ]
 
-        text = ' '.join(str(m.get('Message', '')) for m in self.messages).lower()
+        text = self.corpus.text
         risk_mentions = sum(1 for kw in risk_keywords if kw in text)
 
         # Normalize to 0-100
@@ -409,12 +385,7 @@ class EmergentPropertyTracker:
 
     def _measure_turn_balance(self) -> Dict[str, float]:
         """Measure balance in conversation turns"""
-        speaker_turns = defaultdict(int)
-
-        for msg in self.messages:
-            speaker = msg.get('SpeakerName', 'unknown')
-            speaker_turns[speaker] += 1
-
+        speaker_turns = self.corpus.speaker_counts
         total_turns = sum(speaker_turns.values())
 
         balance = {}
@@ -476,17 +447,12 @@ class EmergentPropertyTracker:
 
     def _measure_qa_effectiveness(self) -> float:
         """Measure effectiveness of questions and answers"""
-        questions = 0
-        answered_questions = 0
-
-        text = ' '.join(str(m.get('Message', '')) for m in self.messages)
-        questions = text.count('?')
+        corpus = self.corpus
+        questions = corpus.text.count('?')
 
         # Simple heuristic: questions followed by detailed answers
-        messages = [str(m.get('Message', '')) for m in self.messages]
-        for i, msg in enumerate(messages[:-1]):
-            if '?' in msg and len(messages[i+1]) > 50:  # Detailed answer
-                answered_questions += 1
+        answered_questions = sum(1 for i in corpus.messages_containing('?')
+                                 if i + 1 < corpus.size and corpus.lengths[i + 1] > 50)
 
         effectiveness = (answered_questions / max(1, questions)) * 100 if questions > 0 else 0
         return round(min(100, effectiveness), 2)
@@ -555,7 +521,7 @@ class EmergentPropertyTracker:
     def _detect_emergence_signals(self) -> List[str]:
         """Detect specific signals of emergent properties"""
         signals = []
-        text = ' '.join(str(m.get('Message', '')) for m in self.messages).lower()
+        text = self.corpus.text
 
         # Signal patterns
         patterns = {
@@ -573,6 +539,17 @@ class EmergentPropertyTracker:
 
         return signals
 
+    # ========== EMERGENCE OVER TIME ==========
+
+    def analyze_emergence_over_time(self, window_messages: Optional[int] = 200,
+                                    window_minutes: Optional[float] = None, step: int = 1,
+                                    dashboard=None) -> List[Dict[str, Any]]:
+        """Sliding-window scores after every step-th message (see EmergenceWindow)"""
+        window = EmergenceWindow(window_messages, window_minutes, dashboard=dashboard, emit_every=step)
+        for msg in self.messages:
+            window.add(msg)
+        return list(window.series)
+
     # ========== UTILITY METHODS ==========
 
     def _std_dev(self, values: List[float]) -> float:
@@ -653,6 +630,140 @@ class EmergentPropertyTracker:
         print("\n" + "="*80)
 
 
+class EmergenceWindow:
+    """
+    Emergence metrics over the last max_messages messages and/or the last
+    max_minutes minutes.
+
+    Vocabulary, phrase, concept and speaker counts are exact counters updated
+    as messages enter and leave the window, so each message costs work in
+    proportion to its own length. Every emit_every messages a point
+    (novelty, diversity, collaboration on a 0-1 scale) is appended to series
+    and, with a dashboard, recorded through record_emergence_signal.
+    """
+
+    SIGNALS = ('novelty', 'diversity', 'collaboration')
+
+    def __init__(self, max_messages: Optional[int] = 200, max_minutes: Optional[float] = None,
+                 dashboard=None, emit_every: int = 1, max_points: Optional[int] = None):
+        if max_messages is None and max_minutes is None:
+            raise ValueError("Set max_messages and/or max_minutes")
+        self.max_messages = max_messages
+        self.max_age = timedelta(minutes=max_minutes) if max_minutes is not None else None
+        self.dashboard = dashboard
+        self.emit_every = max(1, emit_every)
+        self.entries = deque()  # (time, speaker, words, phrases, concepts) per message
+        self.words = Counter()
+        self.word_total = 0
+        self.word_log_sum = 0.0  # Sum of c * log2(c) over word counts, for entropy
+        self.phrases = Counter()
+        self.unique_phrases = 0
+        self.concepts = Counter()
+        self.speakers = Counter()
+        self.seen = 0
+        self.series = deque(maxlen=max_points)
+
+    def add(self, msg: Dict[str, Any]) -> Dict[str, Any]:
+        """Slide the window forward by one message and return the current scores"""
+        timestamp = self._timestamp(msg)
+        lower = message_text(msg).lower()
+        words = WORD_PATTERN.findall(lower)
+        parts = lower.split()
+        phrases = [p for p in (' '.join(parts[i:i + PHRASE_SIZE]) for i in range(len(parts) - PHRASE_SIZE + 1))
+                   if len(p) > MIN_PHRASE_CHARS]
+        concepts = [term for term in TECHNICAL_TERMS if term in lower]
+        entry = (timestamp, msg.get('SpeakerName', 'unknown'), words, phrases, concepts)
+
+        self.entries.append(entry)
+        self._apply(entry, 1)
+        while (self.max_messages is not None and len(self.entries) > self.max_messages) or \
+                (self.max_age is not None and timestamp - self.entries[0][0] > self.max_age):
+            self._apply(self.entries.popleft(), -1)
+
+        self.seen += 1
+        point = self.scores(timestamp)
+        if self.seen % self.emit_every == 0:
+            self.series.append(point)
+            if self.dashboard is not None:
+                for signal in self.SIGNALS:
+                    self.dashboard.record_emergence_signal(
+                        signal, point[signal], f"last {point['window_messages']} messages")
+        return point
+
+    def _timestamp(self, msg: Dict[str, Any]) -> datetime:
+        value = msg.get('Timestamp') or msg.get('timestamp')
+        if value:
+            try:
+                parsed = datetime.fromisoformat(str(value).rstrip('Z'))
+                return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo else parsed
+            except ValueError:
+                pass
+        # Untimed messages are placed just after the newest one
+        return self.entries[-1][0] if self.entries else datetime.now()
+
+    def _apply(self, entry, delta: int) -> None:
+        _, speaker, words, phrases, concepts = entry
+        for word in words:
+            count = self.words[word]
+            new = count + delta
+            self.word_log_sum += (new * math.log2(new) if new > 1 else 0.0) - \
+                (count * math.log2(count) if count > 1 else 0.0)
+            if new:
+                self.words[word] = new
+            else:
+                del self.words[word]
+        self.word_total += delta * len(words)
+
+        for phrase in phrases:
+            count = self.phrases[phrase]
+            new = count + delta
+            # Phrases seen exactly once in the window
+            self.unique_phrases += (new == 1) - (count == 1)
+            if new:
+                self.phrases[phrase] = new
+            else:
+                del self.phrases[phrase]
+
+        for term in concepts:
+            self.concepts[term] += delta
+            if not self.concepts[term]:
+                del self.concepts[term]
+
+        self.speakers[speaker] += delta
+        if not self.speakers[speaker]:
+            del self.speakers[speaker]
+
+    def scores(self, timestamp: Optional[datetime] = None) -> Dict[str, Any]:
+        """Novelty, diversity and collaboration (0-1) for the current window"""
+        total = self.word_total
+        vocab = len(self.words)
+        # Word entropy normalized by its maximum: 1 when every word is used equally
+        diversity = 0.0
+        if total and vocab > 1:
+            entropy = math.log2(total) - self.word_log_sum / total
+            diversity = min(1.0, max(0.0, entropy / math.log2(vocab)))
+
+        turns = sum(self.speakers.values())
+        # Speaker entropy normalized the same way: 1 when turns are evenly shared
+        collaboration = 0.0
+        if len(self.speakers) > 1:
+            entropy = -sum(c / turns * math.log2(c / turns) for c in self.speakers.values())
+            collaboration = entropy / math.log2(len(self.speakers))
+
+        return {
+            'index': self.seen - 1,
+            'timestamp': (timestamp or datetime.now()).isoformat(),
+            'window_messages': len(self.entries),
+            'novelty': round(novelty_score(vocab, self.unique_phrases, len(self.concepts)) / 100, 4),
+            'diversity': round(diversity, 4),
+            'collaboration': round(collaboration, 4),
+            'vocabulary_size': vocab,
+            'unique_phrases': self.unique_phrases,
+            'unique_concepts': len(self.concepts),
+            'turn_balance': {speaker: round(c / turns * 100, 2) for speaker, c in self.speakers.items()},
+        }
+
+
 if __name__ == "__main__":
     tracker = EmergentPropertyTracker()
 
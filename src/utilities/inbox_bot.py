@@ -3,29 +3,39 @@
 Inbox Bot - Automated message monitoring and response system
 Can be extended with custom handlers for different message types.
 Currently monitors and alerts on new messages.
+New files are picked up from filesystem events and handled on a thread pool.
 """
 
 import os
-import json
-import time
 import hashlib
 from datetime import datetime
 from pathlib import Path
-from collections import defaultdict
 import threading
 
+try:
+    from inbox_events import InboxMonitor, SeenLog
+except ImportError:
+    from .inbox_events import InboxMonitor, SeenLog
+
 CLAUDE_INBOX = Path("C:/Users/user/ShearwaterAICAD/communication/claude_code_inbox")
 GEMINI_INBOX = Path("C:/Users/user/ShearwaterAICAD/communication/gemini_cli_inbox")
 LOGS_DIR = Path("logs")
 
 class InboxBot:
-    def __init__(self, check_interval=3, auto_respond=False):
+    def __init__(self, check_interval=3, auto_respond=False, max_workers=4):
+        # check_interval is kept for compatibility; new messages arrive as events
         self.check_interval = check_interval
         self.auto_respond = auto_respond
-        self.seen_files = defaultdict(set)
         self.running = True
+        self.stop_event = threading.Event()
+        self.log_lock = threading.Lock()
         self.message_handlers = {}
-        self.load_seen_files()
+        self.seen_log = SeenLog(LOGS_DIR / "inbox_bot_seen.log", legacy_cache=LOGS_DIR / "inbox_bot_cache.json")
+        self.seen_files = self.seen_log.as_dict()
+        self.monitor = InboxMonitor(
+            {'claude': ('claude_code_inbox', CLAUDE_INBOX), 'gemini': ('gemini_cli_inbox', GEMINI_INBOX)},
+            self.seen_log, self.process_message, load_data=True, max_workers=max_workers,
+        )
         self.register_default_handlers()
 
     def register_handler(self, message_type, handler_func):
@@ -63,30 +73,12 @@ class InboxBot:
         print(f"   From: {message_data.get('from')}")
         print(f"   Subject: {message_data.get('subject')}")
 
-    def load_seen_files(self):
-        """Load previously seen files from cache"""
-        cache_file = LOGS_DIR / "inbox_bot_cache.json"
-        if cache_file.exists():
-            try:
-                with open(cache_file, 'r') as f:
-                    data = json.load(f)
-                    self.seen_files = defaultdict(set, {k: set(v) for k, v in data.items()})
-            except:
-                pass
-
-    def save_seen_files(self):
-        """Save seen files to cache"""
-        LOGS_DIR.mkdir(parents=True, exist_ok=True)
-        cache_file = LOGS_DIR / "inbox_bot_cache.json"
-        with open(cache_file, 'w') as f:
-            json.dump({k: list(v) for k, v in self.seen_files.items()}, f)
-
     def log_message(self, message_data, inbox_name):
         """Log message to inbox bot log"""
         LOGS_DIR.mkdir(parents=True, exist_ok=True)
         log_file = LOGS_DIR / "inbox_bot.log"
 
-        with open(log_file, 'a') as f:
+        with self.log_lock, open(log_file, 'a') as f:
             timestamp = datetime.now().isoformat()
             f.write(f"\n[{timestamp}] {inbox_name}\n")
             f.write(f"  From: {message_data.get('from', 'unknown')}\n")
@@ -100,49 +92,8 @@ class InboxBot:
         return sorted([f for f in inbox_path.glob("*.json")], key=lambda x: x.stat().st_mtime, reverse=True)
 
     def check_for_new_messages(self):
-        """Check both inboxes for new files"""
-        new_messages = []
-
-        # Check Claude inbox
-        claude_files = self.get_inbox_files(CLAUDE_INBOX)
-        for file in claude_files:
-            if file.name not in self.seen_files['claude']:
-                try:
-                    with open(file, 'r') as f:
-                        data = json.load(f)
-                    new_messages.append({
-                        'inbox': 'claude_code_inbox',
-                        'file': file.name,
-                        'path': str(file),
-                        'timestamp': datetime.fromtimestamp(file.stat().st_mtime).isoformat(),
-                        'data': data
-                    })
-                    self.seen_files['claude'].add(file.name)
-                except:
-                    pass
-
-        # Check Gemini inbox
-        gemini_files = self.get_inbox_files(GEMINI_INBOX)
-        for file in gemini_files:
-            if file.name not in self.seen_files['gemini']:
-                try:
-                    with open(file, 'r') as f:
-                        data = json.load(f)
-                    new_messages.append({
-                        'inbox': 'gemini_cli_inbox',
-                        'file': file.name,
-                        'path': str(file),
-                        'timestamp': datetime.fromtimestamp(file.stat().st_mtime).isoformat(),
-                        'data': data
-                    })
-                    self.seen_files['gemini'].add(file.name)
-                except:
-                    pass
-
-        if new_messages:
-            self.save_seen_files()
-
-        return new_messages
+        """Check both inboxes once for new files"""
+        return self.monitor.scan()
 
     def process_message(self, message):
         """Process a single message"""
@@ -162,34 +113,31 @@ class InboxBot:
             print(f"   Subject: {data.get('subject', 'N/A')}\n")
 
     def run(self):
-        """Main bot loop"""
+        """Main bot loop: block while the monitor dispatches new messages"""
         print("\n" + "="*50)
         print("[INBOX BOT] Started")
         print("="*50)
         print(f"[*] Monitoring Claude and Gemini inboxes")
-        print(f"[*] Check interval: {self.check_interval} seconds")
         print(f"[*] Auto-respond enabled: {self.auto_respond}\n")
 
         try:
+            self.monitor.start()
+            print(f"[*] Watching with {type(self.monitor.watcher).__name__}\n")
             while self.running:
-                new_messages = self.check_for_new_messages()
-
-                if new_messages:
-                    for msg in new_messages:
-                        self.process_message(msg)
-
-                time.sleep(self.check_interval)
+                self.stop_event.wait(1)
 
         except KeyboardInterrupt:
             print("\n[INBOX BOT] Stopped by user")
-            self.save_seen_files()
         except Exception as e:
             print(f"\n[ERROR] {e}")
-            self.save_seen_files()
+        finally:
+            self.monitor.stop()
+            self.seen_log.close()
 
     def stop(self):
         """Stop the bot"""
         self.running = False
+        self.stop_event.set()
 
 if __name__ == "__main__":
     import sys
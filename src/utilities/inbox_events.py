@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Event-driven inbox monitoring shared by InboxWatcher and InboxBot.
+
+Replaces sleep-and-glob loops with filesystem notifications:
+- watchdog (if installed), otherwise Linux inotify through ctypes,
+  otherwise a 50 ms directory-mtime poll that only lists a directory
+  when it actually changed
+- An append-only seen log, so marking a file costs one line instead of
+  rewriting the whole cache
+- Handlers run on a thread pool, so a slow handler never delays detection
+"""
+
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    HAS_WATCHDOG = True
+except ImportError:
+    HAS_WATCHDOG = False
+
+# inotify constants (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = os.O_NONBLOCK
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len
+
+# Callback signature for watchers: (inbox_key, file_path)
+FileCallback = Callable[[str, Path], None]
+
+
+class SeenLog:
+    """
+    Append-only record of (inbox, filename) pairs already handled.
+
+    Each new entry is one tab-separated line. The old JSON cache format
+    ({inbox: [filenames]}) is imported on first use.
+    """
+
+    def __init__(self, log_file: Path, legacy_cache: Optional[Path] = None):
+        self.log_file = Path(log_file)
+        self.lock = threading.Lock()
+        self.seen: Dict[str, Set[str]] = {}
+        self._load(legacy_cache)
+
+    def _load(self, legacy_cache: Optional[Path]) -> None:
+        self.log_file.parent.mkdir(parents=True, exist_ok=True)
+        if not self.log_file.exists() and legacy_cache and legacy_cache.exists():
+            try:
+                with open(legacy_cache, 'r') as f:
+                    data = json.load(f)
+                with open(self.log_file, 'w', encoding='utf-8') as f:
+                    for inbox, names in data.items():
+                        for name in names:
+                            f.write(f"{inbox}\t{name}\n")
+            except (OSError, json.JSONDecodeError):
+                pass
+
+        if self.log_file.exists():
+            with open(self.log_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    inbox, sep, name = line.rstrip("\n").partition("\t")
+                    if sep:
+                        self.seen.setdefault(inbox, set()).add(name)
+        self.handle = open(self.log_file, 'a', encoding='utf-8')
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        inbox, name = key
+        return name in self.seen.get(inbox, ())
+
+    def add(self, inbox: str, name: str) -> bool:
+        """Record a file; False if it was already seen"""
+        with self.lock:
+            names = self.seen.setdefault(inbox, set())
+            if name in names:
+                return False
+            names.add(name)
+            self.handle.write(f"{inbox}\t{name}\n")
+            self.handle.flush()
+            return True
+
+    def as_dict(self) -> Dict[str, Set[str]]:
+        return self.seen
+
+    def close(self) -> None:
+        with self.lock:
+            self.handle.close()
+
+
+class _PollingWatcher:
+    """
+    Portable fallback: stat each inbox and list it only when its mtime
+    changes. With modified, every poll also stats the files, to report
+    ones written in place (a directory's mtime does not change on append).
+    """
+
+    def __init__(self, inboxes: Dict[str, Path], callback: FileCallback, interval: float = 0.05,
+                 modified: bool = False):
+        self.inboxes = inboxes
+        self.callback = callback
+        self.interval = interval
+        self.modified = modified
+        self.mtimes = {}
+        self.known = {}
+        self.sizes = {}
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        # Take the baseline listing before returning so nothing created after
+        # start() can slip into it unreported
+        for key, path in self.inboxes.items():
+            self._list(key, path)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        self.thread.join(timeout=2)
+
+    def _list(self, key: str, path: Path) -> Set[str]:
+        try:
+            mtime = path.stat().st_mtime_ns
+            names = {e.name for e in os.scandir(path)}
+        except OSError:
+            return set()
+        self.mtimes[key] = mtime
+        new_names = names - self.known.get(key, names)
+        self.known[key] = names
+        return new_names
+
+    def _changed(self, key: str, path: Path) -> Set[str]:
+        """Files whose size or mtime changed since the last poll"""
+        stats = {}
+        try:
+            for entry in os.scandir(path):
+                if entry.is_file():
+                    stat = entry.stat()
+                    stats[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            return set()
+        before = self.sizes.get(key)
+        self.sizes[key] = stats
+        if before is None:
+            return set()
+        return {name for name, stat in stats.items() if before.get(name) not in (None, stat)}
+
+    def _run(self) -> None:
+        if self.modified:
+            for key, path in self.inboxes.items():
+                self._changed(key, path)
+        while not self.stop_event.wait(self.interval):
+            for key, path in self.inboxes.items():
+                if self.modified:
+                    for name in self._changed(key, path):
+                        self.callback(key, path / name)
+                try:
+                    mtime = path.stat().st_mtime_ns
+                except OSError:
+                    continue
+                # Directory mtimes can be coarse, so keep listing while recent
+                if mtime == self.mtimes.get(key) and time.time_ns() - mtime > 2_000_000_000:
+                    continue
+                for name in self._list(key, path):
+                    self.callback(key, path / name)
+
+
+class _InotifyWatcher:
+    """Linux inotify through ctypes: reports files closed after writing or moved in (or, with modified, written to)"""
+
+    def __init__(self, inboxes: Dict[str, Path], callback: FileCallback, modified: bool = False):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.callback = callback
+        self.watches = {}
+        for key, path in inboxes.items():
+            path.mkdir(parents=True, exist_ok=True)
+            mask = IN_CLOSE_WRITE | IN_MOVED_TO | (IN_MODIFY if modified else 0)
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(str(path)), mask)
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+            self.watches[wd] = (key, path)
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        self.thread.join(timeout=2)
+        os.close(self.fd)
+
+    def _run(self) -> None:
+        while not self.stop_event.is_set():
+            readable, _, _ = select.select([self.fd], [], [], 0.25)
+            if not readable:
+                continue
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                continue
+            offset = 0
+            while offset + INOTIFY_EVENT.size <= len(data):
+                wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+                offset += length
+                if name and wd in self.watches:
+                    key, path = self.watches[wd]
+                    self.callback(key, path / name)
+
+
+class _WatchdogWatcher:
+    """watchdog observer (inotify, FSEvents or ReadDirectoryChangesW)"""
+
+    def __init__(self, inboxes: Dict[str, Path], callback: FileCallback, modified: bool = False):
+        self.observer = Observer()
+        for key, path in inboxes.items():
+            path.mkdir(parents=True, exist_ok=True)
+            self.observer.schedule(self._handler(key, callback, modified), str(path), recursive=False)
+
+    @staticmethod
+    def _handler(key: str, callback: FileCallback, modified: bool):
+        class Handler(FileSystemEventHandler):
+            def on_modified(self, event):
+                if modified and not event.is_directory:
+                    callback(key, Path(event.src_path))
+
+            def on_created(self, event):
+                if not event.is_directory:
+                    callback(key, Path(event.src_path))
+
+            def on_moved(self, event):
+                if not event.is_directory:
+                    callback(key, Path(event.dest_path))
+
+            def on_closed(self, event):
+                if not event.is_directory:
+                    callback(key, Path(event.src_path))
+
+        return Handler()
+
+    def start(self) -> None:
+        self.observer.start()
+
+    def stop(self) -> None:
+        self.observer.stop()
+        self.observer.join(timeout=2)
+
+
+def create_watcher(inboxes: Dict[str, Path], callback: FileCallback, backend: str = "auto",
+                   modified: bool = False):
+    """
+    Pick a watcher (auto, watchdog, inotify or poll); auto prefers watchdog,
+    then inotify. With modified, files written in place (such as appends to
+    a log) are reported as well as new ones, possibly once per write.
+    """
+    if backend in ("auto", "watchdog") and HAS_WATCHDOG:
+        return _WatchdogWatcher(inboxes, callback, modified)
+    if backend in ("auto", "inotify") and sys.platform.startswith("linux"):
+        try:
+            return _InotifyWatcher(inboxes, callback, modified)
+        except (OSError, AttributeError):
+            if backend == "inotify":
+                raise
+    return _PollingWatcher(inboxes, callback, modified=modified)
+
+
+def read_message(path: Path, attempts: int = 25, delay: float = 0.02) -> Optional[Dict]:
+    """Read a JSON message, retrying briefly in case the writer is mid-write"""
+    for _ in range(attempts):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            time.sleep(delay)
+        except OSError:
+            return None
+    return None
+
+
+class InboxMonitor:
+    """
+    Watches a set of inboxes and dispatches each new *.json file once.
+
+    handler(message) receives a dict with inbox, file, path, timestamp and,
+    when load_data is set, the parsed data. Handlers run on a thread pool.
+    """
+
+    def __init__(self, inboxes: Dict[str, Tuple[str, Path]], seen_log: SeenLog,
+                 handler: Callable[[Dict], None], load_data: bool = False,
+                 max_workers: int = 4, backend: str = "auto"):
+        # inboxes: key -> (display name, directory)
+        self.inboxes = inboxes
+        self.seen_log = seen_log
+        self.handler = handler
+        self.load_data = load_data
+        self.max_workers = max_workers
+        self.backend = backend
+        self.pool = None
+        self.watcher = None
+
+    def scan(self) -> List[Dict]:
+        """One pass over every inbox, returning unseen files oldest first"""
+        found = []
+        for key, (_, path) in self.inboxes.items():
+            if not path.exists():
+                continue
+            for entry in os.scandir(path):
+                if entry.name.endswith(".json") and (key, entry.name) not in self.seen_log:
+                    found.append((entry.stat().st_mtime, key, Path(entry.path)))
+        found.sort()
+        messages = []
+        for _, key, file_path in found:
+            message = self._claim(key, file_path)
+            if message is not None:
+                messages.append(message)
+        return messages
+
+    def _claim(self, key: str, file_path: Path) -> Optional[Dict]:
+        if not file_path.name.endswith(".json") or file_path.name.startswith("."):
+            return None
+        if (key, file_path.name) in self.seen_log:
+            return None
+        message = {
+            'inbox': self.inboxes[key][0],
+            'file': file_path.name,
+            'path': str(file_path),
+        }
+        try:
+            message['timestamp'] = datetime.fromtimestamp(file_path.stat().st_mtime).isoformat()
+        except OSError:
+            return None  # Already moved away (e.g. archived)
+        if self.load_data:
+            data = read_message(file_path)
+            if data is None:
+                return None
+            message['data'] = data
+        if not self.seen_log.add(key, file_path.name):
+            return None  # Another event got there first
+        return message
+
+    def _on_file(self, key: str, file_path: Path) -> None:
+        message = self._claim(key, file_path)
+        if message is not None and self.pool is not None:
+            self.pool.submit(self._dispatch, message)
+
+    def _dispatch(self, message: Dict) -> None:
+        try:
+            self.handler(message)
+        except Exception as e:
+            print(f"[ERROR] Inbox handler failed for {message['file']}: {e}")
+
+    def start(self, catch_up: bool = True) -> None:
+        """Start watching; with catch_up, dispatch files that arrived while stopped"""
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inbox")
+        self.watcher = create_watcher({key: path for key, (_, path) in self.inboxes.items()},
+                                      self._on_file, self.backend)
+        self.watcher.start()
+        if catch_up:
+            for message in self.scan():
+                self.pool.submit(self._dispatch, message)
+
+    def stop(self) -> None:
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
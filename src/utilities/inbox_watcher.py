@@ -3,42 +3,36 @@
 Inbox Watcher Bot
 Monitors both Claude and Gemini inboxes for new messages.
 Alerts on new arrivals and can trigger automated responses.
+Arrivals are pushed by filesystem events (see inbox_events), not polled.
 """
 
 import os
 import json
 import time
 import hashlib
-from datetime import datetime
 from pathlib import Path
-from collections import defaultdict
+
+try:
+    from inbox_events import InboxMonitor, SeenLog
+except ImportError:
+    from .inbox_events import InboxMonitor, SeenLog
 
 CLAUDE_INBOX = Path("C:/Users/user/ShearwaterAICAD/communication/claude_code_inbox")
 GEMINI_INBOX = Path("C:/Users/user/ShearwaterAICAD/communication/gemini_cli_inbox")
 
 class InboxWatcher:
     def __init__(self, check_interval=5):
+        # check_interval is kept for compatibility; the watch loop is event-driven
         self.check_interval = check_interval
-        self.seen_files = defaultdict(set)
-        self.load_seen_files()
-
-    def load_seen_files(self):
-        """Load previously seen files from cache"""
-        cache_file = Path("logs/inbox_cache.json")
-        if cache_file.exists():
-            try:
-                with open(cache_file, 'r') as f:
-                    data = json.load(f)
-                    self.seen_files = defaultdict(set, {k: set(v) for k, v in data.items()})
-            except:
-                pass
-
-    def save_seen_files(self):
-        """Save seen files to cache"""
-        cache_file = Path("logs/inbox_cache.json")
-        cache_file.parent.mkdir(parents=True, exist_ok=True)
-        with open(cache_file, 'w') as f:
-            json.dump({k: list(v) for k, v in self.seen_files.items()}, f)
+        self.seen_log = SeenLog(Path("logs/inbox_seen.log"), legacy_cache=Path("logs/inbox_cache.json"))
+        self.seen_files = self.seen_log.as_dict()
+        self.monitor = InboxMonitor(self.inboxes(), self.seen_log, self.alert)
+
+    def inboxes(self):
+        return {
+            'claude': ('claude_code_inbox', CLAUDE_INBOX),
+            'gemini': ('gemini_cli_inbox', GEMINI_INBOX),
+        }
 
     def get_inbox_files(self, inbox_path):
         """Get all JSON files in inbox"""
@@ -47,37 +41,8 @@ class InboxWatcher:
         return sorted([f for f in inbox_path.glob("*.json")], key=lambda x: x.stat().st_mtime, reverse=True)
 
     def check_for_new_messages(self):
-        """Check both inboxes for new files"""
-        new_messages = []
-
-        # Check Claude inbox
-        claude_files = self.get_inbox_files(CLAUDE_INBOX)
-        for file in claude_files:
-            if file.name not in self.seen_files['claude']:
-                new_messages.append({
-                    'inbox': 'claude_code_inbox',
-                    'file': file.name,
-                    'path': str(file),
-                    'timestamp': datetime.fromtimestamp(file.stat().st_mtime).isoformat()
-                })
-                self.seen_files['claude'].add(file.name)
-
-        # Check Gemini inbox
-        gemini_files = self.get_inbox_files(GEMINI_INBOX)
-        for file in gemini_files:
-            if file.name not in self.seen_files['gemini']:
-                new_messages.append({
-                    'inbox': 'gemini_cli_inbox',
-                    'file': file.name,
-                    'path': str(file),
-                    'timestamp': datetime.fromtimestamp(file.stat().st_mtime).isoformat()
-                })
-                self.seen_files['gemini'].add(file.name)
-
-        if new_messages:
-            self.save_seen_files()
-
-        return new_messages
+        """Check both inboxes once for new files"""
+        return self.monitor.scan()
 
     def format_alert(self, message):
         """Format alert message"""
@@ -105,25 +70,26 @@ class InboxWatcher:
             print(f"[ERROR] Could not read message: {e}")
             return None
 
+    def alert(self, message):
+        """Print the alert and a preview for one new message"""
+        print(self.format_alert(message))
+        self.display_message_preview(message['path'])
+
     def run_watch_loop(self):
-        """Main watch loop"""
+        """Main watch loop: block while the monitor dispatches new files"""
         print("[INBOX WATCHER] Started. Monitoring both inboxes...")
-        print(f"[INBOX WATCHER] Check interval: {self.check_interval} seconds\n")
 
         try:
+            self.monitor.start()
+            print(f"[INBOX WATCHER] Watching with {type(self.monitor.watcher).__name__}\n")
             while True:
-                new_messages = self.check_for_new_messages()
-
-                if new_messages:
-                    for msg in new_messages:
-                        print(self.format_alert(msg))
-                        self.display_message_preview(msg['path'])
-
-                time.sleep(self.check_interval)
+                time.sleep(1)
 
         except KeyboardInterrupt:
             print("\n[INBOX WATCHER] Stopped by user")
-            self.save_seen_files()
+        finally:
+            self.monitor.stop()
+            self.seen_log.close()
 
     def list_unread(self):
         """List all unread messages"""
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Message Corpus
+
+Tokenized view of a message log, built in one pass and shared by the
+EmergentPropertyTracker metrics instead of each metric re-reading the
+messages.
+
+- vocabulary / words: interned \\w+ words (word -> id, id -> word)
+- tokens: the word ids of each message, as array('I')
+- introductions: (message index, word) in order of first appearance
+- term_ids: the whitespace-split terms of every message, interned, in one
+  flat array('I') (term_offsets[i]: where message i starts)
+- phrase_stats: counts of n-term phrases (PhraseStats)
+- text: every lowered message joined by ' ' (raw_text: the same, unlowered),
+  with starts[i] the offset of message i in text
+
+PhraseStats counts phrases as 64-bit hashes in NumPy arrays rather than
+as Python strings: exactly (sorted unique hashes with counts) or
+approximately (a fixed-size count-min sketch; see the class docstring for
+its error bound). Without NumPy it falls back to an exact Counter.
+"""
+
+import re
+from array import array
+from bisect import bisect_right
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# NumPy hashes and counts phrases in bulk; without it they are counted as term id tuples
+try:
+    import numpy as np
+    NUMPY_SUPPORT = True
+except ImportError:
+    NUMPY_SUPPORT = False
+
+WORD_PATTERN = re.compile(r'\b\w+\b')
+PHRASE_SIZE = 3
+MIN_PHRASE_CHARS = 10  # Phrases must be longer than this to count
+PHRASE_MODES = ('exact', 'approximate')
+PHRASE_BLOCK = 1 << 16  # Phrase positions hashed at a time, to bound temporaries
+SKETCH_WIDTH = 1 << 22
+SKETCH_DEPTH = 4
+
+if NUMPY_SUPPORT:
+    _GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+    _MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+    _MIX_2 = np.uint64(0x94D049BB133111EB)
+
+
+def message_text(msg: Dict[str, Any]) -> str:
+    return str(msg.get('Message', ''))
+
+
+def _mix64(x):
+    """splitmix64 finalizer over a uint64 array"""
+    x = x ^ (x >> np.uint64(30))
+    x = x * _MIX_1
+    x = x ^ (x >> np.uint64(27))
+    x = x * _MIX_2
+    return x ^ (x >> np.uint64(31))
+
+
+class PhraseStats:
+    """
+    Counts of n-term phrases over a flat array of interned term ids.
+
+    A phrase is n consecutive terms of one message whose joined length
+    exceeds min_chars. Each is hashed to 64 bits (distinct phrases collide
+    with probability about D^2 / 2^65 for D distinct phrases).
+
+    - exact: sorted unique hashes (uint64) with uint32 counts, 12 bytes per
+      distinct phrase, merged block by block
+    - approximate: a depth x width count-min sketch of uint8 cells that
+      saturate at 2, since only "once" versus "more" is needed; memory is
+      fixed at depth * width bytes. A sketch never undercounts, so every
+      phrase it reports as seen once was; a phrase seen once is missed only
+      if it shares a cell with another distinct phrase in every row, which
+      happens with probability (1 - e^(-D / width))^depth <= (D / width)^depth.
+      With the default 4 x 2^22 (16 MB) and D = 1M, at most 0.3% of unique
+      phrases go uncounted.
+    """
+
+    def __init__(self, term_ids: array, term_offsets: array, term_lengths: List[int], n: int = PHRASE_SIZE,
+                 min_chars: int = MIN_PHRASE_CHARS, mode: str = 'exact', width: int = SKETCH_WIDTH,
+                 depth: int = SKETCH_DEPTH):
+        if mode not in PHRASE_MODES:
+            raise ValueError(f"mode must be one of {PHRASE_MODES}")
+        if n < 1:
+            raise ValueError("n must be positive")
+        self.n = n
+        self.min_chars = min_chars
+        self.mode = mode if NUMPY_SUPPORT else 'exact'
+        self.term_ids = term_ids
+        self.term_offsets = term_offsets
+        self.term_lengths = term_lengths
+        self.total = 0  # Phrase occurrences counted
+        self._unique: Optional[int] = None
+
+        if not NUMPY_SUPPORT:
+            self.counts = Counter(key for _, key in self._python_phrases())
+            self.total = sum(self.counts.values())
+            return
+        self.keys = np.zeros(0, dtype=np.uint64)
+        self.counts = np.zeros(0, dtype=np.uint32)
+        if self.mode == 'approximate':
+            self.width, self.depth = width, depth
+            self.sketch = np.zeros((depth, width), dtype=np.uint8)
+            self._row_seeds = [np.uint64(((row + 1) * int(_GOLDEN)) & 0xFFFFFFFFFFFFFFFF) for row in range(depth)]
+        pending, pending_size = [], 0
+        for _, hashes in self._blocks():
+            self.total += len(hashes)
+            if self.mode == 'approximate':
+                self._sketch_add(hashes)
+                continue
+            # Blocks are merged once they add up to the table so far, so merging stays O(D log D) overall
+            pending.append(np.unique(hashes, return_counts=True))
+            pending_size += len(pending[-1][0])
+            if pending_size >= max(len(self.keys), PHRASE_BLOCK):
+                self._merge(pending)
+                pending, pending_size = [], 0
+        if pending:
+            self._merge(pending)
+
+    @property
+    def nbytes(self) -> int:
+        if not NUMPY_SUPPORT:
+            return 0
+        return self.sketch.nbytes if self.mode == 'approximate' else self.keys.nbytes + self.counts.nbytes
+
+    @property
+    def distinct(self) -> Optional[int]:
+        """Distinct phrases (exact mode only)"""
+        if self.mode == 'approximate':
+            return None
+        return len(self.keys) if NUMPY_SUPPORT else len(self.counts)
+
+    def _blocks(self) -> Iterator[Tuple['np.ndarray', 'np.ndarray']]:
+        """(start positions, hashes) of the phrases in each block of positions"""
+        n = self.n
+        total_terms = len(self.term_ids)
+        if total_terms < n:
+            return
+        ids = np.frombuffer(self.term_ids, dtype=np.uint32)
+        offsets = np.frombuffer(self.term_offsets, dtype=np.uint64).astype(np.int64)
+        lengths = np.asarray(self.term_lengths, dtype=np.int32)
+        positions = total_terms - n + 1
+        for start in range(0, positions, PHRASE_BLOCK):
+            stop = min(positions, start + PHRASE_BLOCK)
+            size = stop - start
+            hashes = np.zeros(size, dtype=np.uint64)
+            chars = np.full(size, n - 1, dtype=np.int32)  # Spaces between terms
+            for j in range(n):
+                part = ids[start + j:start + j + size]
+                hashes = _mix64(hashes * _GOLDEN + part.astype(np.uint64) + np.uint64(1))
+                chars += lengths[part]
+            pos = np.arange(start, stop, dtype=np.int64)
+            # Phrases may not span two messages
+            same_message = (np.searchsorted(offsets, pos, side='right') ==
+                            np.searchsorted(offsets, pos + (n - 1), side='right'))
+            keep = same_message & (chars > self.min_chars)
+            yield pos[keep], hashes[keep]
+
+    def _python_phrases(self) -> Iterator[Tuple[int, Tuple[int, ...]]]:
+        """(start position, term id tuple) of every phrase, without NumPy"""
+        n, ids, offsets = self.n, self.term_ids, self.term_offsets
+        for message, start in enumerate(offsets):
+            end = offsets[message + 1] if message + 1 < len(offsets) else len(ids)
+            for pos in range(start, end - n + 1):
+                key = tuple(ids[pos:pos + n])
+                if sum(self.term_lengths[t] for t in key) + n - 1 > self.min_chars:
+                    yield pos, key
+
+    def _merge(self, blocks: List[Tuple['np.ndarray', 'np.ndarray']]) -> None:
+        keys = np.concatenate([self.keys] + [block_keys for block_keys, _ in blocks])
+        counts = np.concatenate([self.counts] + [block_counts.astype(np.uint32) for _, block_counts in blocks])
+        if not len(keys):
+            return
+        order = np.argsort(keys)
+        keys, counts = keys[order], counts[order]
+        del order
+        first = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+        self.keys = keys[first]
+        self.counts = np.add.reduceat(counts, first).astype(np.uint32)
+
+    def _row_index(self, hashes: 'np.ndarray', row: int) -> 'np.ndarray':
+        return _mix64(hashes ^ self._row_seeds[row]) % np.uint64(self.width)
+
+    def _sketch_add(self, hashes: 'np.ndarray') -> None:
+        for row in range(self.depth):
+            cells, counts = np.unique(self._row_index(hashes, row), return_counts=True)
+            self.sketch[row, cells] = np.minimum(self.sketch[row, cells] + counts, 2)
+
+    def _seen_once(self, hashes: 'np.ndarray') -> 'np.ndarray':
+        if self.mode == 'approximate':
+            estimate = np.full(len(hashes), 2, dtype=np.uint8)
+            for row in range(self.depth):
+                estimate = np.minimum(estimate, self.sketch[row, self._row_index(hashes, row)])
+            return estimate == 1
+        index = np.minimum(np.searchsorted(self.keys, hashes), max(len(self.keys) - 1, 0))
+        return (self.keys[index] == hashes) & (self.counts[index] == 1)
+
+    def unique_count(self) -> int:
+        """Phrases seen exactly once (a lower bound in approximate mode)"""
+        if self._unique is None:
+            if not NUMPY_SUPPORT:
+                self._unique = sum(1 for count in self.counts.values() if count == 1)
+            elif self.mode == 'exact':
+                self._unique = int(np.count_nonzero(self.counts == 1))
+            else:
+                self._unique = sum(int(np.count_nonzero(self._seen_once(h))) for _, h in self._blocks())
+        return self._unique
+
+    def unique_positions(self) -> Iterator[int]:
+        """Start positions (in term_ids) of the phrases seen exactly once, in order"""
+        if not NUMPY_SUPPORT:
+            for pos, key in self._python_phrases():
+                if self.counts[key] == 1:
+                    yield pos
+            return
+        for positions, hashes in self._blocks():
+            yield from positions[self._seen_once(hashes)].tolist()
+
+
+class MessageCorpus:
+    """Interned tokens, phrase counts and joined text of a list of messages"""
+
+    def __init__(self, messages: List[Dict[str, Any]], phrase_size: int = PHRASE_SIZE, phrase_mode: str = 'exact'):
+        self.size = len(messages)
+        self.vocabulary: Dict[str, int] = {}
+        self.words: List[str] = []
+        self.tokens: List[array] = []
+        self.introductions: List[Tuple[int, str]] = []
+        self.terms: Dict[str, int] = {}
+        self.term_lengths: List[int] = []
+        self.term_ids = array('I')
+        self.term_offsets = array('Q')
+        self.speaker_counts: Dict[str, int] = {}
+        self.lengths = array('I')
+        self.starts = array('Q')
+
+        lowered, raw = [], []
+        offset = 0
+        for index, msg in enumerate(messages):
+            text = message_text(msg)
+            lower = text.lower()
+            raw.append(text)
+            lowered.append(lower)
+            self.lengths.append(len(text))
+            self.starts.append(offset)
+            offset += len(lower) + 1
+
+            speaker = msg.get('SpeakerName', 'unknown')
+            self.speaker_counts[speaker] = self.speaker_counts.get(speaker, 0) + 1
+            self.tokens.append(array('I', [self._intern_word(word, index) for word in WORD_PATTERN.findall(lower)]))
+            self.term_offsets.append(len(self.term_ids))
+            self.term_ids.extend(self._intern_term(term) for term in lower.split())
+
+        self.text = ' '.join(lowered)
+        self.raw_text = ' '.join(raw)
+        self.term_list = list(self.terms)
+        self.phrase_stats = PhraseStats(self.term_ids, self.term_offsets, self.term_lengths,
+                                        n=phrase_size, mode=phrase_mode)
+        self._concepts: Dict[Tuple[str, ...], Counter] = {}
+        self._matches: Dict[Tuple[str, bool], int] = {}
+        self._containing: Dict[str, List[int]] = {}
+        self._unique_phrases = None
+
+    def _intern_word(self, word: str, index: int) -> int:
+        word_id = self.vocabulary.get(word)
+        if word_id is None:
+            word_id = self.vocabulary[word] = len(self.words)
+            self.words.append(word)
+            self.introductions.append((index, word))
+        return word_id
+
+    def _intern_term(self, term: str) -> int:
+        term_id = self.terms.get(term)
+        if term_id is None:
+            term_id = self.terms[term] = len(self.term_lengths)
+            self.term_lengths.append(len(term))
+        return term_id
+
+    def phrase_at(self, position: int) -> str:
+        """The phrase starting at a position of term_ids"""
+        return ' '.join(self.term_list[t] for t in self.term_ids[position:position + self.phrase_stats.n])
+
+    def unique_phrase_count(self) -> int:
+        return self.phrase_stats.unique_count()
+
+    def unique_phrases(self) -> List[str]:
+        """Phrases seen exactly once, in order of appearance"""
+        if self._unique_phrases is None:
+            self._unique_phrases = [self.phrase_at(pos) for pos in self.phrase_stats.unique_positions()]
+        return self._unique_phrases
+
+    def message_index(self, position: int) -> int:
+        """Message containing a position of text"""
+        return bisect_right(self.starts, position) - 1
+
+    def messages_containing(self, needle: str) -> List[int]:
+        """Indices of the messages whose lowered text contains needle (computed once per needle)"""
+        if needle in self._containing:
+            return self._containing[needle]
+        found = self._containing[needle] = []
+        position = self.text.find(needle)
+        while position != -1:
+            index = self.message_index(position)
+            end = self.starts[index + 1] - 1 if index + 1 < self.size else len(self.text)
+            if position + len(needle) <= end:
+                found.append(index)
+                position = end  # Skip the rest of this message
+            position = self.text.find(needle, position + 1)
+        return found
+
+    def concept_counts(self, terms: Iterable[str]) -> Counter:
+        """Number of messages mentioning each term (computed once per term list)"""
+        terms = tuple(terms)
+        if terms not in self._concepts:
+            counts = Counter()
+            for term in terms:
+                count = len(self.messages_containing(term))
+                if count:
+                    counts[term] = count
+            self._concepts[terms] = counts
+        return self._concepts[terms]
+
+    def count_matches(self, pattern: str, raw: bool = False) -> int:
+        """Matches of a regex over the joined text (raw: unlowered), computed once per pattern"""
+        key = (pattern, raw)
+        if key not in self._matches:
+            self._matches[key] = sum(1 for _ in re.finditer(pattern, self.raw_text if raw else self.text))
+        return self._matches[key]
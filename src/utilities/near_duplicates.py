@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Near-Duplicate Detection (MinHash + LSH)
+
+Exact content hashes miss agent chatter that differs by a counter, a
+timestamp or a word. Each message gets a MinHash signature over character
+shingles of its normalized text; an LSH banding index finds earlier
+messages whose estimated Jaccard similarity reaches a threshold without
+comparing against every message.
+
+- MinHasher: signatures as compact bytes (num_perm x uint32)
+- NearDuplicateIndex: streaming query-then-add, optionally bounded to the
+  most recent max_entries messages
+- The same signature comes out with or without NumPy
+
+Used by defragment_sources (dropped before consolidation) and the live
+recorder in brokers.pub_hub (flagged in metadata).
+"""
+
+import random
+import re
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+# NumPy vectorizes shingling and the permutations; pure Python gives the same signatures
+try:
+    import numpy as np
+    NUMPY_SUPPORT = True
+except ImportError:
+    NUMPY_SUPPORT = False
+
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_SHINGLE_SIZE = 5
+DEFAULT_NUM_PERM = 128
+
+_MASK = 0xFFFFFFFF
+_PRIME = (1 << 61) - 1
+_BASE = 0x01000193
+_SHINGLE_BLOCK = 4096  # Shingles permuted at a time, to bound the NumPy temporaries
+
+_WHITESPACE = re.compile(r'\s+')
+_PUNCTUATION = re.compile(r'[.,!?;:\-]+')
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, collapse whitespace and drop punctuation (as defragment_sources does)"""
+    return _PUNCTUATION.sub('', _WHITESPACE.sub(' ', text.strip().lower()))
+
+
+@lru_cache(maxsize=None)
+def lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    (bands, rows) minimizing the false positive plus false negative area
+    of the banding S-curve around threshold.
+    """
+    def area(bands, rows, lo, hi, fn):
+        steps = 200
+        width = (hi - lo) / steps
+        total = 0.0
+        for i in range(steps):
+            s = lo + (i + 0.5) * width
+            p = 1 - (1 - s ** rows) ** bands
+            total += (1 - p if fn else p) * width
+        return total
+
+    best, best_error = (1, num_perm), None
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            error = area(bands, rows, 0.0, threshold, False) + area(bands, rows, threshold, 1.0, True)
+            if best_error is None or error < best_error:
+                best, best_error = (bands, rows), error
+    return best
+
+
+class MinHasher:
+    """MinHash signatures over character shingles of normalized text"""
+
+    def __init__(self, num_perm: int = DEFAULT_NUM_PERM, shingle_size: int = DEFAULT_SHINGLE_SIZE, seed: int = 1):
+        if num_perm < 1 or shingle_size < 1:
+            raise ValueError("num_perm and shingle_size must be positive")
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = random.Random(seed)
+        self.a = [rng.randrange(1, 1 << 31) for _ in range(num_perm)]
+        self.b = [rng.randrange(0, 1 << 31) for _ in range(num_perm)]
+        if NUMPY_SUPPORT:
+            self._a = np.array(self.a, dtype=np.uint64)[:, None]
+            self._b = np.array(self.b, dtype=np.uint64)[:, None]
+
+    def shingles(self, text: str) -> List[int]:
+        """32-bit hashes of the distinct byte shingles of the normalized text"""
+        data = normalize_text(text).encode('utf-8')
+        k = min(self.shingle_size, len(data))
+        if NUMPY_SUPPORT:
+            return self._shingles_numpy(data, k)
+        hashes = set()
+        for start in range(len(data) - k + 1):
+            h = 0
+            for byte in data[start:start + k]:
+                h = (h * _BASE + byte) & _MASK
+            hashes.add(_mix(h))
+        return sorted(hashes)
+
+    def _shingles_numpy(self, data: bytes, k: int):
+        values = np.frombuffer(data, dtype=np.uint8).astype(np.uint64)
+        count = len(data) - k + 1
+        h = np.zeros(max(count, 0), dtype=np.uint64)
+        for j in range(k):
+            h = (h * np.uint64(_BASE) + values[j:j + count]) & np.uint64(_MASK)
+        h = ((h ^ (h >> np.uint64(16))) * np.uint64(0x45d9f3b)) & np.uint64(_MASK)
+        h = ((h ^ (h >> np.uint64(16))) * np.uint64(0x45d9f3b)) & np.uint64(_MASK)
+        return np.unique(h ^ (h >> np.uint64(16)))
+
+    def signature(self, text: str) -> bytes:
+        """num_perm minimum permuted shingle hashes, as uint32 bytes"""
+        hashes = self.shingles(text)
+        if NUMPY_SUPPORT:
+            signature = np.full(self.num_perm, _MASK, dtype=np.uint64)
+            for start in range(0, len(hashes), _SHINGLE_BLOCK):
+                block = hashes[start:start + _SHINGLE_BLOCK][None, :]
+                permuted = ((self._a * block + self._b) % np.uint64(_PRIME)) & np.uint64(_MASK)
+                signature = np.minimum(signature, permuted.min(axis=1))
+            return signature.astype(np.uint32).tobytes()
+        return array('I', [min(((a * x + b) % _PRIME) & _MASK for x in hashes)
+                           for a, b in zip(self.a, self.b)]).tobytes()
+
+
+def _mix(h: int) -> int:
+    h = ((h ^ (h >> 16)) * 0x45d9f3b) & _MASK
+    h = ((h ^ (h >> 16)) * 0x45d9f3b) & _MASK
+    return h ^ (h >> 16)
+
+
+def similarity(signature_a: bytes, signature_b: bytes) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    if NUMPY_SUPPORT:
+        a = np.frombuffer(signature_a, dtype=np.uint32)
+        b = np.frombuffer(signature_b, dtype=np.uint32)
+        return float(np.count_nonzero(a == b)) / len(a)
+    a, b = array('I', signature_a), array('I', signature_b)
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+class NearDuplicateIndex:
+    """
+    LSH banding index over MinHash signatures.
+
+    check() reports the earlier message a new one nearly duplicates, or
+    indexes it. With max_entries, the oldest messages are evicted so memory
+    stays bounded (a sliding window, like the recorder's message log).
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, shingle_size: int = DEFAULT_SHINGLE_SIZE,
+                 num_perm: int = DEFAULT_NUM_PERM, max_entries: Optional[int] = None, seed: int = 1):
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be in (0, 1]")
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, shingle_size, seed)
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (sequence, signature), oldest first
+        self.sequence = 0
+        self.buckets: List[Dict[bytes, List[Hashable]]] = [{} for _ in range(self.bands)]
+        self.stats = {'checked': 0, 'near_duplicates': 0, 'evicted': 0}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _band_keys(self, signature: bytes):
+        width = self.rows * 4
+        return [signature[band * width:(band + 1) * width] for band in range(self.bands)]
+
+    def query(self, signature: bytes) -> Optional[Tuple[Hashable, float]]:
+        """Most similar indexed message at or above the threshold, with its similarity"""
+        candidates = set()
+        for bucket, band_key in zip(self.buckets, self._band_keys(signature)):
+            candidates.update(bucket.get(band_key, ()))
+        best = None
+        for key in candidates:
+            sequence, indexed = self.entries[key]
+            score = similarity(signature, indexed)
+            # Ties go to the earliest message, so results do not depend on set order
+            if score >= self.threshold and (best is None or (score, -sequence) > (best[1], -best[2])):
+                best = (key, score, sequence)
+        return best[:2] if best else None
+
+    def add(self, key: Hashable, signature: bytes) -> None:
+        """Index a message (a key already present is replaced)"""
+        if key in self.entries:
+            self.remove(key)
+        self.entries[key] = (self.sequence, signature)
+        self.sequence += 1
+        for bucket, band_key in zip(self.buckets, self._band_keys(signature)):
+            bucket.setdefault(band_key, []).append(key)
+        while self.max_entries is not None and len(self.entries) > self.max_entries:
+            self.remove(next(iter(self.entries)))
+            self.stats['evicted'] += 1
+
+    def remove(self, key: Hashable) -> None:
+        _, signature = self.entries.pop(key)
+        for bucket, band_key in zip(self.buckets, self._band_keys(signature)):
+            keys = bucket[band_key]
+            keys.remove(key)
+            if not keys:
+                del bucket[band_key]
+
+    def check(self, key: Hashable, text: str = None, signature: bytes = None) -> Optional[Tuple[Hashable, float]]:
+        """
+        Query-then-add for one message in stream order.
+
+        Returns (earlier key, similarity) for a near duplicate, which is not
+        indexed; otherwise indexes the message and returns None.
+        """
+        if signature is None:
+            signature = self.hasher.signature(text or '')
+        self.stats['checked'] += 1
+        match = self.query(signature)
+        if match is not None:
+            self.stats['near_duplicates'] += 1
+            return match
+        self.add(key, signature)
+        return None
+
+    def report(self) -> Dict[str, Any]:
+        """Extra reduction over the messages checked"""
+        checked = self.stats['checked']
+        return {
+            **self.stats,
+            'threshold': self.threshold,
+            'shingle_size': self.hasher.shingle_size,
+            'bands': self.bands,
+            'rows': self.rows,
+            'extra_reduction_percent': (self.stats['near_duplicates'] / checked * 100) if checked else 0.0,
+        }
@@ -4,19 +4,44 @@ Superthread Analyzer for Conversation Analytics
 
 This tool uses NLP topic modeling to cluster semantically similar conversation
 threads into a small number of high-level "superthreads".
+
+Incremental mode (run(incremental=True)):
+- Threads are vectorized with a HashingVectorizer, so the feature space is
+  fixed; document frequencies are persisted and give the IDF weights
+- Topics are a MiniBatchNMF model that is updated (partial_fit) with the
+  new and changed threads only
+- Other threads keep their saved topic until that topic's components drift
+  more than DRIFT_THRESHOLD (cosine distance) from where they were when the
+  threads were assigned
+- run(incremental=True, refit=True) rebuilds the saved model from every thread
+
+Thread texts are cleaned in one regex pass per thread, in a process pool,
+and cached by thread id and content hash, so reruns only clean the threads
+that changed.
 """
 
+import argparse
+import hashlib
 import json
 import logging
+import os
+import pickle
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.decomposition import NMF
+from typing import List, Dict, Any, Optional
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.decomposition import NMF, MiniBatchNMF
+from sklearn.preprocessing import normalize
 import nltk
 from nltk.corpus import stopwords
 
+try:
+    from defragmentation_engine import read_thread_table, threads_from_table
+except ImportError:
+    from .defragmentation_engine import read_thread_table, threads_from_table
+
 # --- One-time setup for NLTK ---
 try:
     stopwords.words('english')
@@ -28,32 +53,153 @@ except LookupError:
 logging.basicConfig(level=logging.INFO, format='[%(asctime)s] {%(levelname)s} - %(message)s')
 logger = logging.getLogger('SuperthreadAnalyzer')
 
+MODEL_STATE_VERSION = 1
+HASH_FEATURES = 1 << 17  # Hashed vocabulary size; changing it starts a new model
+MIN_DF = 2  # Same document-frequency limits as the full TF-IDF fit
+MAX_DF = 0.95
+TOPIC_BATCH_SIZE = 1024
+DRIFT_THRESHOLD = 0.1  # Cosine distance of a topic before its threads are reassigned
+
+TEXT_CACHE_VERSION = 1  # Bump when clean_text() changes
+PREPROCESS_CHUNK_THREADS = 64  # Threads handed to a worker at a time
+
+# Frequent in the logs but not meaningful for topic differentiation
+CUSTOM_STOPWORDS = frozenset([
+    'message', 'consolidated', 'true', 'original_count', 'time_window', 'keywords', 'contextid', 'updatedat',
+    'phases', 'timestamp', 'phase', 'data', 'length', 'domain', 'confidence', 'commandcount', 'routing', 'lease',
+    'context', 'activated', 'manager',
+])
+
+# Timestamps (e.g. 2025-10-15T22:07:49.2368354Z), UUIDs and every other
+# non-letter, removed in one pass. Digits go one at a time so that a timestamp or
+# UUID starting inside a run of them is still removed whole.
+CLEAN_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d+Z?'
+                           r'|(?i:[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})'
+                           r'|[^a-zA-Z\d\s]+|\d')
+
+
+def text_hash(text: str) -> str:
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+
+def clean_text(text: str) -> str:
+    """
+    Lowercased words of a thread, without timestamps, UUIDs, stopwords or words under 3 letters.
+
+    Neither pattern spans whitespace, so words are cleaned one at a time and
+    the common all-letter words skip the regex.
+    """
+    words = []
+    for word in text.split():
+        if not (word.isascii() and word.isalpha()):
+            word = CLEAN_PATTERN.sub('', word)
+        if len(word) > 2:
+            word = word.lower()
+            if word not in CUSTOM_STOPWORDS:
+                words.append(word)
+    return " ".join(words)
+
+
+def topic_drift(anchors: np.ndarray, components: np.ndarray) -> np.ndarray:
+    """Cosine distance of each topic from its anchor"""
+    dots = np.einsum('ij,ij->i', anchors, components)
+    norms = np.linalg.norm(anchors, axis=1) * np.linalg.norm(components, axis=1)
+    return 1.0 - np.divide(dots, norms, out=np.ones_like(dots), where=norms > 0)
+
+
+class TopicModelState:
+    """
+    Hashed-vocabulary topic model kept between incremental runs.
+
+    state.json holds the settings, the document count, the terms seen for
+    each hashed feature (to name topics) and every thread's content hash and
+    topic; arrays.npz the document frequencies and the topic anchors (the
+    components when each topic's threads were last assigned); nmf.pkl the
+    MiniBatchNMF model.
+    """
+
+    def __init__(self, model_dir: Path):
+        self.model_dir = Path(model_dir)
+        self.reset()
+
+    def reset(self) -> None:
+        self.settings = {}
+        self.n_docs = 0
+        self.terms: Dict[int, str] = {}
+        self.assignments: Dict[str, List[Any]] = {}
+        self.df = np.zeros(HASH_FEATURES, dtype=np.int32)
+        self.anchors = None
+        self.model = None
+
+    def load(self) -> bool:
+        """Load the saved model; False if there is none or it is unreadable"""
+        try:
+            with open(self.model_dir / 'state.json', 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != MODEL_STATE_VERSION:
+                return False
+            with np.load(self.model_dir / 'arrays.npz') as arrays:
+                df, anchors = arrays['df'], arrays['anchors']
+            with open(self.model_dir / 'nmf.pkl', 'rb') as f:
+                model = pickle.load(f)
+        except (OSError, ValueError, KeyError, pickle.UnpicklingError):
+            return False
+        self.settings = data['settings']
+        self.n_docs = data['n_docs']
+        self.terms = {int(index): term for index, term in data['terms'].items()}
+        self.assignments = data['assignments']
+        self.df, self.anchors, self.model = df, anchors, model
+        return True
+
+    def save(self) -> None:
+        self.model_dir.mkdir(parents=True, exist_ok=True)
+        self._replace('nmf.pkl', lambda f: pickle.dump(self.model, f, protocol=pickle.HIGHEST_PROTOCOL))
+        self._replace('arrays.npz', lambda f: np.savez(f, df=self.df, anchors=self.anchors))
+        data = {
+            'version': MODEL_STATE_VERSION,
+            'settings': self.settings,
+            'n_docs': self.n_docs,
+            'terms': self.terms,
+            'assignments': self.assignments,
+        }
+        self._replace('state.json', lambda f: f.write(json.dumps(data, ensure_ascii=False).encode('utf-8')))
+
+    def _replace(self, name: str, write) -> None:
+        path = self.model_dir / name
+        tmp = path.with_name(name + '.tmp')
+        with open(tmp, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+
 class SuperthreadAnalyzer:
     """
     Analyzes defragmented conversation threads to create superthreads using NLP.
     """
 
-    def __init__(self, defragmented_file: str, output_file: str, n_superthreads: int = 20):
+    def __init__(self, defragmented_file: str, output_file: str, n_superthreads: int = 20,
+                 workers: Optional[int] = None):
         self.defragmented_path = Path(defragmented_file)
         self.output_path = Path(output_file)
         if not (1 < n_superthreads < 50):
             raise ValueError("Number of superthreads must be between 2 and 50.")
         self.n_superthreads = n_superthreads
+        self.workers = workers or os.cpu_count() or 1
         self.threads = []
+        self.text_cache_path = self.output_path.with_suffix('.texts.json')
+        self.model_dir = self.output_path.with_suffix('.model')
+        self.state = TopicModelState(self.model_dir)
+        self.stats = {}
 
     def _load_threads(self) -> bool:
-        """Loads conversation threads from the Parquet file."""
+        """Loads conversation threads from the Parquet dataset (or a legacy single file)."""
         if not self.defragmented_path.exists():
             logger.error(f"Defragmented file not found: {self.defragmented_path}")
             return False
         
         try:
-            df = pd.read_parquet(self.defragmented_path)
-            # Re-hydrate the JSON string columns
-            for col in ['messages', 'participants', 'context_shifts']:
-                if col in df.columns:
-                    df[col] = df[col].apply(json.loads)
-            self.threads = df.to_dict('records')
+            # Every column: the threads are written back out whole
+            table = read_thread_table(self.defragmented_path)
+            self.threads = threads_from_table(table) if table is not None else []
             logger.info(f"Loaded {len(self.threads)} threads from {self.defragmented_path}")
             return True
         except Exception as e:
@@ -61,32 +207,57 @@ class SuperthreadAnalyzer:
             return False
 
     def _preprocess_text(self) -> List[str]:
-        """Combines all messages in a thread and preprocesses the text."""
-        thread_texts = []
-        # Custom stopwords that are frequent but not meaningful for topic differentiation
-        custom_stopwords = ['message', 'consolidated', 'true', 'original_count', 'time_window', 'keywords', 'contextid',
-                            'updatedat', 'phases', 'timestamp', 'phase', 'data', 'length', 'domain', 'confidence',
-                            'commandcount', 'routing', 'lease', 'context', 'activated', 'manager']
-
-        for thread in self.threads:
+        """
+        Combines all messages in a thread and preprocesses the text.
+
+        Threads whose id and combined text match the text cache are not
+        cleaned again; the rest go through clean_text() in a process pool
+        (workers=1 cleans in this process).
+        """
+        cache = self._load_text_cache()
+        thread_texts, keys, pending = [], [], []
+        for i, thread in enumerate(self.threads):
             full_text = " ".join([msg.get('Message', '') for msg in thread['messages']])
-            
-            # --- Advanced Text Cleaning ---
-            # Remove timestamps (e.g., 2025-10-15T22:07:49.2368354Z)
-            full_text = re.sub(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d+Z?', '', full_text)
-            # Remove UUIDs
-            full_text = re.sub(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', '', full_text, flags=re.IGNORECASE)
-            # Remove non-alphanumeric characters and lowercase
-            full_text = re.sub(r'[^a-zA-Z\s]', '', full_text).lower()
-            
-            # Tokenize and remove stopwords
-            words = full_text.split()
-            filtered_words = [word for word in words if word not in custom_stopwords and len(word) > 2]
-            
-            thread_texts.append(" ".join(filtered_words))
-            
+            key = (str(thread.get('thread_id', i)), text_hash(full_text))
+            entry = cache.get(key[0])
+            if entry is not None and entry[0] == key[1]:
+                thread_texts.append(entry[1])
+            else:
+                thread_texts.append(full_text)
+                pending.append(i)
+            keys.append(key)
+
+        raw_texts = [thread_texts[i] for i in pending]
+        if self.workers > 1 and len(pending) > PREPROCESS_CHUNK_THREADS:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                cleaned = list(pool.map(clean_text, raw_texts, chunksize=PREPROCESS_CHUNK_THREADS))
+        else:
+            cleaned = list(map(clean_text, raw_texts))
+        for i, text in zip(pending, cleaned):
+            thread_texts[i] = text
+
+        self.stats['text_cache_hits'] = len(thread_texts) - len(pending)
+        self.stats['texts_cleaned'] = len(pending)
+        if pending or len(cache) != len(keys):
+            self._save_text_cache({key: [digest, text] for (key, digest), text in zip(keys, thread_texts)})
         return thread_texts
 
+    def _load_text_cache(self) -> Dict[str, List[str]]:
+        """thread id -> [content hash, cleaned text] from the last run"""
+        try:
+            with open(self.text_cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data['texts'] if data.get('version') == TEXT_CACHE_VERSION else {}
+
+    def _save_text_cache(self, texts: Dict[str, List[str]]) -> None:
+        self.text_cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.text_cache_path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': TEXT_CACHE_VERSION, 'texts': texts}, f, ensure_ascii=False)
+        os.replace(tmp, self.text_cache_path)
+
     def _perform_topic_modeling(self, texts: List[str]) -> tuple[Any, Any, Any]:
         """
         Uses TF-IDF and NMF to discover topics in the conversation texts.
@@ -115,18 +286,118 @@ class SuperthreadAnalyzer:
             topic_names[topic_idx] = f"Topic {topic_idx + 1}: " + ", ".join(top_words)
         return topic_names
 
-    def run(self) -> None:
-        """Executes the full superthread analysis pipeline."""
+    def _settings(self) -> Dict[str, Any]:
+        """Options that shape the saved model; a change starts a new one"""
+        return {'n_superthreads': self.n_superthreads, 'n_features': HASH_FEATURES}
+
+    def _hasher(self) -> HashingVectorizer:
+        stop_words = list(stopwords.words('english'))
+        return HashingVectorizer(n_features=HASH_FEATURES, stop_words=stop_words, alternate_sign=False,
+                                 norm=None, dtype=np.float32)
+
+    def _record_terms(self, hasher: HashingVectorizer, texts: List[str]) -> None:
+        """Remembers a term for every hashed feature, to name the topics"""
+        analyzer = hasher.build_analyzer()
+        words = sorted({word for text in texts for word in analyzer(text)})
+        if not words:
+            return
+        rows = hasher.transform(words)  # One feature per word
+        for word, index in zip(words, rows.indices):
+            self.state.terms.setdefault(int(index), word)
+
+    def _tfidf(self, counts) -> Any:
+        """TF-IDF rows from hashed term counts, weighted by the saved document frequencies"""
+        df, n_docs = self.state.df, self.state.n_docs
+        idf = np.log((1 + n_docs) / (1 + df)) + 1
+        idf[(df < MIN_DF) | (df > MAX_DF * n_docs)] = 0
+        return normalize(counts.multiply(idf.astype(np.float32)).tocsr())
+
+    def _update_topics(self, texts: List[str], refit: bool = False) -> np.ndarray:
+        """
+        Topic of every thread, updating the saved model with new and changed threads.
+
+        Only new threads add to the document frequencies: a changed thread's
+        old terms are not kept, so they cannot be taken back out.
+        """
+        state = self.state
+        hasher = self._hasher()
+        ids = [str(thread.get('thread_id', i)) for i, thread in enumerate(self.threads)]
+        hashes = [text_hash(text) for text in texts]
+        if refit or not state.load() or state.settings != self._settings():
+            state.reset()
+            state.settings = self._settings()
+        saved = state.assignments
+        new = [i for i, thread_id in enumerate(ids) if thread_id not in saved]
+        changed = [i for i, thread_id in enumerate(ids) if thread_id in saved and saved[thread_id][0] != hashes[i]]
+        fresh = new + changed
+
+        tfidf = None
+        if fresh:
+            counts = hasher.transform([texts[i] for i in fresh])
+            state.df += np.bincount(counts[:len(new)].indices, minlength=HASH_FEATURES).astype(np.int32)
+            state.n_docs += len(new)
+            self._record_terms(hasher, [texts[i] for i in fresh])
+            tfidf = self._tfidf(counts)
+
+        topics = np.zeros(len(ids), dtype=np.int64)
+        drifted, stale = np.array([], dtype=np.int64), []
+        if state.model is None:
+            # The first fit is a full NMF, carried on from there as a mini-batch model
+            nmf_model = NMF(n_components=self.n_superthreads, random_state=42, max_iter=1000)
+            weights = nmf_model.fit_transform(tfidf)
+            state.model = MiniBatchNMF(n_components=self.n_superthreads, init='custom', batch_size=TOPIC_BATCH_SIZE,
+                                       random_state=42)
+            state.model.partial_fit(tfidf, W=weights, H=nmf_model.components_)
+            state.anchors = state.model.components_.copy()
+        else:
+            for start in range(0, len(fresh), TOPIC_BATCH_SIZE):
+                state.model.partial_fit(tfidf[start:start + TOPIC_BATCH_SIZE])
+            drifted = np.flatnonzero(topic_drift(state.anchors, state.model.components_) > DRIFT_THRESHOLD)
+            state.anchors[drifted] = state.model.components_[drifted]
+            reassign = set(drifted.tolist())
+            for i, thread_id in enumerate(ids):
+                if thread_id in saved and saved[thread_id][0] == hashes[i]:
+                    topics[i] = saved[thread_id][1]
+                    if topics[i] in reassign:
+                        stale.append(i)
+        if fresh:
+            topics[fresh] = state.model.transform(tfidf).argmax(axis=1)
+        if stale:
+            stale_tfidf = self._tfidf(hasher.transform([texts[i] for i in stale]))
+            topics[stale] = state.model.transform(stale_tfidf).argmax(axis=1)
+
+        removed = len(saved.keys() - set(ids))
+        state.assignments = {thread_id: [hashes[i], int(topics[i])] for i, thread_id in enumerate(ids)}
+        self.stats.update({'threads': len(ids), 'new': len(new), 'changed': len(changed), 'removed': removed,
+                           'reassigned': len(stale), 'drifted_topics': drifted.tolist()})
+        if fresh or removed or len(drifted):
+            state.save()
+        logger.info(f"Topic model update: {self.stats}")
+        return topics
+
+    def run(self, incremental: bool = False, refit: bool = False) -> None:
+        """
+        Executes the full superthread analysis pipeline.
+
+        incremental updates the saved topic model with new and changed threads
+        instead of fitting TF-IDF and NMF on every thread; refit rebuilds the
+        saved model from scratch.
+        """
         if not self._load_threads():
             return
 
         thread_texts = self._preprocess_text()
-        nmf_model, feature_names, tfidf = self._perform_topic_modeling(thread_texts)
-        topic_names = self._get_top_words_for_topics(nmf_model, feature_names)
+        if incremental:
+            dominant_topics = self._update_topics(thread_texts, refit)
+            feature_names = [self.state.terms.get(i, '') for i in range(HASH_FEATURES)]
+            topic_names = self._get_top_words_for_topics(self.state.model, feature_names)
+        else:
+            nmf_model, feature_names, tfidf = self._perform_topic_modeling(thread_texts)
+            topic_names = self._get_top_words_for_topics(nmf_model, feature_names)
 
-        # Assign each thread to its dominant topic
-        thread_topic_matrix = nmf_model.transform(tfidf)
-        dominant_topics = thread_topic_matrix.argmax(axis=1)
+            # Assign each thread to its dominant topic
+            thread_topic_matrix = nmf_model.transform(tfidf)
+            dominant_topics = thread_topic_matrix.argmax(axis=1)
 
         # Structure the output
         superthreads = {name: [] for name in topic_names.values()}
@@ -151,12 +422,16 @@ class SuperthreadAnalyzer:
 
 def main():
     """CLI entry point."""
+    parser = argparse.ArgumentParser(description="Cluster conversation threads into superthreads.")
+    parser.add_argument("--incremental", action="store_true", help="Update the saved topic model with new threads only.")
+    parser.add_argument("--refit", action="store_true", help="With --incremental, rebuild the saved topic model.")
+    args = parser.parse_args()
     analyzer = SuperthreadAnalyzer(
         defragmented_file="conversation_logs/defragmented_sessions.parquet",
         output_file="conversation_logs/superthreads.json",
         n_superthreads=20
     )
-    analyzer.run()
+    analyzer.run(incremental=args.incremental, refit=args.refit)
 
 if __name__ == "__main__":
     main()
@@ -5,93 +5,238 @@ ZeroMQ Conversation Log Viewer
 View and query recorded conversations from broker's persistent logs.
 Useful for reviewing past conversations or recovering from crashes.
 
+Filters and pages are answered from a sidecar index of each log (the
+persistence search index: line offsets, speakers, tiers, chains and times,
+caught up with whatever was appended since the last run), so only the
+messages on the page shown are read and decoded. Without SQLite FTS5 the
+log is streamed instead. --follow then tails the log, printing matching
+messages as they are appended.
+
 Usage:
-    python zmq_log_viewer.py [--limit 50] [--tier A|C|E] [--chain reconstruction]
+    python zmq_log_viewer.py [--limit 50] [--page 2] [--tier A|C|E] [--chain reconstruction] [--follow]
 """
 
 import json
+import sys
+import threading
+from collections import Counter, deque
 from pathlib import Path
 import argparse
-from datetime import datetime
+from datetime import datetime, timezone
+
+try:
+    from ..persistence.storage.search_index import FTS5_SUPPORT, MessageSearchIndex, message_text, timestamp_us
+except ImportError:
+    sys.path.append(str(Path(__file__).parent.parent))  # src, when run from src/utilities
+    from persistence.storage.search_index import FTS5_SUPPORT, MessageSearchIndex, message_text, timestamp_us
+
+try:
+    from inbox_events import create_watcher
+except ImportError:
+    from .inbox_events import create_watcher
 
 LOG_DIR = Path("conversation_logs")
 CURRENT_LOG_FILE = LOG_DIR / "current_session.jsonl"
 ARCHIVE_DIR = LOG_DIR / "archive"
-
-
-def load_logs(file_path):
-    """Load all messages from a JSONL log file"""
-    messages = []
-
-    if not file_path.exists():
-        print(f"[ERROR] Log file not found: {file_path}")
-        return messages
-
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line_num, line in enumerate(f, 1):
-                try:
-                    msg = json.loads(line.strip())
-                    messages.append(msg)
-                except json.JSONDecodeError as e:
-                    print(f"[WARNING] Line {line_num} invalid JSON: {e}")
-                    continue
-
-        print(f"[*] Loaded {len(messages)} messages from {file_path}")
-        return messages
-
-    except Exception as e:
-        print(f"[ERROR] Failed to load log: {e}")
-        return []
-
-
-def filter_messages(messages, tier=None, chain=None, sender=None):
-    """Filter messages by tier, chain type, or sender"""
-    filtered = messages
-
-    if tier:
-        filtered = [m for m in filtered if m.get('tier') == tier]
-
-    if chain:
-        filtered = [m for m in filtered if m.get('chain_type') == chain]
-
-    if sender:
-        filtered = [m for m in filtered if m.get('sender') == sender]
-
-    return filtered
-
-
-def display_message(msg, show_content=True):
+SEARCH_INDEX_FILE = LOG_DIR / "search_index.db"  # The persistence daemon keeps this one current
+FOLLOW_POLL_SECONDS = 1.0  # Checks for appends between file events, in case one is missed
+
+
+def message_fields(msg):
+    """(speaker, tier, chain) of a logged message, from the recorded schema"""
+    metadata = msg.get('Metadata') if isinstance(msg.get('Metadata'), dict) else {}
+    return (msg.get('SpeakerName'), msg.get('ace_tier', metadata.get('ace_tier')),
+            msg.get('chain_type', metadata.get('chain_type')))
+
+
+def iter_log(file_path, offset=0):
+    """(end offset, message or None if invalid) of each complete line from offset on"""
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b'\n'):
+                return  # Still being written
+            offset += len(line)
+            try:
+                msg = json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                msg = None
+            yield offset, msg if isinstance(msg, dict) else None
+
+
+def message_filter(tier=None, chain=None, sender=None, since=None, until=None):
+    """
+    Predicate for messages matching every given filter. tier, chain and
+    sender compare case-insensitively; since/until are ISO timestamps
+    (since inclusive, until exclusive).
+    """
+    wanted = [(i, value.lower()) for i, value in enumerate((sender, tier, chain)) if value]
+    since_us = timestamp_us(since) if since else None
+    until_us = timestamp_us(until) if until else None
+
+    def matches(msg):
+        fields = message_fields(msg)
+        if any(not isinstance(fields[i], str) or fields[i].lower() != value for i, value in wanted):
+            return False
+        if since_us is None and until_us is None:
+            return True
+        time_us = timestamp_us(msg.get('Timestamp'))
+        return time_us is not None and (since_us is None or time_us >= since_us) \
+            and (until_us is None or time_us < until_us)
+
+    return matches
+
+
+def filter_messages(messages, **filters):
+    """Messages matching filters (see message_filter), in one pass"""
+    return filter(message_filter(**filters), messages)
+
+
+def sidecar_index_path(log_file):
+    """The index kept next to a log: the daemon's for the current session, <log>.index.db otherwise"""
+    if Path(log_file).resolve() == CURRENT_LOG_FILE.resolve():
+        return SEARCH_INDEX_FILE
+    return Path(log_file).with_suffix('.index.db')
+
+
+class LogView:
+    """Messages of one log matching filters, in pages counted from the newest"""
+
+    def __init__(self, log_file, index_path=None, tier=None, chain=None, sender=None, since=None, until=None):
+        self.log_file = Path(log_file)
+        self.filters = {'tier': tier, 'chain': chain, 'speaker': sender, 'since': since, 'until': until}
+        for key in ('since', 'until'):
+            if self.filters[key] and timestamp_us(self.filters[key]) is None:
+                raise ValueError(f"--{key} must be an ISO timestamp, got {self.filters[key]!r}")
+        self.index = None
+        self.end_offset = 0  # Where the log was read up to, for --follow
+        if FTS5_SUPPORT:
+            self.index = MessageSearchIndex(index_path or sidecar_index_path(self.log_file))
+            added = self.index.catch_up(self.log_file)
+            if added:
+                print(f"[*] Indexed {added} new messages in {self.index.index_path}")
+            self.end_offset = self.index.log_offset
+
+    def _scan(self):
+        """(line number, message) of matching messages, streaming the whole log (without an index)"""
+        filters = dict(self.filters, sender=self.filters['speaker'])
+        del filters['speaker']
+        matches = message_filter(**filters)
+        number = 0
+        for self.end_offset, msg in iter_log(self.log_file):
+            if msg is not None:
+                number += 1
+                if matches(msg):
+                    yield number, msg
+
+    def stats(self):
+        """Count, speaker/tier/chain counts and time range of the matching messages"""
+        if self.index is not None:
+            stats = self.index.stats(**self.filters)
+            for key in ('first_us', 'last_us'):
+                stats[key] = format_time_us(stats[key])
+            return stats
+        stats = {'count': 0, 'speaker': Counter(), 'tier': Counter(), 'chain': Counter(),
+                 'first_us': None, 'last_us': None}
+        times = []
+        for _, msg in self._scan():
+            stats['count'] += 1
+            for key, value in zip(('speaker', 'tier', 'chain'), message_fields(msg)):
+                stats[key][value] += 1
+            time_us = timestamp_us(msg.get('Timestamp'))
+            if time_us is not None:
+                times.append(time_us)
+        if times:
+            stats['first_us'], stats['last_us'] = format_time_us(min(times)), format_time_us(max(times))
+        return stats
+
+    def page(self, number=1, size=50):
+        """(line number, message) of page number (1 = newest) of size messages, oldest first"""
+        skip = (number - 1) * size
+        if self.index is not None:
+            hits = self.index.search("", limit=size, order='newest', skip=skip, **self.filters)
+            return [(hit['id'], hit['message']) for hit in reversed(hits)]
+        recent = deque(self._scan(), maxlen=skip + size)
+        return list(recent)[:len(recent) - skip] if skip < len(recent) else []
+
+
+def format_time_us(time_us):
+    if time_us is None:
+        return 'unknown'
+    return datetime.fromtimestamp(time_us / 1e6, tz=timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def display_message(msg, show_content=True, number=None):
     """Pretty-print a single message"""
+    speaker, tier, chain = message_fields(msg)
+    metadata = msg.get('Metadata') if isinstance(msg.get('Metadata'), dict) else {}
     print(f"\n{'='*80}")
-    print(f"[#{msg.get('message_num', '?')}] {msg.get('sender', 'unknown')} → {msg.get('topic', 'unknown')}")
-    print(f"[TIME] {msg.get('timestamp', 'unknown')}")
-    print(f"[TIER] {msg.get('tier', 'E')} | [CHAIN] {msg.get('chain_type', 'unknown')}")
-    print(f"[ID] {msg.get('message_id', 'unknown')}")
+    print(f"[#{number or '?'}] {speaker or 'unknown'} → {metadata.get('topic', 'unknown')}")
+    print(f"[TIME] {msg.get('Timestamp', 'unknown')}")
+    print(f"[TIER] {tier or 'E'} | [CHAIN] {chain or 'unknown'}")
+    print(f"[ID] {msg.get('Id', 'unknown')}")
 
-    if msg.get('shl_tags'):
-        print(f"[SHL] {', '.join(msg['shl_tags'])}")
+    if metadata.get('shl_tags'):
+        print(f"[SHL] {', '.join(metadata['shl_tags'])}")
 
     if show_content:
         print(f"\n[CONTENT]:")
-        if isinstance(msg.get('content'), dict):
-            print(json.dumps(msg['content'], indent=2, ensure_ascii=False))
+        try:
+            content = json.loads(msg.get('Message', ''))
+        except (TypeError, json.JSONDecodeError):
+            content = None
+        if isinstance(content, dict):
+            print(json.dumps(content, indent=2, ensure_ascii=False))
         else:
-            print(msg.get('content'))
+            print(message_text(msg))
 
     print(f"{'='*80}")
 
 
+def follow(log_file, offset, filters, show_content=False, poll_seconds=FOLLOW_POLL_SECONDS, stop=None):
+    """Print messages matching filters as they are appended after offset, until interrupted or stop is set"""
+    log_file = Path(log_file)
+    appended = threading.Event()
+    watcher = create_watcher({'log': log_file.parent},
+                             lambda _, path: path.name == log_file.name and appended.set(), modified=True)
+    watcher.start()
+    print(f"\n[*] Following {log_file} (Ctrl+C to stop)")
+    try:
+        while stop is None or not stop.is_set():
+            appended.wait(poll_seconds)
+            appended.clear()
+            try:
+                if log_file.stat().st_size < offset:
+                    print("[*] Log was truncated or rotated, following it from the start")
+                    offset = 0
+            except OSError:
+                continue  # Being replaced
+            new = []
+            for offset, msg in iter_log(log_file, offset):
+                if msg is not None:
+                    new.append(msg)
+            for msg in filter_messages(new, **filters):
+                display_message(msg, show_content=show_content)
+    except KeyboardInterrupt:
+        print("\n[*] Stopped following")
+    finally:
+        watcher.stop()
+
+
 def main():
     parser = argparse.ArgumentParser(description="View ZeroMQ conversation logs")
     parser.add_argument("--limit", type=int, default=50, help="Number of recent messages to show")
+    parser.add_argument("--page", type=int, default=1, help="Page of --limit messages, 1 being the most recent")
     parser.add_argument("--tier", choices=['A', 'C', 'E'], help="Filter by ACE tier")
     parser.add_argument("--chain", help="Filter by domain chain type")
     parser.add_argument("--sender", help="Filter by sender (claude_code, gemini_cli, etc.)")
+    parser.add_argument("--since", help="Only messages at or after this ISO timestamp")
+    parser.add_argument("--until", help="Only messages before this ISO timestamp")
     parser.add_argument("--archive", help="View archived session (filename in archive/)")
     parser.add_argument("--list-archives", action="store_true", help="List all archived sessions")
     parser.add_argument("--stats", action="store_true", help="Show conversation statistics")
     parser.add_argument("--full", action="store_true", help="Show full content of messages")
+    parser.add_argument("--follow", action="store_true", help="Keep printing matching messages as they are logged")
 
     args = parser.parse_args()
 
@@ -124,71 +269,61 @@ def main():
     else:
         log_file = CURRENT_LOG_FILE
 
-    # --- Load messages ---
-    messages = load_logs(log_file)
+    if not log_file.exists():
+        print(f"[ERROR] Log file not found: {log_file}")
+        return
 
-    if not messages:
-        print("[WARNING] No messages found")
+    # --- Index and filter messages ---
+    filters = {'tier': args.tier, 'chain': args.chain, 'sender': args.sender, 'since': args.since, 'until': args.until}
+    try:
+        view = LogView(log_file, **filters)
+    except ValueError as e:
+        print(f"[ERROR] {e}")
         return
+    stats = view.stats()
+    total = stats['count']
 
-    # --- Filter messages ---
-    filtered = filter_messages(messages, tier=args.tier, chain=args.chain, sender=args.sender)
+    if not total and not args.follow:
+        print("[WARNING] No messages found")
+        return
 
-    print(f"\n[*] Showing {min(args.limit, len(filtered))} of {len(filtered)} messages")
+    page = view.page(args.page, args.limit)
+    print(f"\n[*] Showing {len(page)} of {total} messages (page {args.page} of {max(1, -(-total // args.limit))})")
 
     # --- Show statistics ---
-    if args.stats:
+    if args.stats and total:
         print(f"\n{'='*80}")
         print("[CONVERSATION STATISTICS]")
         print(f"{'='*80}")
 
-        # Tier distribution
-        tier_counts = {}
-        for msg in filtered:
-            tier = msg.get('tier', 'E')
-            tier_counts[tier] = tier_counts.get(tier, 0) + 1
-
         print("\n[ACE Tier Distribution]:")
         for tier in ['A', 'C', 'E']:
-            count = tier_counts.get(tier, 0)
-            pct = (count / len(filtered) * 100) if filtered else 0
+            count = stats['tier'].get(tier, 0)
+            pct = (count / total * 100) if total else 0
             print(f"  {tier}-Tier: {count} messages ({pct:.1f}%)")
 
-        # Chain distribution
-        chain_counts = {}
-        for msg in filtered:
-            chain = msg.get('chain_type', 'unknown')
-            chain_counts[chain] = chain_counts.get(chain, 0) + 1
-
         print("\n[Domain Chains]:")
-        for chain in sorted(chain_counts.keys()):
-            count = chain_counts[chain]
-            print(f"  {chain}: {count} messages")
-
-        # Sender distribution
-        sender_counts = {}
-        for msg in filtered:
-            sender = msg.get('sender', 'unknown')
-            sender_counts[sender] = sender_counts.get(sender, 0) + 1
+        for chain in sorted(stats['chain'], key=str):
+            print(f"  {chain or 'unknown'}: {stats['chain'][chain]} messages")
 
         print("\n[Senders]:")
-        for sender in sorted(sender_counts.keys()):
-            count = sender_counts[sender]
-            print(f"  {sender}: {count} messages")
+        for sender in sorted(stats['speaker'], key=str):
+            print(f"  {sender or 'unknown'}: {stats['speaker'][sender]} messages")
 
         print(f"\n[Time Range]:")
-        if filtered:
-            first_time = filtered[0].get('timestamp', 'unknown')
-            last_time = filtered[-1].get('timestamp', 'unknown')
-            print(f"  From: {first_time}")
-            print(f"  To:   {last_time}")
+        print(f"  From: {stats['first_us']}")
+        print(f"  To:   {stats['last_us']}")
 
     # --- Display messages ---
     print(f"\n[RECENT MESSAGES]:\n")
 
-    # Show last N messages
-    for msg in filtered[-args.limit:]:
-        display_message(msg, show_content=args.full)
+    for number, msg in page:
+        display_message(msg, show_content=args.full, number=number)
+    if args.page * args.limit < total:
+        print(f"\n[TIP] Use --page {args.page + 1} for older messages")
+
+    if args.follow:
+        follow(log_file, view.end_offset, filters, show_content=args.full)
 
 
 if __name__ == "__main__":
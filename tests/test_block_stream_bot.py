@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the streaming block segmenter.
+
+Tests:
+- Topic shifts and time gaps close blocks; tiny blocks are skipped
+- Blocks are written as they close, with running similarity stats
+- A restart replays only the open block and gives the same blocks
+- A crash between writing a block and saving the state does not duplicate it
+- Lines still being written are left for the next read
+- The vector index of the log is kept up to date from the embedding cache
+"""
+
+import unittest
+import contextlib
+import io
+import json
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "bots"))
+
+from block_stream_bot import StreamingBlockBot
+
+TOPICS = {"mesh": 0, "photo": 1, "token": 2}
+
+
+class FakeModel:
+    """Encodes each text near the axis of its topic word"""
+
+    def __init__(self):
+        self.encoded = 0
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        self.encoded += len(texts)
+        vectors = np.zeros((len(texts), 4))
+        for row, text in enumerate(texts):
+            vectors[row, TOPICS[text.split()[0]]] = 1.0
+            vectors[row, 3] = 0.1 * (len(text) % 3)
+        return vectors
+
+
+def message(topic, minute, n):
+    return {"Message": json.dumps({"message": f"{topic} update {n}"}), "Sender": f"agent_{n % 2}",
+            "chain_type": "reconstruction", "Timestamp": f"2025-11-01T{minute // 60:02d}:{minute % 60:02d}:00"}
+
+
+SCRIPT = ([message("mesh", m, m) for m in range(6)]
+          + [message("photo", 6 + m, m) for m in range(3)]  # Tiny block
+          + [message("token", 9 + m, m) for m in range(5)]
+          + [message("token", 60 + m, m) for m in range(7)])  # After a 46 minute gap
+
+
+class TestStreamingBlockBot(unittest.TestCase):
+    """Test cases for StreamingBlockBot"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.base = Path(self.tmp.name)
+        self.history = self.base / "current_session.jsonl"
+
+    def append(self, messages, partial=""):
+        with open(self.history, 'a', encoding='utf-8') as f:
+            f.write("".join(json.dumps(m) + "\n" for m in messages) + partial)
+
+    def bot(self, output="blocks.jsonl", **kwargs):
+        kwargs = {'cache_dir': None, 'vector_index': False, **kwargs}
+        bot = StreamingBlockBot(history_file=self.history, output_file=self.base / output, **kwargs)
+        bot.model = FakeModel()
+        return bot
+
+    def blocks(self, output="blocks.jsonl"):
+        with open(self.base / output, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_segments_and_writes_blocks(self):
+        self.append(SCRIPT[:9])
+        bot = self.bot()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(bot.catch_up(), 9)
+            self.assertEqual(self.blocks()[0]['message_indices'], list(range(6)))
+            self.append(SCRIPT[9:])
+            bot.run(follow=False)
+
+        blocks = self.blocks()
+        self.assertEqual([b['message_indices'] for b in blocks],
+                         [list(range(6)), list(range(9, 14)), list(range(14, 21))])
+        self.assertEqual([b['stats']['close_reason'] for b in blocks], ['topic_shift', 'time_gap', 'end_of_log'])
+        self.assertEqual(bot.stats, {'messages': 21, 'blocks': 3, 'skipped': 1, 'errors': 0})
+        first = blocks[0]
+        self.assertEqual(first['speakers'], ['agent_0', 'agent_1'])
+        self.assertEqual(first['primary_chain'], 'reconstruction')
+        self.assertEqual(first['keywords'], ['mesh'])
+        self.assertEqual(first['duration_minutes'], 5.0)
+        self.assertGreater(first['stats']['min_similarity'], 0.9)
+        self.assertEqual(first['confidence'], 0.95)
+
+    def test_restart_replays_open_block(self):
+        self.append(SCRIPT)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.bot("expected.jsonl").run(follow=False)
+
+            self.history.unlink()
+            line = json.dumps(SCRIPT[12]) + "\n"
+            self.append(SCRIPT[:12], partial=line[:20])
+            first = self.bot()
+            first.catch_up()
+            self.assertEqual(first.index, 12)
+            with open(self.history, 'a', encoding='utf-8') as f:
+                f.write(line[20:])
+            self.append(SCRIPT[13:])
+
+            resumed = self.bot()
+            self.assertEqual(resumed.index, 9)  # Start of the open block
+            resumed.run(follow=False)
+        self.assertEqual(resumed.model.encoded, 12)
+        self.assertEqual(self.blocks(), self.blocks("expected.jsonl"))
+
+    def test_crash_after_write_does_not_duplicate(self):
+        self.append(SCRIPT)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.bot("expected.jsonl").run(follow=False)
+
+            crashed = self.bot()
+            with mock.patch.object(crashed, '_save_state', side_effect=OSError("disk full")):
+                with self.assertRaises(OSError):
+                    crashed.catch_up()
+            self.assertEqual(len(self.blocks()), 1)  # Written, but the state still points at its start
+
+            resumed = self.bot()
+            self.assertEqual(resumed.index, 0)
+            resumed.run(follow=False)
+        self.assertEqual(self.blocks(), self.blocks("expected.jsonl"))
+
+    def test_updates_vector_index(self):
+        self.append(SCRIPT)
+        bot = self.bot(cache_dir=self.base / "cache", vector_index=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            bot.run(follow=False)
+        index = bot.vector_index
+        self.assertEqual(index.index_dir, self.base / "current_session.vectors")
+        self.assertEqual((index.stats['messages'], index.stats['blocks'], index.stats['encoded']), (21, 3, 0))
+        hits = index.search_vector(bot.embed(["photo update 1"])[0], k=3, filters={'kind': 'message'})
+        self.assertEqual([json.loads(hit['message']['Message'])['message'].split()[0] for hit in hits], ["photo"] * 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
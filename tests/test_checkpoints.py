@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Unit tests for streamed, deduplicated session checkpoints.
+
+Tests:
+- write_checkpoint stores the log's complete lines as chunks after a header record
+- Successive checkpoints of a growing log share chunks; chunk boundaries
+  survive lines inserted early in the log
+- read_header reads only the first line, and the fields before a legacy
+  checkpoint's message list
+- restore_checkpoint streams every format into the log, and leaves the
+  log alone when a checkpoint or chunk is damaged
+- Tiered retention of auto_ checkpoints only, garbage collection of unreferenced
+  chunks and the storage report
+- CheckpointStore and ContextCheckpoint go through the module
+"""
+
+import unittest
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "persistence"))
+
+import persistence_cli
+from src.core.context_checkpoint import ContextCheckpoint
+from storage import checkpoints, chunk_store
+from storage.checkpoints import (CHECKPOINT_SUFFIX, CHUNKS_DIR, FLAT_VERSION, chunk_refs, iter_legacy_messages,
+                                 prune_checkpoints, read_header, restore_checkpoint, retained, storage_report,
+                                 write_checkpoint)
+from storage.chunk_store import ChunkStore
+
+
+def event(n, text):
+    return {"Id": str(n), "Timestamp": f"2025-11-01T10:00:{n % 60:02d}", "SpeakerName": "claude_code",
+            "Message": json.dumps({"message": text}), "Metadata": {"ace_tier": "E"}}
+
+
+LOG = [event(n, f"message {n} " + "ü, [brackets] and \"quotes\" " * (n % 4)) for n in range(40)]
+
+
+class TestCheckpoints(unittest.TestCase):
+    """Test cases for the checkpoint format"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+        self.log = self.root / "current_session.jsonl"
+        self.checkpoint_dir = self.root / "checkpoints"
+        self.lines = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in LOG)
+        patcher = mock.patch.multiple(chunk_store, CHUNK_MIN_BYTES=1000, CHUNK_MAX_BYTES=4000, CHUNK_CUT_MODULUS=4)
+        patcher.start()  # Several chunks from a small log
+        self.addCleanup(patcher.stop)
+
+    def manifests(self):
+        return sorted(self.checkpoint_dir.glob("*" + CHECKPOINT_SUFFIX))
+
+    def chunk_files(self):
+        return sorted(p for p in (self.checkpoint_dir / CHUNKS_DIR).glob("*/*"))
+
+    def legacy(self, name="2025-11-01T10:00:00_old.json", messages=LOG):
+        path = self.checkpoint_dir / name
+        self.checkpoint_dir.mkdir(exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'checkpoint_id': str(path), 'timestamp': "2025-11-01T10:00:00", 'label': "old",
+                       'message_count': len(messages), 'size_bytes': 123, 'messages': messages}, f, indent=2)
+        return path
+
+    def test_write_and_restore(self):
+        self.log.write_text(self.lines + '{"Id": "torn', encoding='utf-8')
+        path = write_checkpoint(self.log, self.checkpoint_dir, "manual")
+        self.assertTrue(path.name.endswith("_manual" + CHECKPOINT_SUFFIX))
+        self.assertEqual(sorted(p.name for p in self.checkpoint_dir.iterdir()), sorted([CHUNKS_DIR, path.name]))
+
+        header = read_header(path)
+        self.assertEqual((header['label'], header['message_count'], header['size_bytes']),
+                         ("manual", 40, len(self.lines.encode())))
+        refs = list(chunk_refs(path))
+        self.assertGreater(len(refs), 2)
+        self.assertEqual(sum(ref['bytes'] for ref in refs), header['size_bytes'])
+        stored = sum(p.stat().st_size for p in self.chunk_files())
+        self.assertLess(stored, header['size_bytes'] / 2)  # Compressed
+        with mock.patch.object(checkpoints, 'HEADER_MAX_BYTES', 300):
+            self.assertEqual(read_header(path)['message_count'], 40)  # Nothing past the header is needed
+
+        self.log.write_text("later\n", encoding='utf-8')
+        self.assertEqual(restore_checkpoint(path, self.log), 40)
+        self.assertEqual(self.log.read_text(encoding='utf-8'), self.lines)
+
+    def test_chunks_are_shared(self):
+        lines = self.lines.splitlines(keepends=True)
+        self.log.write_text("".join(lines[:30]), encoding='utf-8')
+        first = write_checkpoint(self.log, self.checkpoint_dir, "first")
+        self.log.write_text(self.lines, encoding='utf-8')
+        second = write_checkpoint(self.log, self.checkpoint_dir, "second")
+        first_ids = [ref['chunk'] for ref in chunk_refs(first)]
+        second_ids = [ref['chunk'] for ref in chunk_refs(second)]
+        self.assertEqual(second_ids[:len(first_ids) - 1], first_ids[:-1])  # All but the cut-off last chunk
+        self.assertEqual(len(self.chunk_files()), len(set(first_ids) | set(second_ids)))
+
+        self.log.write_text(lines[0] + json.dumps(event(99, "inserted")) + "\n" + "".join(lines[1:]), encoding='utf-8')
+        third_ids = [ref['chunk'] for ref in chunk_refs(write_checkpoint(self.log, self.checkpoint_dir, "third"))]
+        self.assertGreaterEqual(len(set(third_ids) & set(second_ids)), len(second_ids) - 2)
+
+        report = storage_report(self.checkpoint_dir)
+        self.assertEqual((report['checkpoints'], report['chunks']), (3, len(self.chunk_files())))
+        self.assertEqual(report['full_copy_bytes'], sum(read_header(p)['size_bytes'] for p in self.manifests()))
+        self.assertGreater(report['saved_bytes'], report['full_copy_bytes'] / 2)
+
+    def test_flat_checkpoint(self):
+        self.checkpoint_dir.mkdir()
+        path = self.checkpoint_dir / ("flat" + CHECKPOINT_SUFFIX)
+        header = {'format': checkpoints.CHECKPOINT_FORMAT, 'version': FLAT_VERSION, 'timestamp': "2025-11-01T10:00:00",
+                  'label': "flat", 'message_count': 40, 'size_bytes': len(self.lines.encode())}
+        path.write_bytes(json.dumps(header).encode() + b"\n" + self.lines.encode())
+        self.assertEqual(restore_checkpoint(path, self.log), 40)
+        self.assertEqual(self.log.read_text(encoding='utf-8'), self.lines)
+
+    def test_legacy_checkpoint(self):
+        path = self.legacy()
+        header = read_header(path)
+        self.assertEqual((header['version'], header['label'], header['message_count']), (1, "old", 40))
+        self.assertNotIn('messages', header)
+
+        with mock.patch.object(checkpoints, 'COPY_CHUNK_BYTES', 64):  # Messages span many reads
+            self.assertEqual(list(iter_legacy_messages(path)), LOG)
+            self.assertEqual(restore_checkpoint(path, self.log), 40)
+        self.assertEqual([json.loads(line) for line in self.log.read_text(encoding='utf-8').splitlines()], LOG)
+        self.assertEqual(list(iter_legacy_messages(self.legacy(messages=[]))), [])
+
+    def test_damaged_checkpoint_keeps_log(self):
+        path = self.legacy()
+        path.write_text(path.read_text()[:-500])
+        self.log.write_text("kept\n", encoding='utf-8')
+        with self.assertRaises(ValueError):
+            restore_checkpoint(path, self.log)
+
+        self.log.write_text(self.lines, encoding='utf-8')
+        path = write_checkpoint(self.log, self.checkpoint_dir, "cut")
+        chunk = self.chunk_files()[0]
+        chunk.write_bytes(chunk.read_bytes()[:-5])
+        self.log.write_text("kept\n", encoding='utf-8')
+        with self.assertRaises(ValueError):
+            restore_checkpoint(path, self.log)
+        chunk.unlink()
+        with self.assertRaises(ValueError):
+            restore_checkpoint(path, self.log)
+        self.assertEqual(self.log.read_text(encoding='utf-8'), "kept\n")
+        self.assertEqual(sorted(p.name for p in self.root.iterdir()), ["checkpoints", "current_session.jsonl"])
+
+
+class TestRetention(unittest.TestCase):
+    """Test cases for tiered retention and garbage collection"""
+
+    def test_retained(self):
+        now = datetime(2025, 12, 1, 12, 0)
+        ages = [timedelta(minutes=m) for m in (1, 20, 59)] + \
+               [timedelta(hours=h, minutes=m) for h in (2, 3, 5) for m in (10, 40)] + \
+               [timedelta(days=d, hours=h) for d in (2, 3, 29) for h in (1, 6)] + [timedelta(days=45)]
+        checkpoints = [(Path(f"cp{n}"), now - age) for n, age in enumerate(ages)] + [(Path("undated"), None)]
+        keep = retained(checkpoints, now)
+        kept_ages = sorted(now - when for path, when in checkpoints if path in keep and when is not None)
+        self.assertEqual(kept_ages, [timedelta(minutes=1), timedelta(minutes=20), timedelta(minutes=59),
+                                     timedelta(hours=2, minutes=10), timedelta(hours=3, minutes=10),
+                                     timedelta(hours=5, minutes=10), timedelta(days=2, hours=1),
+                                     timedelta(days=3, hours=1), timedelta(days=29, hours=1)])
+        self.assertIn(Path("undated"), keep)
+        self.assertEqual(retained([(Path("old"), now - timedelta(days=90))], now), {Path("old")})
+
+    def test_prune_and_collect(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        root = Path(tmp.name)
+        log, checkpoint_dir = root / "current_session.jsonl", root / "checkpoints"
+        with mock.patch.multiple(chunk_store, CHUNK_MIN_BYTES=1000, CHUNK_MAX_BYTES=4000, CHUNK_CUT_MODULUS=4):
+            log.write_text("".join(json.dumps(e) + "\n" for e in LOG[:20]), encoding='utf-8')
+            old = write_checkpoint(log, checkpoint_dir, "auto_1")
+            manual = write_checkpoint(log, checkpoint_dir, "session_end_snapshot")
+            log.write_text("".join(json.dumps(e) + "\n" for e in LOG[20:]), encoding='utf-8')  # Nothing shared
+            new = write_checkpoint(log, checkpoint_dir, "auto_2")
+        legacy = checkpoint_dir / "20251101_100000_auto_0.json"
+        legacy.write_text(json.dumps({'timestamp': "2025-11-01T10:00:00", 'label': "auto_0", 'messages': []}))
+        old_chunks = {ref['chunk'] for ref in chunk_refs(old)}
+        store = ChunkStore(checkpoint_dir / CHUNKS_DIR)
+
+        later = datetime.utcnow() + timedelta(days=40)
+        removed = prune_checkpoints(checkpoint_dir, now=later)
+        self.assertEqual((removed['checkpoints'], removed['chunks']), (1, 0))  # Chunks are still in their grace period
+        self.assertEqual(sorted(checkpoint_dir.glob("*" + CHECKPOINT_SUFFIX)), sorted([manual, new]))
+        self.assertTrue(legacy.exists())  # Only periodic chunked checkpoints are thinned out
+        manual.unlink()
+
+        stale = time.time() - 2 * chunk_store.GC_GRACE_SECONDS
+        for chunk_file in (checkpoint_dir / CHUNKS_DIR).glob("*/*"):
+            os.utime(chunk_file, (stale, stale))
+        removed = prune_checkpoints(checkpoint_dir, now=later)
+        self.assertEqual(removed['chunks'], len(old_chunks))
+        self.assertEqual(set(store.sizes()), {ref['chunk'] for ref in chunk_refs(new)})
+        self.assertEqual(restore_checkpoint(new, log), 20)
+
+
+class TestCheckpointStore(unittest.TestCase):
+    """Test cases for CheckpointStore"""
+
+    def test_list_create_load(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        root = Path(tmp.name)
+        store = persistence_cli.CheckpointStore()
+        store.checkpoint_dir, store.current_log = root / "checkpoints", root / "current_session.jsonl"
+        self.assertEqual(store.list_all(), [])
+
+        store.current_log.write_text("".join(json.dumps(e) + "\n" for e in LOG[:5]), encoding='utf-8')
+        self.assertEqual(store.get_current_message_count(), 5)
+        created = store.create_checkpoint("first")
+        (store.checkpoint_dir / "notes.json").write_text("[1, 2]")
+        with mock.patch('builtins.print'):
+            listed = store.list_all()
+        self.assertEqual([(cp['path'], cp['label'], cp['message_count']) for cp in listed], [(created, "first", 5)])
+
+        store.current_log.write_text("", encoding='utf-8')
+        self.assertTrue(store.load_checkpoint(created))
+        self.assertEqual(store.get_current_message_count(), 5)
+        self.assertFalse(store.load_checkpoint(str(root / "missing.ckpt.jsonl")))
+
+
+class TestContextCheckpoint(unittest.TestCase):
+    """Test cases for ContextCheckpoint over the chunked store"""
+
+    def test_create_and_load(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        with mock.patch.object(ContextCheckpoint, 'CHECKPOINT_DIR', Path(tmp.name) / "context_checkpoints"):
+            checkpoint = ContextCheckpoint()
+        state = {"session_data": {"frontend_rounds": 250}, "pending_tasks": ["WebSocket hook"]}
+        path = checkpoint.create_checkpoint(state)
+        self.assertTrue(path.endswith(CHECKPOINT_SUFFIX))
+        self.assertEqual(checkpoint.list_checkpoints(), [path])
+        self.assertEqual(checkpoint.load_checkpoint(path)["state"], state)
+        self.assertEqual(checkpoint.load_latest_checkpoint(), checkpoint.load_checkpoint(path))
+
+        checkpoint.cleanup_old_checkpoints(keep_count=0)
+        self.assertEqual(checkpoint.list_checkpoints(), [])
+        self.assertIsNotNone(checkpoint.load_latest_checkpoint())
+
+
+if __name__ == "__main__":
+    unittest.main()
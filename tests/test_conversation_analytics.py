@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the columnar ConversationAnalytics core.
+
+Tests:
+- Columnar reports match the per-message reports, including tie order
+- Defragmented threads are flattened the same way
+- Columns are extended, not rebuilt, when more data is loaded
+- The persisted AnalyticsState folds only new log lines and reports the same
+- Messages the caller just appended are folded without re-reading the log
+- Logs whose first line is longer than the fingerprint prefix are still tracked
+- Arrow tables are reported on directly, with time-range pushdown
+- Nested defragmented Parquet threads report the same as their JSONL
+"""
+
+import unittest
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "utilities"))
+
+from conversation_analytics_engine import ARROW_SUPPORT, NUMPY_SUPPORT, AnalyticsState, ConversationAnalytics
+
+MESSAGES = [
+    {"SpeakerName": "gemini_cli", "Timestamp": "2025-11-02T10:00:00", "ConversationType": 0,
+     "Metadata": {"keywords": ["zmq", "broker"], "consolidated": True, "content_hash": "a1"},
+     "chain_type": "persistence", "ace_tier": "A", "shl_tags": ["@Chain-persistence"], "keywords": ["zmq"]},
+    {"SpeakerName": "claude_code", "Timestamp": "2025-11-01T09:00:00", "type": "proposal",
+     "Metadata": {"chain_type": "frontend", "ace_tier": "C", "shl_tags": ["@Chain-frontend"]}},
+    {"SpeakerName": "claude_code", "Timestamp": "", "Type": 3, "Metadata": {}},
+    {"Timestamp": "2025-11-02", "keywords": ["broker", "arrow"], "shl_tags": []},
+    {"SpeakerName": "gemini_cli", "Metadata": {"keywords": "not-a-list", "consolidated": False}},
+]
+
+
+@unittest.skipUnless(NUMPY_SUPPORT, "NumPy is required for columnar analytics")
+class TestColumnarAnalytics(unittest.TestCase):
+    """Test cases for MessageColumns through ConversationAnalytics"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.analytics = ConversationAnalytics(log_dir=self.tmp.name)
+
+    def assertMatchesRowwise(self, is_defragmented):
+        analysis = self.analytics.analyze()
+        expected = self.analytics._analyze_rowwise(is_defragmented)
+        for key, value in expected.items():
+            self.assertEqual(analysis[key], value, key)
+            self.assertEqual(list(analysis[key]) if isinstance(value, dict) else None,
+                             list(value) if isinstance(value, dict) else None, f"{key} order")
+
+    def test_raw_messages_match_rowwise(self):
+        self.analytics.threads = list(MESSAGES)
+        self.assertMatchesRowwise(False)
+        analysis = self.analytics.analyze()
+        self.assertEqual(analysis['keywords'][:2], [("zmq", 2), ("broker", 2)])
+        self.assertEqual(list(analysis['timeline']), ["2025-11-01", "2025-11-02"])
+
+    def test_defragmented_threads_match_rowwise(self):
+        self.analytics.threads = [
+            {"thread_id": "t1", "message_count": 2, "messages": MESSAGES[:2]},
+            {"thread_id": "t2", "message_count": 3, "messages": MESSAGES[2:]},
+        ]
+        self.assertMatchesRowwise(True)
+
+    def test_columns_extend_with_new_data(self):
+        self.analytics.threads = list(MESSAGES[:2])
+        columns = self.analytics.get_columns(False)
+        self.analytics.threads.extend(MESSAGES[2:])
+        self.assertIs(self.analytics.get_columns(False), columns)
+        self.assertEqual(len(columns), len(MESSAGES))
+        self.assertMatchesRowwise(False)
+
+
+class TestAnalyticsState(unittest.TestCase):
+    """Test cases for the incremental AnalyticsState"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.base = Path(self.tmp.name)
+        self.log = self.base / "current_session.jsonl"
+        self.state_file = self.base / "analytics_state.json"
+
+    def append(self, messages, partial=""):
+        with open(self.log, 'a', encoding='utf-8') as f:
+            for msg in messages:
+                f.write(json.dumps(msg) + "\n")
+            f.write(partial)
+
+    def rowwise(self, messages):
+        analytics = ConversationAnalytics(log_dir=self.tmp.name)
+        analytics.threads = list(messages)
+        return analytics._analyze_rowwise(False)
+
+    def test_fold_matches_full_analysis(self):
+        self.append(MESSAGES[:3])
+        state = AnalyticsState(self.state_file)
+        self.assertEqual(state.fold_log(self.log), 3)
+        state.save()
+
+        self.append(MESSAGES[3:], partial='{"SpeakerName": "half')
+        reloaded = AnalyticsState(self.state_file)
+        self.assertEqual(reloaded.fold_log(self.log), 2)
+        self.assertEqual(reloaded.fold_log(self.log), 0)
+        report = reloaded.report()
+        for key, value in self.rowwise(MESSAGES).items():
+            self.assertEqual(report[key], value, key)
+        self.assertEqual(list(report['speakers']), list(self.rowwise(MESSAGES)['speakers']))
+
+    def test_replaced_log_is_refolded(self):
+        self.append(MESSAGES)
+        state = AnalyticsState(self.state_file)
+        state.fold_log(self.log)
+        self.log.unlink()
+        self.append(MESSAGES[:1])
+        self.assertEqual(state.fold_log(self.log), 1)
+        self.assertEqual(state.total, 1)
+
+    def test_appended_message_is_folded_directly(self):
+        self.append(MESSAGES[:2])
+        state = AnalyticsState(self.state_file)
+        state.fold_log(self.log)
+        start = self.log.stat().st_size
+        self.append(MESSAGES[2:3])
+        end = self.log.stat().st_size
+        self.assertTrue(state.add_appended(MESSAGES[2], self.log, start, end))
+        self.assertFalse(state.add_appended(MESSAGES[3], self.log, start, end))  # State is past start
+        self.assertEqual(state.fold_log(self.log), 0)
+        self.assertEqual(state.report()['speakers'], self.rowwise(MESSAGES[:3])['speakers'])
+
+    def test_long_first_line_is_fingerprinted(self):
+        self.append([dict(MESSAGES[0], Message="x" * 10000)] + MESSAGES[1:2])
+        state = AnalyticsState(self.state_file)
+        self.assertEqual(state.fold_log(self.log), 2)
+        self.assertIsNotNone(state.log_fingerprint)
+        self.append(MESSAGES[2:3])
+        self.assertEqual(state.fold_log(self.log), 1)
+
+        self.log.unlink()
+        self.append([dict(MESSAGES[0], Message="y" * 10000)] + MESSAGES[1:])
+        self.assertGreater(self.log.stat().st_size, state.log_offset)
+        self.assertEqual(state.fold_log(self.log), len(MESSAGES))  # Only the first line tells the logs apart
+        self.assertEqual(state.total, len(MESSAGES))
+
+    def test_incremental_run_uses_state(self):
+        self.append(MESSAGES[:2])
+        analytics = ConversationAnalytics(log_dir=self.tmp.name)
+        self.assertEqual(analytics.analyze_incremental()['total_items'], 2)
+        self.append(MESSAGES[2:])
+        analysis = ConversationAnalytics(log_dir=self.tmp.name).analyze_incremental()
+        self.assertEqual(analysis['total_items'], len(MESSAGES))
+        self.assertEqual(analysis['speakers'], self.rowwise(MESSAGES)['speakers'])
+
+
+@unittest.skipUnless(ARROW_SUPPORT and NUMPY_SUPPORT, "PyArrow and NumPy are required")
+class TestArrowAnalytics(unittest.TestCase):
+    """Test cases for analytics over Parquet message tables"""
+
+    def setUp(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        rows = [
+            {"Timestamp": "2025-11-01T09:00:00", "SpeakerName": "claude_code", "Type": None,
+             "ConversationType": 0, "Metadata": {"keywords": ["arrow", "zmq"], "consolidated": True,
+                                                 "content_hash": "h1", "chain_type": None},
+             "chain_type": "persistence", "shl_tags": [], "keywords": ["zmq"]},
+            {"Timestamp": "2025-11-02T10:00:00", "SpeakerName": None, "Type": "proposal",
+             "ConversationType": 2, "Metadata": {"keywords": None, "consolidated": None,
+                                                 "content_hash": None, "chain_type": "frontend"},
+             "chain_type": None, "shl_tags": ["@Chain-frontend"], "keywords": ["arrow"]},
+            {"Timestamp": "", "SpeakerName": "gemini_cli", "Type": "", "ConversationType": 3,
+             "Metadata": None, "chain_type": None, "shl_tags": None, "keywords": None},
+        ]
+        pq.write_table(pa.Table.from_pylist(rows), Path(self.tmp.name) / "history.parquet")
+        pq.write_table(pa.table({"thread_id": ["t1"], "messages": ["[]"]}),
+                       Path(self.tmp.name) / "defragmented_sessions.parquet")
+        self.analytics = ConversationAnalytics(log_dir=self.tmp.name)
+
+    def test_arrow_reports_match_rowwise(self):
+        self.assertEqual(self.analytics.load_arrow(), 3)
+        self.assertEqual(self.analytics.threads, [])
+        analysis = self.analytics.analyze()
+        expected = self.analytics._analyze_rowwise(False)
+        for key, value in expected.items():
+            self.assertEqual(analysis[key], value, key)
+        self.assertEqual(analysis['message_types'], {'unknown': 1, 'proposal': 1, '3': 1})
+        self.assertEqual(analysis['keywords'], [('arrow', 2), ('zmq', 2)])
+
+    def test_time_range_pushdown(self):
+        self.assertEqual(self.analytics.load_arrow(start_time="2025-11-02", end_time="2025-11-03"), 1)
+        self.assertEqual(self.analytics.analyze()['speakers'], {'unknown': 1})
+
+    def test_get_messages_materializes_a_page(self):
+        self.analytics.load_arrow()
+        page = self.analytics.get_messages(offset=1, limit=5)
+        self.assertEqual(len(page), 2)
+        self.assertNotIn('SpeakerName', page[0])
+        self.assertEqual(page[0]['Metadata'], {'chain_type': 'frontend'})
+
+
+@unittest.skipUnless(ARROW_SUPPORT and NUMPY_SUPPORT, "PyArrow and NumPy are required")
+class TestDefragmentedArrowAnalytics(unittest.TestCase):
+    """Test cases for load_defragmented_arrow() over nested thread partitions"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.base = Path(self.tmp.name)
+
+    def write_threads(self, threads):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        from defragmentation_engine import PARQUET_SCHEMA, DefragmentationEngine
+
+        jsonl = self.base / "defragmented_sessions.jsonl"
+        jsonl.write_text("".join(json.dumps(t) + "\n" for t in threads), encoding='utf-8')
+        for day, day_threads in (("2025-11-01", threads[:1]), ("2025-11-02", threads[1:])):
+            partition = jsonl.with_suffix('.parquet') / f"day={day}" / "threads.parquet"
+            partition.parent.mkdir(parents=True)
+            rows = [dict(DefragmentationEngine._parquet_row(t), start_time=day, end_time=day, duration_minutes=0.0,
+                         final_status="Unknown") for t in day_threads]
+            pq.write_table(pa.Table.from_pylist(rows, schema=PARQUET_SCHEMA), partition)
+        return jsonl
+
+    def assertSameReport(self, threads, arrow_threads):
+        jsonl = self.write_threads(threads)
+        expected = ConversationAnalytics(log_dir=self.tmp.name, defragmented_log_file=str(jsonl))
+        expected.load_jsonl()
+        analytics = ConversationAnalytics(log_dir=self.tmp.name)
+        self.assertEqual(analytics.load_defragmented_arrow(jsonl.with_suffix('.parquet')), len(threads))
+        self.assertEqual(analytics.arrow_threads, arrow_threads)
+        analysis, reference = analytics.analyze(), expected.analyze()
+        for key, value in reference.items():
+            if key != 'timestamp':
+                self.assertEqual(analysis[key], value, key)
+
+    def test_projected_threads_match_jsonl(self):
+        messages = [dict(MESSAGES[0], Type="note"), MESSAGES[1], MESSAGES[3]]
+        self.assertSameReport([
+            {"thread_id": "t1", "message_count": 2, "participants": ["gemini_cli"], "context_shifts": [],
+             "messages": messages[:2]},
+            {"thread_id": "t2", "message_count": 1, "participants": [], "context_shifts": [], "messages": messages[2:]},
+        ], arrow_threads=2)
+
+    def test_unschematized_values_load_as_threads(self):
+        self.assertSameReport([
+            {"thread_id": "t1", "message_count": 2, "participants": [], "context_shifts": [], "messages": MESSAGES[:2]},
+            {"thread_id": "t2", "message_count": 3, "participants": [], "context_shifts": [], "messages": MESSAGES[2:]},
+        ], arrow_threads=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
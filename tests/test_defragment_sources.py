@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the multi-source loader in defragment_sources.
+
+Tests:
+- Exact duplicates keep their first occurrence in source/file/line order
+- The process pool loads exactly what a single process loads
+- Unreadable files and lines are reported and skipped
+"""
+
+import unittest
+import contextlib
+import io
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "utilities"))
+
+from defragment_sources import DefragmentationEngine
+
+
+class TestParallelSourceLoader(unittest.TestCase):
+    """Test cases for DefragmentationEngine.load_messages()"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.base = Path(self.tmp.name)
+        self.sources = {"dual_agents": self.base / "dual", "shearwater": self.base / "shear",
+                        "missing": self.base / "missing"}
+
+        dual = self.sources["dual_agents"]
+        (dual / "b").mkdir(parents=True)
+        with open(dual / "a.jsonl", 'w', encoding='utf-8') as f:
+            for i in range(30):
+                f.write(json.dumps({"Message": json.dumps({"n": i % 20}), "ContextId": f"ctx_{i % 3}",
+                                    "Timestamp": f"2025-11-01T{i % 24:02d}:00:00"}) + "\n")
+            f.write("not json\n")
+        (dual / "b" / "list.json").write_text(json.dumps([
+            {"message": "Hello,   World!", "thread_id": "t1", "timestamp": "2025-11-02T00:00:00"},
+            {"message": "hello world", "thread_id": "t2", "timestamp": "2025-11-02T01:00:00"},
+            {"message": "", "thread_id": "t3", "timestamp": "2025-11-02T02:00:00"},
+        ]), encoding='utf-8')
+        (dual / "broken.json").write_text("{", encoding='utf-8')
+
+        shear = self.sources["shearwater"]
+        shear.mkdir()
+        (shear / "one.json").write_text(json.dumps(
+            {"content": {"message": "HELLO world"}, "context_id": "t9", "timestamp": "2025-11-03T00:00:00"}),
+            encoding='utf-8')
+        (shear / "log.jsonl").write_text("".join(
+            json.dumps({"content": f"shear {i}", "context_id": "s", "timestamp": f"2025-11-03T0{i}:00:00"}) + "\n"
+            for i in range(5)), encoding='utf-8')
+
+    def load(self, workers):
+        engine = DefragmentationEngine(self.sources)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            total = engine.load_messages(workers=workers)
+        return engine, total, output.getvalue()
+
+    def test_first_occurrence_wins(self):
+        engine, total, output = self.load(workers=1)
+        self.assertEqual(total, 39)
+        self.assertEqual(engine.stats['sources_processed'], {"dual_agents": 33, "shearwater": 6})
+        self.assertEqual(engine.stats['exact_duplicates_removed'], 12)
+        self.assertEqual([m['timestamp'] for m in engine.messages_by_context["ctx_0"]],
+                         [f"2025-11-01T{i:02d}:00:00" for i in range(0, 20, 3)])
+        self.assertEqual(engine.messages_by_context["t1"][0]['content'], "Hello,   World!")
+        self.assertNotIn("t2", engine.messages_by_context)
+        self.assertNotIn("t3", engine.messages_by_context)
+        self.assertNotIn("t9", engine.messages_by_context)
+        self.assertEqual(len(engine.seen_hashes), 26)
+        self.assertIn("[WARNING] Source not found", output)
+        self.assertIn("broken.json", output)
+        self.assertIn("5/5 files, 39 messages", output)
+
+    def test_process_pool_matches_single_process(self):
+        expected, _, _ = self.load(workers=1)
+        engine, total, _ = self.load(workers=3)
+        self.assertEqual(total, expected.stats['total_loaded'])
+        self.assertEqual(engine.stats, expected.stats)
+        self.assertEqual(engine.messages_by_context, expected.messages_by_context)
+        self.assertEqual(list(engine.seen_hashes.items()), list(expected.seen_hashes.items()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the streaming DefragmentationEngine.
+
+Tests:
+- Streaming output is identical to the in-memory run
+- Out-of-order logs go through the external merge sort with the same result
+- Finished threads spilled to sorted runs are written in the same order
+- Sessions split on gaps, and status/context shifts are tracked incrementally
+- Incremental runs extend open threads and, once compacted, match a full run
+- Nested Parquet threads round-trip to the JSONL threads and project per field
+"""
+
+import unittest
+import json
+import logging
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "utilities"))
+
+from defragmentation_engine import (ARROW_SUPPORT, DefragmentationEngine, message_from_row, message_to_row,
+                                    read_thread_table, threads_from_table)
+
+logging.getLogger('DefragmentationEngine').setLevel(logging.ERROR)
+
+
+def make_messages():
+    messages = []
+    for i in range(60):
+        minute = i * 2 + (20 if i >= 30 else 0)  # A 20 minute gap halfway
+        timestamp = f"2025-11-01T{10 + minute // 60:02d}:{minute % 60:02d}:00"
+        msg = {
+            "Id": str(i),
+            "Timestamp": timestamp + "Z" if i % 7 == 0 else timestamp,
+            "SpeakerName": ["claude_code", "gemini_cli", "user"][i % 3],
+            "Message": f"message {i} ✓",
+            "Metadata": {"chain_type": "frontend" if i < 30 else "training",
+                         "shl_tags": ["@Status-Blocked"] if i == 59 else ["@Status-Ready"] if i % 9 == 0 else []},
+        }
+        if i % 4:
+            msg["ContextId"] = f"ctx_{i % 5}"
+        messages.append(msg)
+    return messages
+
+
+class TestStreamingDefragmentation(unittest.TestCase):
+    """Test cases for DefragmentationEngine.run(streaming=True)"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.base = Path(self.tmp.name)
+
+    def write_log(self, messages, name="raw.jsonl"):
+        path = self.base / name
+        with open(path, 'w', encoding='utf-8') as f:
+            for msg in messages:
+                f.write(json.dumps(msg, ensure_ascii=False) + "\n")
+            f.write("not json\n")
+            f.write(json.dumps({"Timestamp": 5}) + "\n")
+        return path
+
+    def run_engine(self, log, out, streaming, **kwargs):
+        engine = DefragmentationEngine(str(log), str(self.base / out / "out.jsonl"), **kwargs)
+        engine.run(streaming=streaming)
+        return engine, (self.base / out / "out.jsonl").read_text(encoding='utf-8')
+
+    def test_matches_in_memory_run(self):
+        log = self.write_log(sorted(make_messages(), key=lambda m: m["Timestamp"]))
+        _, expected = self.run_engine(log, "memory", streaming=False)
+        engine, output = self.run_engine(log, "stream", streaming=True)
+        self.assertEqual(output, expected)
+        self.assertTrue(engine.stats['append_ordered'])
+        self.assertEqual(engine.stats['messages'], 60)
+
+    def test_spilled_threads_match(self):
+        log = self.write_log(sorted(make_messages(), key=lambda m: m["Timestamp"]))
+        settings = dict(min_messages=1, min_duration=0, max_session_gap_minutes=10)
+        engine, output = self.run_engine(log, "stream", streaming=True, sort_buffer_size=4, **settings)
+        _, unspilled = self.run_engine(log, "plain", streaming=True, **settings)
+        self.assertEqual(output, unspilled)
+        self.assertTrue(engine.stats['append_ordered'])
+        self.assertEqual(engine.stats['sessions'], 2)
+        self.assertEqual(engine.state.sessions, 2)
+        self.assertNotIn('spans', engine.state.threads["session_1"])
+        self.assertIn('spans', engine.state.threads["session_2"])
+
+    def test_external_sort_matches(self):
+        messages = make_messages()
+        random.Random(3).shuffle(messages)
+        log = self.write_log(messages)
+        _, expected = self.run_engine(log, "memory", streaming=False)
+        engine, output = self.run_engine(log, "stream", streaming=True, sort_buffer_size=8)
+        self.assertEqual(output, expected)
+        self.assertFalse(engine.stats['append_ordered'])
+        self.assertEqual(engine.stats['sorted_runs'], 8)
+
+    def test_sessions_and_summaries(self):
+        log = self.write_log(make_messages())
+        _, output = self.run_engine(log, "stream", streaming=True,
+                                    min_messages=1, min_duration=0, max_session_gap_minutes=10)
+        threads = {t["thread_id"]: t for t in map(json.loads, output.splitlines())}
+        self.assertEqual(sorted(tid for tid in threads if tid.startswith("session_")), ["session_1", "session_2"])
+        self.assertEqual(threads["ctx_4"]["final_status"], "Blocked")
+        self.assertEqual(threads["ctx_1"]["context_shifts"],
+                         [{"from_topic": "frontend", "to_topic": "training", "message_index": 5}])
+        self.assertEqual(len(threads["ctx_1"]["messages"]), threads["ctx_1"]["message_count"])
+
+
+class TestIncrementalDefragmentation(unittest.TestCase):
+    """Test cases for DefragmentationEngine.run(incremental=True)"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.base = Path(self.tmp.name)
+        self.log = self.base / "raw.jsonl"
+        self.messages = sorted(make_messages(), key=lambda m: m["Timestamp"])
+
+    def append(self, messages):
+        with open(self.log, 'a', encoding='utf-8') as f:
+            for msg in messages:
+                f.write(json.dumps(msg, ensure_ascii=False) + "\n")
+
+    def engine(self, out="inc", **kwargs):
+        return DefragmentationEngine(str(self.log), str(self.base / out / "out.jsonl"), compact_ratio=10, **kwargs)
+
+    def test_compacted_output_matches_full_run(self):
+        runs = []
+        for start in range(0, 60, 15):
+            self.append(self.messages[start:start + 15])
+            engine = self.engine()
+            engine.run(incremental=True)
+            runs.append(engine.stats['incremental'])
+        self.assertEqual(runs, [False, True, True, True])
+
+        lines = (self.base / "inc" / "out.jsonl").read_text(encoding='utf-8').splitlines()
+        self.assertGreater(len(lines), engine.state.live_threads)
+        self.assertEqual(engine.compact(), engine.state.live_threads)
+
+        full = self.engine("full")
+        full.run()
+        self.assertEqual((self.base / "inc" / "out.jsonl").read_text(encoding='utf-8'),
+                         (self.base / "full" / "out.jsonl").read_text(encoding='utf-8'))
+        if ARROW_SUPPORT:
+            import pyarrow.parquet as pq
+            self.assertEqual(pq.read_table(self.base / "inc" / "out.parquet").to_pylist(),
+                             pq.read_table(self.base / "full" / "out.parquet").to_pylist())
+
+    def test_partial_line_waits_for_next_run(self):
+        self.append(self.messages[:10])
+        with open(self.log, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(self.messages[10])[:20])
+        engine = self.engine()
+        engine.run(incremental=True)
+        self.assertEqual(engine.stats['messages'], 10)
+        with open(self.log, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(self.messages[10])[20:] + "\n")
+        engine = self.engine()
+        engine.run(incremental=True)
+        self.assertTrue(engine.stats['incremental'])
+        self.assertEqual(engine.state.log_offset, self.log.stat().st_size)
+
+    def test_closed_thread_falls_back_to_full_run(self):
+        self.append(self.messages)
+        self.engine(thread_close_hours=0.1).run(incremental=True)
+        late = dict(self.messages[1], Id="late", Timestamp="2025-11-01T12:30:00")  # ctx_1 closed at 12:02
+        self.append([late])
+        engine = self.engine(thread_close_hours=0.1)
+        engine.run(incremental=True)
+        self.assertFalse(engine.stats['incremental'])
+        self.assertEqual(engine.state.threads["ctx_1"]["count"], 10)
+
+
+@unittest.skipUnless(ARROW_SUPPORT, "PyArrow is required for Parquet output")
+class TestNestedThreadParquet(unittest.TestCase):
+    """Test cases for the nested thread schema and its readers"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.base = Path(self.tmp.name)
+        self.log = self.base / "raw.jsonl"
+        messages = make_messages()
+        messages[3]["Type"] = 3
+        messages[5]["Metadata"]["keywords"] = "not-a-list"
+        messages[8]["Extra"] = {"nested": [1, 2]}
+        messages[11]["Metadata"] = "not-a-dict"
+        self.messages = messages
+        with open(self.log, 'w', encoding='utf-8') as f:
+            for msg in messages:
+                f.write(json.dumps(msg, ensure_ascii=False) + "\n")
+
+    def test_message_rows_round_trip(self):
+        for msg in self.messages:
+            self.assertEqual(message_from_row(message_to_row(msg)), msg)
+        self.assertEqual(json.loads(message_to_row(self.messages[5])["extra"]), {"Metadata": {"keywords": "not-a-list"}})
+
+    def test_parquet_threads_match_jsonl(self):
+        DefragmentationEngine(str(self.log), str(self.base / "out.jsonl"), min_messages=1, min_duration=0).run()
+        expected = [json.loads(line) for line in (self.base / "out.jsonl").read_text(encoding='utf-8').splitlines()]
+        dataset = self.base / "out.parquet"
+        self.assertEqual(sorted(p.parent.name for p in dataset.glob("day=*/threads.parquet")), ["day=2025-11-01"])
+        self.assertEqual(threads_from_table(read_thread_table(dataset)), expected)
+
+        projected = read_thread_table(dataset, ["thread_id", "messages.list.element.Message", "missing"])
+        self.assertEqual(projected.column_names, ["thread_id", "messages"])
+        self.assertEqual(projected.column("messages")[0].as_py()[0], {"Message": expected[0]["messages"][0]["Message"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the persistent embedding cache used by the consolidation bots.
+
+Tests:
+- Reruns only encode texts not seen before, and rows survive a reload
+- A different model starts a fresh cache; a torn append is truncated
+- Adjacent similarities match pairwise cosine similarity
+"""
+
+import unittest
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "bots"))
+
+from embedding_cache import EmbeddingCache, adjacent_similarities, MATRIX_FILE
+
+
+class FakeEncoder:
+    """Deterministic stand-in for a sentence encoder that records its calls"""
+
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.array([np.random.default_rng(sum(map(ord, text))).normal(size=self.dim) for text in texts])
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    """Test cases for EmbeddingCache"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache_dir = Path(self.tmp.name) / "cache"
+
+    def test_only_new_texts_are_encoded(self):
+        encoder = FakeEncoder()
+        first = EmbeddingCache(self.cache_dir, "model-a").embed(["a", "b", "a", "c"], encoder)
+        self.assertEqual(encoder.calls, [["a", "b", "c"]])
+        self.assertEqual(first.shape, (4, 8))
+        np.testing.assert_allclose(np.linalg.norm(first, axis=1), 1, atol=1e-3)
+        np.testing.assert_array_equal(first[0], first[2])
+
+        cache = EmbeddingCache(self.cache_dir, "model-a")
+        second = cache.embed(["c", "d", "a"], encoder)
+        self.assertEqual(encoder.calls[1:], [["d"]])
+        self.assertEqual(cache.stats, {'hits': 2, 'encoded': 1})
+        np.testing.assert_array_equal(second[0], first[3])
+        np.testing.assert_array_equal(second[2], first[0])
+        self.assertEqual(len(EmbeddingCache(self.cache_dir, "model-a")), 4)
+
+    def test_model_change_and_torn_append(self):
+        encoder = FakeEncoder()
+        EmbeddingCache(self.cache_dir, "model-a").embed(["a", "b"], encoder)
+        with open(self.cache_dir / MATRIX_FILE, 'ab') as f:
+            f.write(b"\0" * 10)  # Rows written, index never updated
+        cache = EmbeddingCache(self.cache_dir, "model-a")
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((self.cache_dir / MATRIX_FILE).stat().st_size, 2 * 8 * 2)
+
+        other = EmbeddingCache(self.cache_dir, "model-b")
+        self.assertEqual(len(other), 0)
+        other.embed(["a"], FakeEncoder(dim=4))
+        self.assertEqual(len(EmbeddingCache(self.cache_dir, "model-b")), 1)
+        self.assertEqual(len(EmbeddingCache(self.cache_dir, "model-a")), 0)
+
+    def test_adjacent_similarities(self):
+        vectors = np.random.default_rng(0).normal(size=(20, 16))
+        expected = [vectors[i] @ vectors[i + 1] / np.linalg.norm(vectors[i]) / np.linalg.norm(vectors[i + 1])
+                    for i in range(19)]
+        np.testing.assert_allclose(adjacent_similarities(vectors), expected, rtol=1e-5)
+        self.assertEqual(adjacent_similarities(vectors[:1]).shape, (0,))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the shared corpus behind EmergentPropertyTracker.
+
+Tests:
+- MessageCorpus interns words, counts phrases and maps text back to messages
+- PhraseStats gives the same unique phrases exactly, approximately (as a
+  lower bound) and without NumPy, for any phrase length
+- Tracker metrics computed from the corpus match a direct recount
+- The corpus is rebuilt when the tracker's messages change
+- Sliding-window scores match a full recount of the window's messages,
+  evict by count and by age, and are recorded on a dashboard
+"""
+
+import unittest
+import random
+import re
+import sys
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "utilities"))
+
+from emergent_property_tracker import EmergenceWindow, EmergentPropertyTracker
+import message_corpus
+from message_corpus import MessageCorpus
+
+MESSAGES = [
+    {"SpeakerName": "claude", "Message": "Should the cache sit in front of the database API?"},
+    {"SpeakerName": "gemini", "Message": "Actually, rather than a cache we could batch the queue; latency drops to 5 ms"},
+    {"SpeakerName": "claude", "Message": "Agreed: a hybrid pipeline, tested with snake_case fixtures and def run_batch"},
+    {"SpeakerName": "gemini", "Message": ""},
+    {"SpeakerName": "claude", "Message": {"nested": "Cache the database results"}},
+    {"Message": "Should the cache sit in front of the database API?"},
+]
+
+
+class TestMessageCorpus(unittest.TestCase):
+    """Test cases for MessageCorpus"""
+
+    def setUp(self):
+        self.corpus = MessageCorpus(MESSAGES)
+
+    def test_tokens_and_vocabulary(self):
+        texts = [str(m.get('Message', '')).lower() for m in MESSAGES]
+        for tokens, text in zip(self.corpus.tokens, texts):
+            self.assertEqual([self.corpus.words[t] for t in tokens], re.findall(r'\b\w+\b', text))
+        self.assertEqual(set(self.corpus.vocabulary), {w for t in texts for w in re.findall(r'\b\w+\b', t)})
+        self.assertEqual(self.corpus.introductions[:3], [(0, "should"), (0, "the"), (0, "cache")])
+        self.assertEqual(self.corpus.text, ' '.join(texts))
+        self.assertEqual(self.corpus.speaker_counts, {"claude": 3, "gemini": 2, "unknown": 1})
+
+    def test_phrases(self):
+        expected = phrase_counts(MESSAGES)
+        stats = self.corpus.phrase_stats
+        self.assertEqual((stats.distinct, stats.total), (len(expected), sum(expected.values())))
+        self.assertEqual(self.corpus.unique_phrases(), [p for p, c in expected.items() if c == 1])
+        self.assertEqual(self.corpus.unique_phrase_count(), len(self.corpus.unique_phrases()))
+
+    def test_messages_containing(self):
+        self.assertEqual(self.corpus.messages_containing("cache"), [0, 1, 4, 5])
+        self.assertEqual(self.corpus.messages_containing("?"), [0, 5])
+        self.assertEqual(self.corpus.messages_containing("api? actually"), [])  # Spans two messages
+        self.assertEqual(self.corpus.concept_counts(["cache", "queue", "encryption"]), {"cache": 4, "queue": 1})
+
+
+def phrase_counts(messages, n=3):
+    counts = Counter()
+    for msg in messages:
+        words = str(msg.get('Message', '')).split()
+        for i in range(len(words) - n + 1):
+            phrase = ' '.join(words[i:i + n]).lower()
+            if len(phrase) > 10:
+                counts[phrase] += 1
+    return counts
+
+
+class TestPhraseStats(unittest.TestCase):
+    """Test cases for exact, approximate and pure-Python phrase counting"""
+
+    def setUp(self):
+        self.messages = synthetic_log(400) + MESSAGES
+
+    def unique(self, n):
+        return [p for p, c in phrase_counts(self.messages, n).items() if c == 1]
+
+    def test_modes_agree(self):
+        for n in (2, 3, 5):
+            expected = self.unique(n)
+            exact = MessageCorpus(self.messages, phrase_size=n)
+            self.assertEqual(exact.unique_phrases(), expected)
+            approximate = MessageCorpus(self.messages, phrase_size=n, phrase_mode='approximate')
+            self.assertEqual(approximate.unique_phrases(), expected)
+            self.assertEqual(approximate.unique_phrase_count(), len(expected))
+            self.assertIsNone(approximate.phrase_stats.distinct)
+
+    def test_small_sketch_is_a_lower_bound(self):
+        expected = self.unique(3)
+        corpus = MessageCorpus(self.messages)
+        stats = message_corpus.PhraseStats(corpus.term_ids, corpus.term_offsets, corpus.term_lengths,
+                                           mode='approximate', width=64, depth=2)
+        found = [corpus.phrase_at(pos) for pos in stats.unique_positions()]
+        self.assertLess(stats.unique_count(), len(expected))
+        self.assertEqual(len(found), stats.unique_count())
+        self.assertTrue(set(found) <= set(expected))
+        self.assertEqual(stats.nbytes, 128)
+
+    def test_without_numpy(self):
+        with mock.patch.object(message_corpus, 'NUMPY_SUPPORT', False):
+            corpus = MessageCorpus(self.messages, phrase_mode='approximate')
+            self.assertEqual(corpus.phrase_stats.mode, 'exact')
+            self.assertEqual(corpus.unique_phrases(), self.unique(3))
+            self.assertEqual(corpus.unique_phrase_count(), len(self.unique(3)))
+        with self.assertRaises(ValueError):
+            MessageCorpus(MESSAGES, phrase_mode='fuzzy')
+
+
+class TestTrackerMetrics(unittest.TestCase):
+    """Test cases for tracker metrics read from the corpus"""
+
+    def setUp(self):
+        self.tracker = EmergentPropertyTracker()
+        self.tracker.messages = list(MESSAGES)
+        self.tracker.extract_conversations()
+
+    def test_metrics(self):
+        diversity = self.tracker.analyze_diversity()
+        self.assertEqual(diversity['speaker_distribution'], {"claude": 3, "gemini": 2, "unknown": 1})
+        self.assertEqual(diversity['message_length']['max'], len(MESSAGES[1]['Message']))
+        self.assertEqual(diversity['message_length']['min'], 0)
+        self.assertEqual(diversity['unique_concepts'], 6)
+
+        quality = self.tracker.analyze_solution_quality()
+        self.assertEqual(quality['solution_completeness'], 20.0)  # "tested"
+        self.assertEqual(quality['solution_specificity'], 20.0)  # 5 ms, snake_case, run_batch, def run_batch
+        self.assertEqual(self.tracker._count_problem_reframings(), 2)
+        self.assertEqual(self.tracker._measure_qa_effectiveness(), 50.0)
+        self.assertEqual(self.tracker._measure_turn_balance()["claude"], 50.0)
+        self.assertEqual(self.tracker._detect_emergence_signals(),
+                         ['novel_synthesis', 'assumption_challenge', 'cross_domain'])
+
+    def test_corpus_follows_messages(self):
+        first = self.tracker.corpus
+        self.assertIs(self.tracker.corpus, first)
+        self.tracker.messages.append({"SpeakerName": "claude", "Message": "encryption everywhere"})
+        self.assertEqual(self.tracker.analyze_diversity()['unique_concepts'], 7)
+        self.tracker.messages = []
+        self.assertEqual(self.tracker.analyze_diversity(), {'status': 'no_data'})
+        self.assertEqual(self.tracker.analyze_novelty()['novelty_score'], 0.0)
+
+
+class RecordingDashboard:
+    """Stand-in for RealtimeMonitoringDashboard"""
+
+    def __init__(self):
+        self.signals = []
+
+    def record_emergence_signal(self, signal_type, value, details=""):
+        self.signals.append((signal_type, value))
+
+
+def synthetic_log(count, seed=3):
+    rng = random.Random(seed)
+    vocabulary = "cache queue latency the a rather than hybrid api encryption pipeline risk".split()
+    start = datetime(2025, 11, 1)
+    return [{"SpeakerName": rng.choice(["claude", "gemini", "gpt"]),
+             "Timestamp": (start + timedelta(minutes=i)).isoformat(),
+             "Message": " ".join(rng.choice(vocabulary) if rng.random() < 0.7 else f"w{rng.randint(0, 60)}"
+                                 for _ in range(rng.randint(0, 12)))}
+            for i in range(count)]
+
+
+class TestEmergenceWindow(unittest.TestCase):
+    """Test cases for EmergenceWindow"""
+
+    def assert_matches_recount(self, point, window_messages):
+        tracker = EmergentPropertyTracker()
+        tracker.messages = window_messages
+        self.assertEqual(point['window_messages'], len(window_messages))
+        self.assertEqual(point['vocabulary_size'], len(tracker._extract_vocabulary()))
+        self.assertEqual(point['unique_phrases'], len(tracker._find_unique_phrases()))
+        self.assertEqual(point['unique_concepts'], len(tracker._extract_concepts()))
+        self.assertAlmostEqual(point['novelty'], tracker._calculate_novelty_score() / 100, places=4)
+        self.assertEqual(point['turn_balance'], tracker._measure_turn_balance())
+
+    def test_count_window_matches_recount(self):
+        messages = synthetic_log(120)
+        window = EmergenceWindow(max_messages=25)
+        for i, msg in enumerate(messages):
+            point = window.add(msg)
+            if i % 10 == 9:
+                self.assert_matches_recount(point, messages[max(0, i - 24):i + 1])
+        self.assertEqual(len(window.series), 120)
+        self.assertTrue(all(0 <= p[s] <= 1 for p in window.series for s in EmergenceWindow.SIGNALS))
+
+    def test_time_window(self):
+        messages = synthetic_log(60)
+        window = EmergenceWindow(max_messages=None, max_minutes=10)
+        for msg in messages:
+            point = window.add(msg)
+        self.assert_matches_recount(point, messages[-11:])
+
+    def test_dashboard_and_timeline(self):
+        dashboard = RecordingDashboard()
+        tracker = EmergentPropertyTracker()
+        tracker.messages = synthetic_log(30)
+        series = tracker.analyze_emergence_over_time(window_messages=10, step=5, dashboard=dashboard)
+        self.assertEqual([p['index'] for p in series], [4, 9, 14, 19, 24, 29])
+        self.assertEqual([name for name, _ in dashboard.signals], ['novelty', 'diversity', 'collaboration'] * 6)
+        self.assertEqual(dashboard.signals[-3][1], series[-1]['novelty'])
+
+        single = EmergenceWindow(max_messages=5)
+        point = single.add({"SpeakerName": "claude", "Message": "cache cache cache"})
+        self.assertEqual((point['diversity'], point['collaboration']), (0.0, 0.0))
+        point = single.add({"SpeakerName": "gemini", "Message": "queue"})
+        self.assertEqual(point['collaboration'], 1.0)
+        self.assertGreater(point['diversity'], 0.8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the heartbeat liveness protocol.
+
+Tests:
+- Stats snapshot reports processed count, last error and loop lag
+- Aggregator liveness honours per-component and advertised timeouts
+- Aggregator reports processing rates and the queue depths components send
+"""
+
+import unittest
+import json
+import time
+from pathlib import Path
+import sys
+
+# Add src directory to path to allow for clean imports
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from core.heartbeat import HeartbeatStats, HeartbeatAggregator, is_heartbeat_topic
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def beat(component, processed=0, interval=5.0, pid=1, queue_depth=None):
+    return {'type': 'heartbeat', 'from': component, 'pid': pid, 'seq': 1,
+            'interval': interval, 'processed': processed, 'queue_depth': queue_depth,
+            'last_error': None, 'loop_lag': 0.0}
+
+
+class TestHeartbeatStats(unittest.TestCase):
+    """Test cases for HeartbeatStats"""
+
+    def test_snapshot_counts_and_error(self):
+        stats = HeartbeatStats(queue_depth=lambda: 7)
+        stats.tick()
+        stats.processed()
+        stats.processed(2)
+        stats.error(ValueError("boom"))
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot['processed'], 3)
+        self.assertEqual(snapshot['last_error'], "boom")
+        self.assertEqual(snapshot['queue_depth'], 7)
+        self.assertIsNotNone(snapshot['loop_lag'])
+
+    def test_loop_lag_measures_stall(self):
+        stats = HeartbeatStats(expected_loop_interval=0.0)
+        stats.tick()
+        time.sleep(0.05)
+        stats.tick()
+        self.assertGreaterEqual(stats.snapshot()['loop_lag'], 0.04)
+
+    def test_no_ticks_means_unknown_lag(self):
+        self.assertIsNone(HeartbeatStats().snapshot()['loop_lag'])
+
+
+class TestHeartbeatAggregator(unittest.TestCase):
+    """Test cases for HeartbeatAggregator"""
+
+    def test_component_expires_after_advertised_interval(self):
+        clock = FakeClock()
+        aggregator = HeartbeatAggregator(clock=clock)
+        aggregator.update(beat("broker", interval=2.0))
+        self.assertTrue(aggregator.liveness()["broker"]["alive"])
+        clock.now += 7.0  # more than 3 missed beats
+        self.assertFalse(aggregator.liveness()["broker"]["alive"])
+        self.assertEqual(aggregator.dead_components(), ["broker"])
+
+    def test_configured_timeout_overrides_interval(self):
+        clock = FakeClock()
+        aggregator = HeartbeatAggregator(timeouts={"broker": 60.0}, clock=clock)
+        aggregator.update(beat("broker", interval=2.0))
+        clock.now += 30.0
+        self.assertTrue(aggregator.liveness()["broker"]["alive"])
+
+    def test_rate_and_queue_depths(self):
+        clock = FakeClock()
+        aggregator = HeartbeatAggregator(clock=clock)
+        self.assertEqual(aggregator.queue_depths(), {})
+        aggregator.update(beat("broker", processed=10, queue_depth=0))
+        aggregator.update(beat("persistence_daemon", processed=4, queue_depth=56))
+        aggregator.update(beat("claude_code"))
+        clock.now += 5.0
+        aggregator.update(beat("broker", processed=60, queue_depth=3))
+        self.assertEqual(aggregator.liveness()["broker"]["rate"], 10.0)
+        self.assertEqual(aggregator.queue_depths(), {"broker": 3, "persistence_daemon": 56})
+
+    def test_update_from_frame_rejects_garbage(self):
+        aggregator = HeartbeatAggregator()
+        self.assertFalse(aggregator.update_from_frame(b"not json"))
+        self.assertTrue(aggregator.update_from_frame(json.dumps(beat("claude_code")).encode()))
+        self.assertIn("claude_code", aggregator.liveness())
+
+    def test_is_heartbeat_topic(self):
+        self.assertTrue(is_heartbeat_topic(b"heartbeat"))
+        self.assertFalse(is_heartbeat_topic(b"claude_code"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Unit tests for event-driven inbox monitoring.
+
+Tests:
+- The seen log is append-only, survives reloads and imports the old JSON cache
+- Every watcher backend reports a new message well under a second
+- Each file is dispatched once, including files that arrived while stopped
+"""
+
+import unittest
+import json
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# inbox_watcher/inbox_bot import inbox_events as a sibling script module
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "utilities"))
+
+from inbox_events import InboxMonitor, SeenLog
+
+
+class TestSeenLog(unittest.TestCase):
+    """Test cases for SeenLog"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.base = Path(self.tmp.name)
+
+    def test_append_and_reload(self):
+        log = SeenLog(self.base / "seen.log")
+        self.assertTrue(log.add("claude", "a.json"))
+        self.assertFalse(log.add("claude", "a.json"))
+        log.close()
+
+        reloaded = SeenLog(self.base / "seen.log")
+        self.addCleanup(reloaded.close)
+        self.assertIn(("claude", "a.json"), reloaded)
+        self.assertNotIn(("gemini", "a.json"), reloaded)
+        self.assertEqual((self.base / "seen.log").read_text().count("\n"), 1)
+
+    def test_imports_legacy_cache(self):
+        legacy = self.base / "cache.json"
+        legacy.write_text(json.dumps({"gemini": ["old.json"]}))
+        log = SeenLog(self.base / "seen.log", legacy_cache=legacy)
+        self.addCleanup(log.close)
+        self.assertIn(("gemini", "old.json"), log)
+
+
+class InboxMonitorTests:
+    """Shared cases; subclasses set BACKEND"""
+
+    BACKEND = None
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.base = Path(self.tmp.name)
+        self.inbox = self.base / "inbox"
+        self.inbox.mkdir()
+        self.seen = SeenLog(self.base / "seen.log")
+        self.addCleanup(self.seen.close)
+        self.received = []
+        self.arrived = threading.Event()
+
+    def handler(self, message):
+        self.received.append(message)
+        self.arrived.set()
+
+    def make_monitor(self):
+        monitor = InboxMonitor({'claude': ('claude_code_inbox', self.inbox)}, self.seen,
+                               self.handler, load_data=True, backend=self.BACKEND)
+        self.addCleanup(monitor.stop)
+        return monitor
+
+    def write_message(self, name, data):
+        with open(self.inbox / name, 'w') as f:
+            json.dump(data, f)
+
+    def test_new_message_latency(self):
+        self.make_monitor().start()
+        start = time.monotonic()
+        self.write_message("m1.json", {"subject": "hi"})
+        self.assertTrue(self.arrived.wait(2))
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(self.received[0]['data'], {"subject": "hi"})
+        self.assertEqual(self.received[0]['inbox'], 'claude_code_inbox')
+
+    def test_catch_up_and_no_duplicates(self):
+        self.write_message("early.json", {"n": 1})
+        self.write_message("seen.json", {"n": 0})
+        self.seen.add("claude", "seen.json")
+        monitor = self.make_monitor()
+        monitor.start()
+        self.assertTrue(self.arrived.wait(2))
+        self.write_message("early.json", {"n": 2})  # rewritten, still one delivery
+        (self.inbox / "notes.txt").write_text("ignored")
+        time.sleep(0.3)
+        monitor.stop()
+        self.assertEqual([m['file'] for m in self.received], ["early.json"])
+
+
+class TestPollingMonitor(InboxMonitorTests, unittest.TestCase):
+    BACKEND = "poll"
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux only")
+class TestInotifyMonitor(InboxMonitorTests, unittest.TestCase):
+    BACKEND = "inotify"
+
+
+if __name__ == "__main__":
+    unittest.main()
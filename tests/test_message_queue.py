@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the MessageQueue storage backends.
+
+Each test runs against both the file and the SQLite backend:
+- Pending tasks are ordered by priority, then age
+- Claiming a task is atomic and completing it archives it
+- Results flow back to the task sender
+- wait_for_task() wakes up when a task arrives
+- Leases expire and requeue, repeated failures dead-letter
+- Concurrent workers never claim the same task twice
+- File backend: claims left by a crashed worker are recovered
+"""
+
+import unittest
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+import sys
+
+# The top-level core package shares its name with src/core, which other
+# tests put on the path first. Import it in isolation, then restore.
+_saved_core = {name: sys.modules.pop(name) for name in list(sys.modules)
+               if name == "core" or name.startswith("core.")}
+sys.path.insert(0, str(Path(__file__).parent.parent))
+try:
+    from core.message_queue import AgentName, MessageQueue
+    from core.task_scheduler import TaskScheduler, fair_select
+finally:
+    sys.path.pop(0)
+    for name in [name for name in sys.modules if name == "core" or name.startswith("core.")]:
+        del sys.modules[name]
+    sys.modules.update(_saved_core)
+
+
+class MessageQueueBackendTests:
+    """Shared cases; subclasses set BACKEND"""
+
+    BACKEND = None
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        base = Path(self.tmp.name)
+        self.claude = MessageQueue(AgentName.CLAUDE, base_path=base, backend=self.BACKEND)
+        self.gemini = MessageQueue(AgentName.GEMINI, base_path=base, backend=self.BACKEND)
+
+    def test_pending_tasks_ordered_by_priority(self):
+        low = self.claude.send_task(AgentName.GEMINI, "t", {}, priority="low")
+        normal = self.claude.send_task(AgentName.GEMINI, "t", {}, priority="normal")
+        high = self.claude.send_task(AgentName.GEMINI, "t", {}, priority="high")
+        ids = [task["id"] for task in self.gemini.get_pending_tasks()]
+        self.assertEqual(ids, [high, normal, low])
+
+    def test_claim_is_atomic_and_complete_archives(self):
+        task_id = self.claude.send_task(AgentName.GEMINI, "t", {"x": 1})
+        self.assertTrue(self.gemini.mark_task_processing(task_id))
+        self.assertFalse(self.gemini.mark_task_processing(task_id))
+        status = self.gemini.get_status()
+        self.assertEqual(status["pending_tasks"], 0)
+        self.assertEqual(status["processing_tasks"], 1)
+
+        self.assertTrue(self.gemini.mark_task_complete(task_id))
+        self.assertFalse(self.gemini.mark_task_complete(task_id))
+        status = self.gemini.get_status()
+        self.assertEqual(status["processing_tasks"], 0)
+        self.assertEqual(status["archived_messages"], 1)
+
+    def test_result_returns_to_sender(self):
+        task_id = self.claude.send_task(AgentName.GEMINI, "t", {})
+        self.gemini.mark_task_processing(task_id)
+        self.assertTrue(self.gemini.send_result(task_id, {"answer": 42}))
+        results = self.claude.get_results(task_id)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["result"], {"answer": 42})
+
+    def test_wait_for_task(self):
+        self.assertFalse(self.gemini.wait_for_task(timeout=0.1))
+
+        def send_later():
+            time.sleep(0.2)
+            self.claude.send_task(AgentName.GEMINI, "t", {})
+
+        threading.Thread(target=send_later).start()
+        start = time.monotonic()
+        self.assertTrue(self.gemini.wait_for_task(timeout=5))
+        self.assertLess(time.monotonic() - start, 2)
+
+
+    def test_claim_uses_numeric_priorities(self):
+        ids = {p: self.claude.send_task(AgentName.GEMINI, "t", {}, priority=p) for p in ("low", 5, "normal", 70)}
+        claimed = [task["id"] for task in self.gemini.claim(4)]
+        self.assertEqual(claimed, [ids[5], ids["normal"], ids[70], ids["low"]])
+        self.assertEqual(self.gemini.claim(1), [])
+
+    def test_expired_lease_is_requeued_then_dead_lettered(self):
+        worker = MessageQueue(AgentName.GEMINI, base_path=Path(self.tmp.name), backend=self.BACKEND,
+                              lease_seconds=0.05, max_attempts=2)
+        task_id = self.claude.send_task(AgentName.GEMINI, "t", {})
+        self.assertEqual(len(worker.claim(1)), 1)
+        time.sleep(0.1)
+        self.assertEqual(worker.requeue_expired(), 1)
+        self.assertFalse(worker.mark_task_complete(task_id))
+
+        self.assertEqual(worker.claim(1)[0]["attempts"], 2)
+        self.assertTrue(worker.mark_task_failed(task_id, "boom"))
+        self.assertEqual(worker.claim(1), [])
+        dead = worker.get_dead_letters()
+        self.assertEqual([task["id"] for task in dead], [task_id])
+        self.assertEqual(dead[0]["last_error"], "boom")
+        self.assertEqual(worker.get_status()["dead_letters"], 1)
+
+    def test_other_worker_cannot_complete_leased_task(self):
+        other = MessageQueue(AgentName.GEMINI, base_path=Path(self.tmp.name), backend=self.BACKEND,
+                             worker_id="other")
+        task_id = self.claude.send_task(AgentName.GEMINI, "t", {})
+        self.gemini.claim(1)
+        self.assertFalse(other.mark_task_complete(task_id))
+        self.assertTrue(self.gemini.mark_task_complete(task_id))
+
+    def test_concurrent_workers_do_not_double_claim(self):
+        for i in range(60):
+            self.claude.send_task(AgentName.GEMINI, "t", {"n": i})
+        claimed = []
+        lock = threading.Lock()
+
+        def drain(worker_id):
+            worker = MessageQueue(AgentName.GEMINI, base_path=Path(self.tmp.name), backend=self.BACKEND,
+                                  worker_id=worker_id)
+            try:
+                while True:
+                    batch = worker.claim(4)
+                    if not batch:
+                        return
+                    with lock:
+                        claimed.extend(task["id"] for task in batch)
+            finally:
+                worker.backend.close()
+
+        threads = [threading.Thread(target=drain, args=(f"w{i}",)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(claimed), 60)
+        self.assertEqual(len(set(claimed)), 60)
+
+    def test_scheduler_is_fair_across_recipients(self):
+        for _ in range(3):
+            self.claude.send_task(AgentName.GEMINI, "t", {})
+        deepseek_id = self.claude.send_task(AgentName.DEEPSEEK, "t", {})
+        scheduler = TaskScheduler(self.gemini.backend, [AgentName.GEMINI.value, AgentName.DEEPSEEK.value])
+        recipients = [task["to"] for task in scheduler.claim(2)]
+        self.assertEqual(sorted(recipients), sorted([AgentName.GEMINI.value, AgentName.DEEPSEEK.value]))
+        self.assertTrue(scheduler.complete({"to": AgentName.DEEPSEEK.value, "id": deepseek_id}))
+
+
+class TestFairSelect(unittest.TestCase):
+    """Test cases for the heap-based selection order"""
+
+    def test_priority_beats_fairness(self):
+        candidates = {"a": [(10, "t1", "a1"), (10, "t2", "a2")], "b": [(50, "t0", "b1")]}
+        self.assertEqual(fair_select(candidates, 3), [("a", "a1"), ("a", "a2"), ("b", "b1")])
+
+    def test_equal_priority_alternates(self):
+        candidates = {"a": [(50, "t1", "a1"), (50, "t2", "a2")], "b": [(50, "t3", "b1"), (50, "t4", "b2")]}
+        self.assertEqual(fair_select(candidates, 4), [("a", "a1"), ("b", "b1"), ("a", "a2"), ("b", "b2")])
+
+
+class TestFileBackend(MessageQueueBackendTests, unittest.TestCase):
+    BACKEND = "file"
+
+    def test_crash_after_claim_rename_is_recovered(self):
+        task_id = self.claude.send_task(AgentName.GEMINI, "t", {})
+        with mock.patch.object(self.gemini.backend, '_write_json', side_effect=RuntimeError("killed")):
+            with self.assertRaises(RuntimeError):
+                self.gemini.claim(1)
+        self.assertEqual(self.gemini.get_status()["pending_tasks"], 0)
+        self.assertEqual(self.gemini.claim(1), [])  # Claim is still fresh
+
+        self.gemini.backend.claim_stale_seconds = 0
+        self.assertEqual([task["id"] for task in self.gemini.claim(1)], [task_id])
+        self.assertEqual(list(self.gemini.inbox_path.glob(".*.claim")), [])
+
+    def test_claim_of_finished_transition_is_dropped(self):
+        task_id = self.claude.send_task(AgentName.GEMINI, "t", {})
+        self.assertTrue(self.gemini.mark_task_processing(task_id))
+        # Crash after the PROCESSING copy was written, before the claim was removed
+        (self.gemini.inbox_path / f".{task_id}_PENDING.1.1.0.claim").write_text("{}")
+
+        self.gemini.backend.claim_stale_seconds = 0
+        self.gemini.requeue_expired()
+        status = self.gemini.get_status()
+        self.assertEqual((status["pending_tasks"], status["processing_tasks"]), (0, 1))
+        self.assertEqual(list(self.gemini.inbox_path.glob(".*.claim")), [])
+
+    def test_lease_lost_before_take_is_handed_back(self):
+        other = MessageQueue(AgentName.GEMINI, base_path=Path(self.tmp.name), backend=self.BACKEND,
+                             worker_id="other")
+        task_id = self.claude.send_task(AgentName.GEMINI, "t", {})
+        self.gemini.claim(1)
+        backend, take = self.gemini.backend, self.gemini.backend._take
+
+        def reclaimed_then_take(path):
+            # The lease expired and another worker took the task just before the rename
+            message = backend._read_json(path)
+            backend._write_json(path, dict(message, lease_owner="other"))
+            return take(path)
+
+        with mock.patch.object(backend, '_take', side_effect=reclaimed_then_take):
+            self.assertFalse(self.gemini.mark_task_complete(task_id))
+        self.assertEqual(list(self.gemini.inbox_path.glob(".*.claim")), [])
+        self.assertTrue(other.mark_task_complete(task_id))
+
+
+class TestSQLiteBackend(MessageQueueBackendTests, unittest.TestCase):
+    BACKEND = "sqlite"
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Unit tests for MinHash/LSH near-duplicate detection.
+
+Tests:
+- Signatures are identical with and without NumPy and estimate Jaccard
+- The LSH index finds near duplicates, prefers the earliest on ties, and
+  evicts the oldest entries when bounded
+- defragment_sources drops near duplicates on top of exact duplicates
+"""
+
+import unittest
+import contextlib
+import io
+import json
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "utilities"))
+
+import near_duplicates
+from near_duplicates import MinHasher, NearDuplicateIndex, lsh_params, normalize_text, similarity
+from defragment_sources import DefragmentationEngine
+
+STATUS = "Heartbeat from gemini_cli: all systems nominal, queue depth {n}, uptime {u} seconds since last restart"
+
+
+def jaccard(a: str, b: str, k: int = 5) -> float:
+    a, b = normalize_text(a).encode(), normalize_text(b).encode()
+    sa = {a[i:i + k] for i in range(len(a) - k + 1)}
+    sb = {b[i:i + k] for i in range(len(b) - k + 1)}
+    return len(sa & sb) / len(sa | sb)
+
+
+class TestMinHash(unittest.TestCase):
+    """Test cases for MinHasher and lsh_params"""
+
+    @unittest.skipUnless(near_duplicates.NUMPY_SUPPORT, "NumPy is required for the vectorized path")
+    def test_signatures_match_without_numpy(self):
+        texts = [STATUS.format(n=12, u=3600), "", "ab", "Unicode ✓ text — with dashes", "x" * 10000]
+        expected = [MinHasher().signature(text) for text in texts]
+        with mock.patch.object(near_duplicates, 'NUMPY_SUPPORT', False):
+            self.assertEqual([MinHasher().signature(text) for text in texts], expected)
+            self.assertEqual(similarity(expected[0], expected[0]), 1.0)
+
+    def test_similarity_estimates_jaccard(self):
+        hasher = MinHasher(num_perm=256)
+        a, b = STATUS.format(n=12, u=3600), STATUS.format(n=13, u=3660)
+        self.assertAlmostEqual(similarity(hasher.signature(a), hasher.signature(b)), jaccard(a, b), delta=0.1)
+        self.assertLess(similarity(hasher.signature(a), hasher.signature("Unrelated note on mesh export")), 0.1)
+        self.assertEqual(hasher.signature("Hello,  World!"), hasher.signature("hello world"))
+
+    def test_lsh_params(self):
+        for threshold in (0.5, 0.8, 0.9):
+            bands, rows = lsh_params(threshold, 128)
+            self.assertLessEqual(bands * rows, 128)
+            self.assertAlmostEqual((1 / bands) ** (1 / rows), threshold, delta=0.1)
+
+
+class TestNearDuplicateIndex(unittest.TestCase):
+    """Test cases for NearDuplicateIndex"""
+
+    def test_check_flags_near_duplicates(self):
+        index = NearDuplicateIndex(threshold=0.7)
+        self.assertIsNone(index.check("m1", STATUS.format(n=12, u=3600)))
+        self.assertIsNone(index.check("m2", "A different message about Unity material import settings"))
+        match = index.check("m3", STATUS.format(n=13, u=3660))
+        self.assertEqual(match[0], "m1")
+        self.assertGreaterEqual(match[1], 0.7)
+        self.assertEqual(len(index), 2)
+        report = index.report()
+        self.assertEqual((report['checked'], report['near_duplicates']), (3, 1))
+        self.assertAlmostEqual(report['extra_reduction_percent'], 100 / 3)
+
+    def test_ties_prefer_earliest(self):
+        index = NearDuplicateIndex(threshold=0.9)
+        signature = index.hasher.signature(STATUS)
+        for key in ("c", "a", "b"):
+            index.add(key, signature)
+        self.assertEqual(index.query(signature), ("c", 1.0))
+
+    def test_window_evicts_oldest(self):
+        index = NearDuplicateIndex(threshold=0.9, max_entries=2)
+        index.check("old", STATUS)
+        index.check("x", "first unrelated message about photo capture")
+        index.check("y", "second unrelated message about token budgets")
+        self.assertEqual(list(index.entries), ["x", "y"])
+        self.assertIsNone(index.check("new", STATUS))
+        self.assertEqual(index.stats['evicted'], 2)
+        self.assertTrue(all(keys for bucket in index.buckets for keys in bucket.values()))
+
+
+class TestDefragmentSourcesNearDuplicates(unittest.TestCase):
+    """Test cases for near-duplicate removal in defragment_sources"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        source = Path(self.tmp.name) / "source"
+        source.mkdir()
+        messages = [STATUS.format(n=n, u=3600 + n) for n in range(10, 20)]
+        messages += [STATUS.format(n=10, u=3610)] * 2  # Exact copies of the first
+        messages += [f"Design note {i}: " + " ".join(f"topic{i}_{j}" for j in range(12)) for i in range(5)]
+        with open(source / "log.jsonl", 'w', encoding='utf-8') as f:
+            for i, text in enumerate(messages):
+                f.write(json.dumps({"message": text, "thread_id": "t", "timestamp": f"2025-11-01T00:{i:02d}:00"}) + "\n")
+        self.sources = {"shearwater": source}
+
+    def load(self, **kwargs):
+        engine = DefragmentationEngine(self.sources, **kwargs)
+        with contextlib.redirect_stdout(io.StringIO()):
+            engine.load_messages(workers=1)
+        return engine
+
+    def test_near_duplicates_removed(self):
+        exact = self.load()
+        self.assertEqual(exact.stats['exact_duplicates_removed'], 2)
+        self.assertEqual(len(exact.messages_by_context["t"]), 15)
+
+        near = self.load(near_threshold=0.6)
+        self.assertEqual(near.stats['exact_duplicates_removed'], 2)
+        self.assertEqual(near.stats['near_duplicates_removed'], 9)
+        self.assertEqual([m['content'] for m in near.messages_by_context["t"]][:2],
+                         [STATUS.format(n=10, u=3610), "Design note 0: " + " ".join(f"topic0_{j}" for j in range(12))])
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            near.consolidate()
+            near.report_statistics()
+        self.assertIn("Near duplicates removed:     9", output.getvalue())
+        self.assertIn("Unique messages:             6", output.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
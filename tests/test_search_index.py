@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the persistence full-text search index.
+
+Tests:
+- catch_up indexes appended lines only and leaves partial lines for later
+- A truncated or rewritten log is reindexed
+- BM25 ranking, newest-first order, phrases, prefixes and FTS5 syntax in queries
+- Speaker, tier, chain and time range filters, alone and with search terms
+- ConversationBrowser searches through the index, or scans without FTS5
+"""
+
+import unittest
+import json
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "persistence"))
+
+import persistence_cli
+from storage.search_index import FTS5_SUPPORT, MessageSearchIndex, message_text, parse_query
+
+
+def event(n, text, speaker="claude_code", tier="E", chain="reconstruction", day=1):
+    return {"Id": str(n), "Timestamp": f"2025-11-{day:02d}T10:00:{n % 60:02d}", "SpeakerName": speaker,
+            "Message": json.dumps({"message": text}), "chain_type": chain, "ace_tier": tier,
+            "Metadata": {}}
+
+
+LOG = [
+    event(0, "Gaussian splatting beats NeRF on mesh quality"),
+    event(1, "mesh mesh mesh: the mesh decimation pass", speaker="gemini_cli"),
+    event(2, "Should we cache the token budget?", tier="C", chain="token_optimization", day=2),
+    event(3, "Token costs dropped after caching; the mesh export is next", day=3),
+    event(4, "C++ exporter: use std::vector<float> for vertices (not arrays)", speaker="gemini_cli", day=3),
+]
+
+
+@unittest.skipUnless(FTS5_SUPPORT, "SQLite built without FTS5")
+class TestMessageSearchIndex(unittest.TestCase):
+    """Test cases for MessageSearchIndex"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.log = Path(self.tmp.name) / "current_session.jsonl"
+        self.index = MessageSearchIndex(Path(self.tmp.name) / "search_index.db")
+        self.addCleanup(self.index.close)
+
+    def append(self, events, partial=""):
+        with open(self.log, 'a', encoding='utf-8') as f:
+            f.write("".join(json.dumps(e) + "\n" for e in events) + partial)
+
+    def ids(self, query, **kwargs):
+        return [int(hit['message']['Id']) for hit in self.index.search(query, **kwargs)]
+
+    def test_catch_up(self):
+        line = json.dumps(LOG[3]) + "\n"
+        self.append(LOG[:3], partial=line[:15])
+        self.assertEqual(self.index.catch_up(self.log), 3)
+        self.assertEqual(self.index.catch_up(self.log), 0)
+        with open(self.log, 'a', encoding='utf-8') as f:
+            f.write(line[15:] + "not json\n\n")
+        self.append(LOG[4:])
+        self.assertEqual(self.index.catch_up(self.log), 2)
+        self.assertEqual(self.index.message_count, 5)
+        self.assertEqual(self.ids("token"), [2, 3])
+
+    def test_rewritten_log_is_reindexed(self):
+        self.append(LOG)
+        self.index.catch_up(self.log)
+        self.log.write_text(json.dumps(LOG[0]) + "\n" + json.dumps(event(9, "replacement text about token")) + "\n"
+                            + json.dumps(LOG[2]) + "\n" + json.dumps(LOG[3]) + "\n" + json.dumps(LOG[4]) + "\n",
+                            encoding='utf-8')
+        self.assertEqual(self.index.catch_up(self.log), 5)
+        self.assertEqual(self.ids("token", order='newest'), [3, 2, 9])
+        self.log.write_text(json.dumps(LOG[2]) + "\n", encoding='utf-8')  # Truncated
+        self.assertEqual(self.index.catch_up(self.log), 1)
+        self.assertEqual(self.ids("mesh"), [])
+
+    def test_ranking_and_query_syntax(self):
+        self.append(LOG)
+        self.index.catch_up(self.log)
+        self.assertEqual(self.ids("mesh"), [1, 0, 3])
+        self.assertEqual(self.ids("mesh", order='newest'), [3, 1, 0])
+        self.assertEqual(self.ids("mesh order:newest", limit=2), [3, 1])
+        self.assertEqual(self.ids('"mesh quality"'), [0])
+        self.assertEqual(sorted(self.ids("cach*")), [2, 3])
+        self.assertEqual(self.ids("std::vector<float> (not"), [4])
+        self.assertEqual(self.ids("MESH NeRF"), [0])
+        self.assertEqual(self.ids("splat"), [])  # Whole words unless a prefix is asked for
+        self.assertEqual(self.ids("ñerf"), [0])
+        hit = self.index.search("decimation")[0]
+        self.assertGreater(hit['score'], 0)
+        self.assertEqual(message_text(hit['message']), "mesh mesh mesh: the mesh decimation pass")
+
+    def test_filters(self):
+        self.append(LOG)
+        self.index.catch_up(self.log)
+        self.assertEqual(self.ids("mesh speaker:GEMINI_CLI"), [1])
+        self.assertEqual(self.ids("mesh", speaker="claude_code", order='newest'), [3, 0])
+        self.assertEqual(self.ids("tier:c"), [2])
+        self.assertEqual(self.ids("chain:reconstruction since:2025-11-02"), [4, 3])
+        self.assertEqual(self.ids("", since="2025-11-01T10:00:01", until="2025-11-03"), [2, 1])
+        self.assertEqual(self.ids('speaker:"gemini_cli" mesh OR token'), [])  # OR is just a word
+        with self.assertRaises(ValueError):
+            self.index.search("mesh since:yesterday")
+        with self.assertRaises(ValueError):
+            self.index.search("mesh", order='oldest')
+
+    def test_parse_query(self):
+        self.assertEqual(parse_query('Mesh "gaussian splat" exp* tier:A order:newest http://x "'),
+                         ('"Mesh" "gaussian splat" "exp" * "http://x"', {'tier': 'A', 'order': 'newest'}))
+        self.assertEqual(parse_query('say "hi" -- ***'), ('"say" "hi"', {}))
+
+
+class TestConversationBrowserSearch(unittest.TestCase):
+    """Test cases for ConversationBrowser.search"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.browser = persistence_cli.ConversationBrowser()
+        self.browser.log_file = Path(self.tmp.name) / "current_session.jsonl"
+        self.browser.index_file = Path(self.tmp.name) / "search_index.db"
+        with open(self.browser.log_file, 'w', encoding='utf-8') as f:
+            f.write("".join(json.dumps(e) + "\n" for e in LOG))
+
+    def tearDown(self):
+        if self.browser.index is not None:
+            self.browser.index.close()
+
+    @unittest.skipUnless(FTS5_SUPPORT, "SQLite built without FTS5")
+    def test_indexed_search(self):
+        results = self.browser.search("mesh")
+        self.assertEqual([r['preview'][:12] for r in results], ["mesh mesh me", "Gaussian spl", "Token costs "])
+        self.assertEqual(results[0]['sender'], "gemini_cli")
+        with open(self.browser.log_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(event(5, "late mesh note", day=4)) + "\n")
+        self.assertEqual(self.browser.search("mesh order:newest", limit=1)[0]['preview'], "late mesh note")
+
+    def test_scan_without_fts5(self):
+        with mock.patch.object(persistence_cli, 'FTS5_SUPPORT', False):
+            results = self.browser.search("mesh", limit=2)
+        self.assertEqual([r['timestamp'] for r in results], [LOG[0]['Timestamp'], LOG[1]['Timestamp']])
+        self.assertIsNone(self.browser.index)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the in-process service supervisor.
+
+Tests:
+- Component heartbeats move a started service from starting to running
+- Crashed services are restarted with backoff
+- Stop terminates the child and disables restarts
+- SupervisorClient commands a supervisor through its control socket
+"""
+
+import unittest
+import sys
+import time
+from pathlib import Path
+
+# Add src directory to path to allow for clean imports
+SRC_DIR = Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(SRC_DIR))
+
+from core.service_supervisor import ServiceSupervisor, ServiceSpec, SupervisorClient, SupervisorUnavailable
+
+BEATING_CHILD = (
+    f"import sys, time; sys.path.insert(0, {str(SRC_DIR)!r}); "
+    "from core.heartbeat import HeartbeatStats, start_component_heartbeat; "
+    "start_component_heartbeat('component', HeartbeatStats(), interval=0.1); time.sleep(30)"
+)
+CRASHING_CHILD = "import sys; sys.exit(3)"
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class TestServiceSupervisor(unittest.TestCase):
+    """Test cases for ServiceSupervisor"""
+
+    def make_supervisor(self, *specs):
+        supervisor = ServiceSupervisor(specs, heartbeat_port=0, control_address=("127.0.0.1", 0),
+                                       backoff_base=0.1, stop_timeout=2)
+        supervisor.open()
+        self.addCleanup(supervisor.close)
+        return supervisor
+
+    def test_heartbeat_marks_service_running(self):
+        supervisor = self.make_supervisor(
+            ServiceSpec(name="worker", command=[sys.executable, "-c", BEATING_CHILD])
+        )
+        supervisor.start("worker")
+        self.assertIn(supervisor.status("worker")["worker"]["status"], ("starting", "running"))
+        self.assertTrue(wait_for(lambda: supervisor.status("worker")["worker"]["status"] == "running"))
+        self.assertIsNotNone(supervisor.status("worker")["worker"]["last_heartbeat_age"])
+
+    def test_crashed_service_is_restarted(self):
+        supervisor = self.make_supervisor(
+            ServiceSpec(name="crasher", command=[sys.executable, "-c", CRASHING_CHILD], heartbeat=False)
+        )
+        supervisor.start("crasher")
+        self.assertTrue(wait_for(lambda: supervisor.status("crasher")["crasher"]["restarts"] >= 2))
+        info = supervisor.status("crasher")["crasher"]
+        self.assertEqual(info["last_exit_code"], 3)
+
+    def test_stop_terminates_and_disables_restart(self):
+        supervisor = self.make_supervisor(
+            ServiceSpec(name="worker", command=[sys.executable, "-c", BEATING_CHILD])
+        )
+        supervisor.start("worker")
+        self.assertTrue(wait_for(lambda: supervisor.status("worker")["worker"]["pid"] is not None))
+        supervisor.stop("worker")
+        time.sleep(0.5)
+        info = supervisor.status("worker")["worker"]
+        self.assertEqual(info["status"], "stopped")
+        self.assertIsNone(info["pid"])
+
+    def test_unknown_service_raises(self):
+        supervisor = self.make_supervisor()
+        with self.assertRaises(KeyError):
+            supervisor.start("missing")
+
+    def test_client_commands_supervisor(self):
+        supervisor = self.make_supervisor(
+            ServiceSpec(name="worker", command=[sys.executable, "-c", BEATING_CHILD])
+        )
+        client = SupervisorClient(supervisor.control_address)
+        self.assertTrue(client.is_running())
+        self.assertEqual(client.status(), {"worker": supervisor.status("worker")["worker"]})
+        self.assertTrue(client.start("worker")["worker"].startswith("started"))
+        self.assertTrue(wait_for(lambda: client.status("worker")["worker"]["status"] == "running"))
+        self.assertIn("- worker: Running (PID:", client.format_status())
+        self.assertTrue(client.stop()["worker"].startswith("stopped"))
+        self.assertEqual(supervisor.status("worker")["worker"]["status"], "stopped")
+        with self.assertRaises(KeyError):
+            client.start("missing")
+
+    def test_second_supervisor_cannot_open(self):
+        supervisor = self.make_supervisor()
+        second = ServiceSupervisor([], heartbeat_port=0, control_address=supervisor.control_address)
+        with self.assertRaises(OSError):
+            second.open()
+        self.assertIsNone(second.heartbeat_socket)
+
+    def test_client_without_supervisor(self):
+        supervisor = self.make_supervisor()
+        address = supervisor.control_address
+        supervisor.close()
+        client = SupervisorClient(address, connect_timeout=0.5)
+        self.assertFalse(client.is_running())
+        with self.assertRaises(SupervisorUnavailable):
+            client.status()
+
+
+if __name__ == "__main__":
+    unittest.main()
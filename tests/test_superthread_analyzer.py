@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Unit tests for incremental topic modeling in SuperthreadAnalyzer.
+
+Tests:
+- The first incremental run fits a hashed TF-IDF model that separates topics
+- Later runs fit new and changed threads only and keep other assignments
+- Drifted topics have their threads reassigned
+- refit and a changed topic count rebuild the saved model
+- Text cleaning removes timestamps, UUIDs and stopwords in one pass, gives
+  the same texts in a process pool, and is cached per thread id and content
+"""
+
+import unittest
+import json
+import logging
+import random
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "utilities"))
+
+import superthread_analyzer
+from superthread_analyzer import SuperthreadAnalyzer, clean_text
+
+logging.getLogger('SuperthreadAnalyzer').setLevel(logging.ERROR)
+
+TOPICS = [
+    "mesh broker socket publisher subscriber heartbeat router dealer queue envelope",
+    "gradient tensor epoch optimizer checkpoint batchnorm convolution dropout learning weights",
+    "grant funding investor pitch proposal budget outreach email sponsor deadline",
+    "frontend react component render stylesheet layout button widget browser viewport",
+]
+
+
+def synthetic_threads(count, start=0, seed=5):
+    rng = random.Random(seed + start)
+    threads = []
+    for i in range(start, start + count):
+        words = TOPICS[i % len(TOPICS)].split()
+        messages = [{"Message": " ".join(rng.choices(words, k=12))} for _ in range(3)]
+        threads.append({"thread_id": f"thread_{i}", "messages": messages})
+    return threads
+
+
+class TestIncrementalTopics(unittest.TestCase):
+    """Test cases for run(incremental=True)"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.output = Path(self.tmp.name) / "superthreads.json"
+        stopwords = mock.Mock(**{'words.return_value': ['the', 'and']})  # The NLTK corpus may not be downloaded
+        patcher = mock.patch.object(superthread_analyzer, 'stopwords', stopwords)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_analyzer(self, threads, n_superthreads=4, **kwargs):
+        analyzer = SuperthreadAnalyzer("unused.parquet", str(self.output), n_superthreads=n_superthreads)
+
+        def load():
+            analyzer.threads = threads
+            return True
+
+        with mock.patch.object(analyzer, '_load_threads', load):
+            analyzer.run(incremental=True, **kwargs)
+        return analyzer
+
+    def topics(self, analyzer):
+        return {thread_id: topic for thread_id, (_, topic) in analyzer.state.assignments.items()}
+
+    def test_first_run_separates_topics(self):
+        threads = synthetic_threads(80)
+        analyzer = self.run_analyzer(threads)
+        self.assertEqual(analyzer.stats['new'], 80)
+        topics = self.topics(analyzer)
+        for k in range(len(TOPICS)):
+            self.assertEqual(len({topics[f"thread_{i}"] for i in range(k, 80, len(TOPICS))}), 1)
+        self.assertEqual(len(set(topics.values())), len(TOPICS))
+
+        with open(self.output, encoding='utf-8') as f:
+            superthreads = json.load(f)
+        self.assertEqual(sorted(len(v) for v in superthreads.values()), [20] * 4)
+        name = next(name for name, members in superthreads.items() if members[0]['thread_id'] == "thread_0")
+        self.assertTrue(set(name.split(": ")[1].split(", ")) <= set(TOPICS[0].split()))
+
+    def test_update_keeps_assignments(self):
+        threads = synthetic_threads(80)
+        first = self.topics(self.run_analyzer(threads))
+
+        updated = threads[1:] + synthetic_threads(8, start=80)
+        updated[0] = dict(updated[0], messages=[{"Message": TOPICS[0]}])  # thread_1 moves to topic 0
+        with mock.patch.object(superthread_analyzer, 'DRIFT_THRESHOLD', 1.0):
+            analyzer = self.run_analyzer(updated)
+        self.assertEqual(analyzer.stats, {'threads': 87, 'new': 8, 'changed': 1, 'removed': 1,
+                                          'reassigned': 0, 'drifted_topics': [],
+                                          'text_cache_hits': 78, 'texts_cleaned': 9})
+        topics = self.topics(analyzer)
+        self.assertEqual({t: topics[t] for t in first if t in topics and t != "thread_1"},
+                         {t: first[t] for t in first if t not in ("thread_0", "thread_1")})
+        self.assertEqual(topics["thread_1"], first["thread_0"])
+        self.assertEqual(topics["thread_84"], first["thread_0"])
+        self.assertEqual(analyzer.state.n_docs, 88)
+
+        unchanged = self.run_analyzer(updated)
+        self.assertEqual((unchanged.stats['new'], unchanged.stats['changed']), (0, 0))
+        self.assertEqual(self.topics(unchanged), topics)
+
+    def test_drift_reassigns(self):
+        threads = synthetic_threads(40)
+        self.run_analyzer(threads)
+        with mock.patch.object(superthread_analyzer, 'DRIFT_THRESHOLD', -1.0):
+            analyzer = self.run_analyzer(threads + synthetic_threads(4, start=40))
+        self.assertEqual(analyzer.stats['drifted_topics'], [0, 1, 2, 3])
+        self.assertEqual(analyzer.stats['reassigned'], 40)
+        self.assertEqual(analyzer.state.anchors.tolist(), analyzer.state.model.components_.tolist())
+
+    def test_refit(self):
+        threads = synthetic_threads(40)
+        self.run_analyzer(threads)
+        analyzer = self.run_analyzer(threads, refit=True)
+        self.assertEqual((analyzer.stats['new'], analyzer.state.n_docs), (40, 40))
+        analyzer = self.run_analyzer(threads, n_superthreads=3)
+        self.assertEqual(analyzer.stats['new'], 40)
+        self.assertEqual(analyzer.state.model.components_.shape[0], 3)
+
+
+class TestPreprocessing(unittest.TestCase):
+    """Test cases for clean_text and the text cache"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.output = Path(self.tmp.name) / "superthreads.json"
+
+    def test_clean_text(self):
+        text = ('{"Message": "Rebuilt the Mesh", "timestamp": "2025-10-15T22:07:49.2368354Z"} '
+                'id=1F2E3D4C-0000-4abc-8def-0123456789ab at 12:00, ok? Consolidated_Manager v2-ready')
+        self.assertEqual(clean_text(text), "rebuilt the mesh consolidatedmanager vready")
+        self.assertEqual(clean_text("ab2025-10-15T22:07:49.5Zcd99abcdef12-3456-7890-abcd-ef0123456789ef"), "abcdef")
+
+    def analyzer(self, threads, workers=1):
+        analyzer = SuperthreadAnalyzer("unused.parquet", str(self.output), n_superthreads=4, workers=workers)
+        analyzer.threads = threads
+        return analyzer
+
+    def test_cache_and_pool(self):
+        threads = synthetic_threads(150)
+        expected = [clean_text(" ".join(m["Message"] for m in t["messages"])) for t in threads]
+        pooled = self.analyzer(threads, workers=2)
+        self.assertEqual(pooled._preprocess_text(), expected)
+        self.assertEqual(pooled.stats['texts_cleaned'], 150)
+
+        threads[3] = dict(threads[3], messages=[{"Message": "Broker rewired"}])
+        expected[3] = "broker rewired"
+        rerun = self.analyzer(threads[:100])
+        with mock.patch.object(superthread_analyzer, 'clean_text', wraps=clean_text) as cleaner:
+            self.assertEqual(rerun._preprocess_text(), expected[:100])
+        self.assertEqual(cleaner.call_count, 1)
+        self.assertEqual((rerun.stats['text_cache_hits'], rerun.stats['texts_cleaned']), (99, 1))
+        self.assertEqual(len(rerun._load_text_cache()), 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
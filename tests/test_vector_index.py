@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the semantic vector index over the session log and blocks.
+
+Tests:
+- catch_up embeds only messages the embedding cache has not seen, and
+  leaves partial lines and blocks with unindexed messages for later
+- search_similar ranks by cosine similarity, with kind, speaker and time filters
+- IVF search finds the flat results when every list is probed, and keeps
+  new rows searchable without retraining
+- A torn append is truncated by the next writer, never by a reader; a
+  rewritten log is reindexed
+- A reader sees rows another index instance appended once it refreshes
+- ConversationBrowser.search_similar parses filters out of the query
+"""
+
+import unittest
+import hashlib
+import json
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "bots"))
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "persistence"))
+
+import persistence_cli
+from embedding_cache import EmbeddingCache
+from vector_index import VECTORS_FILE, VectorIndex, vector_index_dir
+
+
+class BagOfWordsEncoder:
+    """Sum of a fixed random vector per word, so texts sharing words are similar; records its calls"""
+
+    def __init__(self, dim=32):
+        self.dim = dim
+        self.calls = []
+
+    def word(self, word):
+        seed = int(hashlib.md5(word.lower().encode()).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).normal(size=self.dim)
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.array([sum(self.word(w) for w in text.split()) for text in texts])
+
+
+def event(n, text, speaker="claude_code", day=1):
+    return {"Id": str(n), "Timestamp": f"2025-11-{day:02d}T10:00:{n % 60:02d}", "SpeakerName": speaker,
+            "Message": json.dumps({"message": text}), "chain_type": "reconstruction", "ace_tier": "E"}
+
+
+LOG = [
+    event(0, "gaussian splatting mesh export pipeline"),
+    event(1, "token budget cache pricing", speaker="gemini_cli"),
+    event(2, "mesh decimation before export", day=2),
+    event(3, "grant proposal deadline outreach", speaker="gemini_cli", day=3),
+    event(4, "token cache hit rate pricing", day=3),
+]
+
+
+class TestVectorIndex(unittest.TestCase):
+    """Test cases for VectorIndex"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+        self.log = self.root / "current_session.jsonl"
+        self.blocks = self.root / "blocks.jsonl"
+        self.encoder = BagOfWordsEncoder()
+
+    def index(self, **kwargs):
+        return VectorIndex(self.root / "index", self.root / "cache", model_name="bow", encode=self.encoder, **kwargs)
+
+    def append(self, path, items, partial=""):
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write("".join(json.dumps(item) + "\n" for item in items) + partial)
+
+    def texts(self, hits):
+        return [json.loads(hit['message']['Message'])['message'] for hit in hits]
+
+    def test_incremental_catch_up(self):
+        cache = EmbeddingCache(self.root / "cache", "bow")
+        cache.embed(["gaussian splatting mesh export pipeline"], self.encoder)  # Embedded earlier by a bot
+        line = json.dumps(LOG[3]) + "\n"
+        self.append(self.log, LOG[:3], partial=line[:20])
+        index = self.index()
+        self.assertEqual(index.catch_up(self.log, self.blocks), 3)
+        self.assertEqual(self.encoder.calls[1:], [["token budget cache pricing", "mesh decimation before export"]])
+
+        with open(self.log, 'a', encoding='utf-8') as f:
+            f.write(line[20:] + "not json\n")
+        self.append(self.log, LOG[4:])
+        self.append(self.blocks, [{"block_id": "b0", "message_indices": [0, 2], "timestamp_start": "2025-11-01T10:00:00Z",
+                                   "primary_tier": "E", "primary_chain": "reconstruction",
+                                   "stats": {"speaker_messages": {"claude_code": 2}}},
+                                  {"block_id": "b1", "message_indices": [4, 5]}])
+        index = self.index()
+        self.assertEqual(index.catch_up(self.log, self.blocks), 3)  # Two messages and block b0
+        self.assertEqual(len(self.encoder.calls), 3)
+        self.assertEqual(index.catch_up(self.log, self.blocks), 0)
+
+        block = index.search_similar("mesh export", k=1, filters={'kind': 'block'})[0]
+        self.assertEqual(block['block']['block_id'], "b0")
+        expected = self.encoder(["gaussian splatting mesh export pipeline", "mesh decimation before export"])
+        expected = (expected / np.linalg.norm(expected, axis=1, keepdims=True)).sum(axis=0)
+        np.testing.assert_allclose(index.vectors[-1], expected / np.linalg.norm(expected), atol=2e-3)
+
+        self.append(self.log, [event(5, "cache warmup")])
+        self.assertEqual(index.catch_up(self.log, self.blocks), 2)  # b1 can be built now
+        self.assertEqual(len(index), 8)
+
+    def test_search_and_filters(self):
+        self.append(self.log, LOG)
+        index = self.index()
+        index.catch_up(self.log, self.blocks)
+        hits = index.search_similar("token cache pricing", k=2)
+        self.assertEqual(self.texts(hits), ["token budget cache pricing", "token cache hit rate pricing"])
+        self.assertGreater(hits[0]['score'], 0.8)
+        self.assertEqual(self.texts(index.search_similar("token cache pricing", k=1, filters={'speaker': 'CLAUDE_CODE'})),
+                         ["token cache hit rate pricing"])
+        self.assertEqual(self.texts(index.search_similar("mesh", k=5, filters={'since': "2025-11-02",
+                                                                               'until': "2025-11-03"})),
+                         ["mesh decimation before export"])
+        self.assertEqual(index.search_similar("mesh", filters={'kind': 'block'}), [])
+        with self.assertRaises(ValueError):
+            index.search_similar("mesh", filters={'sender': 'x'})
+        with self.assertRaises(ValueError):
+            index.search_similar("mesh", filters={'since': 'yesterday'})
+
+    def test_ivf_matches_flat(self):
+        rng = np.random.default_rng(3)
+        centers = rng.normal(size=(20, 32))
+        vectors = centers[rng.integers(20, size=3000)] + rng.normal(scale=0.3, size=(3000, 32))
+        flat, ivf = self.index(backend='flat'), VectorIndex(self.root / "ivf", self.root / "cache", model_name="bow",
+                                                           encode=self.encoder, backend='ivf', nprobe=4)
+        for index in (flat, ivf):
+            index.index_dir.mkdir(parents=True, exist_ok=True)
+            index._append(vectors, [(0, 0, 0, -1, -1, -1)] * len(vectors))
+        ivf.train_ivf(lists=16)
+        self.assertEqual(ivf.state['ivf'], {'lists': 16, 'trained': 3000})
+
+        queries = centers[:5] + rng.normal(scale=0.3, size=(5, 32))
+        with mock.patch.object(flat, '_read_hits', lambda rows, scores: rows.tolist()), \
+                mock.patch.object(ivf, '_read_hits', lambda rows, scores: rows.tolist()):
+            for query in queries:
+                self.assertEqual(ivf.search_vector(query, k=10, nprobe=16), flat.search_vector(query, k=10))
+                self.assertGreaterEqual(len(set(ivf.search_vector(query, k=10)) & set(flat.search_vector(query, k=10))), 9)
+            ivf._append(queries[:1] * 10, [(0, 0, 0, -1, -1, -1)])
+            ivf._map()
+            self.assertEqual(ivf.search_vector(queries[0], k=1), [3000])
+
+    def test_torn_append_and_rewritten_log(self):
+        self.append(self.log, LOG[:3])
+        index = self.index()
+        index.catch_up(self.log, self.blocks)
+        with open(index.index_dir / VECTORS_FILE, 'ab') as f:
+            f.write(b'\0' * 100)  # Rows whose state was never written
+        index = self.index()
+        self.assertEqual(len(index), 3)
+        self.assertEqual((index.index_dir / VECTORS_FILE).stat().st_size, 3 * 32 * 2 + 100)  # Maybe an append in progress
+        self.assertEqual(index.catch_up(self.log, self.blocks), 0)
+        self.assertEqual((index.index_dir / VECTORS_FILE).stat().st_size, 3 * 32 * 2)
+
+        self.log.write_text("".join(json.dumps(e) + "\n" for e in LOG[3:]), encoding='utf-8')
+        self.assertEqual(index.catch_up(self.log, self.blocks), 2)
+        self.assertEqual(len(index), 2)
+        self.assertNotIn("mesh decimation before export", self.texts(index.search_similar("mesh export", k=5)))
+
+    def test_reader_refresh(self):
+        self.assertEqual(vector_index_dir(self.log), self.root / "current_session.vectors")
+        reader = self.index()
+        self.assertFalse(reader.exists())
+        self.append(self.log, LOG[:2])
+        writer = self.index()
+        writer.catch_up(self.log, self.blocks)
+        self.assertTrue(reader.refresh())
+        self.assertTrue(reader.exists())
+        self.assertEqual(len(reader), 2)
+        self.assertFalse(reader.refresh())
+
+        self.append(self.log, LOG[2:])
+        writer.catch_up(self.log, self.blocks)
+        reader.refresh()
+        self.assertEqual(self.texts(reader.search_similar("mesh decimation", k=1)), ["mesh decimation before export"])
+
+
+class TestConversationBrowserSimilar(unittest.TestCase):
+    """Test cases for ConversationBrowser.search_similar"""
+
+    def test_search_similar(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        root = Path(tmp.name)
+        browser = persistence_cli.ConversationBrowser()
+        browser.log_file, browser.blocks_file = root / "current_session.jsonl", root / "blocks.jsonl"
+        browser.log_file.write_text("".join(json.dumps(e) + "\n" for e in LOG), encoding='utf-8')
+        browser.vector_index = VectorIndex(root / "index", root / "cache", model_name="bow", encode=BagOfWordsEncoder())
+        results = browser.search_similar("cache pricing speaker:gemini_cli", limit=3)
+        self.assertEqual([(r['sender'], r['preview']) for r in results], [("gemini_cli", "token budget cache pricing"),
+                                                                          ("gemini_cli", "grant proposal deadline outreach")])
+        with mock.patch.object(persistence_cli, 'VECTOR_SEARCH_SUPPORT', False):
+            with self.assertRaises(RuntimeError):
+                browser.search_similar("cache")
+
+
+if __name__ == "__main__":
+    unittest.main()
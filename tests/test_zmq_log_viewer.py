@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the indexed ZeroMQ log viewer.
+
+Tests:
+- Filters read the recorded schema (SpeakerName, Metadata.ace_tier/chain_type)
+- Pages come from the sidecar index, newest page first, decoding only their rows
+- The streaming fallback without FTS5 gives the same pages and stats
+- follow prints matching messages as they are appended, and survives truncation
+- The polling watcher reports files appended to in place
+"""
+
+import unittest
+import json
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "utilities"))
+
+import zmq_log_viewer
+from inbox_events import create_watcher
+from zmq_log_viewer import FTS5_SUPPORT, LogView, filter_messages, follow
+
+
+def event(n, speaker="claude_code", tier="E", chain="reconstruction", hour=10):
+    return {"Id": f"id-{n}", "Timestamp": f"2025-11-30T{hour:02d}:00:{n % 60:02d}", "SpeakerName": speaker,
+            "SpeakerRole": "Agent", "Message": json.dumps({"message": f"message {n}"}),
+            "Metadata": {"topic": "general", "chain_type": chain, "ace_tier": tier}}
+
+
+LOG = [event(n, speaker=("claude_code", "gemini_cli")[n % 2], tier="A" if n % 3 == 0 else "E",
+             hour=9 + n // 10) for n in range(25)]
+
+
+class LogViewTests:
+    """Shared cases for the indexed and streaming views"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.log = Path(self.tmp.name) / "session.jsonl"
+        with open(self.log, 'w', encoding='utf-8') as f:
+            f.write("".join(json.dumps(e) + "\n" for e in LOG[:10]) + "not json\n"
+                    + "".join(json.dumps(e) + "\n" for e in LOG[10:]))
+
+    def view(self, **filters):
+        view = LogView(self.log, **filters)
+        if view.index is not None:
+            self.addCleanup(view.index.close)
+        return view
+
+    def ids(self, page):
+        return [msg['Id'] for _, msg in page]
+
+    def test_pages_and_filters(self):
+        view = self.view()
+        self.assertEqual(self.ids(view.page(1, 10)), [f"id-{n}" for n in range(15, 25)])
+        self.assertEqual(self.ids(view.page(3, 10)), [f"id-{n}" for n in range(5)])
+        self.assertEqual(view.page(4, 10), [])
+        self.assertEqual(view.end_offset, self.log.stat().st_size)
+
+        view = self.view(tier="a", sender="GEMINI_CLI", since="2025-11-30T10:00:00")
+        self.assertEqual(self.ids(view.page(1, 10)), ["id-15", "id-21"])
+        self.assertEqual(view.page(1, 10)[0][0], 16)  # Line 16 of the valid messages
+        stats = view.stats()
+        self.assertEqual((stats['count'], stats['tier'], stats['speaker']), (2, {'A': 2}, {'gemini_cli': 2}))
+        self.assertEqual((stats['first_us'], stats['last_us']), ("2025-11-30T10:00:15", "2025-11-30T11:00:21"))
+
+        with self.assertRaises(ValueError):
+            self.view(since="last week")
+
+
+@unittest.skipUnless(FTS5_SUPPORT, "SQLite built without FTS5")
+class TestIndexedLogView(LogViewTests, unittest.TestCase):
+    """LogView over the sidecar index"""
+
+    def test_only_page_rows_are_decoded(self):
+        self.view()  # Builds the index
+        view = self.view(chain="reconstruction")
+        with mock.patch('persistence.storage.search_index.json.loads', wraps=json.loads) as loads:
+            self.assertEqual(len(view.page(2, 5)), 5)
+        self.assertEqual(loads.call_count, 5)
+        self.assertTrue((self.log.parent / "session.index.db").exists())
+
+
+class TestStreamingLogView(LogViewTests, unittest.TestCase):
+    """LogView without FTS5"""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(zmq_log_viewer, 'FTS5_SUPPORT', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TestFollow(unittest.TestCase):
+    """Test cases for --follow and in-place change watching"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.log = Path(self.tmp.name) / "session.jsonl"
+
+    def append(self, events):
+        with open(self.log, 'a', encoding='utf-8') as f:
+            f.write("".join(json.dumps(e) + "\n" for e in events))
+
+    def wait_for(self, shown, count, timeout=5):
+        deadline = time.time() + timeout
+        while len(shown) < count and time.time() < deadline:
+            time.sleep(0.02)
+
+    def test_follow(self):
+        self.append(LOG[:3])
+        shown, stop = [], threading.Event()
+        with mock.patch.object(zmq_log_viewer, 'display_message', lambda msg, **_: shown.append(msg['Id'])):
+            thread = threading.Thread(target=follow, args=(self.log, self.log.stat().st_size, {'sender': 'gemini_cli'}),
+                                      kwargs={'stop': stop, 'poll_seconds': 5})
+            thread.start()
+            time.sleep(0.2)
+            start = time.time()
+            self.append(LOG[3:6])
+            self.wait_for(shown, 2)
+            self.assertLess(time.time() - start, 2)  # An event, not the 5 s poll
+            self.log.write_text(json.dumps(LOG[7]) + "\n", encoding='utf-8')  # Rotated
+            self.wait_for(shown, 3, timeout=12)
+            stop.set()
+            thread.join(timeout=10)
+        self.assertEqual(shown, ["id-3", "id-5", "id-7"])
+
+    def test_polling_watcher_reports_appends(self):
+        self.append(LOG[:1])
+        changed = []
+        watcher = create_watcher({'logs': self.log.parent}, lambda _, path: changed.append(path.name),
+                                 backend="poll", modified=True)
+        watcher.start()
+        self.addCleanup(watcher.stop)
+        time.sleep(0.15)
+        self.append(LOG[1:2])
+        deadline = time.time() + 2
+        while not changed and time.time() < deadline:
+            time.sleep(0.02)
+        self.assertIn("session.jsonl", changed)
+
+    def test_filter_messages(self):
+        self.assertEqual([m['Id'] for m in filter_messages(LOG[:7], tier="A", chain="RECONSTRUCTION")],
+                         ["id-0", "id-3", "id-6"])
+
+
+if __name__ == "__main__":
+    unittest.main()